@@ -7,6 +7,8 @@ from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeybo
 import psycopg2
 import time
 import os
+import threading
+import functools
 
 import imaplib
 import email
@@ -14,28 +16,481 @@ from pyrogram import Client, filters
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, Message, CallbackQuery
 
 
+# ======================
+# ADMIN STATS REGISTRY
+# ======================
+# Kowane sashe (pool, queue, da sauransu) yana rijista function
+# da ke dawo da rubutu, /stats kuma yana haɗa su gaba ɗaya.
+STATS_SECTIONS = []
+
+def register_stats_section(title, fn):
+    STATS_SECTIONS.append((title, fn))
+
+
+def build_stats_text():
+    blocks = []
+    for title, fn in STATS_SECTIONS:
+        try:
+            body = fn()
+        except Exception as e:
+            body = f"error: {e}"
+        blocks.append(f"<b>{title}</b>\n{body}")
+    return "\n\n".join(blocks) if blocks else "Babu stats."
+
+
+# ======================
+# QUERY LATENCY STATS
+# ======================
+SLOW_QUERY_MS = int(os.environ.get("SLOW_QUERY_MS", 500))
+
+QUERY_STATS = {}
+QUERY_STATS_LOCK = threading.Lock()
+
+
+def _query_key(sql):
+    if isinstance(sql, bytes):
+        sql = sql.decode("utf-8", "ignore")
+    elif not isinstance(sql, str):
+        sql = str(sql)
+    return " ".join(sql.split())[:70]
+
+
+def record_query(sql, elapsed):
+    key = _query_key(sql)
+    with QUERY_STATS_LOCK:
+        st = QUERY_STATS.get(key)
+        if st is None:
+            st = QUERY_STATS[key] = {"count": 0, "total": 0.0, "max": 0.0}
+        st["count"] += 1
+        st["total"] += elapsed
+        if elapsed > st["max"]:
+            st["max"] = elapsed
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        print(f"🐢 SLOW QUERY {elapsed * 1000:.0f}ms:", key)
+
+
+def query_stats_text(limit=8):
+    with QUERY_STATS_LOCK:
+        rows = sorted(
+            QUERY_STATS.items(),
+            key=lambda kv: kv[1]["total"],
+            reverse=True
+        )[:limit]
+
+    if not rows:
+        return "Babu query tukuna."
+
+    lines = []
+    for key, st in rows:
+        avg = st["total"] / st["count"] * 1000
+        lines.append(
+            f"• {st['count']}x avg {avg:.1f}ms max {st['max'] * 1000:.1f}ms\n"
+            f"  <code>{key.replace('<', '&lt;')}</code>"
+        )
+    return "\n".join(lines)
+
+
+# ======================
+# TTL CACHE
+# ======================
+# Dict mai iyaka: maxsize (LRU eviction) + ttl (seconds, None = babu).
+# Ana amfani da shi maimakon module dict da ke girma har abada.
+from collections import OrderedDict
+
+TTL_CACHES = []
+
+
+class TTLCache:
+
+    def __init__(self, name, maxsize=1000, ttl=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()     # key -> (value, deadline)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        TTL_CACHES.append(self)
+
+    def _alive(self, key, now):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= now:
+            del self._data[key]
+            self.expired += 1
+            return None
+        return entry
+
+    def _purge(self, now):
+        # Daga mafi tsufa; tsaya a na farko da bai kare ba
+        while self._data:
+            key, (value, deadline) = next(iter(self._data.items()))
+            if deadline is None or deadline > now:
+                break
+            del self._data[key]
+            self.expired += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._alive(key, time.monotonic())
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.monotonic()
+        with self._lock:
+            self._data[key] = (value, now + ttl if ttl else None)
+            self._data.move_to_end(key)
+            self._purge(now)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, *default):
+        with self._lock:
+            entry = self._alive(key, time.monotonic())
+            if entry is None:
+                if default:
+                    return default[0]
+                raise KeyError(key)
+            del self._data[key]
+            return entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __getitem__(self, key):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __delitem__(self, key):
+        self.pop(key)
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._alive(key, time.monotonic()) is not None
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0.0
+        return (
+            f"• {self.name}: {len(self._data)}/{self.maxsize} "
+            f"hit {rate:.0f}% ({self.hits}/{total}) "
+            f"evict {self.evictions} exp {self.expired}"
+        )
+
+
+def ttl_cache_stats_text():
+    if not TTL_CACHES:
+        return "Babu cache."
+    return "\n".join(c.stats() for c in TTL_CACHES)
+
+
+register_stats_section("🗃 CACHES", ttl_cache_stats_text)
+
+
+class TimedCursor:
+    """
+    Wrapper a kan psycopg2 cursor wanda yake auna lokacin kowane query.
+    """
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def execute(self, sql, params=None):
+        start = time.monotonic()
+        try:
+            self._raw.execute(sql, params)
+        finally:
+            record_query(sql, time.monotonic() - start)
+        return self
+
+    def executemany(self, sql, seq):
+        start = time.monotonic()
+        try:
+            self._raw.executemany(sql, seq)
+        finally:
+            record_query(sql, time.monotonic() - start)
+        return self
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._raw.close()
+        return False
+
+
+# ======================
+# CONNECTION POOL
+# ======================
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+WALLET_DB_POOL_SIZE = int(os.environ.get("WALLET_DB_POOL_SIZE", 5))
+DB_POOL_MAX_LIFETIME = int(os.environ.get("DB_POOL_MAX_LIFETIME", 1800))   # seconds
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 10))               # seconds jiran checkout
+DB_POOL_HEALTHCHECK_IDLE = int(os.environ.get("DB_POOL_HEALTHCHECK_IDLE", 30))
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PgPool:
+    """
+    Bounded, thread-safe pool na psycopg2 connections.
+    - health check lokacin checkout (SELECT 1 idan connection ya dade a zaune)
+    - max lifetime: tsohon connection ana rufe shi a bude sabo
+    - stats: in use, idle, wait time
+    """
+
+    def __init__(self, name, dsn, maxconn, max_lifetime, timeout, healthcheck_idle):
+        self.name = name
+        self.dsn = dsn
+        self.maxconn = maxconn
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.healthcheck_idle = healthcheck_idle
+
+        self._cond = threading.Condition()
+        self._idle = []          # [(raw_conn, created_at, last_used)]
+        self._in_use = 0
+        self._opening = 0
+
+        self.opened = 0
+        self.recycled = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.health_failures = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    # ---------- internal ----------
+    def _connect(self):
+        c = psycopg2.connect(
+            self.dsn,
+            connect_timeout=5,
+            sslmode="require"
+        )
+        c.autocommit = True
+        return c
+
+    def dedicated(self):
+        """
+        Connection na musamman (ba a cikin pool ba), misali domin session
+        advisory lock da dole ya zauna a buɗe.
+        """
+        return self._connect()
+
+    def _close_raw(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _healthy(self, raw, created_at, last_used):
+        now = time.monotonic()
+
+        if raw.closed:
+            return False
+
+        if now - created_at > self.max_lifetime:
+            self.recycled += 1
+            return False
+
+        if now - last_used > self.healthcheck_idle:
+            try:
+                c = raw.cursor()
+                c.execute("SELECT 1")
+                c.close()
+            except Exception:
+                self.health_failures += 1
+                return False
+
+        return True
+
+    # ---------- public ----------
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+
+        while True:
+            entry = None
+            must_open = False
+
+            with self._cond:
+                while True:
+                    if self._idle:
+                        entry = self._idle.pop()
+                        self._in_use += 1
+                        break
+
+                    if self._in_use + self._opening < self.maxconn:
+                        self._opening += 1
+                        must_open = True
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(
+                            f"{self.name} pool exhausted ({self.maxconn} in use)"
+                        )
+                    self._cond.wait(remaining)
+
+            if must_open:
+                try:
+                    raw = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._opening -= 1
+                        self._cond.notify()
+                    raise
+
+                with self._cond:
+                    self._opening -= 1
+                    self._in_use += 1
+                    self.opened += 1
+                created_at = time.monotonic()
+
+            else:
+                raw, created_at, last_used = entry
+                if not self._healthy(raw, created_at, last_used):
+                    self._close_raw(raw)
+                    with self._cond:
+                        self._in_use -= 1
+                        self._cond.notify()
+                    continue
+
+            waited = time.monotonic() - start
+            with self._cond:
+                self.checkouts += 1
+                self.wait_total += waited
+                if waited > self.wait_max:
+                    self.wait_max = waited
+
+            return PooledConnection(self, raw, created_at)
+
+    def putconn(self, raw, created_at):
+        keep = not raw.closed
+
+        if keep:
+            try:
+                if raw.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    raw.rollback()
+                if not raw.autocommit:
+                    raw.autocommit = True
+            except Exception:
+                keep = False
+
+        if not keep:
+            self._close_raw(raw)
+
+        with self._cond:
+            self._in_use -= 1
+            if keep:
+                self._idle.append((raw, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            avg_wait = (self.wait_total / self.checkouts * 1000) if self.checkouts else 0
+            return (
+                f"in use: {self._in_use} | idle: {len(self._idle)} | max: {self.maxconn}\n"
+                f"checkouts: {self.checkouts} | opened: {self.opened} | recycled: {self.recycled}\n"
+                f"wait avg: {avg_wait:.1f}ms | wait max: {self.wait_max * 1000:.1f}ms\n"
+                f"timeouts: {self.timeouts} | health failures: {self.health_failures}"
+            )
+
+
+class PooledConnection:
+    """
+    Wrapper a kan psycopg2 connection: close() yana mayar da shi pool
+    maimakon rufe shi, don haka tsofaffin call sites suna aiki kamar da.
+    """
+
+    def __init__(self, pool, raw, created_at):
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_raw", raw)
+        object.__setattr__(self, "_created_at", created_at)
+
+    def close(self):
+        raw = self._raw
+        if raw is None:
+            return
+        object.__setattr__(self, "_raw", None)
+        self._pool.putconn(raw, self._created_at)
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._raw.cursor(*args, **kwargs))
+
+    @property
+    def closed(self):
+        return 1 if self._raw is None else self._raw.closed
+
+    def __getattr__(self, name):
+        raw = object.__getattribute__(self, "_raw")
+        if raw is None:
+            raise psycopg2.InterfaceError("connection already returned to pool")
+        return getattr(raw, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._raw, name, value)
+
+    def __del__(self):
+        # Wasu handlers ba sa kiran conn.close() — kada connection ya bata
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
 # ======================
 # DATABASE CONNECTION
 # ======================
 DATABASE_URL = os.environ.get("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL is not set")
+
+DB_POOL = PgPool(
+    "main",
+    DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_POOL_MAX_LIFETIME,
+    DB_POOL_TIMEOUT,
+    DB_POOL_HEALTHCHECK_IDLE
+)
     
 def get_conn():
     try:
-        c = psycopg2.connect(
-            DATABASE_URL,
-            connect_timeout=5,
-            sslmode="require"
-        )
-        c.autocommit = True
-        return c
+        return DB_POOL.getconn()
     except Exception as e:
         print("❌ DB CONNECT ERROR:", e)
         return None
-conn = psycopg2.connect(DATABASE_URL)
-conn.autocommit = True
-cur = conn.cursor()
 # =========================================
 # ======================
 # WALLET DATABASE CONNECTION
@@ -45,66 +500,218 @@ WALLET_DATABASE_URL = os.environ.get("WALLET_DATABASE_URL")
 if not WALLET_DATABASE_URL:
     raise RuntimeError("WALLET_DATABASE_URL is not set")
 
+WALLET_DB_POOL = PgPool(
+    "wallet",
+    WALLET_DATABASE_URL,
+    WALLET_DB_POOL_SIZE,
+    DB_POOL_MAX_LIFETIME,
+    DB_POOL_TIMEOUT,
+    DB_POOL_HEALTHCHECK_IDLE
+)
+
 def get_wallet_conn():
     try:
-        c = psycopg2.connect(
-            WALLET_DATABASE_URL,
-            connect_timeout=5,
-            sslmode="require"
-        )
-        c.autocommit = True
-        return c
+        return WALLET_DB_POOL.getconn()
     except Exception as e:
         print("❌ WALLET DB CONNECT ERROR:", e)
         return None
 
-# ===== GLOBAL CONNECTION (FOR TABLE CREATION) =====
-wallet_conn = psycopg2.connect(WALLET_DATABASE_URL)
-wallet_conn.autocommit = True
-wallet_cur = wallet_conn.cursor()
+
+# ======================
+# REQUEST-SCOPED DB SESSION
+# ======================
+# Amfani:
+#   with db_session() as db:
+#       row = db.execute("SELECT ...", (x,)).fetchone()
+#
+#   @db_session(wallet=True)
+#   def credit(uid, amount, db=None): ...
+#
+# Session yana ɗaukar connection daga pool, transaction guda, commit idan
+# komai ya yi kyau, rollback idan error. Idan connection ya mutu kafin
+# statement na farko, ana sake haɗawa sau ɗaya ba tare da caller ya sani ba.
+_RECONNECT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class SessionCursor:
+
+    def __init__(self, session, args, kwargs):
+        self._session = session
+        self._args = args
+        self._kwargs = kwargs
+        self._cur = session.conn.cursor(*args, **kwargs)
+
+    def _rebind(self):
+        self._cur = self._session.conn.cursor(*self._args, **self._kwargs)
+
+    def execute(self, sql, params=None):
+        try:
+            self._cur.execute(sql, params)
+        except _RECONNECT_ERRORS as e:
+            if self._session.used:
+                raise
+            print("♻️ DB RECONNECT:", e)
+            self._session.reconnect()
+            self._cur.execute(sql, params)
+        self._session.used = True
+        return self
+
+    def executemany(self, sql, seq):
+        self._cur.executemany(sql, seq)
+        self._session.used = True
+        return self
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+    def __iter__(self):
+        return iter(self._cur)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cur.close()
+        return False
+
+
+class DBSession:
+
+    def __init__(self, wallet=False):
+        self.wallet = wallet
+        self.conn = None
+        self.used = False
+        self._cursors = []
+
+    # ---------- connection ----------
+    def _checkout(self):
+        pool = WALLET_DB_POOL if self.wallet else DB_POOL
+        try:
+            conn = pool.getconn()
+        except _RECONNECT_ERRORS as e:
+            print("♻️ DB RECONNECT (checkout):", e)
+            time.sleep(0.5)
+            conn = pool.getconn()
+        conn.autocommit = False
+        return conn
+
+    def reconnect(self):
+        old = self.conn
+        self.conn = None
+        try:
+            old._raw.close()
+        except Exception:
+            pass
+        try:
+            old.close()
+        except Exception:
+            pass
+
+        self.conn = self._checkout()
+        for c in self._cursors:
+            c._rebind()
+
+    # ---------- queries ----------
+    def cursor(self, *args, **kwargs):
+        c = SessionCursor(self, args, kwargs)
+        self._cursors.append(c)
+        return c
+
+    def execute(self, sql, params=None):
+        return self.cursor().execute(sql, params)
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    # ---------- lifecycle ----------
+    def __enter__(self):
+        self.conn = self._checkout()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        except Exception:
+            try:
+                self.conn.rollback()
+            except Exception:
+                pass
+            if exc_type is None:
+                raise
+        finally:
+            self._cursors = []
+            self.conn.close()
+        return False
+
+    def __call__(self, fn):
+        wallet = self.wallet
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if kwargs.get("db") is not None:
+                return fn(*args, **kwargs)
+            with DBSession(wallet) as db:
+                kwargs["db"] = db
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+
+def db_session(wallet=False):
+    return DBSession(wallet)
+
+
+register_stats_section("🗄 MAIN DB POOL", DB_POOL.stats)
+register_stats_section("👛 WALLET DB POOL", WALLET_DB_POOL.stats)
+register_stats_section("⏱ QUERY LATENCY", query_stats_text)
 
 
 #=== Farko
 
 def ensure_items_table():
-    conn = None
     try:
-        conn = get_conn()
-        cur = conn.cursor()
+        with db_session() as db:
+            cur = db.cursor()
 
-        # 1️⃣ Create table if not exists
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS items (
-                id SERIAL PRIMARY KEY,
-                title TEXT,
-                price INTEGER,
-                file_id TEXT,
-                file_name TEXT,
-                group_key TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                channel_msg_id INTEGER,
-                channel_username TEXT
-            )
-        """)
-        conn.commit()
+            # 1️⃣ Create table if not exists
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS items (
+                    id SERIAL PRIMARY KEY,
+                    title TEXT,
+                    price INTEGER,
+                    file_id TEXT,
+                    file_name TEXT,
+                    group_key TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    channel_msg_id INTEGER,
+                    channel_username TEXT
+                )
+            """)
+            db.commit()
 
-        # 2️⃣ Add column directly safely
-        cur.execute("""
-            ALTER TABLE items 
-            ADD COLUMN IF NOT EXISTS cashback_amount INTEGER DEFAULT 0;
-        """)
-        conn.commit()
+            # 2️⃣ Add column directly safely
+            cur.execute("""
+                ALTER TABLE items
+                ADD COLUMN IF NOT EXISTS cashback_amount INTEGER DEFAULT 0;
+            """)
+            db.commit()
+
+            # 3️⃣ Nau'in media (video/document/animation) na file_id
+            cur.execute("""
+                ALTER TABLE items
+                ADD COLUMN IF NOT EXISTS media_kind TEXT;
+            """)
 
-        cur.close()
         print("✅ items table structure verified successfully")
 
     except Exception as e:
-        if conn:
-            conn.rollback()
         print("❌ ITEMS TABLE MIGRATION ERROR:", e)
-    finally:
-        if conn:
-            conn.close()
 
 # Gudanar da shi gilma lokacin da script ta tashi
 try:
@@ -118,36 +725,32 @@ except Exception as e:
 # =============================
 def ensure_items_table():
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-
-        # 1️⃣ Create table if not exists
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS items (
-                id SERIAL PRIMARY KEY,
-                title TEXT,
-                price INTEGER,
-                file_id TEXT,
-                file_name TEXT,
-                group_key TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                channel_msg_id INTEGER,
-                channel_username TEXT
-            )
-        """)
+        with db_session() as db:
+            cur = db.cursor()
 
-        # 2️⃣ Ensure cashback_amount column exists
-        cur.execute("""
-            SELECT column_name FROM information_schema.columns
-            WHERE table_name='items'
-            AND column_name='cashback_amount'
-        """)
-        if not cur.fetchone():
-            cur.execute("ALTER TABLE items ADD COLUMN cashback_amount INTEGER DEFAULT 0")
+            # 1️⃣ Create table if not exists
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS items (
+                    id SERIAL PRIMARY KEY,
+                    title TEXT,
+                    price INTEGER,
+                    file_id TEXT,
+                    file_name TEXT,
+                    group_key TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    channel_msg_id INTEGER,
+                    channel_username TEXT
+                )
+            """)
 
-        conn.commit()
-        cur.close()
-        conn.close()
+            # 2️⃣ Ensure cashback_amount column exists
+            cur.execute("""
+                SELECT column_name FROM information_schema.columns
+                WHERE table_name='items'
+                AND column_name='cashback_amount'
+            """)
+            if not cur.fetchone():
+                cur.execute("ALTER TABLE items ADD COLUMN cashback_amount INTEGER DEFAULT 0")
 
         print("✅ items table structure verified successfully")
 
@@ -157,44 +760,43 @@ def ensure_items_table():
 #=== Farko
 
 def ensure_items_table():
-    conn = None
     try:
-        conn = get_conn()
-        cur = conn.cursor()
+        with db_session() as db:
+            cur = db.cursor()
 
-        # 1️⃣ Create table if not exists
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS items (
-                id SERIAL PRIMARY KEY,
-                title TEXT,
-                price INTEGER,
-                file_id TEXT,
-                file_name TEXT,
-                group_key TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                channel_msg_id INTEGER,
-                channel_username TEXT
-            )
-        """)
-        conn.commit()
+            # 1️⃣ Create table if not exists
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS items (
+                    id SERIAL PRIMARY KEY,
+                    title TEXT,
+                    price INTEGER,
+                    file_id TEXT,
+                    file_name TEXT,
+                    group_key TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    channel_msg_id INTEGER,
+                    channel_username TEXT
+                )
+            """)
+            db.commit()
 
-        # 2️⃣ Add column directly safely
-        cur.execute("""
-            ALTER TABLE items 
-            ADD COLUMN IF NOT EXISTS cashback_amount INTEGER DEFAULT 0;
-        """)
-        conn.commit()
+            # 2️⃣ Add column directly safely
+            cur.execute("""
+                ALTER TABLE items
+                ADD COLUMN IF NOT EXISTS cashback_amount INTEGER DEFAULT 0;
+            """)
+            db.commit()
+
+            # 3️⃣ Nau'in media (video/document/animation) na file_id
+            cur.execute("""
+                ALTER TABLE items
+                ADD COLUMN IF NOT EXISTS media_kind TEXT;
+            """)
 
-        cur.close()
         print("✅ items table structure verified successfully")
 
     except Exception as e:
-        if conn:
-            conn.rollback()
         print("❌ ITEMS TABLE MIGRATION ERROR:", e)
-    finally:
-        if conn:
-            conn.close()
 
 # Gudanar da shi gilma lokacin da script ta tashi
 try:
@@ -209,25 +811,22 @@ except Exception as e:
 # ==========================================
 def ensure_vip_invite_column():
     try:
-        conn = get_conn()
-        cur = conn.cursor()
+        with db_session() as db:
+            # Check if column exists
+            exists = db.execute("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name='vip_members'
+                AND column_name='invite_link'
+            """).fetchone()
 
-        # Check if column exists
-        cur.execute("""
-            SELECT column_name
-            FROM information_schema.columns
-            WHERE table_name='vip_members'
-            AND column_name='invite_link'
-        """)
-        exists = cur.fetchone()
+            if not exists:
+                db.execute("""
+                    ALTER TABLE vip_members
+                    ADD COLUMN invite_link TEXT DEFAULT NULL
+                """)
 
         if not exists:
-            cur.execute("""
-                ALTER TABLE vip_members
-                ADD COLUMN invite_link TEXT DEFAULT NULL
-            """)
-            conn.commit()
-
             try:
                 bot.send_message(ADMIN_ID, "✅ invite_link column created successfully.")
             except:
@@ -238,9 +837,6 @@ def ensure_vip_invite_column():
             except:
                 pass
 
-        cur.close()
-        conn.close()
-
     except Exception as e:
         try:
             bot.send_message(ADMIN_ID, f"❌ DB AUTO FIX ERROR:\n{e}")
@@ -258,96 +854,93 @@ ensure_vip_invite_column()
 
 def ensure_vip_table_structure():
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-
-        print("🔍 Checking VIP table structure...")
-
-        # ================= CHECK TABLE =================
-        cur.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_name = 'vip_members'
-            )
-        """)
-        table_exists = cur.fetchone()[0]
+        with db_session() as db:
+            cur = db.cursor()
 
-        if not table_exists:
-            print("⚠️ vip_members table not found. Creating it...")
+            print("🔍 Checking VIP table structure...")
 
+            # ================= CHECK TABLE =================
             cur.execute("""
-                CREATE TABLE vip_members (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT UNIQUE NOT NULL,
-                    order_id TEXT,
-                    join_date TIMESTAMP,
-                    expire_at TIMESTAMP,
-                    status TEXT DEFAULT 'active',
-                    warn1_sent BOOLEAN DEFAULT FALSE,
-                    warn2_sent BOOLEAN DEFAULT FALSE,
-                    payment_date TIMESTAMP DEFAULT NOW()
+                SELECT EXISTS (
+                    SELECT FROM information_schema.tables 
+                    WHERE table_name = 'vip_members'
                 )
             """)
+            table_exists = cur.fetchone()[0]
 
-            conn.commit()
-            print("✅ vip_members table created.")
+            if not table_exists:
+                print("⚠️ vip_members table not found. Creating it...")
 
-        else:
-            print("✅ vip_members table exists. Checking columns...")
+                cur.execute("""
+                    CREATE TABLE vip_members (
+                        id SERIAL PRIMARY KEY,
+                        user_id BIGINT UNIQUE NOT NULL,
+                        order_id TEXT,
+                        join_date TIMESTAMP,
+                        expire_at TIMESTAMP,
+                        status TEXT DEFAULT 'active',
+                        warn1_sent BOOLEAN DEFAULT FALSE,
+                        warn2_sent BOOLEAN DEFAULT FALSE,
+                        payment_date TIMESTAMP DEFAULT NOW()
+                    )
+                """)
 
-            # ================= CHECK COLUMNS =================
-            cur.execute("""
-                SELECT column_name
-                FROM information_schema.columns
-                WHERE table_name='vip_members'
-            """)
-            existing_cols = [r[0] for r in cur.fetchall()]
+                db.commit()
+                print("✅ vip_members table created.")
 
-            def add_column(query, col_name):
-                if col_name not in existing_cols:
-                    print(f"⚠️ Adding missing column: {col_name}")
-                    cur.execute(query)
+            else:
+                print("✅ vip_members table exists. Checking columns...")
 
-            add_column(
-                "ALTER TABLE vip_members ADD COLUMN order_id TEXT",
-                "order_id"
-            )
+                # ================= CHECK COLUMNS =================
+                cur.execute("""
+                    SELECT column_name
+                    FROM information_schema.columns
+                    WHERE table_name='vip_members'
+                """)
+                existing_cols = [r[0] for r in cur.fetchall()]
 
-            add_column(
-                "ALTER TABLE vip_members ADD COLUMN join_date TIMESTAMP",
-                "join_date"
-            )
+                def add_column(query, col_name):
+                    if col_name not in existing_cols:
+                        print(f"⚠️ Adding missing column: {col_name}")
+                        cur.execute(query)
 
-            add_column(
-                "ALTER TABLE vip_members ADD COLUMN expire_at TIMESTAMP",
-                "expire_at"
-            )
+                add_column(
+                    "ALTER TABLE vip_members ADD COLUMN order_id TEXT",
+                    "order_id"
+                )
 
-            add_column(
-                "ALTER TABLE vip_members ADD COLUMN status TEXT DEFAULT 'active'",
-                "status"
-            )
+                add_column(
+                    "ALTER TABLE vip_members ADD COLUMN join_date TIMESTAMP",
+                    "join_date"
+                )
 
-            add_column(
-                "ALTER TABLE vip_members ADD COLUMN warn1_sent BOOLEAN DEFAULT FALSE",
-                "warn1_sent"
-            )
+                add_column(
+                    "ALTER TABLE vip_members ADD COLUMN expire_at TIMESTAMP",
+                    "expire_at"
+                )
 
-            add_column(
-                "ALTER TABLE vip_members ADD COLUMN warn2_sent BOOLEAN DEFAULT FALSE",
-                "warn2_sent"
-            )
+                add_column(
+                    "ALTER TABLE vip_members ADD COLUMN status TEXT DEFAULT 'active'",
+                    "status"
+                )
 
-            add_column(
-                "ALTER TABLE vip_members ADD COLUMN payment_date TIMESTAMP DEFAULT NOW()",
-                "payment_date"
-            )
+                add_column(
+                    "ALTER TABLE vip_members ADD COLUMN warn1_sent BOOLEAN DEFAULT FALSE",
+                    "warn1_sent"
+                )
+
+                add_column(
+                    "ALTER TABLE vip_members ADD COLUMN warn2_sent BOOLEAN DEFAULT FALSE",
+                    "warn2_sent"
+                )
 
-            conn.commit()
-            print("✅ VIP table structure verified.")
+                add_column(
+                    "ALTER TABLE vip_members ADD COLUMN payment_date TIMESTAMP DEFAULT NOW()",
+                    "payment_date"
+                )
 
-        cur.close()
-        conn.close()
+                db.commit()
+                print("✅ VIP table structure verified.")
 
     except Exception as e:
         print("❌ VIP STRUCTURE CHECK FAILED:", e)
@@ -362,51 +955,54 @@ ensure_vip_table_structure()
 # =============================
 def ensure_vip_members_table():
     try:
-        # 1️⃣ Create table if not exists
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS vip_members (
-                id SERIAL PRIMARY KEY,
-                user_id BIGINT UNIQUE NOT NULL
-            )
-        """)
+        with db_session() as db:
+            cur = db.cursor()
 
-        # 2️⃣ Ensure order_id column
-        cur.execute("""
-            SELECT column_name FROM information_schema.columns
-            WHERE table_name='vip_members'
-            AND column_name='order_id'
-        """)
-        if not cur.fetchone():
-            cur.execute("ALTER TABLE vip_members ADD COLUMN order_id TEXT")
+            # 1️⃣ Create table if not exists
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS vip_members (
+                    id SERIAL PRIMARY KEY,
+                    user_id BIGINT UNIQUE NOT NULL
+                )
+            """)
 
-        # 3️⃣ Ensure join_date column
-        cur.execute("""
-            SELECT column_name FROM information_schema.columns
-            WHERE table_name='vip_members'
-            AND column_name='join_date'
-        """)
-        if not cur.fetchone():
-            cur.execute("ALTER TABLE vip_members ADD COLUMN join_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
+            # 2️⃣ Ensure order_id column
+            cur.execute("""
+                SELECT column_name FROM information_schema.columns
+                WHERE table_name='vip_members'
+                AND column_name='order_id'
+            """)
+            if not cur.fetchone():
+                cur.execute("ALTER TABLE vip_members ADD COLUMN order_id TEXT")
 
-        # 4️⃣ Ensure expire_at column
-        cur.execute("""
-            SELECT column_name FROM information_schema.columns
-            WHERE table_name='vip_members'
-            AND column_name='expire_at'
-        """)
-        if not cur.fetchone():
-            cur.execute("ALTER TABLE vip_members ADD COLUMN expire_at TIMESTAMP")
+            # 3️⃣ Ensure join_date column
+            cur.execute("""
+                SELECT column_name FROM information_schema.columns
+                WHERE table_name='vip_members'
+                AND column_name='join_date'
+            """)
+            if not cur.fetchone():
+                cur.execute("ALTER TABLE vip_members ADD COLUMN join_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
 
-        # 5️⃣ Ensure status column
-        cur.execute("""
-            SELECT column_name FROM information_schema.columns
-            WHERE table_name='vip_members'
-            AND column_name='status'
-        """)
-        if not cur.fetchone():
-            cur.execute("ALTER TABLE vip_members ADD COLUMN status VARCHAR(20) DEFAULT 'active'")
+            # 4️⃣ Ensure expire_at column
+            cur.execute("""
+                SELECT column_name FROM information_schema.columns
+                WHERE table_name='vip_members'
+                AND column_name='expire_at'
+            """)
+            if not cur.fetchone():
+                cur.execute("ALTER TABLE vip_members ADD COLUMN expire_at TIMESTAMP")
+
+            # 5️⃣ Ensure status column
+            cur.execute("""
+                SELECT column_name FROM information_schema.columns
+                WHERE table_name='vip_members'
+                AND column_name='status'
+            """)
+            if not cur.fetchone():
+                cur.execute("ALTER TABLE vip_members ADD COLUMN status VARCHAR(20) DEFAULT 'active'")
 
-        print("✅ vip_members table structure verified")
+            print("✅ vip_members table structure verified")
 
     except Exception as e:
         print("❌ VIP MEMBERS MIGRATION ERROR:", e)
@@ -419,33 +1015,36 @@ ensure_vip_members_table()
 # =============================
 def ensure_vip_members_table():
     try:
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS vip_members (
-                id SERIAL PRIMARY KEY,
-                user_id BIGINT UNIQUE NOT NULL
-            )
-        """)
+        with db_session() as db:
+            cur = db.cursor()
 
-        # Helper function
-        def ensure_column(column_name, column_type):
             cur.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_name='vip_members'
-                AND column_name=%s
-            """, (column_name,))
-            if not cur.fetchone():
-                cur.execute(f"ALTER TABLE vip_members ADD COLUMN {column_name} {column_type}")
-
-        # Required columns
-        ensure_column("order_id", "TEXT")
-        ensure_column("join_date", "TIMESTAMP")
-        ensure_column("expire_at", "TIMESTAMP")
-        ensure_column("status", "VARCHAR(20) DEFAULT 'active'")
-        ensure_column("warn1_sent", "BOOLEAN DEFAULT FALSE")
-        ensure_column("warn2_sent", "BOOLEAN DEFAULT FALSE")
-        ensure_column("payment_date", "TIMESTAMP")
+                CREATE TABLE IF NOT EXISTS vip_members (
+                    id SERIAL PRIMARY KEY,
+                    user_id BIGINT UNIQUE NOT NULL
+                )
+            """)
 
-        print("✅ vip_members table structure verified")
+            # Helper function
+            def ensure_column(column_name, column_type):
+                cur.execute("""
+                    SELECT column_name FROM information_schema.columns
+                    WHERE table_name='vip_members'
+                    AND column_name=%s
+                """, (column_name,))
+                if not cur.fetchone():
+                    cur.execute(f"ALTER TABLE vip_members ADD COLUMN {column_name} {column_type}")
+
+            # Required columns
+            ensure_column("order_id", "TEXT")
+            ensure_column("join_date", "TIMESTAMP")
+            ensure_column("expire_at", "TIMESTAMP")
+            ensure_column("status", "VARCHAR(20) DEFAULT 'active'")
+            ensure_column("warn1_sent", "BOOLEAN DEFAULT FALSE")
+            ensure_column("warn2_sent", "BOOLEAN DEFAULT FALSE")
+            ensure_column("payment_date", "TIMESTAMP")
+
+            print("✅ vip_members table structure verified")
 
     except Exception as e:
         print("❌ VIP MEMBERS MIGRATION ERROR:", e)
@@ -455,19 +1054,22 @@ def ensure_vip_members_table():
 # =============================
 def ensure_orders_columns():
     try:
-        cur.execute("""
-            SELECT column_name
-            FROM information_schema.columns
-            WHERE table_name='orders'
-              AND column_name='type'
-        """)
-        exists = cur.fetchone()
+        with db_session() as db:
+            cur = db.cursor()
 
-        if not exists:
-            cur.execute("ALTER TABLE orders ADD COLUMN type VARCHAR(20) DEFAULT 'film'")
-            print("✅ Column 'type' added successfully")
-        else:
-            print("✅ Column 'type' already exists")
+            cur.execute("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name='orders'
+                  AND column_name='type'
+            """)
+            exists = cur.fetchone()
+
+            if not exists:
+                cur.execute("ALTER TABLE orders ADD COLUMN type VARCHAR(20) DEFAULT 'film'")
+                print("✅ Column 'type' added successfully")
+            else:
+                print("✅ Column 'type' already exists")
 
     except Exception as e:
         print("❌ MIGRATION ERROR:", e)
@@ -480,590 +1082,1258 @@ ensure_orders_columns()
 
 
 # ======================
-# GLOBAL STATES
+# SHARED STATE STORE
 # ======================
-TRANSFER_STAGE = {}
-admin_states = {}
-last_menu_msg = {}
-last_category_msg = {}
-last_allfilms_msg = {}
-allfilms_sessions = {}
-cart_sessions = {}
-series_sessions = {}
-user_states = {}
-active_links = {}
+# Conversation state (user_states, cart_sessions, TRANSFER_STAGE, ...) ba
+# ya zama a cikin process kadai ba: restart ko worker na biyu yana ganin
+# state daya. Backend: postgres (UNLOGGED table) ko memory (process daya).
+# Kowane worker yana da cache na gida; rubutu → NOTIFY → sauran workers
+# suna goge nasu cache.
+#
+# MUHIMMI: value kwafi ne (JSON). Idan ka canza abu a ciki, ka mayar da
+# shi: `st = X[uid]; st["a"] = 1; X[uid] = st` — ko `with X.mutate(uid)`.
+import json
+import select
+from contextlib import contextmanager
 
+STATE_BACKEND = os.environ.get("STATE_BACKEND", "postgres")
+STATE_TTL_SECONDS = int(os.environ.get("STATE_TTL_SECONDS", 86400))
+STATE_CACHE_TTL = int(os.environ.get("STATE_CACHE_TTL", 60))
+STATE_CACHE_SIZE = int(os.environ.get("STATE_CACHE_SIZE", 10000))
+STATE_CHANNEL = "bot_state"
 
-# =========================
-# WALLET DATABASE TABLES
-# =========================
 
-# -------- WALLET BALANCE --------
-wallet_cur.execute("""
-CREATE TABLE IF NOT EXISTS wallet_balance (
-    user_id BIGINT PRIMARY KEY,
-    balance BIGINT DEFAULT 0,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
-
-# -------- WALLET TRANSACTIONS --------
-wallet_cur.execute("""
-CREATE TABLE IF NOT EXISTS wallet_transactions (
-    id SERIAL PRIMARY KEY,
-    user_id BIGINT NOT NULL,
-    amount BIGINT NOT NULL,
-    type VARCHAR(30) NOT NULL,
-    reference TEXT,
-    description TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
-
-# index domin saurin transaction history
-wallet_cur.execute("""
-CREATE INDEX IF NOT EXISTS idx_wallet_transactions_user
-ON wallet_transactions(user_id)
-""")
-
-# -------- WALLET DEPOSITS (PAYSTACK) --------
-wallet_cur.execute("""
-CREATE TABLE IF NOT EXISTS wallet_deposits (
-    id TEXT PRIMARY KEY,
-    user_id BIGINT NOT NULL,
-    amount BIGINT NOT NULL,
-    type VARCHAR(30) DEFAULT 'wallet',
-    paystack_ref TEXT UNIQUE,
-    status VARCHAR(20) DEFAULT 'pending',
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    paid_at TIMESTAMP
-)
-""")
-
-# index domin saurin lookup
-wallet_cur.execute("""
-CREATE INDEX IF NOT EXISTS idx_wallet_deposits_user
-ON wallet_deposits(user_id)
-""")
-
-# -------- WALLET WITHDRAWALS (ADMIN USE) --------
-wallet_cur.execute("""
-CREATE TABLE IF NOT EXISTS wallet_withdrawals (
-    id SERIAL PRIMARY KEY,
-    user_id BIGINT,
-    amount BIGINT,
-    status VARCHAR(20) DEFAULT 'pending',
-    processed_by BIGINT,
-    reference TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    processed_at TIMESTAMP
-)
-""")
+class PgNotifyListener:
+    """
+    Connection daya (dedicated) na LISTEN ga dukkan channels na process.
+    subscribe(channel, on_notify, on_reset): on_notify(payload) ga kowane
+    NOTIFY; on_reset() bayan kowane (re)connect — abin da aka rasa ba a sani ba.
+    """
 
-# index domin saurin admin queries
-wallet_cur.execute("""
-CREATE INDEX IF NOT EXISTS idx_wallet_withdrawals_user
-ON wallet_withdrawals(user_id)
-""")
+    def __init__(self):
+        self.conn = None
+        self.handlers = {}       # channel -> (on_notify, on_reset)
+        self.active = set()      # channels da ake LISTEN a kan conn na yanzu
+        self.lock = threading.Lock()
+        self.started = False
+        self.notifications = 0
+        self.reconnects = 0
+
+    def subscribe(self, channel, on_notify, on_reset=None):
+        with self.lock:
+            self.handlers[channel] = (on_notify, on_reset)
+            if self.started:
+                return
+            self.started = True
+        threading.Thread(target=self._loop, daemon=True).start()
 
-#===============
-# END DB MyWallet
-#===============
+    def listening(self, channel):
+        return channel in self.active
 
+    def _listen_new(self):
+        with self.lock:
+            pending = [(ch, h) for ch, h in self.handlers.items() if ch not in self.active]
 
+        for channel, (_, on_reset) in pending:
+            cur = self.conn.cursor()
+            cur.execute(f"LISTEN {channel}")
+            cur.close()
+            if on_reset:
+                on_reset()
+            self.active.add(channel)
 
-# =========================
-# DATABASE TABLES (SAFE)
-# =========================
+    def _loop(self):
+        while True:
+            try:
+                self.conn = DB_POOL.dedicated()
+                while True:
+                    self._listen_new()
+                    if select.select([self.conn], [], [], 5) == ([], [], []):
+                        continue
+                    self.conn.poll()
+                    while self.conn.notifies:
+                        n = self.conn.notifies.pop(0)
+                        handler = self.handlers.get(n.channel)
+                        if not handler:
+                            continue
+                        self.notifications += 1
+                        try:
+                            handler[0](n.payload)
+                        except Exception as e:
+                            print("NOTIFY HANDLER ERROR:", n.channel, e)
 
+            except Exception as e:
+                print("PG LISTENER ERROR:", e)
+                self.active.clear()
+                self.reconnects += 1
+                try:
+                    self.conn.close()
+                except Exception:
+                    pass
+                time.sleep(5)
 
-# ================= ADMIN NOTES TABLE =================
+    def stats(self):
+        channels = ", ".join(sorted(self.active)) or "⚠️ none"
+        return f"listening: {channels} | notifies: {self.notifications} | reconnects: {self.reconnects}"
 
-cur.execute("""
-CREATE TABLE IF NOT EXISTS admin_notes (
-    id SERIAL PRIMARY KEY,
-    admin_id BIGINT NOT NULL,
-    content TEXT NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
-
-# ===== INDEX domin saurin fetch =====
-cur.execute("""
-CREATE INDEX IF NOT EXISTS idx_admin_notes_admin
-ON admin_notes(admin_id)
-""")
-
-
-# -------- MOVIES --------
-cur.execute("""
-CREATE TABLE IF NOT EXISTS movies (
-    id SERIAL PRIMARY KEY,
-    title TEXT,
-    price INTEGER,
-    file_id TEXT,
-    file_name TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    channel_msg_id INTEGER,
-    channel_username TEXT
-)
-""")
-
-# -------- ITEMS --------
-cur.execute("""
-CREATE TABLE IF NOT EXISTS items (
-    id SERIAL PRIMARY KEY,
-    title TEXT,
-    price INTEGER,
-    file_id TEXT,
-    file_name TEXT,
-    group_key TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    channel_msg_id INTEGER,
-    channel_username TEXT,
-    cashback_amount INTEGER DEFAULT 0
-)
-""")
-
-
-# -------- ORDERS --------
-cur.execute("""
-CREATE TABLE IF NOT EXISTS orders (
-    id TEXT PRIMARY KEY,
-    user_id BIGINT,
-    movie_id INTEGER,
-    item_id INTEGER,
-    amount INTEGER,
-    paid INTEGER DEFAULT 0,
-    pay_ref TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    type VARCHAR(20) DEFAULT 'film'
-)
-""")
-
-
-# -------- VIP MEMBERS --------
-cur.execute("""
-CREATE TABLE IF NOT EXISTS vip_members (
-    id SERIAL PRIMARY KEY,
-    user_id BIGINT UNIQUE NOT NULL,
-    order_id TEXT,
-    join_date TIMESTAMP,
-    expire_at TIMESTAMP,
-    status VARCHAR(20) DEFAULT 'active',
-    warn1_sent BOOLEAN DEFAULT FALSE,
-    warn2_sent BOOLEAN DEFAULT FALSE,
-    payment_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    invite_link TEXT DEFAULT NULL
-)
-""")
-
-# -------- ORDER ITEMS --------
-cur.execute("""
-CREATE TABLE IF NOT EXISTS order_items (
-    id SERIAL PRIMARY KEY,
-    order_id TEXT,
-    movie_id INTEGER,
-    item_id INTEGER,
-    price INTEGER,
-    file_id TEXT
-)
-""")
-
-# -------- WEEKLY --------
-cur.execute("""
-CREATE TABLE IF NOT EXISTS weekly (
-    id SERIAL PRIMARY KEY,
-    poster_file_id TEXT,
-    items TEXT,
-    file_name TEXT,
-    file_id TEXT,
-    channel_msg_id INTEGER,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
-
-# -------- CART --------
-cur.execute("""
-CREATE TABLE IF NOT EXISTS cart (
-    id SERIAL PRIMARY KEY,
-    user_id BIGINT,
-    movie_id INTEGER,
-    item_id INTEGER,
-    price INTEGER,
-    added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
-
-# -------- REFERRALS --------
-cur.execute("""
-CREATE TABLE IF NOT EXISTS referrals (
-    id SERIAL PRIMARY KEY,
-    referrer_id BIGINT,
-    referred_id BIGINT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    reward_granted INTEGER DEFAULT 0
-)
-""")
-
-# -------- REORDERS --------
-cur.execute("""
-CREATE TABLE IF NOT EXISTS reorders (
-    old_order_id INTEGER,
-    new_order_id INTEGER,
-    user_id BIGINT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    PRIMARY KEY (old_order_id, user_id)
-)
-""")
-
-cur.execute("""
-CREATE TABLE IF NOT EXISTS referral_credits (
-    id SERIAL PRIMARY KEY,
-    referrer_id BIGINT,
-    amount INTEGER,
-    used INTEGER DEFAULT 0,
-    granted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
 
-# -------- USER PREFS --------
-cur.execute("""
-CREATE TABLE IF NOT EXISTS user_prefs (
-    user_id BIGINT PRIMARY KEY,
-    lang TEXT DEFAULT 'ha'
-)
-""")
-
-# -------- USER LIBRARY --------
-cur.execute("""
-CREATE TABLE IF NOT EXISTS user_library (
-    user_id BIGINT NOT NULL,
-    movie_id INTEGER,
-    item_id INTEGER,
-    acquired_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    PRIMARY KEY (user_id, movie_id, item_id)
-)
-""")
+PG_NOTIFY = PgNotifyListener()
+register_stats_section("📡 PG NOTIFY", PG_NOTIFY.stats)
 
-# -------- BUY ALL TOKENS --------
-cur.execute("""
-CREATE TABLE IF NOT EXISTS buyall_tokens (
-    token TEXT PRIMARY KEY,
-    ids TEXT
-)
-""")
-
-# -------- USER MOVIES --------
-cur.execute("""
-CREATE TABLE IF NOT EXISTS user_movies (
-    id SERIAL PRIMARY KEY,
-    user_id BIGINT,
-    movie_id INTEGER,
-    item_id INTEGER,
-    order_id TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    resend_count INTEGER DEFAULT 0
-)
-""")
 
-# =====================
-# SERIES
-# =====================
-cur.execute("""
-CREATE TABLE IF NOT EXISTS series (
-    id SERIAL PRIMARY KEY,
-    title TEXT,
-    file_name TEXT,
-    file_id TEXT,
-    price INTEGER,
-    poster_file_id TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    channel_msg_id INTEGER,
-    channel_username TEXT
-)
-""")
-
-cur.execute("""
-CREATE TABLE IF NOT EXISTS series_items (
-    id SERIAL PRIMARY KEY,
-    series_id INTEGER,
-    movie_id INTEGER,
-    item_id INTEGER,
-    file_id TEXT,
-    title TEXT,
-    order_id TEXT,
-    price INTEGER DEFAULT 0,
-    channel_msg_id INTEGER,
-    channel_username TEXT,
-    file_name TEXT
-)
-""")
+def ensure_bot_state_table():
+    try:
+        with db_session() as db:
+            # UNLOGGED: babu WAL — state na wucin gadi ne, sauri ya fi muhimmanci
+            db.execute("""
+                CREATE UNLOGGED TABLE IF NOT EXISTS bot_state (
+                    ns TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    updated_at TIMESTAMPTZ DEFAULT NOW(),
+                    expires_at TIMESTAMPTZ,
+                    PRIMARY KEY (ns, key)
+                )
+            """)
+            db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_bot_state_expires
+                ON bot_state (expires_at)
+                WHERE expires_at IS NOT NULL
+            """)
+    except Exception as e:
+        print("❌ bot_state table error:", e)
+
+
+class PgStateBackend:
+
+    def _notify(self, db, ns, key):
+        db.execute(
+            "SELECT pg_notify(%s, %s)",
+            (STATE_CHANNEL, f"{ns}|{key}")
+        )
+
+    def get(self, ns, key):
+        with db_session() as db:
+            row = db.execute("""
+                SELECT value FROM bot_state
+                WHERE ns=%s AND key=%s
+                  AND (expires_at IS NULL OR expires_at > NOW())
+            """, (ns, key)).fetchone()
+        return row[0] if row else None
+
+    def _upsert(self, db, ns, key, raw, ttl):
+        db.execute("""
+            INSERT INTO bot_state (ns, key, value, updated_at, expires_at)
+            VALUES (%s, %s, %s, NOW(), NOW() + (%s * INTERVAL '1 second'))
+            ON CONFLICT (ns, key) DO UPDATE
+            SET value=EXCLUDED.value,
+                updated_at=NOW(),
+                expires_at=EXCLUDED.expires_at
+        """, (ns, key, raw, ttl))
+        self._notify(db, ns, key)
+
+    def set(self, ns, key, raw, ttl):
+        with db_session() as db:
+            self._upsert(db, ns, key, raw, ttl)
+
+    def delete(self, ns, key):
+        with db_session() as db:
+            gone = db.execute(
+                "DELETE FROM bot_state WHERE ns=%s AND key=%s RETURNING value",
+                (ns, key)
+            ).fetchone()
+            if gone:
+                self._notify(db, ns, key)
+        return gone[0] if gone else None
+
+    def claim(self, ns, key, raw, ttl):
+        # Insert idan babu (ko ya kare) — atomic a tsakanin workers
+        with db_session() as db:
+            row = db.execute("""
+                INSERT INTO bot_state (ns, key, value, updated_at, expires_at)
+                VALUES (%s, %s, %s, NOW(), NOW() + (%s * INTERVAL '1 second'))
+                ON CONFLICT (ns, key) DO UPDATE
+                SET value=EXCLUDED.value,
+                    updated_at=NOW(),
+                    expires_at=EXCLUDED.expires_at
+                WHERE bot_state.expires_at <= NOW()
+                RETURNING 1
+            """, (ns, key, raw, ttl)).fetchone()
+            if row:
+                self._notify(db, ns, key)
+        return row is not None
+
+    @contextmanager
+    def locked(self, ns, key, ttl):
+        # Row lock har karshen block — read-modify-write ba tare da race ba
+        with db_session() as db:
+            row = db.execute("""
+                SELECT value FROM bot_state
+                WHERE ns=%s AND key=%s
+                  AND (expires_at IS NULL OR expires_at > NOW())
+                FOR UPDATE
+            """, (ns, key)).fetchone()
+            cell = [row[0] if row else None]
+            yield cell
+            if cell[0] is not None:
+                self._upsert(db, ns, key, cell[0], ttl)
+
+    def purge(self):
+        with db_session() as db:
+            return db.execute(
+                "DELETE FROM bot_state WHERE expires_at <= NOW()"
+            ).rowcount
+
+    # ---------- LISTEN / NOTIFY ----------
+    def coherent(self):
+        # Ba tare da listener ba, cache na gida zai iya tsufa → kar a yi amfani da shi
+        return PG_NOTIFY.listening(STATE_CHANNEL)
+
+    def start(self, on_invalidate, on_reset):
+        def on_notify(payload):
+            ns, _, key = payload.partition("|")
+            on_invalidate(ns, key)
+
+        PG_NOTIFY.subscribe(STATE_CHANNEL, on_notify, on_reset)
+
+    def stats(self):
+        state = "listening" if self.coherent() else "⚠️ not listening"
+        return f"postgres ({state})"
+
+
+class MemoryStateBackend:
+    """Process daya kawai (dev/tests) — babu abin da ake rabawa."""
+
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.RLock()
+
+    def _live(self, ns, key):
+        entry = self.data.get((ns, key))
+        if entry and entry[1] <= time.time():
+            del self.data[(ns, key)]
+            return None
+        return entry
+
+    def get(self, ns, key):
+        with self.lock:
+            entry = self._live(ns, key)
+            return entry[0] if entry else None
+
+    def set(self, ns, key, raw, ttl):
+        with self.lock:
+            self.data[(ns, key)] = (raw, time.time() + ttl)
+
+    def delete(self, ns, key):
+        with self.lock:
+            entry = self._live(ns, key)
+            self.data.pop((ns, key), None)
+            return entry[0] if entry else None
+
+    def claim(self, ns, key, raw, ttl):
+        with self.lock:
+            if self._live(ns, key):
+                return False
+            self.data[(ns, key)] = (raw, time.time() + ttl)
+            return True
+
+    @contextmanager
+    def locked(self, ns, key, ttl):
+        with self.lock:
+            cell = [self.get(ns, key)]
+            yield cell
+            if cell[0] is not None:
+                self.set(ns, key, cell[0], ttl)
+
+    def purge(self):
+        with self.lock:
+            dead = [k for k, (_, exp) in self.data.items() if exp <= time.time()]
+            for k in dead:
+                del self.data[k]
+            return len(dead)
+
+    def coherent(self):
+        return True
+
+    def start(self, on_invalidate, on_reset):
+        pass
 
-# =====================
-# FEEDBACK
-# =====================
-cur.execute("""
-CREATE TABLE IF NOT EXISTS feedbacks (
-    id SERIAL PRIMARY KEY,
-    order_id TEXT NOT NULL UNIQUE,
-    user_id BIGINT NOT NULL,
-    mood TEXT NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
-
-cur.execute("""
-CREATE TABLE IF NOT EXISTS resend_logs (
-    id SERIAL PRIMARY KEY,
-    user_id BIGINT,
-    used_at TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
+    def stats(self):
+        return f"memory | keys: {len(self.data)}"
 
-# =====================
-# HAUSA SERIES
-# =====================
-cur.execute("""
-CREATE TABLE IF NOT EXISTS hausa_series (
-    id SERIAL PRIMARY KEY,
-    title TEXT,
-    file_name TEXT,
-    file_id TEXT,
-    price INTEGER,
-    series_id TEXT,
-    poster_file_id TEXT,
-    channel_msg_id INTEGER,
-    channel_username TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
-
-cur.execute("""
-CREATE TABLE IF NOT EXISTS hausa_series_items (
-    id SERIAL PRIMARY KEY,
-    hausa_series_id INTEGER,
-    movie_id INTEGER,
-    item_id INTEGER,
-    price INTEGER,
-    file_id TEXT,
-    title TEXT,
-    order_id TEXT,
-    series_id INTEGER,
-    channel_msg_id INTEGER,
-    channel_username TEXT,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    file_name TEXT
-)
-""")
-
-# ================= VISITED USERS =================
-cur.execute("""
-CREATE TABLE IF NOT EXISTS visited_users (
-    user_id BIGINT PRIMARY KEY,
-    first_name TEXT,
-    last_name TEXT,
-    username TEXT,
-    first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
-
-# -------- ADMIN CONTROLS --------
-cur.execute("""
-CREATE TABLE IF NOT EXISTS admin_controls (
-    id SERIAL PRIMARY KEY,
-    admin_id BIGINT UNIQUE,
-    sendmovie_enabled INTEGER DEFAULT 0,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
-
-# ================= HOW TO BUY =================
-cur.execute("""
-CREATE TABLE IF NOT EXISTS how_to_buy (
-    id SERIAL PRIMARY KEY,
-    hausa_text TEXT,
-    english_text TEXT,
-    media_file_id TEXT,
-    media_type TEXT,
-    version INTEGER DEFAULT 1,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
-
-# ================= G_ORDERS =================
-cur.execute("""
-CREATE TABLE IF NOT EXISTS g_orders (
-    id TEXT PRIMARY KEY,
-    user_id BIGINT,
-    amount INTEGER,
-    paid INTEGER DEFAULT 0,
-    remark TEXT UNIQUE NOT NULL,
-    status TEXT DEFAULT 'pending',
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    paid_at TIMESTAMP
-)
-""")
-
-# ================= G_ORDER_ITEMS =================
-cur.execute("""
-CREATE TABLE IF NOT EXISTS g_order_items (
-    id SERIAL PRIMARY KEY,
-    order_id TEXT,
-    item_id INTEGER,
-    price INTEGER,
-    file_id TEXT
-)
-""")
-
-# ================= G_USER_MOVIES =================
-cur.execute("""
-CREATE TABLE IF NOT EXISTS g_user_movies (
-    id SERIAL PRIMARY KEY,
-    user_id BIGINT,
-    item_id INTEGER,
-    order_id TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
-
-# ================= G_EMAIL_LOGS =================
-cur.execute("""
-CREATE TABLE IF NOT EXISTS g_email_logs (
-    id SERIAL PRIMARY KEY,
-    email_uid TEXT UNIQUE,
-    sender TEXT,
-    subject TEXT,
-    remark TEXT,
-    amount INTEGER,
-    processed BOOLEAN DEFAULT FALSE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
 
+if STATE_BACKEND == "memory":
+    STATE_STORE = MemoryStateBackend()
+else:
+    ensure_bot_state_table()
+    STATE_STORE = PgStateBackend()
 
+SHARED_STATES = {}
+_STATE_MISS = object()
 
 
-print("✅ DATABASE READY — BIGINT FIX APPLIED")
-import uuid
-import re
-import json
-import requests
-import traceback
-import random
-import difflib
-from datetime import datetime, timedelta
-import urllib.parse
-import os
-import hmac
-import hashlib
-# Store order message temporarily in memory
-ORDER_MESSAGES = {}
-G_ORDER_MESSAGES = {}
+class SharedStateDict:
+    """
+    Dict-like state mai rai a STATE_STORE. Keys suna zama str
+    (uid da str(uid) daya ne). Values dole su zama JSON.
+    """
 
-admin_states = {}
-active_links = {}
-# --- Admins configuration ---
-ADMINS = [8537505191]
+    def __init__(self, ns, ttl=STATE_TTL_SECONDS, store=None):
+        self.ns = ns
+        self.ttl = ttl
+        self.store = store or STATE_STORE
+        self.cache = TTLCache(f"state:{ns}", maxsize=STATE_CACHE_SIZE, ttl=STATE_CACHE_TTL)
+        # Invalidation generations: NOTIFY da ya iso tsakanin karanta store
+        # da saka cache bai kamata ya bace ba (stale value har STATE_CACHE_TTL).
+        self._gen_lock = threading.Lock()
+        self._epoch = 0          # invalidate() na duka
+        self._gens = {}          # key -> generation (sai keys da ake karantawa)
+        self._inflight = {}      # key -> adadin reads/writes da ke gudana
+        SHARED_STATES[ns] = self
+
+    def _begin(self, key):
+        with self._gen_lock:
+            self._inflight[key] = self._inflight.get(key, 0) + 1
+            return (self._epoch, self._gens.get(key, 0))
+
+    def _end(self, key, before, raw=_STATE_MISS):
+        """Saka raw a cache sai idan babu invalidation tun _begin."""
+        with self._gen_lock:
+            if raw is not _STATE_MISS:
+                if (self._epoch, self._gens.get(key, 0)) == before:
+                    self.cache.set(key, raw)       # None → "babu" shima ana cache
+                else:
+                    self.cache.pop(key, None)
+            n = self._inflight[key] - 1
+            if n:
+                self._inflight[key] = n
+            else:
+                del self._inflight[key]
+                self._gens.pop(key, None)
+
+    def _raw(self, key):
+        key = str(key)
+        coherent = self.store.coherent()
+        if coherent:
+            raw = self.cache.get(key, _STATE_MISS)
+            if raw is not _STATE_MISS:
+                return raw
+        before = self._begin(key)
+        raw = _STATE_MISS
+        try:
+            raw = self.store.get(self.ns, key)
+            return raw
+        finally:
+            self._end(key, before, raw if coherent else _STATE_MISS)
+
+    def get(self, key, default=None):
+        raw = self._raw(key)
+        return default if raw is None else json.loads(raw)
+
+    def __getitem__(self, key):
+        raw = self._raw(key)
+        if raw is None:
+            raise KeyError(key)
+        return json.loads(raw)
+
+    def __contains__(self, key):
+        return self._raw(key) is not None
+
+    def __setitem__(self, key, value):
+        key = str(key)
+        raw = json.dumps(value)
+        before = self._begin(key)
+        stored = _STATE_MISS
+        try:
+            self.store.set(self.ns, key, raw, self.ttl)
+            stored = raw
+        finally:
+            self._end(key, before, stored)
 
+    def pop(self, key, *default):
+        key = str(key)
+        before = self._begin(key)
+        gone = _STATE_MISS
+        try:
+            raw = self.store.delete(self.ns, key)
+            gone = None
+        finally:
+            self._end(key, before, gone)
+        if raw is None:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        return json.loads(raw)
+
+    def __delitem__(self, key):
+        self.pop(key)
+
+    def claim(self, key, value=True):
+        """Saka value idan babu — True idan wannan kiran ne ya samu."""
+        key = str(key)
+        ok = self.store.claim(self.ns, key, json.dumps(value), self.ttl)
+        self.cache.pop(key, None)
+        return ok
+
+    @contextmanager
+    def mutate(self, key):
+        """
+        Read-modify-write a karkashin lock: `with X.mutate(uid) as st:`.
+        st None ne idan babu key; canje-canje a cikin st ana ajiye su.
+        """
+        key = str(key)
+        with self.store.locked(self.ns, key, self.ttl) as cell:
+            value = None if cell[0] is None else json.loads(cell[0])
+            yield value
+            if value is not None:
+                cell[0] = json.dumps(value)
+        self.cache.pop(key, None)
+
+    def invalidate(self, key=None):
+        with self._gen_lock:
+            if key is None:
+                self._epoch += 1
+                self.cache.clear()
+            else:
+                if key in self._inflight:
+                    self._gens[key] = self._gens.get(key, 0) + 1
+                self.cache.pop(key, None)
 
-API_ID = int(os.getenv("API_ID", 0))
-API_HASH = os.getenv("API_HASH", "")
-# ========= CONFIG =========
-BOT_TOKEN = os.getenv("BOT_TOKEN")
 
-BOT_MODE = os.getenv("BOT_MODE", "polling")
+def _state_invalidate(ns, key):
+    state = SHARED_STATES.get(ns)
+    if state:
+        state.invalidate(key)
 
-CASHBACK = 20
 
-VIP_PRICE = 100
-VIP_DURATION_VALUE = 33
-VIP_DURATION_UNIT = "days"
+def _state_reset():
+    for state in SHARED_STATES.values():
+        state.invalidate()
 
-WARNING_1_VALUE = 30
-WARNING_1_UNIT = "days"
 
-WARNING_2_VALUE = 32
-WARNING_2_UNIT = "days"
-ADMIN_ID = 8537505191
-OTP_ADMIN_ID = 6603268127
+def purge_bot_state():
+    n = STATE_STORE.purge()
+    if n:
+        print(f"🧹 bot_state purged: {n}")
 
 
-# ==========================================
-WARNING_1_VALUE = 5  # Misali: Kwana 5 kafin expire
-WARNING_2_VALUE = 2  # Misali: Kwana 2 kafin expire
+STATE_STORE.start(_state_invalidate, _state_reset)
+register_stats_section("🧠 SHARED STATE", STATE_STORE.stats)
 
-EMAIL_USER = "nazifinazifi222@gmail.com"
-EMAIL_PASS = "ekhfnhzjdkpbqxeo"
-IMAP_SERVER = "imap.gmail.com"
-IMAP_PORT = 993
 
-BOT_USERNAME = "Danchirinbot"
-CHANNEL = "@Danchirinps"
+# ======================
+# GLOBAL STATES
+# ======================
+TRANSFER_STAGE = SharedStateDict("transfer_stage", ttl=600)
+admin_states = SharedStateDict("admin_states")
+last_menu_msg = TTLCache("last_menu_msg", maxsize=10000, ttl=86400)
+last_category_msg = TTLCache("last_category_msg", maxsize=10000, ttl=86400)
+last_allfilms_msg = TTLCache("last_allfilms_msg", maxsize=10000, ttl=86400)
+allfilms_sessions = TTLCache("allfilms_sessions", maxsize=5000, ttl=3600)
+cart_sessions = SharedStateDict("cart_sessions")
+series_sessions = SharedStateDict("series_sessions")
+user_states = SharedStateDict("user_states")
+active_links = {}
 
-COUNTDOWN_SECONDS = 70
-VIP_LINK = "https://t.me/+wRfKqP2nnHw0OGZk"  # saka permanent group link naka
-# ========= DATABASE CONFIG =========
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise RuntimeError("DATABASE_URL is missing")
 
-# Flutterwave
-FLW_PUBLIC_KEY = os.getenv("FLW_PUBLIC_KEY")
-FLW_SECRET_KEY = os.getenv("FLW_SECRET_KEY")
-FLW_WEBHOOK_SECRET = os.getenv("FLW_WEBHOOK_SECRET")
-FLW_REDIRECT_URL = os.getenv("FLW_REDIRECT_URL")
-WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+# =========================
+# WALLET DATABASE TABLES
+# =========================
 
-FLW_BASE = "https://api.flutterwave.com/v3"
+def create_wallet_tables():
+    with db_session(wallet=True) as db:
+        wallet_cur = db.cursor()
 
+        # -------- WALLET BALANCE --------
+        wallet_cur.execute("""
+        CREATE TABLE IF NOT EXISTS wallet_balance (
+            user_id BIGINT PRIMARY KEY,
+            balance BIGINT DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
 
+        # -------- WALLET TRANSACTIONS --------
+        wallet_cur.execute("""
+        CREATE TABLE IF NOT EXISTS wallet_transactions (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            amount BIGINT NOT NULL,
+            type VARCHAR(30) NOT NULL,
+            reference TEXT,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
 
-VIP_GROUP_ID = -1004420788431
+        # index domin saurin transaction history
+        wallet_cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_wallet_transactions_user
+        ON wallet_transactions(user_id)
+        """)
 
-# === PAYMENTS / STORAGE ===
-PAYMENT_NOTIFY_GROUP = -1003769342354
-STORAGE_CHANNEL = -1003794258511
+        # -------- WALLET DEPOSITS (PAYSTACK) --------
+        wallet_cur.execute("""
+        CREATE TABLE IF NOT EXISTS wallet_deposits (
+            id TEXT PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            amount BIGINT NOT NULL,
+            type VARCHAR(30) DEFAULT 'wallet',
+            paystack_ref TEXT UNIQUE,
+            status VARCHAR(20) DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            paid_at TIMESTAMP
+        )
+        """)
 
-PAYMENT_NOTIFY_GROUP_WALLET = -1003769342354
+        # index domin saurin lookup
+        wallet_cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_wallet_deposits_user
+        ON wallet_deposits(user_id)
+        """)
 
-SEND_ADMIN_PAYMENT_NOTIF = False
+        # -------- WALLET WITHDRAWALS (ADMIN USE) --------
+        wallet_cur.execute("""
+        CREATE TABLE IF NOT EXISTS wallet_withdrawals (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT,
+            amount BIGINT,
+            status VARCHAR(20) DEFAULT 'pending',
+            processed_by BIGINT,
+            reference TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            processed_at TIMESTAMP
+        )
+        """)
 
-ADMIN_USERNAME = "CEOalgaitabot"
-#end
+        # index domin saurin admin queries
+        wallet_cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_wallet_withdrawals_user
+        ON wallet_withdrawals(user_id)
+        """)
 
-# ========= IMPORTS =========
-import telebot
-import hmac
-import hashlib
-import requests
-from flask import Flask, request
-from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+create_wallet_tables()
 
-# ========= BOT =========
-bot = telebot.TeleBot(BOT_TOKEN, parse_mode="HTML")
+#===============
+# END DB MyWallet
+#===============
 
 
-# ========= FLASK =========
-app = Flask(__name__)
 
+# =========================
+# DATABASE TABLES (SAFE)
+# =========================
 
-import time
-import requests
 
-def create_flutterwave_payment(user_id, order_id, amount, title):
-    # ================= HEADERS =================
-    headers = {
-        "Authorization": f"Bearer {FLW_SECRET_KEY}",
-        "Content-Type": "application/json"
-    }
+def create_main_tables():
+    with db_session() as db:
+        cur = db.cursor()
 
-    # ================= PAYLOAD (FLUTTERWAVE FORMAT) =================
-    payload = {
-        "tx_ref": f"{order_id}_{int(time.time())}",  # ✅ Kamar yadda muka yi a baya
+        # ================= ADMIN NOTES TABLE =================
+
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS admin_notes (
+            id SERIAL PRIMARY KEY,
+            admin_id BIGINT NOT NULL,
+            content TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+
+        # ===== INDEX domin saurin fetch =====
+        cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_admin_notes_admin
+        ON admin_notes(admin_id)
+        """)
+
+
+        # -------- MOVIES --------
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS movies (
+            id SERIAL PRIMARY KEY,
+            title TEXT,
+            price INTEGER,
+            file_id TEXT,
+            file_name TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            channel_msg_id INTEGER,
+            channel_username TEXT
+        )
+        """)
+
+        # -------- ITEMS --------
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS items (
+            id SERIAL PRIMARY KEY,
+            title TEXT,
+            price INTEGER,
+            file_id TEXT,
+            file_name TEXT,
+            group_key TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            channel_msg_id INTEGER,
+            channel_username TEXT,
+            cashback_amount INTEGER DEFAULT 0
+        )
+        """)
+
+
+        # -------- ORDERS --------
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS orders (
+            id TEXT PRIMARY KEY,
+            user_id BIGINT,
+            movie_id INTEGER,
+            item_id INTEGER,
+            amount INTEGER,
+            paid INTEGER DEFAULT 0,
+            pay_ref TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            type VARCHAR(20) DEFAULT 'film'
+        )
+        """)
+
+
+        # -------- VIP MEMBERS --------
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS vip_members (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT UNIQUE NOT NULL,
+            order_id TEXT,
+            join_date TIMESTAMP,
+            expire_at TIMESTAMP,
+            status VARCHAR(20) DEFAULT 'active',
+            warn1_sent BOOLEAN DEFAULT FALSE,
+            warn2_sent BOOLEAN DEFAULT FALSE,
+            payment_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            invite_link TEXT DEFAULT NULL
+        )
+        """)
+
+        # -------- ORDER ITEMS --------
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS order_items (
+            id SERIAL PRIMARY KEY,
+            order_id TEXT,
+            movie_id INTEGER,
+            item_id INTEGER,
+            price INTEGER,
+            file_id TEXT
+        )
+        """)
+
+        # -------- WEEKLY --------
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS weekly (
+            id SERIAL PRIMARY KEY,
+            poster_file_id TEXT,
+            items TEXT,
+            file_name TEXT,
+            file_id TEXT,
+            channel_msg_id INTEGER,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+
+        # -------- CART --------
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS cart (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT,
+            movie_id INTEGER,
+            item_id INTEGER,
+            price INTEGER,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+
+        # -------- REFERRALS --------
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS referrals (
+            id SERIAL PRIMARY KEY,
+            referrer_id BIGINT,
+            referred_id BIGINT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            reward_granted INTEGER DEFAULT 0
+        )
+        """)
+
+        # -------- REORDERS --------
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS reorders (
+            old_order_id INTEGER,
+            new_order_id INTEGER,
+            user_id BIGINT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (old_order_id, user_id)
+        )
+        """)
+
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS referral_credits (
+            id SERIAL PRIMARY KEY,
+            referrer_id BIGINT,
+            amount INTEGER,
+            used INTEGER DEFAULT 0,
+            granted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+
+        # -------- USER PREFS --------
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS user_prefs (
+            user_id BIGINT PRIMARY KEY,
+            lang TEXT DEFAULT 'ha'
+        )
+        """)
+
+        # -------- USER LIBRARY --------
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS user_library (
+            user_id BIGINT NOT NULL,
+            movie_id INTEGER,
+            item_id INTEGER,
+            acquired_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, movie_id, item_id)
+        )
+        """)
+
+        # -------- BUY ALL TOKENS --------
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS buyall_tokens (
+            token TEXT PRIMARY KEY,
+            ids TEXT
+        )
+        """)
+
+        # -------- USER MOVIES --------
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS user_movies (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT,
+            movie_id INTEGER,
+            item_id INTEGER,
+            order_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            resend_count INTEGER DEFAULT 0
+        )
+        """)
+
+        # =====================
+        # SERIES
+        # =====================
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS series (
+            id SERIAL PRIMARY KEY,
+            title TEXT,
+            file_name TEXT,
+            file_id TEXT,
+            price INTEGER,
+            poster_file_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            channel_msg_id INTEGER,
+            channel_username TEXT
+        )
+        """)
+
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS series_items (
+            id SERIAL PRIMARY KEY,
+            series_id INTEGER,
+            movie_id INTEGER,
+            item_id INTEGER,
+            file_id TEXT,
+            title TEXT,
+            order_id TEXT,
+            price INTEGER DEFAULT 0,
+            channel_msg_id INTEGER,
+            channel_username TEXT,
+            file_name TEXT
+        )
+        """)
+
+        # =====================
+        # FEEDBACK
+        # =====================
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS feedbacks (
+            id SERIAL PRIMARY KEY,
+            order_id TEXT NOT NULL UNIQUE,
+            user_id BIGINT NOT NULL,
+            mood TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS resend_logs (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT,
+            used_at TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+
+        # =====================
+        # HAUSA SERIES
+        # =====================
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS hausa_series (
+            id SERIAL PRIMARY KEY,
+            title TEXT,
+            file_name TEXT,
+            file_id TEXT,
+            price INTEGER,
+            series_id TEXT,
+            poster_file_id TEXT,
+            channel_msg_id INTEGER,
+            channel_username TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS hausa_series_items (
+            id SERIAL PRIMARY KEY,
+            hausa_series_id INTEGER,
+            movie_id INTEGER,
+            item_id INTEGER,
+            price INTEGER,
+            file_id TEXT,
+            title TEXT,
+            order_id TEXT,
+            series_id INTEGER,
+            channel_msg_id INTEGER,
+            channel_username TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            file_name TEXT
+        )
+        """)
+
+        # ================= VISITED USERS =================
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS visited_users (
+            user_id BIGINT PRIMARY KEY,
+            first_name TEXT,
+            last_name TEXT,
+            username TEXT,
+            first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+
+        # -------- ADMIN CONTROLS --------
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS admin_controls (
+            id SERIAL PRIMARY KEY,
+            admin_id BIGINT UNIQUE,
+            sendmovie_enabled INTEGER DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+
+        # ================= HOW TO BUY =================
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS how_to_buy (
+            id SERIAL PRIMARY KEY,
+            hausa_text TEXT,
+            english_text TEXT,
+            media_file_id TEXT,
+            media_type TEXT,
+            version INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+
+        # ================= G_ORDERS =================
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS g_orders (
+            id TEXT PRIMARY KEY,
+            user_id BIGINT,
+            amount INTEGER,
+            paid INTEGER DEFAULT 0,
+            remark TEXT UNIQUE NOT NULL,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            paid_at TIMESTAMP
+        )
+        """)
+
+        # ================= G_ORDER_ITEMS =================
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS g_order_items (
+            id SERIAL PRIMARY KEY,
+            order_id TEXT,
+            item_id INTEGER,
+            price INTEGER,
+            file_id TEXT
+        )
+        """)
+
+        # ================= G_USER_MOVIES =================
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS g_user_movies (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT,
+            item_id INTEGER,
+            order_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+
+        # ================= G_EMAIL_LOGS =================
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS g_email_logs (
+            id SERIAL PRIMARY KEY,
+            email_uid TEXT UNIQUE,
+            sender TEXT,
+            subject TEXT,
+            remark TEXT,
+            amount INTEGER,
+            processed BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+
+        # ================= MAIL_SYNC_STATE =================
+        # Inda muka tsaya a kowane mailbox (UIDVALIDITY + UID na karshe)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS mail_sync_state (
+            mailbox TEXT PRIMARY KEY,
+            uidvalidity BIGINT NOT NULL,
+            last_uid BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+
+
+create_main_tables()
+
+
+
+
+print("✅ DATABASE READY — BIGINT FIX APPLIED")
+import uuid
+import re
+import json
+import requests
+import traceback
+import random
+from datetime import datetime, timedelta
+import urllib.parse
+import os
+import hmac
+import hashlib
+# Store order message temporarily in memory
+ORDER_MESSAGES = SharedStateDict("order_messages", ttl=86400)
+G_ORDER_MESSAGES = SharedStateDict("g_order_messages", ttl=86400)
+
+active_links = {}
+# --- Admins configuration ---
+ADMINS = [8537505191]
+
+
+API_ID = int(os.getenv("API_ID", 0))
+API_HASH = os.getenv("API_HASH", "")
+# ========= CONFIG =========
+BOT_TOKEN = os.getenv("BOT_TOKEN")
+
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+
+CASHBACK = 20
+
+VIP_PRICE = 100
+VIP_DURATION_VALUE = 33
+VIP_DURATION_UNIT = "days"
+
+WARNING_1_VALUE = 30
+WARNING_1_UNIT = "days"
+
+WARNING_2_VALUE = 32
+WARNING_2_UNIT = "days"
+ADMIN_ID = 8537505191
+OTP_ADMIN_ID = 6603268127
+
+
+# ==========================================
+WARNING_1_VALUE = 5  # Misali: Kwana 5 kafin expire
+WARNING_2_VALUE = 2  # Misali: Kwana 2 kafin expire
+
+EMAIL_USER = "nazifinazifi222@gmail.com"
+EMAIL_PASS = "ekhfnhzjdkpbqxeo"
+IMAP_SERVER = "imap.gmail.com"
+IMAP_PORT = 993
+
+BOT_USERNAME = "Danchirinbot"
+CHANNEL = "@Danchirinps"
+
+COUNTDOWN_SECONDS = 70
+VIP_LINK = "https://t.me/+wRfKqP2nnHw0OGZk"  # saka permanent group link naka
+# ========= DATABASE CONFIG =========
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    raise RuntimeError("DATABASE_URL is missing")
+
+# Flutterwave
+FLW_PUBLIC_KEY = os.getenv("FLW_PUBLIC_KEY")
+FLW_SECRET_KEY = os.getenv("FLW_SECRET_KEY")
+FLW_WEBHOOK_SECRET = os.getenv("FLW_WEBHOOK_SECRET")
+FLW_REDIRECT_URL = os.getenv("FLW_REDIRECT_URL")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+
+FLW_BASE = "https://api.flutterwave.com/v3"
+
+
+
+VIP_GROUP_ID = -1004420788431
+
+# === PAYMENTS / STORAGE ===
+PAYMENT_NOTIFY_GROUP = -1003769342354
+STORAGE_CHANNEL = -1003794258511
+
+PAYMENT_NOTIFY_GROUP_WALLET = -1003769342354
+
+SEND_ADMIN_PAYMENT_NOTIF = False
+
+ADMIN_USERNAME = "CEOalgaitabot"
+#end
+
+# ========= IMPORTS =========
+import telebot
+import hmac
+import hashlib
+import requests
+from flask import Flask, request
+from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+
+# ========= TELEGRAM RATE LIMITER =========
+# Token buckets guda uku kamar dokokin Telegram:
+#   - global: ~30 sako a sakan ga bot gaba ɗaya
+#   - private chat: ~1 a sakan
+#   - group/channel: 20 a minti
+# Bulk (broadcast, storage uploads) yana barin BULK_RESERVE tokens ga
+# interactive (delivery, amsoshi) domin kada ya hana users amsa.
+from contextlib import contextmanager
+from telebot.apihelper import ApiTelegramException
+
+TG_GLOBAL_RATE = float(os.environ.get("TG_GLOBAL_RATE", 30))
+TG_PRIVATE_RATE = float(os.environ.get("TG_PRIVATE_RATE", 1))
+TG_GROUP_PER_MINUTE = float(os.environ.get("TG_GROUP_PER_MINUTE", 20))
+TG_BULK_RESERVE = float(os.environ.get("TG_BULK_RESERVE", 5))
+TG_MAX_429_RETRIES = 3
+
+
+def telegram_retry_after(e, default=5):
+    try:
+        return int(e.result_json["parameters"]["retry_after"])
+    except Exception:
+        return default
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "stamp", "blocked_until")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = time.monotonic()
+        self.blocked_until = 0.0
+
+    def wait_time(self, now, cost, reserve=0):
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+        if now < self.blocked_until:
+            return self.blocked_until - now
+
+        need = cost + reserve - self.tokens
+        return 0 if need <= 0 else need / self.rate
+
+
+class TelegramRateLimiter:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.global_bucket = TokenBucket(TG_GLOBAL_RATE, TG_GLOBAL_RATE)
+        self.chats = {}
+
+        self.sent = {"interactive": 0, "bulk": 0}
+        self.waited = {"interactive": 0.0, "bulk": 0.0}
+        self.hits_429 = 0
+
+    # ---------- priority ----------
+    @contextmanager
+    def bulk(self):
+        depth = getattr(self._local, "bulk", 0)
+        self._local.bulk = depth + 1
+        try:
+            yield
+        finally:
+            self._local.bulk = depth
+
+    def is_bulk(self):
+        return getattr(self._local, "bulk", 0) > 0
+
+    # ---------- buckets ----------
+    def _chat_bucket(self, chat_id):
+        key = str(chat_id)
+        b = self.chats.get(key)
+        if b is None:
+            if len(self.chats) > 20000:
+                self._prune()
+            if key.startswith("-") or key.startswith("@"):
+                b = TokenBucket(TG_GROUP_PER_MINUTE / 60.0, 5)
+            else:
+                b = TokenBucket(TG_PRIVATE_RATE, 3)
+            self.chats[key] = b
+        return b
+
+    def _prune(self):
+        now = time.monotonic()
+        for key, b in list(self.chats.items()):
+            if b.blocked_until < now and b.wait_time(now, b.capacity) == 0:
+                del self.chats[key]
+
+    def acquire(self, chat_id, cost=1):
+        kind = "bulk" if self.is_bulk() else "interactive"
+        reserve = TG_BULK_RESERVE if kind == "bulk" else 0
+        start = time.monotonic()
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self.global_bucket.wait_time(now, cost, reserve)
+                cb = self._chat_bucket(chat_id) if chat_id is not None else None
+                if cb is not None:
+                    wait = max(wait, cb.wait_time(now, 1))
+
+                if wait <= 0:
+                    self.global_bucket.tokens -= cost
+                    if cb is not None:
+                        cb.tokens -= 1
+                    self.sent[kind] += 1
+                    self.waited[kind] += now - start
+                    return
+
+            time.sleep(min(wait, 1.0))
+
+    def penalize(self, chat_id, retry_after):
+        with self._lock:
+            until = time.monotonic() + retry_after
+            target = self._chat_bucket(chat_id) if chat_id is not None else self.global_bucket
+            target.blocked_until = max(target.blocked_until, until)
+            self.hits_429 += 1
+        print(f"⏸ TELEGRAM 429 ({chat_id}) retry_after={retry_after}s")
+
+    # ---------- bot patching ----------
+    def wrap(self, fn, name, chat_pos):
+
+        @functools.wraps(fn)
+        def call(*args, **kwargs):
+            chat_id = kwargs.get("chat_id")
+            if chat_pos is None:
+                chat_id = None
+            elif chat_id is None and len(args) > chat_pos:
+                chat_id = args[chat_pos]
+
+            cost = 1
+            if name == "send_media_group":
+                media = kwargs.get("media") or (args[1] if len(args) > 1 else None)
+                cost = len(media or []) or 1
+
+            for attempt in range(TG_MAX_429_RETRIES + 1):
+                self.acquire(chat_id, cost)
+                try:
+                    return fn(*args, **kwargs)
+                except ApiTelegramException as e:
+                    if e.error_code != 429 or attempt >= TG_MAX_429_RETRIES:
+                        raise
+                    self.penalize(chat_id, telegram_retry_after(e))
+
+        return call
+
+    def stats(self):
+        with self._lock:
+            lines = []
+            for kind in ("interactive", "bulk"):
+                n = self.sent[kind]
+                avg = (self.waited[kind] / n * 1000) if n else 0
+                lines.append(f"{kind}: {n} sent | avg wait {avg:.0f}ms")
+            lines.append(f"429 hits: {self.hits_429} | tracked chats: {len(self.chats)}")
+            return "\n".join(lines)
+
+
+TG_LIMITER = TelegramRateLimiter()
+
+# method → index na chat_id a positional args
+_RATE_LIMITED_METHODS = {
+    "send_message": 0,
+    "send_photo": 0,
+    "send_video": 0,
+    "send_document": 0,
+    "send_audio": 0,
+    "send_voice": 0,
+    "send_animation": 0,
+    "send_sticker": 0,
+    "send_media_group": 0,
+    "copy_message": 0,
+    "forward_message": 0,
+    "edit_message_text": 1,
+    "edit_message_caption": 1,
+    "edit_message_media": 1,
+    "edit_message_reply_markup": 0,
+    # admin actions: global bucket kawai (ba iyakar sakonni na group ba)
+    "ban_chat_member": None,
+    "unban_chat_member": None,
+    "create_chat_invite_link": None,
+    "revoke_chat_invite_link": None,
+}
+
+
+def install_rate_limiter(b):
+    if getattr(b, "_rate_limited", False):
+        return b
+    for name, pos in _RATE_LIMITED_METHODS.items():
+        fn = getattr(b, name, None)
+        if fn is not None:
+            setattr(b, name, TG_LIMITER.wrap(fn, name, pos))
+    b._rate_limited = True
+    return b
+
+
+def telegram_bulk():
+    return TG_LIMITER.bulk()
+
+
+register_stats_section("🚦 TELEGRAM RATE LIMITER", TG_LIMITER.stats)
+
+
+# ========= BOT =========
+bot = telebot.TeleBot(BOT_TOKEN, parse_mode="HTML")
+install_rate_limiter(bot)
+
+
+# ========= FLASK =========
+app = Flask(__name__)
+
+
+import time
+import requests
+
+def create_flutterwave_payment(user_id, order_id, amount, title):
+    # ================= HEADERS =================
+    headers = {
+        "Authorization": f"Bearer {FLW_SECRET_KEY}",
+        "Content-Type": "application/json"
+    }
+
+    # ================= PAYLOAD (FLUTTERWAVE FORMAT) =================
+    payload = {
+        "tx_ref": f"{order_id}_{int(time.time())}",  # ✅ Kamar yadda muka yi a baya
         "amount": str(amount),
         "currency": "NGN",
         "redirect_url": FLW_REDIRECT_URL,
@@ -1083,335 +2353,1610 @@ def create_flutterwave_payment(user_id, order_id, amount, title):
         }
     }
 
-    # ================= REQUEST =================
+    # ================= REQUEST =================
+    try:
+        r = requests.post(
+            "https://api.flutterwave.com/v3/payments",
+            json=payload,
+            headers=headers,
+            timeout=30
+        )
+
+        data = r.json()
+
+        # Duba idan komai yayi nasara
+        if data.get("status") != "success":
+            print(f"Flutterwave Error: {data.get('message')}")
+            return None
+
+        # Flutterwave tana dawo da link din a 'data' -> 'link'
+        return data["data"]["link"]
+
+    except Exception as e:
+        print(f"Request Error: {e}")
+        return None
+
+
+
+
+# ========= HOME / KEEP ALIVE =========
+@app.route("/")
+def home():
+    return "OK", 200
+
+
+# ========= FLUTTERWAVE CALLBACK PAGE =========
+@app.route("/flutterwave-callback", methods=["GET"])
+def flutterwave_callback():
+    return """
+    <html>
+    <head>
+        <title>Payment Successful</title>
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <meta http-equiv="refresh" content="5;url=https://t.me/Algaitabot">
+        <style>
+            body {
+                margin: 0;
+                padding: 0;
+                display: flex;
+                justify-content: center;
+                align-items: center;
+                height: 100vh;
+                background-color: #f4f7f6;
+                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            }
+            .card {
+                background: white;
+                padding: 40px;
+                border-radius: 20px;
+                box-shadow: 0 10px 25px rgba(0,0,0,0.1);
+                text-align: center;
+                width: 90%;
+                max-width: 400px;
+            }
+            .icon {
+                font-size: 70px;
+                color: #2ecc71;
+                margin-bottom: 20px;
+            }
+            h2 {
+                color: #2c3e50;
+                margin-bottom: 10px;
+            }
+            p {
+                color: #7f8c8d;
+                font-size: 18px;
+                line-height: 1.6;
+            }
+            .btn {
+                display: inline-block;
+                margin-top: 25px;
+                padding: 12px 30px;
+                background-color: #0088cc;
+                color: white;
+                text-decoration: none;
+                border-radius: 50px;
+                font-weight: bold;
+                transition: background 0.3s;
+            }
+            .btn:hover {
+                background-color: #0077b5;
+            }
+        </style>
+    </head>
+    <body>
+        <div class="card">
+            <div class="icon">✅</div>
+            <h2>BIYA YA NASARA</h2>
+            <p>An tabbatar da biyan ka cikin nasara.</p>
+            <p>Zaka iya rufe browser ka koma Telegram yanzu.</p>
+            <a href="https://t.me/Algaitabot" class="btn">KOMawa TELEGRAM</a>
+        </div>
+    </body>
+    </html>
+    """
+
+# ========= FEEDBACK =========
+def send_feedback_prompt(user_id, order_id):
+    try:
+        with db_session() as db:
+            exists = db.execute(
+                "SELECT 1 FROM feedbacks WHERE order_id = %s",
+                (order_id,)
+            ).fetchone()
+
+    except Exception as e:
+        print("FEEDBACK DB ERROR:", e)
+        return  # DB ta kasa tashi → kar bot ya mutu
+
+    if exists:
+        return
+
+    kb = InlineKeyboardMarkup()
+    kb.add(
+        InlineKeyboardButton("😁 Very good", callback_data=f"feedback:very:{order_id}"),
+        InlineKeyboardButton("🙂 Good", callback_data=f"feedback:good:{order_id}")
+    )
+    kb.add(
+        InlineKeyboardButton("😓 Not sure", callback_data=f"feedback:neutral:{order_id}"),
+        InlineKeyboardButton("😠 Angry", callback_data=f"feedback:angry:{order_id}")
+    )
+
     try:
-        r = requests.post(
-            "https://api.flutterwave.com/v3/payments",
-            json=payload,
-            headers=headers,
-            timeout=30
+        bot.send_message(
+            user_id,
+            "We hope you enjoyed your shopping 🥰\nPlease choose how you’re feeling right now👇👇.",
+            reply_markup=kb
+        )
+        print("✅ Feedback prompt sent:", user_id, order_id)
+    except Exception as e:
+        print("FEEDBACK SEND ERROR:", e)
+
+
+# =====================================================
+# ================= SCHEDULER ========================
+# =====================================================
+# Timer thread ɗaya (heap na lokutan jobs) maimakon kowane feature ya
+# riƙe nasa `while True: sleep()`. Aikin kansa yana gudana a executor.
+#   - interval ko cron ("50 23 * * 5", "L" = ranar karshe ta wata)
+#   - jitter, overlap guard (idan run na baya bai gama ba → skip)
+#   - catch-up: cron job da aka rasa saboda restart ana gudanar da shi
+#     da zarar mun tashi (idan bai wuce catch_up seconds ba)
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+
+SCHEDULER_WORKERS = int(os.environ.get("SCHEDULER_WORKERS", 4))
+
+
+def ensure_scheduler_table():
+    with db_session() as db:
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS scheduler_runs (
+                name TEXT PRIMARY KEY,
+                last_run_at TIMESTAMPTZ,
+                last_status TEXT,
+                last_duration_ms INTEGER,
+                last_error TEXT
+            )
+        """)
+
+
+ensure_scheduler_table()
+
+
+def _cron_values(expr, lo, hi):
+    values = set()
+    for part in expr.split(","):
+        step = 1
+        if "/" in part:
+            part, step = part.split("/")
+            step = int(step)
+        if part == "*":
+            a, b = lo, hi
+        elif "-" in part:
+            a, b = (int(x) for x in part.split("-"))
+        else:
+            a = b = int(part)
+        values.update(range(a, b + 1, step))
+    return values
+
+
+class CronSpec:
+    """
+    minute hour day month weekday (0/7 = Lahadi). utc_offset a awanni.
+    """
+
+    def __init__(self, expr, utc_offset=0):
+        minute, hour, day, month, weekday = expr.split()
+        self.expr = expr
+        self.offset = timedelta(hours=utc_offset)
+        self.minutes = sorted(_cron_values(minute, 0, 59))
+        self.hours = sorted(_cron_values(hour, 0, 23))
+        self.last_day = day.upper() == "L"
+        self.days = set() if self.last_day else _cron_values(day, 1, 31)
+        self.months = _cron_values(month, 1, 12)
+        # cron: 0=Sunday → python: 6=Sunday
+        self.weekdays = {(d - 1) % 7 for d in _cron_values(weekday, 0, 7)}
+        self.any_day = day == "*"
+        self.any_weekday = weekday == "*"
+
+    def _day_ok(self, dt):
+        if dt.month not in self.months:
+            return False
+        if self.last_day:
+            nxt = dt.replace(day=28) + timedelta(days=4)
+            dom = dt.day == (nxt - timedelta(days=nxt.day)).day
+        else:
+            dom = dt.day in self.days
+        dow = dt.weekday() in self.weekdays
+        if not self.any_day and not self.any_weekday:
+            return dom or dow
+        return dom and dow
+
+    def next_after(self, ts):
+        local = datetime.utcfromtimestamp(ts) + self.offset
+        local = local.replace(second=0, microsecond=0) + timedelta(minutes=1)
+
+        for _ in range(800):
+            if self._day_ok(local):
+                for h in self.hours:
+                    if h < local.hour:
+                        continue
+                    for m in self.minutes:
+                        if h == local.hour and m < local.minute:
+                            continue
+                        hit = local.replace(hour=h, minute=m) - self.offset
+                        return (hit - datetime(1970, 1, 1)).total_seconds()
+            local = (local + timedelta(days=1)).replace(hour=0, minute=0)
+
+        raise ValueError(f"cron '{self.expr}' bata taɓa faruwa")
+
+
+class ScheduledJob:
+    def __init__(self, name, fn, interval=None, cron=None, jitter=0, catch_up=0, singleton=False):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.cron = cron
+        self.jitter = jitter
+        self.catch_up = catch_up
+        self.singleton = singleton
+        self.standby = 0
+        self.next_run = None
+        self.seq = None             # heap entry mai rai; sauran stale ne
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.last_error = None
+
+    def next_after(self, ts):
+        base = ts + self.interval if self.interval else self.cron.next_after(ts)
+        return base + (random.uniform(0, self.jitter) if self.jitter else 0)
+
+
+class Scheduler:
+    def __init__(self, workers=SCHEDULER_WORKERS):
+        self.jobs = {}
+        self.heap = []
+        self.cond = threading.Condition()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sched")
+        self.started = False
+        self._seq = 0
+
+    def add(self, name, fn, interval=None, cron=None, utc_offset=0,
+            jitter=0, catch_up=0, run_at_start=True, singleton=False):
+        """
+        interval=seconds ko cron="m h dom mon dow". Interval jobs suna fara
+        aiki nan take (kamar tsoffin threads) idan run_at_start.
+        singleton=True → leader kawai ke gudanar da shi (duba LEADER).
+        """
+        if (interval is None) == (cron is None):
+            raise ValueError("interval ko cron (ɗaya kawai)")
+
+        job = ScheduledJob(
+            name, fn,
+            interval=interval,
+            cron=CronSpec(cron, utc_offset) if cron else None,
+            jitter=jitter,
+            catch_up=catch_up,
+            singleton=singleton
+        )
+
+        now = time.time()
+        if interval and run_at_start:
+            first = now + (random.uniform(0, jitter) if jitter else 0)
+        else:
+            first = job.next_after(now)
+        # singleton: catch-up sai idan mu ne leader (ko a leader_acquired)
+        if job.cron and catch_up and (not singleton or LEADER.is_leader()) and self._missed_run(job, now):
+            print(f"⏰ CATCH-UP: {name}")
+            first = now
+
+        with self.cond:
+            self.jobs[name] = job
+            self._push(job, first)
+            self.cond.notify()
+        return job
+
+    def leader_acquired(self):
+        """
+        Sabon leader: singleton interval jobs su gudana yanzu (kamar farkon
+        process), cron jobs kuma a duba ko an rasa wani run (catch-up).
+        Ana matsar da entry na job ne a wuri ɗaya — re-election ba ya ninka runs.
+        """
+        now = time.time()
+        with self.cond:
+            jobs = [j for j in self.jobs.values() if j.singleton]
+
+        for job in jobs:
+            if job.interval:
+                due = now
+            elif job.catch_up and self._missed_run(job, now):
+                print(f"⏰ CATCH-UP: {job.name}")
+                due = now
+            else:
+                continue
+            with self.cond:
+                if self.jobs.get(job.name) is job and (job.next_run is None or job.next_run > due):
+                    self._push(job, due)
+                    self.cond.notify()
+
+    def trigger(self, name):
+        """
+        A gudanar da job nan take (misali pool ya ragu) maimakon jiran tick.
+        Ana matsar da run ɗin da ke jira ne kawai — ba a ƙara na biyu ba.
+        """
+        with self.cond:
+            job = self.jobs.get(name)
+            if job is None:
+                return False
+            now = time.time()
+            if job.next_run is None or job.next_run > now:
+                self._push(job, now)
+                self.cond.notify()
+        return True
+
+    def _missed_run(self, job, now):
+        try:
+            with db_session() as db:
+                row = db.execute(
+                    "SELECT EXTRACT(EPOCH FROM last_run_at) FROM scheduler_runs WHERE name=%s",
+                    (job.name,)
+                ).fetchone()
+        except Exception as e:
+            print("SCHEDULER CATCH-UP CHECK ERROR:", e)
+            return False
+
+        if not row or row[0] is None:
+            return False
+        due = job.cron.next_after(float(row[0]))
+        return due <= now and now - due <= job.catch_up
+
+    def _push(self, job, when):
+        # tsohon entry na job ya zama stale (_tick zai yar da shi)
+        job.next_run = when
+        self._seq += 1
+        job.seq = self._seq
+        heapq.heappush(self.heap, (when, self._seq, job))
+
+    def start(self):
+        with self.cond:
+            if self.started:
+                return
+            self.started = True
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _loop(self):
+        # Thread daya ne ke tuka dukkan jobs: kuskure kada ya kashe shi
+        while True:
+            try:
+                self._tick()
+            except Exception as e:
+                print("❌ SCHEDULER LOOP ERROR:", e)
+                time.sleep(1)
+
+    def _tick(self):
+        with self.cond:
+            while not self.heap or self.heap[0][0] > time.time():
+                timeout = self.heap[0][0] - time.time() if self.heap else None
+                self.cond.wait(timeout)
+
+            due, seq, job = heapq.heappop(self.heap)
+            if self.jobs.get(job.name) is not job or seq != job.seq:
+                return
+
+            now = time.time()
+            try:
+                when = job.next_after(max(due, now))
+            except Exception as e:
+                # kada job ya bace daga heap: a sake gwadawa nan da minti daya
+                print(f"❌ SCHEDULER NEXT RUN ERROR {job.name}:", e)
+                when = now + 60
+            self._push(job, when)
+
+            if job.singleton and not LEADER.is_leader():
+                job.standby += 1
+                return
+
+            if job.running:
+                # overlap guard
+                job.skipped += 1
+                return
+            job.running = True
+
+        try:
+            self.executor.submit(self._run, job)
+        except Exception as e:
+            print("SCHEDULER SUBMIT ERROR:", e)
+            with self.cond:
+                job.running = False
+
+    def _run(self, job):
+        started = time.monotonic()
+        error = None
+        try:
+            job.fn()
+        except Exception as e:
+            error = e
+            print(f"❌ SCHEDULED JOB {job.name} ERROR:", e)
+        finally:
+            elapsed = time.monotonic() - started
+            with self.cond:
+                job.running = False
+                job.runs += 1
+                job.total_time += elapsed
+                job.max_time = max(job.max_time, elapsed)
+                if error is not None:
+                    job.failures += 1
+                    job.last_error = str(error)[:200]
+
+        if job.catch_up:
+            self._persist(job, error, elapsed)
+
+    def _persist(self, job, error, elapsed):
+        try:
+            with db_session() as db:
+                db.execute("""
+                    INSERT INTO scheduler_runs (name, last_run_at, last_status, last_duration_ms, last_error)
+                    VALUES (%s, NOW(), %s, %s, %s)
+                    ON CONFLICT (name) DO UPDATE
+                    SET last_run_at=EXCLUDED.last_run_at,
+                        last_status=EXCLUDED.last_status,
+                        last_duration_ms=EXCLUDED.last_duration_ms,
+                        last_error=EXCLUDED.last_error
+                """, (
+                    job.name,
+                    "error" if error else "ok",
+                    int(elapsed * 1000),
+                    str(error)[:500] if error else None
+                ))
+        except Exception as e:
+            print("SCHEDULER PERSIST ERROR:", e)
+
+    def stats(self):
+        now = time.time()
+        with self.cond:
+            jobs = sorted(self.jobs.values(), key=lambda j: j.name)
+            lines = []
+            for j in jobs:
+                avg = j.total_time / j.runs * 1000 if j.runs else 0
+                nxt = int(max((j.next_run or now) - now, 0))
+                line = (
+                    f"• {j.name}: runs {j.runs} | fail {j.failures} | skipped {j.skipped} "
+                    f"| avg {avg:.0f}ms max {j.max_time * 1000:.0f}ms | next {nxt}s"
+                )
+                if j.singleton:
+                    line += f" | singleton (standby {j.standby})"
+                if j.running:
+                    line += " | ⏳ running"
+                lines.append(line)
+        return "\n".join(lines) or "Babu jobs."
+
+
+SCHEDULER = Scheduler()
+SCHEDULER.start()
+register_stats_section("⏰ SCHEDULER", SCHEDULER.stats)
+
+
+# =====================================================
+# ================= LEADER ELECTION ==================
+# =====================================================
+# Idan akwai gunicorn workers ko hosts da yawa, singleton jobs (VIP checks,
+# sales reports, Gmail) su gudana a process ɗaya kawai. Leader shi ne wanda
+# ya riƙe pg advisory lock a kan connection na musamman: idan process ya
+# mutu connection ya rufe → lock ya saku → wani ya karɓa (failover).
+# Lease + heartbeat suna kare mu daga leader da ya makale amma connection
+# ɗinsa yana nan: idan lease ya ƙare, wani zai kashe backend ɗin.
+import socket
+
+LEADER_LOCK_KEY = int(os.environ.get("LEADER_LOCK_KEY", 735100016))
+LEADER_HEARTBEAT_SECONDS = int(os.environ.get("LEADER_HEARTBEAT_SECONDS", 10))
+LEADER_LEASE_SECONDS = int(os.environ.get("LEADER_LEASE_SECONDS", 45))
+
+
+def ensure_leader_leases_table():
+    with db_session() as db:
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS leader_leases (
+                name TEXT PRIMARY KEY,
+                holder TEXT NOT NULL,
+                backend_pid INTEGER,
+                acquired_at TIMESTAMPTZ DEFAULT NOW(),
+                heartbeat_at TIMESTAMPTZ DEFAULT NOW(),
+                expires_at TIMESTAMPTZ NOT NULL
+            )
+        """)
+
+
+ensure_leader_leases_table()
+
+
+class LeaderElector:
+    def __init__(self, name="background", lock_key=LEADER_LOCK_KEY):
+        self.name = name
+        self.lock_key = lock_key
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"
+        self.conn = None
+        self.leader = False
+        self.last_ok = 0.0
+        self.started = False
+        self.lock = threading.Lock()
+        self.elections = 0
+        self.takeovers = 0
+        self.callbacks = []
+
+    def is_leader(self):
+        # Heartbeat ya tsufa → kar mu ɗauka muna leader, domin kafin lease
+        # ya ƙare (wani ya karɓa) mun riga mun daina.
+        fresh = time.monotonic() - self.last_ok < LEADER_LEASE_SECONDS - LEADER_HEARTBEAT_SECONDS
+        return self.leader and fresh
+
+    def on_elected(self, fn):
+        self.callbacks.append(fn)
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _loop(self):
+        while True:
+            try:
+                self._tick()
+            except Exception as e:
+                print("LEADER ELECTION ERROR:", e)
+                self._drop()
+            time.sleep(LEADER_HEARTBEAT_SECONDS)
+
+    def _drop(self):
+        if self.leader:
+            print(f"👑 LEADERSHIP LOST ({self.holder})")
+        self.leader = False
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+        self.conn = None
+
+    def _tick(self):
+        if self.conn is None or self.conn.closed:
+            # sabon session → lock na baya (idan akwai) ya riga ya saku
+            self.leader = False
+            self.conn = DB_POOL.dedicated()
+
+        cur = self.conn.cursor()
+        try:
+            if self.leader:
+                self._heartbeat(cur)
+            elif self._try_acquire(cur):
+                self._elected()
+            else:
+                self._reap_stale_leader(cur)
+        finally:
+            cur.close()
+
+    def _heartbeat(self, cur):
+        cur.execute("""
+            UPDATE leader_leases
+            SET heartbeat_at=NOW(),
+                expires_at=NOW() + (%s * INTERVAL '1 second')
+            WHERE name=%s AND holder=%s AND backend_pid=pg_backend_pid()
+        """, (LEADER_LEASE_SECONDS, self.name, self.holder))
+        if cur.rowcount != 1:
+            raise RuntimeError("lease lost")
+        self.last_ok = time.monotonic()
+
+    def _try_acquire(self, cur):
+        cur.execute("SELECT pg_try_advisory_lock(%s)", (self.lock_key,))
+        if not cur.fetchone()[0]:
+            return False
+
+        cur.execute("""
+            INSERT INTO leader_leases (name, holder, backend_pid, acquired_at, heartbeat_at, expires_at)
+            VALUES (%s, %s, pg_backend_pid(), NOW(), NOW(), NOW() + (%s * INTERVAL '1 second'))
+            ON CONFLICT (name) DO UPDATE
+            SET holder=EXCLUDED.holder,
+                backend_pid=EXCLUDED.backend_pid,
+                acquired_at=NOW(),
+                heartbeat_at=NOW(),
+                expires_at=EXCLUDED.expires_at
+        """, (self.name, self.holder, LEADER_LEASE_SECONDS))
+        self.leader = True
+        self.last_ok = time.monotonic()
+        return True
+
+    def _elected(self):
+        self.elections += 1
+        print(f"👑 LEADER ELECTED: {self.holder}")
+        for fn in self.callbacks:
+            try:
+                fn()
+            except Exception as e:
+                print("LEADER CALLBACK ERROR:", e)
+
+    def _reap_stale_leader(self, cur):
+        # Lease ya ƙare amma lock yana hannun wani → leader ya makale.
+        # pid daga pg_locks (ba daga lease ba) domin kar mu kashe wani session.
+        cur.execute("""
+            SELECT l.pid
+            FROM pg_locks l
+            JOIN leader_leases ll ON ll.name=%s AND ll.expires_at < NOW()
+            WHERE l.locktype='advisory'
+              AND l.granted
+              AND l.classid=0 AND l.objid=%s AND l.objsubid=1
+        """, (self.name, self.lock_key))
+        row = cur.fetchone()
+        if not row:
+            return
+
+        cur.execute("SELECT pg_terminate_backend(%s)", (row[0],))
+        self.takeovers += 1
+        print(f"👑 STALE LEADER TERMINATED (backend {row[0]})")
+
+    def stats(self):
+        role = "👑 leader" if self.is_leader() else "standby"
+        lines = [f"{role} | {self.holder} | elections: {self.elections} | takeovers: {self.takeovers}"]
+        try:
+            with db_session() as db:
+                row = db.execute("""
+                    SELECT holder, EXTRACT(EPOCH FROM expires_at - NOW())
+                    FROM leader_leases WHERE name=%s
+                """, (self.name,)).fetchone()
+            if row:
+                lines.append(f"lease: {row[0]} (expires in {int(row[1])}s)")
+        except Exception as e:
+            lines.append(f"db error: {e}")
+        return "\n".join(lines)
+
+
+LEADER = LeaderElector()
+LEADER.on_elected(lambda: SCHEDULER.leader_acquired())
+LEADER.start()
+register_stats_section("👑 LEADER", LEADER.stats)
+
+# Singleton jobs sai bayan LEADER ya wanzu (loop yana duba LEADER.is_leader())
+SCHEDULER.add("bot_state_purge", purge_bot_state, interval=3600, jitter=60, singleton=True)
+
+
+# =====================================================
+# ================= COUNTDOWN WHEEL ==================
+# =====================================================
+# Thread ɗaya (timing wheel na sakan 1) yana tuƙa dukkan countdown
+# messages maimakon thread + sleep(1) ga kowane user. Edits ana haɗa su
+# (COUNTDOWN_EDIT_EVERY), checks (misali "ya shiga group?") suna da nasu
+# tazara, kuma idan lokaci ya ƙare ana revoke link ɗin (idan akwai).
+COUNTDOWN_EDIT_EVERY = int(os.environ.get("COUNTDOWN_EDIT_EVERY", 5))
+COUNTDOWN_CHECK_EVERY = int(os.environ.get("COUNTDOWN_CHECK_EVERY", 3))
+COUNTDOWN_WORKERS = int(os.environ.get("COUNTDOWN_WORKERS", 8))
+COUNTDOWN_WHEEL_SLOTS = 512
+
+
+class Countdown:
+    def __init__(self, key, seconds, chat_id, message_id, render, check, on_expire,
+                 alive, revoke, edit_every, check_every, edit_kwargs):
+        now = time.monotonic()
+        self.key = key
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.render = render
+        self.check = check
+        self.on_expire = on_expire
+        self.alive = alive
+        self.revoke = revoke
+        self.edit_every = edit_every
+        self.check_every = check_every
+        self.edit_kwargs = edit_kwargs
+        self.started_at = now
+        self.deadline = now + seconds
+        self.next_edit = now + edit_every
+        self.next_check = now + 1
+        self.last_text = None
+        self.rounds = 0
+        self.cancelled = False
+        self.edits = 0
+
+
+class CountdownWheel:
+    def __init__(self, slots=COUNTDOWN_WHEEL_SLOTS, workers=COUNTDOWN_WORKERS):
+        self.slots = [[] for _ in range(slots)]
+        self.tick = 0
+        self.active = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="countdown")
+        self.running = False
+        self.started = 0
+        self.edits = 0
+        self.edit_seconds = 0
+
+    def start(self, key, seconds, chat_id, message_id, render, check=None,
+              on_expire=None, alive=None, revoke=None,
+              edit_every=COUNTDOWN_EDIT_EVERY, check_every=COUNTDOWN_CHECK_EVERY,
+              **edit_kwargs):
+        """
+        render(remaining) → text. check() → True idan an gama (misali ya
+        shiga group). alive() → False = a daina shiru. revoke=(chat_id, link)
+        za a revoke idan lokaci ya ƙare.
+        """
+        cd = Countdown(
+            key, seconds, chat_id, message_id, render, check, on_expire,
+            alive, revoke, edit_every, check_every, edit_kwargs
+        )
+        with self.lock:
+            old = self.active.get(key)
+            if old is not None:
+                old.cancelled = True
+            self.active[key] = cd
+            self.started += 1
+            if not self.running:
+                self.running = True
+                threading.Thread(target=self._loop, daemon=True).start()
+        self._schedule(cd, 1)
+        return cd
+
+    def cancel(self, key):
+        with self.lock:
+            cd = self.active.pop(key, None)
+        if cd is not None:
+            cd.cancelled = True
+
+    # ---------- wheel ----------
+    def _schedule(self, cd, delay):
+        delay = max(1, int(math.ceil(delay)))
+        with self.lock:
+            n = len(self.slots)
+            cd.rounds = (delay - 1) // n
+            self.slots[(self.tick + delay) % n].append(cd)
+
+    def _loop(self):
+        next_at = time.monotonic()
+        while True:
+            next_at += 1
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -5:
+                next_at = time.monotonic()   # mun makara sosai → kar mu yi ta gudu
+
+            with self.lock:
+                self.tick += 1
+                idx = self.tick % len(self.slots)
+                due, keep = [], []
+                for cd in self.slots[idx]:
+                    if cd.cancelled:
+                        continue
+                    if cd.rounds > 0:
+                        cd.rounds -= 1
+                        keep.append(cd)
+                    else:
+                        due.append(cd)
+                self.slots[idx] = keep
+
+            for cd in due:
+                self.executor.submit(self._step, cd)
+
+    # ---------- countdown step ----------
+    def _step(self, cd):
+        try:
+            if cd.cancelled:
+                return
+            if cd.alive is not None and not cd.alive():
+                self._finish(cd)
+                return
+
+            now = time.monotonic()
+            remaining = int(math.ceil(cd.deadline - now))
+            if remaining <= 0:
+                self._finish(cd)
+                self._expire(cd)
+                return
+
+            if cd.check is not None and now >= cd.next_check:
+                cd.next_check = now + cd.check_every
+                try:
+                    done = cd.check()
+                except Exception:
+                    done = False
+                if done:
+                    self._finish(cd)
+                    return
+
+            if now >= cd.next_edit:
+                cd.next_edit = now + cd.edit_every
+                self._edit(cd, remaining)
+
+            nxt = min(cd.deadline, cd.next_edit)
+            if cd.check is not None:
+                nxt = min(nxt, cd.next_check)
+            self._schedule(cd, nxt - time.monotonic())
+
+        except Exception as e:
+            print("COUNTDOWN ERROR:", cd.key, e)
+            self._finish(cd)
+
+    def _edit(self, cd, remaining):
+        text = cd.render(remaining)
+        if text == cd.last_text:
+            return
+        cd.last_text = text
+        try:
+            with telegram_bulk():
+                bot.edit_message_text(
+                    text,
+                    chat_id=cd.chat_id,
+                    message_id=cd.message_id,
+                    **cd.edit_kwargs
+                )
+            cd.edits += 1
+        except Exception:
+            pass
+
+    def _expire(self, cd):
+        if cd.revoke:
+            try:
+                bot.revoke_chat_invite_link(*cd.revoke)
+            except Exception as e:
+                print("INVITE LINK REVOKE ERROR:", e)
+        if cd.on_expire is not None:
+            try:
+                cd.on_expire()
+            except Exception as e:
+                print("COUNTDOWN EXPIRE ERROR:", cd.key, e)
+
+    def _finish(self, cd):
+        cd.cancelled = True
+        with self.lock:
+            if self.active.get(cd.key) is cd:
+                del self.active[cd.key]
+            self.edits += cd.edits
+            self.edit_seconds += int(time.monotonic() - cd.started_at)
+
+    def stats(self):
+        with self.lock:
+            return (
+                f"active: {len(self.active)} | started: {self.started}\n"
+                f"edits: {self.edits} (1/s zai kasance {self.edit_seconds}) | every {COUNTDOWN_EDIT_EVERY}s"
+            )
+
+
+COUNTDOWNS = CountdownWheel()
+register_stats_section("⏳ COUNTDOWNS", COUNTDOWNS.stats)
+
+
+# =====================================================
+# ================= BACKGROUND JOB QUEUE ==============
+# =====================================================
+# Webhooks suna ajiye aiki a table `jobs` cikin transaction ɗaya da
+# biyan kuɗin, sannan workers suna ɗauka da FOR UPDATE SKIP LOCKED.
+# Idan job ya faɗi ana sake gwadawa (backoff); idan ya wuce max_attempts
+# ya koma 'dead' domin admin ya duba.
+from telebot.apihelper import ApiTelegramException
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 6))
+JOB_POLL_SECONDS = 2
+JOB_STALE_SECONDS = 300          # 'running' fiye da wannan = worker ya mutu
+JOB_KEEP_DONE_DAYS = 7
+
+JOB_HANDLERS = {}
+JOB_WAKEUP = threading.Event()
+JOB_STATS = {"done": 0, "retried": 0, "dead": 0}
+JOB_STATS_LOCK = threading.Lock()
+_job_workers_started = False
+_job_workers_lock = threading.Lock()
+
+
+def ensure_jobs_table():
+    try:
+        with db_session() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id BIGSERIAL PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload JSONB NOT NULL DEFAULT '{}',
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    attempts INT NOT NULL DEFAULT 0,
+                    max_attempts INT NOT NULL DEFAULT 6,
+                    run_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                    locked_at TIMESTAMP,
+                    last_error TEXT,
+                    dedupe_key TEXT UNIQUE,
+                    created_at TIMESTAMP DEFAULT NOW(),
+                    finished_at TIMESTAMP
+                )
+            """)
+            db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_jobs_due
+                ON jobs(run_at) WHERE status='queued'
+            """)
+        print("✅ jobs table ready")
+    except Exception as e:
+        print("❌ JOBS TABLE ERROR:", e)
+
+
+ensure_jobs_table()
+
+
+def job_handler(kind):
+    def deco(fn):
+        JOB_HANDLERS[kind] = fn
+        return fn
+    return deco
+
+
+def enqueue_job(kind, payload=None, db=None, delay=0, dedupe_key=None, max_attempts=None):
+    """
+    Ajiye job. Idan an bada `db`, job ɗin yana shiga transaction ɗin
+    caller (commit ɗaya da sauran canje-canje).
+    """
+    sql = """
+        INSERT INTO jobs (kind, payload, run_at, dedupe_key, max_attempts)
+        VALUES (%s, %s::jsonb, NOW() + (%s * INTERVAL '1 second'), %s, %s)
+        ON CONFLICT (dedupe_key) DO NOTHING
+    """
+    params = (
+        kind,
+        json.dumps(payload or {}),
+        delay,
+        dedupe_key,
+        max_attempts or JOB_MAX_ATTEMPTS
+    )
+
+    if db is not None:
+        db.execute(sql, params)
+        return
+
+    with db_session() as own:
+        own.execute(sql, params)
+    wake_job_workers()
+
+
+def wake_job_workers():
+    JOB_WAKEUP.set()
+
+
+def _claim_job():
+    with db_session() as db:
+        return db.execute("""
+            UPDATE jobs
+            SET status='running', locked_at=NOW(), attempts=attempts+1
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE status='queued' AND run_at <= NOW()
+                ORDER BY run_at, id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id, kind, payload, attempts, max_attempts
+        """).fetchone()
+
+
+def _run_job(job):
+    job_id, kind, payload, attempts, max_attempts = job
+    handler = JOB_HANDLERS.get(kind)
+
+    try:
+        if handler is None:
+            raise RuntimeError(f"no handler for job kind '{kind}'")
+        handler(payload or {})
+
+    except Exception as e:
+        err = f"{type(e).__name__}: {e}"[:1000]
+
+        with db_session() as db:
+            if attempts >= max_attempts:
+                db.execute(
+                    """
+                    UPDATE jobs
+                    SET status='dead', last_error=%s, finished_at=NOW()
+                    WHERE id=%s
+                    """,
+                    (err, job_id)
+                )
+            else:
+                backoff = min(5 * (2 ** (attempts - 1)), 900)
+                db.execute(
+                    """
+                    UPDATE jobs
+                    SET status='queued', last_error=%s,
+                        run_at=NOW() + (%s * INTERVAL '1 second')
+                    WHERE id=%s
+                    """,
+                    (err, backoff, job_id)
+                )
+
+        with JOB_STATS_LOCK:
+            if attempts >= max_attempts:
+                JOB_STATS["dead"] += 1
+            else:
+                JOB_STATS["retried"] += 1
+
+        if attempts >= max_attempts:
+            print(f"☠️ JOB DEAD #{job_id} {kind}:", err)
+        else:
+            print(f"🔁 JOB RETRY #{job_id} {kind} ({attempts}/{max_attempts}):", err)
+        return
+
+    with db_session() as db:
+        db.execute(
+            "UPDATE jobs SET status='done', finished_at=NOW(), last_error=NULL WHERE id=%s",
+            (job_id,)
+        )
+
+    with JOB_STATS_LOCK:
+        JOB_STATS["done"] += 1
+
+
+def job_worker_loop():
+    while True:
+        try:
+            job = _claim_job()
+        except Exception as e:
+            print("❌ JOB CLAIM ERROR:", e)
+            time.sleep(5)
+            continue
+
+        if not job:
+            JOB_WAKEUP.wait(JOB_POLL_SECONDS)
+            JOB_WAKEUP.clear()
+            continue
+
+        try:
+            _run_job(job)
+        except Exception as e:
+            # DB ta faɗi yayin rubuta sakamako → janitor zai dawo da job
+            print("❌ JOB WORKER ERROR:", e)
+            time.sleep(1)
+
+
+def job_janitor():
+    with db_session() as db:
+        cur = db.execute(
+            """
+            UPDATE jobs
+            SET status='queued', locked_at=NULL,
+                last_error='recovered: worker stopped'
+            WHERE status='running'
+              AND locked_at < NOW() - (%s * INTERVAL '1 second')
+            """,
+            (JOB_STALE_SECONDS,)
+        )
+        if cur.rowcount:
+            print(f"♻️ RECOVERED {cur.rowcount} STALE JOB(S)")
+
+        db.execute(
+            """
+            DELETE FROM jobs
+            WHERE status='done'
+              AND finished_at < NOW() - (%s * INTERVAL '1 day')
+            """,
+            (JOB_KEEP_DONE_DAYS,)
         )
 
-        data = r.json()
 
-        # Duba idan komai yayi nasara
-        if data.get("status") != "success":
-            print(f"Flutterwave Error: {data.get('message')}")
+def start_job_workers():
+    global _job_workers_started
+
+    with _job_workers_lock:
+        if _job_workers_started:
+            return
+        _job_workers_started = True
+
+    for _ in range(JOB_WORKERS):
+        threading.Thread(target=job_worker_loop, daemon=True).start()
+    SCHEDULER.add("job_janitor", job_janitor, interval=60, jitter=5, singleton=True)
+    print(f"✅ JOB WORKERS STARTED ({JOB_WORKERS})")
+
+
+def job_stats_text():
+    with JOB_STATS_LOCK:
+        local = dict(JOB_STATS)
+
+    lines = [
+        f"this process → done: {local['done']} | retried: {local['retried']} | dead: {local['dead']}"
+    ]
+    try:
+        with db_session() as db:
+            rows = db.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status ORDER BY status"
+            ).fetchall()
+        lines.append(" | ".join(f"{s}: {n}" for s, n in rows) or "jobs table empty")
+    except Exception as e:
+        lines.append(f"db error: {e}")
+    return "\n".join(lines)
+
+
+register_stats_section("📬 JOB QUEUE", job_stats_text)
+
+
+def job_send(chat_id, text, **kwargs):
+    """
+    send_message na jobs: idan user ya block bot (403) ko chat babu,
+    babu amfanin retry — sauran errors suna tashi domin a sake gwadawa.
+    """
+    try:
+        return bot.send_message(chat_id, text, **kwargs)
+    except ApiTelegramException as e:
+        if e.error_code in (400, 403):
+            print(f"⚠️ JOB SEND SKIPPED ({chat_id}):", e.description)
             return None
+        raise
 
-        # Flutterwave tana dawo da link din a 'data' -> 'link'
-        return data["data"]["link"]
 
-    except Exception as e:
-        print(f"Request Error: {e}")
-        return None
+@job_handler("send_message")
+def job_send_message(p):
+    job_send(
+        p["chat_id"],
+        p["text"],
+        parse_mode=p.get("parse_mode")
+    )
 
 
+@job_handler("delete_message")
+def job_delete_message(p):
+    try:
+        bot.delete_message(p["chat_id"], p["message_id"])
+    except Exception:
+        pass
 
 
-# ========= HOME / KEEP ALIVE =========
-@app.route("/")
-def home():
-    return "OK", 200
+# =====================================================
+# ============ PAYMENT FULFILMENT (JOBS) ===============
+# =====================================================
+def ensure_payment_events_table():
+    try:
+        with db_session() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS payment_events (
+                    id BIGSERIAL PRIMARY KEY,
+                    provider TEXT NOT NULL,
+                    provider_ref TEXT NOT NULL,
+                    order_id TEXT,
+                    amount INTEGER,
+                    currency TEXT,
+                    outcome TEXT,
+                    payload JSONB,
+                    created_at TIMESTAMP DEFAULT NOW(),
+                    UNIQUE (provider, provider_ref)
+                )
+            """)
+            db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_payment_events_order
+                ON payment_events(order_id)
+            """)
+        print("✅ payment_events table ready")
+    except Exception as e:
+        print("❌ PAYMENT EVENTS TABLE ERROR:", e)
 
 
-# ========= FLUTTERWAVE CALLBACK PAGE =========
-@app.route("/flutterwave-callback", methods=["GET"])
-def flutterwave_callback():
-    return """
-    <html>
-    <head>
-        <title>Payment Successful</title>
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <meta http-equiv="refresh" content="5;url=https://t.me/Algaitabot">
-        <style>
-            body {
-                margin: 0;
-                padding: 0;
-                display: flex;
-                justify-content: center;
-                align-items: center;
-                height: 100vh;
-                background-color: #f4f7f6;
-                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            }
-            .card {
-                background: white;
-                padding: 40px;
-                border-radius: 20px;
-                box-shadow: 0 10px 25px rgba(0,0,0,0.1);
-                text-align: center;
-                width: 90%;
-                max-width: 400px;
-            }
-            .icon {
-                font-size: 70px;
-                color: #2ecc71;
-                margin-bottom: 20px;
-            }
-            h2 {
-                color: #2c3e50;
-                margin-bottom: 10px;
-            }
-            p {
-                color: #7f8c8d;
-                font-size: 18px;
-                line-height: 1.6;
-            }
-            .btn {
-                display: inline-block;
-                margin-top: 25px;
-                padding: 12px 30px;
-                background-color: #0088cc;
-                color: white;
-                text-decoration: none;
-                border-radius: 50px;
-                font-weight: bold;
-                transition: background 0.3s;
-            }
-            .btn:hover {
-                background-color: #0077b5;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="card">
-            <div class="icon">✅</div>
-            <h2>BIYA YA NASARA</h2>
-            <p>An tabbatar da biyan ka cikin nasara.</p>
-            <p>Zaka iya rufe browser ka koma Telegram yanzu.</p>
-            <a href="https://t.me/Algaitabot" class="btn">KOMawa TELEGRAM</a>
-        </div>
-    </body>
-    </html>
+ensure_payment_events_table()
+
+
+def payment_user_names(user_id):
     """
+    (full_name, @username) — visited_users da farko, sannan get_chat sau ɗaya.
+    """
+    full_name = None
+    try:
+        with db_session() as db:
+            u = db.execute(
+                """
+                SELECT first_name, last_name
+                FROM visited_users
+                WHERE user_id=%s
+                """,
+                (user_id,)
+            ).fetchone()
+        if u and (u[0] or u[1]):
+            full_name = f"{u[0] or ''} {u[1] or ''}".strip()
+    except Exception as e:
+        print("⚠️ VISITED USER LOOKUP ERROR:", e)
 
-# ========= FEEDBACK =========
-def send_feedback_prompt(user_id, order_id):
     try:
-        conn = get_conn()          # ✅ ABIN DA YA RASA
-        cur = conn.cursor()
+        chat = bot.get_chat(user_id)
+        if not full_name:
+            full_name = f"{chat.first_name or ''} {chat.last_name or ''}".strip() or "User"
+        tg_username = f"@{chat.username}" if chat.username else "unknown"
+    except:
+        full_name = full_name or "User"
+        tg_username = "unknown"
 
-        cur.execute(
-            "SELECT 1 FROM feedbacks WHERE order_id = %s",
+    return full_name, tg_username
+
+
+def order_item_groups(order_id):
+    with db_session() as db:
+        rows = db.execute(
+            """
+            SELECT i.title, i.group_key, COALESCE(i.cashback_amount, 0)
+            FROM order_items oi
+            JOIN items i ON i.id = oi.item_id
+            WHERE oi.order_id=%s
+            """,
             (order_id,)
-        )
-        exists = cur.fetchone()
+        ).fetchall()
 
-        cur.close()
-        conn.close()
+    groups = {}
+    total_custom_cashback = 0
 
-    except Exception as e:
-        print("FEEDBACK DB ERROR:", e)
+    for title, group_key, cb_amount in rows:
+        key = group_key or f"single_{title}"
+        if key not in groups:
+            groups[key] = {"title": title, "count": 0}
+            # Idan fims na cikin group guda ne, sau daya kawai za a dauki custom cashback din don gudun ninki (doubling)
+            if cb_amount and cb_amount > 0:
+                total_custom_cashback += cb_amount
+        groups[key]["count"] += 1
+
+    return groups, total_custom_cashback
+
+
+def delete_order_message(p):
+    ref = p.get("order_msg")
+    if ref:
         try:
-            cur.close()
-            conn.close()
+            bot.delete_message(ref[0], ref[1])
         except:
             pass
-        return  # DB ta kasa tashi → kar bot ya mutu
 
-    if exists:
+
+@job_handler("film_cashback")
+def job_film_cashback(p):
+    order_id = p["order_id"]
+    user_id = p["user_id"]
+    paid_amount = p["paid_amount"]
+
+    groups, total_custom_cashback = order_item_groups(order_id)
+    if not groups:
+        print("⚠️ CASHBACK: EMPTY ORDER", order_id)
+        return
+
+    # ================= CASHBACK REWARD LOGIC =================
+    if total_custom_cashback > 0:
+        # 1. SABON TSARI: IDAN FIM(IN) YANA DA CUSTOM CASHBACK A DATABASE
+        cashback = total_custom_cashback
+        is_custom_cashback = True
+    else:
+        # 2. TSOHON TSARI: IDAN FIM(IN) BASHI DA CUSTOM CASHBACK
+        cashback = (paid_amount // 200) * CASHBACK
+        if cashback > 200:
+            cashback = 200
+        is_custom_cashback = False
+
+    if cashback <= 0:
+        return
+
+    with db_session(wallet=True) as wdb:
+        # Kariya daga retry: kar a ba da cashback sau biyu
+        credited = wdb.execute(
+            """
+            SELECT 1 FROM wallet_transactions
+            WHERE reference=%s AND type='cashback'
+            """,
+            (order_id,)
+        ).fetchone()
+
+        if not credited:
+            wdb.execute(
+                """
+                INSERT INTO wallet_balance (user_id, balance)
+                VALUES (%s,%s)
+                ON CONFLICT (user_id)
+                DO UPDATE SET
+                balance = wallet_balance.balance + EXCLUDED.balance,
+                updated_at = NOW()
+                """,
+                (user_id, cashback)
+            )
+
+            wdb.execute(
+                """
+                INSERT INTO wallet_transactions
+                (user_id, amount, type, reference, description)
+                VALUES (%s,%s,'cashback',%s,'Movie Cashback Reward')
+                """,
+                (user_id, cashback, order_id)
+            )
+
+        # Samun jimillar balance dake cikin wallet din user bayan an kara cashback
+        user_balance_row = wdb.execute(
+            "SELECT balance FROM wallet_balance WHERE user_id=%s",
+            (user_id,)
+        ).fetchone()
+        user_wallet_balance = user_balance_row[0] if user_balance_row else 0
+
+    # Tura Saƙon Cashback Dangane da Nau'in Tsari (Custom ko Tsohon Tsari)
+    if is_custom_cashback:
+        job_send(
+            user_id,
+            f"""Congratulations wannan fim ka siya mun ji dadin siyayyarka😍
+Kuma kai tsaye mun baka <b>₦{cashback}</b> CASHBACK zuwa wallet din ka.
+
+Ka duba wallet din ka, zaka iya siyayya dashi a nan gaba.
+
+Wallet Balance: ₦{user_wallet_balance}""",
+            parse_mode="HTML"
+        )
+    else:
+        job_send(
+            user_id,
+            f"""🎁 Cashback Reward🎉
+
+Wallet ID: <code>{user_id}</code>
+
+You received ₦{cashback} cashback,  
+
+Ka duba wallet din ka, zaka iya siyayya dashi a nan gaba.
+
+Wallet Balance: ₦{user_wallet_balance}""",
+            parse_mode="HTML"
+        )
+
+
+@job_handler("film_paid_notify")
+def job_film_paid_notify(p):
+    order_id = p["order_id"]
+    user_id = p["user_id"]
+    paid_amount = p["paid_amount"]
+
+    delete_order_message(p)
+
+    groups, _ = order_item_groups(order_id)
+    if not groups:
+        print("⚠️ PAID NOTIFY: EMPTY ORDER", order_id)
         return
 
+    lines = []
+    for g in groups.values():
+        if g["count"] > 1:
+            lines.append(f"{g['title']} ({g['count']})")
+        else:
+            lines.append(f"{g['title']}")
+
+    titles_text = ", ".join(lines) if lines else "N/A"
+
+    full_name, tg_username = payment_user_names(user_id)
+
     kb = InlineKeyboardMarkup()
     kb.add(
-        InlineKeyboardButton("😁 Very good", callback_data=f"feedback:very:{order_id}"),
-        InlineKeyboardButton("🙂 Good", callback_data=f"feedback:good:{order_id}")
-    )
-    kb.add(
-        InlineKeyboardButton("😓 Not sure", callback_data=f"feedback:neutral:{order_id}"),
-        InlineKeyboardButton("😠 Angry", callback_data=f"feedback:angry:{order_id}")
+        InlineKeyboardButton(
+            "⬇️ DOWNLOAD NOW",
+            callback_data=f"deliver:{order_id}"
+        )
     )
 
-    try:
-        bot.send_message(
-            user_id,
-            "We hope you enjoyed your shopping 🥰\nPlease choose how you’re feeling right now👇👇.",
-            reply_markup=kb
-        )
-        print("✅ Feedback prompt sent:", user_id, order_id)
-    except Exception as e:
-        print("FEEDBACK SEND ERROR:", e)
+    job_send(
+        user_id,
+        f"""🎉 <b>PAYMENT SUCCESSFUL</b>
 
+👤 <b>Name:</b> {full_name}
+🆔 <b>User ID:</b> <code>{user_id}</code>
 
-@app.route("/webhook", methods=["POST"])
-def flutterwave_webhook():
-    try:
-        # ================= SECURITY & VALIDATION (FLUTTERWAVE) =================
-        signature = request.headers.get("verif-hash")
-        if not signature: 
-            return "Missing signature", 401
+🎬 <b>Items:</b> {titles_text}
+🗃 <b>Order ID:</b> <code>{order_id}</code>
 
-        if signature != FLW_WEBHOOK_SECRET: 
-            return "Invalid signature", 401
+💳 <b>Amount Paid:</b> ₦{paid_amount}
 
-        # ================= PAYLOAD =================
-        payload = request.json or {}
-        data = payload.get("data", {})
+⬇️ Click the button below to download your files.
+""",
+        parse_mode="HTML",
+        reply_markup=kb
+    )
 
-        status = (data.get("status") or "").lower()
-        if status not in ("successful", "success"): 
-            return "Ignored", 200
+    if PAYMENT_NOTIFY_GROUP:
+        enqueue_job(
+            "send_message",
+            {
+                "chat_id": PAYMENT_NOTIFY_GROUP,
+                "parse_mode": "HTML",
+                "text": f"""✅ <b>NEW PAYMENT RECEIVED</b>
+
+👤 <b>Name:</b> {full_name}
+🔗 <b>Username:</b> {tg_username}
+🆔 <b>User ID:</b> <code>{user_id}</code>
+
+🎬 <b>Items:</b> {titles_text}
+🗃 <b>Order ID:</b> <code>{order_id}</code>
 
-        raw_reference = data.get("tx_ref")
-        currency = data.get("currency")
+💰 <b>Amount:</b> ₦{paid_amount}
+⏰ <b>Time:</b> {p['paid_at']}
+"""
+            },
+            dedupe_key=f"paid_group:{order_id}"
+        )
 
-        # Safe amount conversion
-        try:
-            paid_amount = int(float(data.get("amount", 0)))
-        except:
-            paid_amount = 0
 
-        # ✅ FIX REFERENCE: Ciro order_id ta hanyar split (kamar yadda aka gyara maka)
-        order_id = raw_reference.split("_")[0] if raw_reference else None
+@job_handler("vip_activate")
+def job_vip_activate(p):
+    from datetime import datetime, timedelta
 
-        if not order_id:
-            return "Order ID missing", 200
+    order_id = p["order_id"]
+    user_id = p["user_id"]
+    paid_amount = p["paid_amount"]
 
-        # ================= DB =================
-        conn = get_conn()
-        cur = conn.cursor()
+    delete_order_message(p)
 
-        cur.execute(
-            """
-            SELECT user_id, amount, paid, type
-            FROM orders
-            WHERE id=%s
-            """,
-            (order_id,)
-        )
-        row = cur.fetchone()
+    start_date = datetime.fromtimestamp(p["start_ts"])
+    end_date = start_date + (
+        timedelta(minutes=VIP_DURATION_VALUE)
+        if VIP_DURATION_UNIT == "minutes"
+        else timedelta(days=VIP_DURATION_VALUE)
+    )
 
-        if row:
-            user_id, expected_amount, paid, order_type = row
-        else:
-            order_type = None
+    start_local = start_date + timedelta(hours=1)
+    end_local = end_date + timedelta(hours=1)
 
-        # =====================================================
-        # ================= WALLET TOPUP ======================
-        # =====================================================
+    full_name, tg_username = payment_user_names(user_id)
 
-        if not row:
-            wallet_conn = get_wallet_conn()
-            wallet_cur = wallet_conn.cursor()
+    already_in_group = False
+    try:
+        member = bot.get_chat_member(VIP_GROUP_ID, user_id)
+        if member.status in ["member", "administrator", "creator"]:
+            already_in_group = True
+    except:
+        already_in_group = False
 
-            wallet_cur.execute(
+    if already_in_group:
+        with db_session() as db:
+            db.execute(
                 """
-                SELECT user_id, amount, status
-                FROM wallet_deposits
-                WHERE id=%s
+                INSERT INTO vip_members
+                (user_id, order_id, join_date, expire_at, status, warn1_sent, warn2_sent, payment_date)
+                VALUES (%s,%s,%s,%s,'active',FALSE,FALSE,NOW())
+                ON CONFLICT (user_id)
+                DO UPDATE SET
+                    order_id = EXCLUDED.order_id,
+                    join_date = EXCLUDED.join_date,
+                    expire_at = EXCLUDED.expire_at,
+                    status = 'active',
+                    warn1_sent = FALSE,
+                    warn2_sent = FALSE,
+                    payment_date = NOW()
                 """,
-                (order_id,)
+                (user_id, order_id, start_date, end_date)
             )
+        VIP_DUE.schedule(user_id)
 
-            dep = wallet_cur.fetchone()
+        job_send(
+            user_id,
+            f"""💎 <b>AN SABUNTA VIP NAKA</b>
 
-            if not dep:
-                wallet_cur.close()
-                wallet_conn.close()
-                cur.close()
-                conn.close()
-                return "Order not found", 200
+Muna tayaka murnar sabunta biyan VIP ɗinka.
 
-            user_id, expected_amount, status = dep
+Domin more samun duk fim ɗin da ranka yake so,
+ci gaba da ziyartar VIP Group kawai.
 
-            if status == "success":
-                wallet_cur.close()
-                wallet_conn.close()
-                cur.close()
-                conn.close()
-                return "Already processed", 200
+📅 <b>Ka biya a yau:</b> {start_local.strftime("%Y-%m-%d")}
+⏳ <b>Sake biya aranar ko kafin:</b> {end_local.strftime("%Y-%m-%d")}
 
-            # ✅ GYARA: Maimakon != expected_amount, mun yi amfani da < domin amincewa da biya
-            if paid_amount < expected_amount or currency != "NGN":
-                wallet_cur.close()
-                wallet_conn.close()
-                cur.close()
-                conn.close()
-                return "Wrong payment", 200
+Na gode da kasancewa tare da mu 🙏""",
+            parse_mode="HTML"
+        )
 
-            wallet_cur.execute(
-                """
-                UPDATE wallet_deposits
-                SET status='success',
-                    paystack_ref=%s,
-                    paid_at=NOW()
-                WHERE id=%s
-                """,
-                (raw_reference, order_id)
+        if PAYMENT_NOTIFY_GROUP:
+            enqueue_job(
+                "send_message",
+                {
+                    "chat_id": PAYMENT_NOTIFY_GROUP,
+                    "parse_mode": "HTML",
+                    "text": f"""💎 <b>VIP RENEWAL PAYMENT</b>
+
+👤 <b>Name:</b> {full_name}
+🔗 <b>Username:</b> {tg_username}
+🆔 <b>User ID:</b> <code>{user_id}</code>
+
+🗃 <b>Order ID:</b> <code>{order_id}</code>
+
+💰 <b>Amount:</b> ₦{paid_amount}
+⏰ <b>Time:</b> {p['paid_at']}
+"""
+                },
+                dedupe_key=f"vip_group:{order_id}"
             )
 
-            wallet_cur.execute(
+        enqueue_job(
+            "send_message",
+            {
+                "chat_id": ADMIN_ID,
+                "text": f"🔔 VIP RENEWAL\n\n👤 {full_name}\n🆔 {user_id}\n💰 ₦{paid_amount}\n\nYa sabunta VIP dinsa."
+            },
+            dedupe_key=f"vip_admin:{order_id}"
+        )
+
+    else:
+        with db_session() as db:
+            db.execute(
                 """
-                INSERT INTO wallet_balance (user_id, balance)
-                VALUES (%s,%s)
+                INSERT INTO vip_members
+                (user_id, order_id, join_date, expire_at, status, warn1_sent, warn2_sent, payment_date)
+                VALUES (%s,%s,NULL,NULL,'active',FALSE,FALSE,NOW())
                 ON CONFLICT (user_id)
                 DO UPDATE SET
-                balance = wallet_balance.balance + EXCLUDED.balance,
-                updated_at = NOW()
+                    order_id = EXCLUDED.order_id,
+                    join_date = NULL,
+                    expire_at = NULL,
+                    status = 'active',
+                    warn1_sent = FALSE,
+                    warn2_sent = FALSE,
+                    payment_date = NOW()
                 """,
-                (user_id, paid_amount)
+                (user_id, order_id)
             )
 
-            wallet_cur.execute(
-                """
-                INSERT INTO wallet_transactions
-                (user_id, amount, type, reference, description)
-                VALUES (%s,%s,'deposit',%s,'Wallet Top-up')
-                """,
-                (user_id, paid_amount, order_id)
+        vip_kb = InlineKeyboardMarkup()
+        vip_kb.add(
+            InlineKeyboardButton(
+                "🔐 JOIN VIP GROUP",
+                callback_data=f"vipnow:{order_id}"
             )
+        )
 
-            wallet_conn.commit()
-            wallet_cur.close()
-            wallet_conn.close()
+        job_send(
+            user_id,
+            f"""💎 <b>VIP SUBSCRIPTION ACTIVATED</b>
 
-            # ================= DELETE ORIGINAL ORDER MESSAGE =================
-            if order_id in ORDER_MESSAGES:
-                chat_id, message_id = ORDER_MESSAGES[order_id]
-                try:
-                    bot.delete_message(chat_id, message_id)
-                except:
-                    pass
-                del ORDER_MESSAGES[order_id]
+👤 <b>Name:</b> {full_name}
+🆔 <b>User ID:</b> <code>{user_id}</code>
 
-            # ================= USER INFO =================
-            cur.execute(
-                """
-                SELECT first_name, last_name
-                FROM visited_users
-                WHERE user_id=%s
-                """,
-                (user_id,)
-            )
-            u = cur.fetchone()
+💳 <b>Amount Paid:</b> ₦{paid_amount}
 
-            if u and (u[0] or u[1]):
-                full_name = f"{u[0] or ''} {u[1] or ''}".strip()
-            else:
-                try:
-                    chat = bot.get_chat(user_id)
-                    full_name = f"{chat.first_name or ''} {chat.last_name or ''}".strip()
-                except:
-                    full_name = "User"
+📅 <b>Start Date:</b> {start_local.strftime("%Y-%m-%d")}
+⏳ <b>End Date:</b> {end_local.strftime("%Y-%m-%d")}
 
-            try:
-                chat = bot.get_chat(user_id)
-                tg_username = f"@{chat.username}" if chat.username else "unknown"
-            except:
-                tg_username = "unknown"
+🔐 Click the button below to join the VIP Group.
+""",
+            parse_mode="HTML",
+            reply_markup=vip_kb
+        )
 
-            wallet_kb = InlineKeyboardMarkup()
-            wallet_kb.add(
-                InlineKeyboardButton(
-                    "🏦MY WALLET💵",
-                    callback_data="wallet"
-                )
+        if PAYMENT_NOTIFY_GROUP:
+            enqueue_job(
+                "send_message",
+                {
+                    "chat_id": PAYMENT_NOTIFY_GROUP,
+                    "parse_mode": "HTML",
+                    "text": f"""💎 <b>NEW VIP SUBSCRIPTION</b>
+
+👤 <b>Name:</b> {full_name}
+🔗 <b>Username:</b> {tg_username}
+🆔 <b>User ID:</b> <code>{user_id}</code>
+
+🗃 <b>Order ID:</b> <code>{order_id}</code>
+
+💰 <b>Amount:</b> ₦{paid_amount}
+⏰ <b>Time:</b> {p['paid_at']}
+"""
+                },
+                dedupe_key=f"vip_group:{order_id}"
             )
 
-            bot.send_message(
-                user_id,
-                f"""🎉 <b>CONGRATULATIONS MALAM {full_name}</b>
+
+@job_handler("wallet_topup_notify")
+def job_wallet_topup_notify(p):
+    order_id = p["order_id"]
+    user_id = p["user_id"]
+    paid_amount = p["paid_amount"]
+
+    delete_order_message(p)
+
+    full_name, tg_username = payment_user_names(user_id)
+
+    wallet_kb = InlineKeyboardMarkup()
+    wallet_kb.add(
+        InlineKeyboardButton(
+            "🏦MY WALLET💵",
+            callback_data="wallet"
+        )
+    )
+
+    job_send(
+        user_id,
+        f"""🎉 <b>CONGRATULATIONS MALAM {full_name}</b>
 
 💰 <b>Your wallet credited:</b> ₦{paid_amount}
 
@@ -1421,17 +3966,17 @@ Your deposit was successful.
 
 Use the button below to open your wallet.
 """,
-                parse_mode="HTML",
-                reply_markup=wallet_kb
-            )
-
-            if PAYMENT_NOTIFY_GROUP:
-                from datetime import datetime, timedelta
-                now = (datetime.now() + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
+        parse_mode="HTML",
+        reply_markup=wallet_kb
+    )
 
-                bot.send_message(
-                    PAYMENT_NOTIFY_GROUP,
-                    f"""💰 <b>TOP-UP SUCCESSFUL</b>
+    if PAYMENT_NOTIFY_GROUP:
+        enqueue_job(
+            "send_message",
+            {
+                "chat_id": PAYMENT_NOTIFY_GROUP,
+                "parse_mode": "HTML",
+                "text": f"""💰 <b>TOP-UP SUCCESSFUL</b>
 
 👤 <b>Name:</b> {full_name}
 🔗 <b>Username:</b> {tg_username}
@@ -1442,420 +3987,832 @@ Use the button below to open your wallet.
 🗃 <b>Order ID:</b> <code>{order_id}</code>
 📊 <b>Status:</b> success
 
-⏰ <b>Time:</b> {now}
-""",
-                    parse_mode="HTML"
-                )
+⏰ <b>Time:</b> {p['paid_at']}
+"""
+            },
+            dedupe_key=f"topup_group:{order_id}"
+        )
 
-            cur.close()
-            conn.close()
-            return "OK", 200
 
-        if paid == 1:
-            cur.close()
-            conn.close()
-            return "Already processed", 200
+start_job_workers()
 
-        # ✅ GYARA: Maimakon != expected_amount, mun yi amfani da < domin amincewa da biya
-        if paid_amount < expected_amount or currency != "NGN":
-            cur.close()
-            conn.close()
-            return "Wrong payment", 200
 
-        # ================= MARK AS PAID =================
-        cur.execute(
-            "UPDATE orders SET paid=1 WHERE id=%s",
-            (order_id,)
-        )
+@app.route("/webhook", methods=["POST"])
+def flutterwave_webhook():
+    try:
+        # ================= SECURITY & VALIDATION (FLUTTERWAVE) =================
+        signature = request.headers.get("verif-hash")
+        if not signature: 
+            return "Missing signature", 401
 
-        # ================= DELETE ORIGINAL ORDER MESSAGE =================
-        if order_id in ORDER_MESSAGES:
-            chat_id, message_id = ORDER_MESSAGES[order_id]
-            try:
-                bot.delete_message(chat_id, message_id)
-            except:
-                pass
-            del ORDER_MESSAGES[order_id]
+        if signature != FLW_WEBHOOK_SECRET: 
+            return "Invalid signature", 401
 
-        # ================= USER INFO =================
-        cur.execute(
-            """
-            SELECT first_name, last_name
-            FROM visited_users
-            WHERE user_id=%s
-            """,
-            (user_id,)
-        )
-        u = cur.fetchone()
+        # ================= PAYLOAD =================
+        payload = request.json or {}
+        data = payload.get("data", {})
 
-        if u and (u[0] or u[1]):
-            full_name = f"{u[0] or ''} {u[1] or ''}".strip()
-        else:
-            try:
-                chat = bot.get_chat(user_id)
-                full_name = f"{chat.first_name or ''} {chat.last_name or ''}".strip()
-            except:
-                full_name = "User"
+        status = (data.get("status") or "").lower()
+        if status not in ("successful", "success"): 
+            return "Ignored", 200
+
+        raw_reference = data.get("tx_ref")
+        currency = data.get("currency")
 
+        # Safe amount conversion
         try:
-            chat = bot.get_chat(user_id)
-            tg_username = f"@{chat.username}" if chat.username else "unknown"
+            paid_amount = int(float(data.get("amount", 0)))
         except:
-            tg_username = "unknown"
+            paid_amount = 0
 
-        # =====================================================
-        # ================== FILM ORDER =======================
-        # =====================================================
-        if order_type == "film":
-            cur.execute(
+        # ✅ FIX REFERENCE: Ciro order_id ta hanyar split (kamar yadda aka gyara maka)
+        order_id = raw_reference.split("_")[0] if raw_reference else None
+
+        if not order_id:
+            return "Order ID missing", 200
+
+        from datetime import datetime, timedelta
+        paid_at = (datetime.now() + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
+
+        # ================= CLAIM (MAIN DB) =================
+        # Round trip ɗaya: ajiye event (unique tx_ref) + claim order a
+        # lokaci guda. Retry na tx_ref ɗaya → ev_id NULL → no-op.
+        with db_session() as db:
+            row = db.execute(
                 """
-                SELECT i.title, i.group_key, COALESCE(i.cashback_amount, 0)
-                FROM order_items oi
-                JOIN items i ON i.id = oi.item_id
-                WHERE oi.order_id=%s
+                WITH ev AS (
+                    INSERT INTO payment_events
+                    (provider, provider_ref, order_id, amount, currency, payload)
+                    VALUES ('flutterwave', %s, %s, %s, %s, %s::jsonb)
+                    ON CONFLICT (provider, provider_ref) DO NOTHING
+                    RETURNING id
+                ),
+                claim AS (
+                    UPDATE orders
+                    SET paid=1
+                    WHERE id=%s
+                      AND paid=0
+                      AND amount <= %s
+                      AND %s = 'NGN'
+                      AND EXISTS (SELECT 1 FROM ev)
+                    RETURNING user_id, type
+                )
+                SELECT
+                    (SELECT id FROM ev),
+                    (SELECT user_id FROM claim),
+                    (SELECT type FROM claim),
+                    o.paid
+                FROM (SELECT 1) one
+                LEFT JOIN orders o ON o.id = %s
                 """,
-                (order_id,)
-            )
-            rows = cur.fetchall()
+                (
+                    raw_reference, order_id, paid_amount, currency, json.dumps(data),
+                    order_id, paid_amount, currency,
+                    order_id
+                )
+            ).fetchone()
 
-            if not rows:
-                cur.close()
-                conn.close()
-                return "Empty order", 200
+            event_id, user_id, order_type, order_paid = row
 
-            groups = {}
-            total_custom_cashback = 0
+            if event_id is None:
+                return "Already processed", 200
 
-            for title, group_key, cb_amount in rows:
-                key = group_key or f"single_{title}"
-                if key not in groups:
-                    groups[key] = {"title": title, "count": 0}
-                    # Idan fims na cikin group guda ne, sau daya kawai za a dauki custom cashback din don gudun ninki (doubling)
-                    if cb_amount and cb_amount > 0:
-                        total_custom_cashback += cb_amount
-                groups[key]["count"] += 1
+            if order_paid is not None:
+                if user_id is None:
+                    outcome = "already_paid" if order_paid == 1 else "wrong_payment"
+                    db.execute(
+                        "UPDATE payment_events SET outcome=%s WHERE id=%s",
+                        (outcome, event_id)
+                    )
+                    return ("Already processed" if order_paid == 1 else "Wrong payment"), 200
 
-            lines = []
-            for g in groups.values():
-                if g["count"] > 1:
-                    lines.append(f"{g['title']} ({g['count']})")
-                else:
-                    lines.append(f"{g['title']}")
+                rollup_paid_orders(db.cursor(), [order_id])
 
-            titles_text = ", ".join(lines) if lines else "N/A"
+                job_payload = {
+                    "order_id": order_id,
+                    "user_id": user_id,
+                    "paid_amount": paid_amount,
+                    "paid_at": paid_at,
+                    "start_ts": time.time(),
+                    "order_msg": ORDER_MESSAGES.get(order_id)
+                }
 
-            # ================= CASHBACK REWARD LOGIC =================
-            if total_custom_cashback > 0:
-                # 1. SABON TSARI: IDAN FIM(IN) YANA DA CUSTOM CASHBACK A DATABASE
-                cashback = total_custom_cashback
-                is_custom_cashback = True
-            else:
-                # 2. TSOHON TSARI: IDAN FIM(IN) BASHI DA CUSTOM CASHBACK
-                cashback = (paid_amount // 200) * CASHBACK
-                if cashback > 200:
-                    cashback = 200
-                is_custom_cashback = False
+                if order_type == "film":
+                    enqueue_job("film_cashback", job_payload, db=db, dedupe_key=f"cashback:{order_id}")
+                    enqueue_job("film_paid_notify", job_payload, db=db, dedupe_key=f"paid_notify:{order_id}")
 
-            if cashback > 0:
-                wallet_conn = get_wallet_conn()
-                wallet_cur = wallet_conn.cursor()
+                elif order_type == "vip":
+                    enqueue_job("vip_activate", job_payload, db=db, dedupe_key=f"vip_activate:{order_id}")
 
-                wallet_cur.execute(
-                    """
-                    INSERT INTO wallet_balance (user_id, balance)
-                    VALUES (%s,%s)
-                    ON CONFLICT (user_id)
-                    DO UPDATE SET
-                    balance = wallet_balance.balance + EXCLUDED.balance,
-                    updated_at = NOW()
-                    """,
-                    (user_id, cashback)
+                db.execute(
+                    "UPDATE payment_events SET outcome='order_paid' WHERE id=%s",
+                    (event_id,)
                 )
 
-                wallet_cur.execute(
-                    """
-                    INSERT INTO wallet_transactions
-                    (user_id, amount, type, reference, description)
-                    VALUES (%s,%s,'cashback',%s,'Movie Cashback Reward')
-                    """,
-                    (user_id, cashback, order_id)
-                )
+            else:
+                # =====================================================
+                # ================= WALLET TOPUP ======================
+                # =====================================================
+                # Main transaction (event) yana jira har wallet ya yi commit:
+                # idan wallet ya faɗi, event ma zai koma baya a sake gwadawa.
+                with db_session(wallet=True) as wdb:
+                    dep = wdb.execute(
+                        """
+                        UPDATE wallet_deposits
+                        SET status='success',
+                            paystack_ref=%s,
+                            paid_at=NOW()
+                        WHERE id=%s
+                          AND status <> 'success'
+                          AND amount <= %s
+                          AND %s = 'NGN'
+                        RETURNING user_id
+                        """,
+                        (raw_reference, order_id, paid_amount, currency)
+                    ).fetchone()
 
-                # Samun jimillar balance dake cikin wallet din user bayan an kara cashback
-                wallet_cur.execute(
-                    """
-                    SELECT balance FROM wallet_balance WHERE user_id=%s
-                    """,
-                    (user_id,)
+                    if dep:
+                        user_id = dep[0]
+
+                        wdb.execute(
+                            """
+                            INSERT INTO wallet_balance (user_id, balance)
+                            VALUES (%s,%s)
+                            ON CONFLICT (user_id)
+                            DO UPDATE SET
+                            balance = wallet_balance.balance + EXCLUDED.balance,
+                            updated_at = NOW()
+                            """,
+                            (user_id, paid_amount)
+                        )
+
+                        wdb.execute(
+                            """
+                            INSERT INTO wallet_transactions
+                            (user_id, amount, type, reference, description)
+                            VALUES (%s,%s,'deposit',%s,'Wallet Top-up')
+                            """,
+                            (user_id, paid_amount, order_id)
+                        )
+                        outcome = "wallet_credited"
+                    else:
+                        st = wdb.execute(
+                            "SELECT status FROM wallet_deposits WHERE id=%s",
+                            (order_id,)
+                        ).fetchone()
+                        if not st:
+                            outcome = "not_found"
+                        elif st[0] == "success":
+                            outcome = "already_paid"
+                        else:
+                            outcome = "wrong_payment"
+
+                db.execute(
+                    "UPDATE payment_events SET outcome=%s WHERE id=%s",
+                    (outcome, event_id)
                 )
-                user_balance_row = wallet_cur.fetchone()
-                user_wallet_balance = user_balance_row[0] if user_balance_row else 0
-
-                wallet_conn.commit()
-                wallet_cur.close()
-                wallet_conn.close()
-
-                # Tura Saƙon Cashback Dangane da Nau'in Tsari (Custom ko Tsohon Tsari)
-                if is_custom_cashback:
-                    bot.send_message(
-                        user_id,
-                        f"""Congratulations wannan fim ka siya mun ji dadin siyayyarka😍
-Kuma kai tsaye mun baka <b>₦{cashback}</b> CASHBACK zuwa wallet din ka.
 
-Ka duba wallet din ka, zaka iya siyayya dashi a nan gaba.
+                if outcome == "not_found":
+                    return "Order not found", 200
+                if outcome == "already_paid":
+                    return "Already processed", 200
+                if outcome == "wrong_payment":
+                    return "Wrong payment", 200
+
+                # Kuɗin ya shiga wallet; sakonni su biyo baya ta job
+                enqueue_job(
+                    "wallet_topup_notify",
+                    {
+                        "order_id": order_id,
+                        "user_id": user_id,
+                        "paid_amount": paid_amount,
+                        "paid_at": paid_at,
+                        "order_msg": ORDER_MESSAGES.get(order_id)
+                    },
+                    db=db,
+                    dedupe_key=f"topup_notify:{order_id}"
+                )
 
-Wallet Balance: ₦{user_wallet_balance}""",
-                        parse_mode="HTML"
-                    )
-                else:
-                    bot.send_message(
-                        user_id,
-                        f"""🎁 Cashback Reward🎉
+        ORDER_MESSAGES.pop(order_id, None)
+        wake_job_workers()
+        return "OK", 200
 
-Wallet ID: <code>{user_id}</code>
+    except Exception as e:
+        print(f"Webhook Error: {e}")
+        return "Internal Error", 500
 
-You received ₦{cashback} cashback,  
 
-Ka duba wallet din ka, zaka iya siyayya dashi a nan gaba.
 
-Wallet Balance: ₦{user_wallet_balance}""",
-                        parse_mode="HTML"
-                    )
+# 
+# ========= TELEGRAM WEBHOOK =========
+# Updates suna shiga queue, webhook yana amsawa nan take. Kowane user
+# yana da shard ɗinsa (user_id % workers) domin sakonninsa su tafi a
+# jere, yayin da users daban-daban suke tafiya tare.
+import queue
+
+UPDATE_WORKERS = int(os.environ.get("UPDATE_WORKERS", 8))
+UPDATE_QUEUE_SIZE = int(os.environ.get("UPDATE_QUEUE_SIZE", 200))
+
+
+def update_user_id(update):
+    for attr in (
+        "message", "edited_message", "callback_query", "inline_query",
+        "chosen_inline_result", "shipping_query", "pre_checkout_query",
+        "my_chat_member", "chat_member", "chat_join_request",
+        "channel_post", "edited_channel_post"
+    ):
+        obj = getattr(update, attr, None)
+        if obj is None:
+            continue
+        user = getattr(obj, "from_user", None)
+        if user is not None:
+            return user.id
+        chat = getattr(obj, "chat", None)
+        if chat is not None:
+            return chat.id
+    return update.update_id
+
+
+class UpdateDispatcher:
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._started = False
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+        self.accepted = 0
+        self.rejected = 0
+        self.handled = 0
+        self.errors = 0
+        self.handle_total = 0.0
+        self.handle_max = 0.0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        # handlers su gudana a cikin shard thread, ba a telebot pool ba
+        bot.threaded = False
+
+        for i in range(self.workers):
+            threading.Thread(
+                target=self._worker,
+                args=(self.queues[i],),
+                daemon=True
+            ).start()
+        print(f"✅ UPDATE DISPATCHER STARTED ({self.workers} shards)")
+
+    def submit(self, update):
+        self.start()
+        shard = update_user_id(update) % self.workers
+        try:
+            self.queues[shard].put_nowait((time.monotonic(), update))
+        except queue.Full:
+            with self._stats_lock:
+                self.rejected += 1
+            return False
 
-            conn.commit()
-            cur.close()
-            conn.close()
+        with self._stats_lock:
+            self.accepted += 1
+        return True
 
-            kb = InlineKeyboardMarkup()
-            kb.add(
-                InlineKeyboardButton(
-                    "⬇️ DOWNLOAD NOW",
-                    callback_data=f"deliver:{order_id}"
-                )
-            )
+    def _worker(self, q):
+        while True:
+            queued_at, update = q.get()
+            start = time.monotonic()
+            ok = True
+            try:
+                bot.process_new_updates([update])
+            except Exception as e:
+                ok = False
+                print("❌ UPDATE HANDLER ERROR:", e)
+            finally:
+                end = time.monotonic()
+                waited = start - queued_at
+                took = end - start
+                with self._stats_lock:
+                    self.handled += 1
+                    if not ok:
+                        self.errors += 1
+                    self.handle_total += took
+                    self.wait_total += waited
+                    if took > self.handle_max:
+                        self.handle_max = took
+                    if waited > self.wait_max:
+                        self.wait_max = waited
+                q.task_done()
+
+    def stats(self):
+        depths = [q.qsize() for q in self.queues]
+        with self._stats_lock:
+            n = self.handled or 1
+            return (
+                f"queued: {sum(depths)} | busiest shard: {max(depths)} / {UPDATE_QUEUE_SIZE}\n"
+                f"accepted: {self.accepted} | rejected (503): {self.rejected}\n"
+                f"handled: {self.handled} | errors: {self.errors}\n"
+                f"handler avg: {self.handle_total / n * 1000:.0f}ms | max: {self.handle_max * 1000:.0f}ms\n"
+                f"queue wait avg: {self.wait_total / n * 1000:.0f}ms | max: {self.wait_max * 1000:.0f}ms"
+            )
+
+
+UPDATE_DISPATCHER = UpdateDispatcher(UPDATE_WORKERS, UPDATE_QUEUE_SIZE)
+register_stats_section("📥 TELEGRAM UPDATES", UPDATE_DISPATCHER.stats)
 
-            bot.send_message(
-                user_id,
-                f"""🎉 <b>PAYMENT SUCCESSFUL</b>
 
-👤 <b>Name:</b> {full_name}
-🆔 <b>User ID:</b> <code>{user_id}</code>
+@app.route("/telegram", methods=["POST"])
+def telegram_webhook():
+    update = telebot.types.Update.de_json(
+        request.stream.read().decode("utf-8")
+    )
+    if not UPDATE_DISPATCHER.submit(update):
+        # Queue ta cika → Telegram zai sake turo update daga baya
+        return "Busy", 503
+    return "OK", 200
 
-🎬 <b>Items:</b> {titles_text}
-🗃 <b>Order ID:</b> <code>{order_id}</code>
 
-💳 <b>Amount Paid:</b> ₦{paid_amount}
+import time
+from telebot.apihelper import ApiTelegramException
+from psycopg2.extras import execute_values
+
+# ================= CATALOG INDEX =================
+# items / series / hausa_series a memory. Catalog yana canzawa ne kawai
+# idan admin ya yi upload, don haka hot paths (cart, checkout, groupitem,
+# deliver, pay all) suna karantawa daga nan maimakon DB.
+# Trigger → NOTIFY 'catalog' "table:id" → layin ya zama dirty → ana sake
+# karanta dirty rows a query daya a read na gaba.
+import re
+from collections import namedtuple
+from catalog_search import SearchIndex
 
-⬇️ Click the button below to download your files.
-""",
-                parse_mode="HTML",
-                reply_markup=kb
-            )
+CATALOG_CHANNEL = "catalog"
 
-            if PAYMENT_NOTIFY_GROUP:
-                from datetime import datetime, timedelta
-                now = (datetime.now() + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
+CatalogItem = namedtuple("CatalogItem", [
+    "id", "title", "price", "file_id", "file_name", "group_key",
+    "cashback_amount", "media_kind", "channel_msg_id", "channel_username",
+])
 
-                bot.send_message(
-                    PAYMENT_NOTIFY_GROUP,
-                    f"""✅ <b>NEW PAYMENT RECEIVED</b>
+CatalogSeries = namedtuple("CatalogSeries", [
+    "id", "title", "price", "file_id", "file_name", "poster_file_id",
+    "channel_msg_id", "channel_username",
+])
 
-👤 <b>Name:</b> {full_name}
-🔗 <b>Username:</b> {tg_username}
-🆔 <b>User ID:</b> <code>{user_id}</code>
+_CATALOG_TABLES = {
+    "items": CatalogItem,
+    "series": CatalogSeries,
+    "hausa_series": CatalogSeries,
+}
 
-🎬 <b>Items:</b> {titles_text}
-🗃 <b>Order ID:</b> <code>{order_id}</code>
 
-💰 <b>Amount:</b> ₦{paid_amount}
-⏰ <b>Time:</b> {now}
-""",
-                    parse_mode="HTML"
-                )
+def catalog_title_key(title):
+    return " ".join(re.sub(r"[^\w\s]", " ", (title or "").lower()).split())
 
-            return "OK", 200
 
-        # =====================================================
-        # ================== VIP ORDER ========================
-        # =====================================================
-        elif order_type == "vip":
-            from datetime import datetime, timedelta
+def ensure_catalog_triggers():
+    try:
+        with db_session() as db:
+            db.execute("""
+                CREATE OR REPLACE FUNCTION notify_catalog_change() RETURNS trigger AS $$
+                BEGIN
+                    IF TG_LEVEL = 'STATEMENT' THEN
+                        PERFORM pg_notify('catalog', TG_TABLE_NAME || ':*');
+                    ELSIF TG_OP = 'DELETE' THEN
+                        PERFORM pg_notify('catalog', TG_TABLE_NAME || ':' || OLD.id);
+                    ELSE
+                        PERFORM pg_notify('catalog', TG_TABLE_NAME || ':' || NEW.id);
+                    END IF;
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            """)
+            for table in _CATALOG_TABLES:
+                db.execute(f"DROP TRIGGER IF EXISTS trg_{table}_catalog ON {table}")
+                db.execute(f"""
+                    CREATE TRIGGER trg_{table}_catalog
+                    AFTER INSERT OR UPDATE OR DELETE ON {table}
+                    FOR EACH ROW EXECUTE PROCEDURE notify_catalog_change()
+                """)
+                db.execute(f"DROP TRIGGER IF EXISTS trg_{table}_catalog_truncate ON {table}")
+                db.execute(f"""
+                    CREATE TRIGGER trg_{table}_catalog_truncate
+                    AFTER TRUNCATE ON {table}
+                    FOR EACH STATEMENT EXECUTE PROCEDURE notify_catalog_change()
+                """)
+    except Exception as e:
+        print("❌ catalog triggers error:", e)
+
+
+class CatalogIndex:
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.sync_lock = threading.Lock()                # sync daya a lokaci guda (DB a waje da self.lock)
+        self.rows = {t: {} for t in _CATALOG_TABLES}     # table -> {id: row}
+        self.by_group = {}                               # group_key -> {item ids}
+        self.by_title = {}                               # title key -> {item ids}
+        self.search_index = SearchIndex()                # fuzzy title/file name search
+        self.dirty = {t: set() for t in _CATALOG_TABLES}
+        self.dirty_all = set()
+        self.loaded = False
+        self.loads = 0
+        self.row_reloads = 0
+        self.hits = 0
+        self.fallbacks = 0
+
+    def start(self):
+        PG_NOTIFY.subscribe(CATALOG_CHANNEL, self._on_notify, self._on_reset)
+
+    def ready(self):
+        return self.loaded and PG_NOTIFY.listening(CATALOG_CHANNEL)
+
+    # ---------- loading ----------
+    def _fetch(self, table, where="TRUE", params=None):
+        cls = _CATALOG_TABLES[table]
+        with db_session() as db:
+            rows = db.execute(
+                f"SELECT {', '.join(cls._fields)} FROM {table} WHERE {where}",
+                params
+            ).fetchall()
+        return [cls(*r) for r in rows]
+
+    def _index(self, item):
+        if item.group_key:
+            self.by_group.setdefault(item.group_key, set()).add(item.id)
+        self.by_title.setdefault(catalog_title_key(item.title), set()).add(item.id)
+
+    def _unindex(self, item):
+        for index, key in ((self.by_group, item.group_key), (self.by_title, catalog_title_key(item.title))):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(item.id)
+                if not ids:
+                    del index[key]
+
+    def _sync_search(self, ids):
+        # A waje da self.lock (search na iya jira). Row na yanzu ake karantawa
+        # a karkashin search lock → syncs biyu ba za su bar tsohon title ba.
+        search = self.search_index
+        with search.lock:
+            rows = self.rows["items"]
+            for row_id in ids:
+                item = rows.get(row_id)
+                if item is None:
+                    search.remove(row_id)
+                else:
+                    search.add(item.id, item.title, item.file_name)
 
-            start_date = datetime.now()
-            end_date = start_date + (
-                timedelta(minutes=VIP_DURATION_VALUE)
-                if VIP_DURATION_UNIT == "minutes"
-                else timedelta(days=VIP_DURATION_VALUE)
-            )
+    def _load_table(self, table):
+        # A share dirty kafin fetch: notify da ya zo lokacin fetch zai sake sync
+        with self.lock:
+            self.dirty[table].clear()
+            self.dirty_all.discard(table)
+        try:
+            rows = {r.id: r for r in self._fetch(table)}
+        except Exception:
+            with self.lock:
+                self.dirty_all.add(table)
+            raise
+        search = None
+        if table == "items":
+            # Search index ana gina shi a waje da lock (reads ba sa jira)
+            search = SearchIndex()
+            for item in rows.values():
+                search.add(item.id, item.title, item.file_name)
+        with self.lock:
+            self.rows[table] = rows
+            if table == "items":
+                self.by_group = {}
+                self.by_title = {}
+                self.search_index = search
+                for item in rows.values():
+                    self._index(item)
+
+    def reload(self):
+        with self.sync_lock:
+            for table in _CATALOG_TABLES:
+                self._load_table(table)
+        self.loaded = True
+        self.loads += 1
+        print(f"📚 CATALOG LOADED: {len(self.rows['items'])} items")
+
+    def _on_reset(self):
+        # Sabon LISTEN → ba mu san abin da ya canza ba a tsakani
+        self.loaded = False
+        try:
+            self.reload()
+        except Exception as e:
+            print("CATALOG LOAD ERROR:", e)
 
-            start_local = start_date + timedelta(hours=1)
-            end_local = end_date + timedelta(hours=1)
+    def _on_notify(self, payload):
+        table, _, key = payload.partition(":")
+        if table not in self.dirty:
+            return
+        with self.lock:
+            if key == "*":
+                self.dirty_all.add(table)
+            else:
+                self.dirty[table].add(int(key))
 
-            already_in_group = False
-            try:
-                member = bot.get_chat_member(VIP_GROUP_ID, user_id)
-                if member.status in ["member", "administrator", "creator"]:
-                    already_in_group = True
-            except:
-                already_in_group = False
+    def _sync(self):
+        # Sync guda a lokaci guda; idan wani yana yi, reader ya karanta abin
+        # da ke memory maimakon jira (notify na gaba zai shigo a sync na gaba)
+        if not self.sync_lock.acquire(blocking=False):
+            return
+        try:
+            self._sync_locked()
+        finally:
+            self.sync_lock.release()
 
-            if already_in_group:
-                cur.execute(
-                    """
-                    INSERT INTO vip_members
-                    (user_id, order_id, join_date, expire_at, status, warn1_sent, warn2_sent, payment_date)
-                    VALUES (%s,%s,%s,%s,'active',FALSE,FALSE,NOW())
-                    ON CONFLICT (user_id)
-                    DO UPDATE SET
-                        order_id = EXCLUDED.order_id,
-                        join_date = EXCLUDED.join_date,
-                        expire_at = EXCLUDED.expire_at,
-                        status = 'active',
-                        warn1_sent = FALSE,
-                        warn2_sent = FALSE,
-                        payment_date = NOW()
-                    """,
-                    (user_id, order_id, start_date, end_date)
-                )
+    def _sync_locked(self):
+        # 1) kwafi dirty sets a karkashin lock
+        with self.lock:
+            if not self.dirty_all and not any(self.dirty.values()):
+                return
+            full = list(self.dirty_all)
+            partial = {}
+            for table, ids in self.dirty.items():
+                if ids and table not in self.dirty_all:
+                    partial[table] = list(ids)
+                    ids.clear()
+
+        # 2) DB + gina index a waje da lock (readers ba sa jira)
+        try:
+            for table in full:
+                self._load_table(table)
+            fetched = {
+                table: {r.id: r for r in self._fetch(table, "id = ANY(%s)", (ids,))}
+                for table, ids in partial.items()
+            }
+        except Exception:
+            with self.lock:
+                for table, ids in partial.items():
+                    self.dirty[table].update(ids)
+            raise
+
+        # 3) swap a karkashin lock
+        touched = []
+        with self.lock:
+            for table, ids in partial.items():
+                fresh = fetched[table]
+                rows = self.rows[table]
+                for row_id in ids:
+                    old = rows.pop(row_id, None)
+                    if table == "items" and old is not None:
+                        self._unindex(old)
+                    new = fresh.get(row_id)
+                    if new is not None:
+                        rows[row_id] = new
+                        if table == "items":
+                            self._index(new)
+                if table == "items":
+                    touched.extend(ids)
+                self.row_reloads += len(ids)
+        if touched:
+            self._sync_search(touched)
+
+    def _view(self):
+        """True idan za a karanta daga memory; in ba haka ba sai DB kai tsaye."""
+        if not self.ready():
+            self.fallbacks += 1
+            return False
+        self._sync()
+        self.hits += 1
+        return True
+
+    # ---------- reads ----------
+    def get(self, table, row_id):
+        if self._view():
+            with self.lock:
+                return self.rows[table].get(row_id)
+        rows = self._fetch(table, "id = %s", (row_id,))
+        return rows[0] if rows else None
+
+    def item(self, item_id):
+        return self.get("items", item_id)
+
+    def items(self, ids):
+        """Items a jerin ids (tsarin ids, har da maimaici); wadanda babu ana tsallake su."""
+        ids = [int(i) for i in ids if i is not None]
+        if not ids:
+            return []
+        if self._view():
+            # _sync yana canza dict din a wurinsa → karanta a karkashin lock
+            with self.lock:
+                rows = self.rows["items"]
+                return [rows[i] for i in ids if i in rows]
+        rows = {r.id: r for r in self._fetch("items", "id = ANY(%s)", (list(set(ids)),))}
+        return [rows[i] for i in ids if i in rows]
+
+    def group(self, group_key):
+        if self._view():
+            with self.lock:
+                rows = self.rows["items"]
+                return sorted((rows[i] for i in self.by_group.get(group_key, ())), key=lambda r: r.id)
+        return sorted(self._fetch("items", "group_key = %s", (group_key,)), key=lambda r: r.id)
+
+    def titled(self, title):
+        key = catalog_title_key(title)
+        if self._view():
+            with self.lock:
+                rows = self.rows["items"]
+                return sorted((rows[i] for i in self.by_title.get(key, ())), key=lambda r: r.id)
+        return [r for r in self._fetch("items") if catalog_title_key(r.title) == key]
+
+    def all_items(self):
+        if self._view():
+            with self.lock:
+                return list(self.rows["items"].values())
+        return self._fetch("items")
+
+    def search(self, query, limit=10, allowed=None):
+        """
+        Fuzzy search na items ta title / file name (typo da prefix),
+        mafi dacewa tukuna. allowed = ids da aka yarda (misali fina-finan user).
+        """
+        query = (query or "").strip()
+        if not query:
+            return []
+        if allowed is not None:
+            allowed = {int(i) for i in allowed}
+            if not allowed:
+                return []
+        if self._view():
+            # SearchIndex yana da nasa lock → kada a rike self.lock lokacin search
+            hits = self.search_index.search(query, limit=limit, allowed=allowed)
+            with self.lock:
+                rows = self.rows["items"]
+                return [rows[h.id] for h in hits if h.id in rows]
+
+        # DB fallback: LIKE (babu typo tolerance)
+        q = f"%{query.lower()}%"
+        where = "(LOWER(title) LIKE %s OR LOWER(file_name) LIKE %s)"
+        params = [q, q]
+        if allowed is not None:
+            where += " AND id = ANY(%s)"
+            params.append(list(allowed))
+        return self._fetch("items", f"{where} ORDER BY id DESC LIMIT {int(limit)}", tuple(params))
+
+    def stats(self):
+        state = "ready" if self.ready() else "⚠️ DB fallback"
+        return (
+            f"{state} | items: {len(self.rows['items'])} | series: {len(self.rows['series'])} "
+            f"| hausa: {len(self.rows['hausa_series'])}\n"
+            f"hits: {self.hits} | fallbacks: {self.fallbacks} | loads: {self.loads} "
+            f"| row reloads: {self.row_reloads}\n"
+            f"search: {self.search_index.stats()}"
+        )
 
-                conn.commit()
-                cur.close()
-                conn.close()
 
-                bot.send_message(
-                    user_id,
-                    f"""💎 <b>AN SABUNTA VIP NAKA</b>
+ensure_catalog_triggers()
 
-Muna tayaka murnar sabunta biyan VIP ɗinka.
+CATALOG = CatalogIndex()
+CATALOG.start()
+register_stats_section("📚 CATALOG", CATALOG.stats)
 
-Domin more samun duk fim ɗin da ranka yake so,
-ci gaba da ziyartar VIP Group kawai.
 
-📅 <b>Ka biya a yau:</b> {start_local.strftime("%Y-%m-%d")}
-⏳ <b>Sake biya aranar ko kafin:</b> {end_local.strftime("%Y-%m-%d")}
+# ================= MEDIA KIND (PER FILE_ID) =================
+# Kowane file_id ana san nau'insa (video/document/animation) domin
+# delivery ya yi API call ɗaya daidai, ba send_video → send_document ba.
+# Tushe: items.media_kind → cache → decode na file_id (babu API call).
+from pyrogram.file_id import FileId, FileType
 
-Na gode da kasancewa tare da mu 🙏""",
-                    parse_mode="HTML"
-                )
+# file_id baya canza nau'i → babu TTL, LRU kawai
+MEDIA_KIND_CACHE = TTLCache("MEDIA_KIND_CACHE", maxsize=50000)
 
-                if PAYMENT_NOTIFY_GROUP:
-                    now = (datetime.now() + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
+_FILE_TYPE_KINDS = {
+    FileType.VIDEO: "video",
+    FileType.ANIMATION: "animation",
+    FileType.DOCUMENT: "document",
+}
 
-                    bot.send_message(
-                        PAYMENT_NOTIFY_GROUP,
-                        f"""💎 <b>VIP RENEWAL PAYMENT</b>
 
-👤 <b>Name:</b> {full_name}
-🔗 <b>Username:</b> {tg_username}
-🆔 <b>User ID:</b> <code>{user_id}</code>
+def media_kind_of_message(msg):
+    if msg is None:
+        return None
+    if getattr(msg, "animation", None):
+        return "animation"
+    if getattr(msg, "video", None):
+        return "video"
+    if getattr(msg, "document", None):
+        return "document"
+    return None
 
-🗃 <b>Order ID:</b> <code>{order_id}</code>
 
-💰 <b>Amount:</b> ₦{paid_amount}
-⏰ <b>Time:</b> {now}
-""",
-                        parse_mode="HTML"
-                    )
+def decode_media_kind(file_id):
+    try:
+        return _FILE_TYPE_KINDS.get(FileId.decode(file_id).file_type)
+    except Exception:
+        return None
 
-                try:
-                    bot.send_message(
-                        ADMIN_ID,
-                        f"🔔 VIP RENEWAL\n\n👤 {full_name}\n🆔 {user_id}\n💰 ₦{paid_amount}\n\nYa sabunta VIP dinsa."
-                    )
-                except:
-                    pass
 
-            else:
-                cur.execute(
-                    """
-                    INSERT INTO vip_members
-                    (user_id, order_id, join_date, expire_at, status, warn1_sent, warn2_sent, payment_date)
-                    VALUES (%s,%s,NULL,NULL,'active',FALSE,FALSE,NOW())
-                    ON CONFLICT (user_id)
-                    DO UPDATE SET
-                        order_id = EXCLUDED.order_id,
-                        join_date = NULL,
-                        expire_at = NULL,
-                        status = 'active',
-                        warn1_sent = FALSE,
-                        warn2_sent = FALSE,
-                        payment_date = NOW()
-                    """,
-                    (user_id, order_id)
-                )
+def media_kind(file_id, known=None):
+    if known:
+        MEDIA_KIND_CACHE[file_id] = known
+        return known
 
-                conn.commit()
-                cur.close()
-                conn.close()
+    kind = MEDIA_KIND_CACHE.get(file_id)
+    if kind is None:
+        kind = decode_media_kind(file_id)
+        if kind:
+            MEDIA_KIND_CACHE[file_id] = kind
+    return kind
 
-                vip_kb = InlineKeyboardMarkup()
-                vip_kb.add(
-                    InlineKeyboardButton(
-                        "🔐 JOIN VIP GROUP",
-                        callback_data=f"vipnow:{order_id}"
-                    )
-                )
 
-                bot.send_message(
-                    user_id,
-                    f"""💎 <b>VIP SUBSCRIPTION ACTIVATED</b>
+def send_media_by_kind(chat_id, file_id, caption=None, kind=None, **kwargs):
+    kind = media_kind(file_id, kind)
 
-👤 <b>Name:</b> {full_name}
-🆔 <b>User ID:</b> <code>{user_id}</code>
+    sender = {
+        "video": bot.send_video,
+        "document": bot.send_document,
+        "animation": bot.send_animation,
+    }.get(kind)
 
-💳 <b>Amount Paid:</b> ₦{paid_amount}
+    if sender is not None:
+        return sender(chat_id, file_id, caption=caption, **kwargs)
 
-📅 <b>Start Date:</b> {start_local.strftime("%Y-%m-%d")}
-⏳ <b>End Date:</b> {end_local.strftime("%Y-%m-%d")}
+    # Ba a san nau'in ba → tsohon hanya, sannan a koya daga amsar Telegram
+    try:
+        msg = bot.send_video(chat_id, file_id, caption=caption, **kwargs)
+    except:
+        msg = bot.send_document(chat_id, file_id, caption=caption, **kwargs)
 
-🔐 Click the button below to join the VIP Group.
-""",
-                    parse_mode="HTML",
-                    reply_markup=vip_kb
-                )
+    learned = media_kind_of_message(msg)
+    if learned:
+        MEDIA_KIND_CACHE[file_id] = learned
+    return msg
 
-                if PAYMENT_NOTIFY_GROUP:
-                    now = (datetime.now() + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
 
-                    bot.send_message(
-                        PAYMENT_NOTIFY_GROUP,
-                        f"""💎 <b>NEW VIP SUBSCRIPTION</b>
+DELIVERY_CHUNK = 10      # iyakar send_media_group na Telegram
 
-👤 <b>Name:</b> {full_name}
-🔗 <b>Username:</b> {tg_username}
-🆔 <b>User ID:</b> <code>{user_id}</code>
+_ALBUM_CLASSES = {
+    "video": (types.InputMediaVideo,),
+    "document": (types.InputMediaDocument,),
+    None: (types.InputMediaVideo, types.InputMediaDocument),
+}
 
-🗃 <b>Order ID:</b> <code>{order_id}</code>
 
-💰 <b>Amount:</b> ₦{paid_amount}
-⏰ <b>Time:</b> {now}
-""",
-                        parse_mode="HTML"
-                    )
+def send_single_media(chat_id, file_id, caption):
+    try:
+        return send_media_by_kind(chat_id, file_id, caption)
+    except:
+        return None
 
-            return "OK", 200
 
-        return "OK", 200
+def send_media_batch(chat_id, items):
+    """
+    items: [(item_id, file_id, title)] → item_ids da suka isa.
+    Ana haɗa files masu nau'i ɗaya zuwa album na 10-10; animation ko
+    album da ya ƙi ana tura su ɗaya-ɗaya.
+    """
+    delivered = []
+
+    # runs na nau'i ɗaya a jere (album ba ya haɗa video da document)
+    runs = []
+    for item in items:
+        kind = media_kind(item[1])
+        if runs and runs[-1][0] == kind:
+            runs[-1][1].append(item)
+        else:
+            runs.append((kind, [item]))
 
-    except Exception as e:
-        print(f"Webhook Error: {e}")
-        return "Internal Error", 500
+    chunks = []
+    for kind, run in runs:
+        for i in range(0, len(run), DELIVERY_CHUNK):
+            chunks.append((kind, run[i:i + DELIVERY_CHUNK]))
 
+    for kind, chunk in chunks:
 
+        if len(chunk) > 1 and kind in _ALBUM_CLASSES:
+            for media_cls in _ALBUM_CLASSES[kind]:
+                try:
+                    bot.send_media_group(
+                        chat_id,
+                        [media_cls(file_id, caption=f"{title}") for _, file_id, title in chunk]
+                    )
+                    delivered.extend(item_id for item_id, _, _ in chunk)
+                    chunk = None
+                    break
+                except ApiTelegramException as e:
+                    # 400 = nau'in file bai dace da album ba → gwada na gaba
+                    if e.error_code != 400:
+                        break
+                except Exception:
+                    break
+
+        if not chunk:
+            continue
 
-# 
-# ========= TELEGRAM WEBHOOK =========
-@app.route("/telegram", methods=["POST"])
-def telegram_webhook():
-    update = telebot.types.Update.de_json(
-        request.stream.read().decode("utf-8")
-    )
-    bot.process_new_updates([update])
-    return "OK", 200
+        for item_id, file_id, title in chunk:
+            if send_single_media(chat_id, file_id, f"{title}"):
+                delivered.append(item_id)
 
+    return delivered
 
-import time
-from telebot.apihelper import ApiTelegramException
 
 @bot.callback_query_handler(func=lambda c: c.data.startswith("deliver:"))
 def deliver_items(call):
@@ -1868,34 +4825,43 @@ def deliver_items(call):
         bot.answer_callback_query(call.id, "Invalid order information.")
         return
 
-    conn = get_conn()
-    cur = conn.cursor()
+    # ================= CHECK ORDER + PREVENT RESEND + ITEMS =================
+    with db_session() as db:
+        row = db.execute(
+            """
+            SELECT o.paid,
+                   EXISTS (SELECT 1 FROM user_movies WHERE order_id=%s)
+            FROM orders o
+            WHERE o.id=%s AND o.user_id=%s
+            """,
+            (order_id, order_id, user_id)
+        ).fetchone()
 
-    # ================= CHECK ORDER =================
-    cur.execute(
-        "SELECT paid FROM orders WHERE id=%s AND user_id=%s",
-        (order_id, user_id)
-    )
-    row = cur.fetchone()
+        items = []
+        if row and row[0] == 1 and not row[1]:
+            # abin da user bai mallaka ba tukuna, a query ɗaya
+            items = db.execute(
+                """
+                SELECT oi.item_id, oi.file_id,
+                       EXISTS (
+                           SELECT 1 FROM user_movies um
+                           WHERE um.user_id=%s AND um.item_id=oi.item_id
+                       )
+                FROM order_items oi
+                WHERE oi.order_id=%s
+                ORDER BY oi.id
+                """,
+                (user_id, order_id)
+            ).fetchall()
 
     if not row or row[0] != 1:
-        cur.close()
-        conn.close()
         bot.answer_callback_query(
             call.id,
             "Your payment has not been confirmed yet."
         )
         return
 
-    # ================= PREVENT RESEND =================
-    cur.execute(
-        "SELECT 1 FROM user_movies WHERE order_id=%s LIMIT 1",
-        (order_id,)
-    )
-    if cur.fetchone():
-        cur.close()
-        conn.close()
-
+    if row[1]:
         kb = InlineKeyboardMarkup()
         kb.add(
             InlineKeyboardButton(
@@ -1915,97 +4881,32 @@ def deliver_items(call):
     # remove popup message completely
     bot.answer_callback_query(call.id)
 
-    # ================= FETCH ITEMS =================
-    cur.execute(
-        """
-        SELECT oi.item_id, oi.file_id, i.title
-        FROM order_items oi
-        JOIN items i ON i.id = oi.item_id
-        WHERE oi.order_id=%s
-        """,
-        (order_id,)
-    )
-    items = cur.fetchall()
-
     if not items:
-        cur.close()
-        conn.close()
         bot.send_message(user_id, "Order items not found.")
         return
 
-    # ================= SAFE SEND FUNCTION =================
-    def safe_send(chat_id, file_id, title):
-
-        while True:
-            try:
-                try:
-                    return bot.send_video(
-                        chat_id,
-                        file_id,
-                        caption=f"{title}"
-                    )
-                except:
-                    return bot.send_document(
-                        chat_id,
-                        file_id,
-                        caption=f"{title}"
-                    )
-
-            except ApiTelegramException as e:
-
-                if e.error_code == 429:
-                    retry = int(e.result_json["parameters"]["retry_after"])
-
-                    # ONLY visible message to user
-                    bot.send_message(
-                        chat_id,
-                        "Wait...\n"
-                        "Please wait, delivery will continue in a few seconds."
-                    )
-
-                    time.sleep(retry)
-                    continue
-                else:
-                    return None
-
-            except:
-                return None
-
-    # ================= SEND LOOP =================
-    sent = 0
-
-    for item_id, file_id, title in items:
-
-        if not file_id:
-            continue
-
-        cur.execute(
-            "SELECT 1 FROM user_movies WHERE user_id=%s AND item_id=%s",
-            (user_id, item_id)
-        )
-        if cur.fetchone():
-            continue
-
-        msg = safe_send(user_id, file_id, title)
+    catalog = {i.id: i for i in CATALOG.items(r[0] for r in items)}
 
-        if not msg:
+    to_send = []
+    for item_id, file_id, owned in items:
+        item = catalog.get(item_id)
+        if item is None or not file_id or owned:
             continue
+        media_kind(file_id, item.media_kind if item.file_id == file_id else None)
+        to_send.append((item_id, file_id, item.title))
 
-        cur.execute(
-            """
-            INSERT INTO user_movies (user_id, item_id, order_id)
-            VALUES (%s,%s,%s)
-            """,
-            (user_id, item_id, order_id)
-        )
-
-        sent += 1
+    # ================= SEND (ALBUMS OF 10) =================
+    delivered = send_media_batch(user_id, to_send)
 
-        time.sleep(1.0)
+    if delivered:
+        with db_session() as db:
+            execute_values(
+                db.cursor(),
+                "INSERT INTO user_movies (user_id, item_id, order_id) VALUES %s",
+                [(user_id, item_id, order_id) for item_id in delivered]
+            )
 
-    conn.commit()
-    cur.close()
-    conn.close()
+    sent = len(delivered)
 
     if sent == 0:
         bot.send_message(user_id, "Items could not be delivered.")
@@ -2085,23 +4986,14 @@ def series_finalize(m):
 
     poster_file_id = m.photo[-1].file_id
 
-    # ================= DB CONNECT =================
-    try:
-        conn = get_conn()
-        cur = conn.cursor()
-    except Exception as e:
-        bot.send_message(ADMIN_ID, f"❌ **DB Connection Error:**\n<code>{e}</code>", parse_mode="HTML")
-        return
-
     # ================= CREATE SERIES =================
     try:
-        cur.execute(
-            "INSERT INTO series (title, price, poster_file_id) VALUES (%s,%s,%s) RETURNING id",
-            (title, price, poster_file_id)
-        )
-        series_id = cur.fetchone()[0]
+        with db_session() as db:
+            series_id = db.execute(
+                "INSERT INTO series (title, price, poster_file_id) VALUES (%s,%s,%s) RETURNING id",
+                (title, price, poster_file_id)
+            ).fetchone()[0]
     except Exception as e:
-        conn.rollback()
         error_msg = f"❌ **Series DB Insert Error:**\n<code>{e}</code>"
         print(error_msg)
         bot.send_message(ADMIN_ID, error_msg, parse_mode="HTML")
@@ -2123,37 +5015,19 @@ def series_finalize(m):
     )
 
     # ================= SAFE SEND =================
+    # Upload na storage bulk ne: TG_LIMITER yana jiran 429 da kansa
     def safe_send_document(chat_id, file_id, caption):
-        while True:
-            try:
+        try:
+            with telegram_bulk():
                 return bot.send_document(chat_id, file_id, caption=caption)
 
-            except ApiTelegramException as e:
-                if e.error_code == 429:
-                    retry = int(e.result_json["parameters"]["retry_after"])
-
-                    bot.edit_message_text(
-                        f"⏸ Rate limit hit.\nWaiting {retry}s...\n"
-                        f"{len(item_ids)}/{total_files} saved",
-                        ADMIN_ID,
-                        progress_msg.message_id
-                    )
-
-                    time.sleep(retry)
-
-                    bot.edit_message_text(
-                        f"⏳ Loading... ({len(item_ids)}/{total_files})",
-                        ADMIN_ID,
-                        progress_msg.message_id
-                    )
-                    continue
-                else:
-                    bot.send_message(ADMIN_ID, f"❌ **Telegram Send Error (Storage Channel):**\n<code>{e}</code>", parse_mode="HTML")
-                    return None
+        except ApiTelegramException as e:
+            bot.send_message(ADMIN_ID, f"❌ **Telegram Send Error (Storage Channel):**\n<code>{e}</code>", parse_mode="HTML")
+            return None
 
-            except Exception as e:
-                bot.send_message(ADMIN_ID, f"❌ **General Send Error:**\n<code>{e}</code>", parse_mode="HTML")
-                return None
+        except Exception as e:
+            bot.send_message(ADMIN_ID, f"❌ **General Send Error:**\n<code>{e}</code>", parse_mode="HTML")
+            return None
 
     # ================= UPLOAD LOOP =================
     for f in sess["files"]:
@@ -2173,32 +5047,33 @@ def series_finalize(m):
             bot.send_message(ADMIN_ID, f"⚠️ Fayil ɗin **{f.get('file_name')}** ba Document/Video ba ne.", parse_mode="Markdown")
             continue
 
+        # Kowane item session nasa → kuskure daya ba ya goge sauran
         try:
-            cur.execute(
-                """
-                INSERT INTO items
-                (title, price, file_id, file_name, group_key,
-                 created_at, channel_msg_id, channel_username, cashback_amount)
-                VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                RETURNING id
-                """,
-                (
-                    title,
-                    price,
-                    doc.file_id,
-                    f["file_name"],
-                    group_key,
-                    created_at,
-                    msg.message_id,
-                    STORAGE_CHANNEL,
-                    cashback_amount  # Adana cashback na fim ɗin
-                )
-            )
-            new_id = cur.fetchone()[0]
+            with db_session() as db:
+                new_id = db.execute(
+                    """
+                    INSERT INTO items
+                    (title, price, file_id, file_name, group_key,
+                     created_at, channel_msg_id, channel_username, cashback_amount, media_kind)
+                    VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+                    RETURNING id
+                    """,
+                    (
+                        title,
+                        price,
+                        doc.file_id,
+                        f["file_name"],
+                        group_key,
+                        created_at,
+                        msg.message_id,
+                        STORAGE_CHANNEL,
+                        cashback_amount,  # Adana cashback na fim ɗin
+                        media_kind(doc.file_id, media_kind_of_message(msg))
+                    )
+                ).fetchone()[0]
             item_ids.append(new_id)
 
         except Exception as e:
-            conn.rollback() # Rollback don karya garkuwar sauran queries
             error_details = f"❌ **Item DB Save Error:**\n<code>{e}</code>\n\n**Haske:** Tabbatar ka shigar da column ɗin 'cashback_amount' a 'items' table."
             print(error_details)
             bot.send_message(ADMIN_ID, error_details, parse_mode="HTML")
@@ -2214,17 +5089,6 @@ def series_finalize(m):
         except:
             pass
 
-        time.sleep(1.1)
-
-    # ================= COMMIT =================
-    try:
-        conn.commit()
-    except Exception as e:
-        bot.send_message(ADMIN_ID, f"❌ **DB Commit Error:**\n<code>{e}</code>", parse_mode="HTML")
-
-    cur.close()
-    conn.close()
-
     # ================= PUBLIC POST =================
     try:
         display_price = f"{price:,}" if has_comma else str(price)
@@ -2287,6 +5151,7 @@ from pyrogram.errors import FloodWait
 # -------------------------------------------------------------
 
 bot = telebot.TeleBot(BOT_TOKEN)
+install_rate_limiter(bot)
 
 pyro_bot = Client(
     "pyro_converter_session",
@@ -2688,2392 +5553,3294 @@ async def progress_args(
         or "Turawa" in str(text_type)
     )
 
-    is_download = (
-        "Downloading" in str(text_type)
-        or "Saukewa" in str(text_type)
-    )
+    is_download = (
+        "Downloading" in str(text_type)
+        or "Saukewa" in str(text_type)
+    )
+
+    # ---------------------------------------------------------
+    # STORE LAST PROGRESS
+    # ---------------------------------------------------------
+
+    try:
+
+        if is_upload:
+
+            DEBUG_LAST_UPLOAD_PROGRESS["global"] = {
+                "time": now,
+                "current": current,
+                "total": total,
+                "percentage": percentage
+            }
+
+        if is_download:
+
+            DEBUG_LAST_DOWNLOAD_PROGRESS["global"] = {
+                "time": now,
+                "current": current,
+                "total": total,
+                "percentage": percentage
+            }
+
+    except Exception as e:
+
+        print(
+            f"[PROGRESS TRACK ERROR] "
+            f"{type(e).__name__}: {e}"
+        )
+
+    # ---------------------------------------------------------
+    # SEND DEBUG TO ADMIN EVERY ~5% OR 10 SECONDS
+    # ---------------------------------------------------------
+
+    try:
+
+        key = (
+            f"{message.chat.id}:"
+            f"{message.id}:"
+            f"{text_type}"
+        )
+
+        old = DEBUG_PROGRESS.get(key)
+
+        should_debug = False
+
+        if old is None:
+            should_debug = True
+
+        else:
+
+            old_percentage = old.get(
+                "percentage",
+                0
+            )
+
+            old_time = old.get(
+                "time",
+                0
+            )
+
+            if (
+                percentage - old_percentage >= 5
+                or now - old_time >= 10
+                or current == total
+            ):
+                should_debug = True
+
+        if should_debug:
+
+            DEBUG_PROGRESS[key] = {
+                "percentage": percentage,
+                "time": now
+            }
+
+            debug_log(
+                f"📈 PROGRESS UPDATE\n\n"
+                f"Type: {text_type}\n"
+                f"Percentage: {percentage:.2f}%\n"
+                f"Current: {humanbytes(current)}\n"
+                f"Total: {humanbytes(total)}\n"
+                f"Speed: {humanbytes(speed)}/s\n"
+                f"ETA: {eta_str}\n\n"
+                f"{get_system_info()}"
+            )
+
+    except Exception as e:
+
+        print(
+            f"[ADMIN PROGRESS DEBUG ERROR] "
+            f"{type(e).__name__}: {e}"
+        )
+
+    # ---------------------------------------------------------
+    # EDIT USER STATUS
+    # ---------------------------------------------------------
+
+    try:
+
+        await message.edit_text(
+            text=tmp
+        )
+
+    except Exception as e:
+
+        print(
+            f"[STATUS EDIT ERROR] "
+            f"{type(e).__name__}: {e}"
+        )
+
+
+# -------------------------------------------------------------
+# 3. UPLOAD WATCHDOG
+# -------------------------------------------------------------
+
+async def upload_watchdog(
+    chat_id,
+    status_msg_id,
+    upload_start,
+    file_size
+):
+
+    debug_log(
+        "👀 UPLOAD WATCHDOG YA FARA.\n"
+        f"Chat ID: {chat_id}\n"
+        f"Status Message ID: {status_msg_id}\n"
+        f"File Size: {humanbytes(file_size)}"
+    )
+
+    try:
+
+        while True:
+
+            await asyncio.sleep(15)
+
+            now = time.time()
+
+            last = DEBUG_LAST_UPLOAD_PROGRESS.get(
+                "global"
+            )
+
+            if not last:
+
+                debug_log(
+                    "⚠️ WATCHDOG:\n"
+                    "Babu upload progress callback har yanzu.\n"
+                    "Wannan na iya nuna cewa Telegram/Pyrogram "
+                    "bai fara tura bytes ba."
+                )
+
+                continue
+
+            last_time = last["time"]
+
+            silence = now - last_time
+
+            debug_log(
+                "👀 UPLOAD WATCHDOG CHECK\n\n"
+                f"Last Upload: "
+                f"{last['percentage']:.2f}%\n"
+                f"Last Bytes: "
+                f"{humanbytes(last['current'])}\n"
+                f"Silence: {silence:.1f}s\n\n"
+                f"{get_system_info()}"
+            )
+
+            if silence >= 60:
+
+                debug_log(
+                    "🚨🚨🚨 UPLOAD STUCK DETECTED 🚨🚨🚨\n\n"
+                    f"An shafe fiye da dakika 60 "
+                    f"ba tare da sabon upload progress ba.\n\n"
+                    f"Last Percentage: "
+                    f"{last['percentage']:.2f}%\n"
+                    f"Last Bytes: "
+                    f"{humanbytes(last['current'])}\n\n"
+                    f"Wannan na iya nuna:\n"
+                    f"• Render network\n"
+                    f"• Telegram connection\n"
+                    f"• Pyrogram upload\n"
+                    f"• Server resource\n"
+                    f"• Telegram RPC/network timeout"
+                )
+
+    except asyncio.CancelledError:
+
+        debug_log(
+            "🛑 UPLOAD WATCHDOG AN KASHE."
+        )
+
+    except Exception as e:
+
+        debug_log(
+            "💥 WATCHDOG ERROR\n\n"
+            f"{type(e).__name__}: {e}\n\n"
+            f"{traceback.format_exc()}"
+        )
+
+
+# -------------------------------------------------------------
+# 4. TASK WORKER
+# -------------------------------------------------------------
+
+async def run_pyrogram_task(
+    chat_id,
+    target_msg_id,
+    status_msg_id,
+    as_video
+):
+
+    print(
+        "--> [DEBUG] Task din Pyrogram ya FARA aiki!"
+    )
+
+    debug_log(
+        "🚀🚀🚀 PYROGRAM TASK YA FARA 🚀🚀🚀\n\n"
+        f"Chat ID: {chat_id}\n"
+        f"Target Message ID: {target_msg_id}\n"
+        f"Status Message ID: {status_msg_id}\n"
+        f"As Video: {as_video}\n\n"
+        f"Thread: {threading.current_thread().name}\n"
+        f"Pyro Ready: {pyro_ready.is_set()}\n"
+        f"Pyro Connected: {pyro_bot.is_connected}\n\n"
+        f"{get_system_info()}"
+    )
+
+    file_path = ""
+
+    watchdog_task = None
+
+    task_start = time.time()
+
+    try:
+
+        # -----------------------------------------------------
+        # CHECK PYROGRAM
+        # -----------------------------------------------------
+
+        debug_log(
+            "🔍 CHECK 1: Ana duba Pyrogram connection..."
+        )
+
+        if not pyro_ready.is_set():
+
+            debug_log(
+                "⚠️ Pyrogram bai READY ba.\n"
+                "Ana jira har zuwa 30 seconds..."
+            )
 
-    # ---------------------------------------------------------
-    # STORE LAST PROGRESS
-    # ---------------------------------------------------------
+            ready = await asyncio.to_thread(
+                pyro_ready.wait,
+                30
+            )
 
-    try:
+            if not ready:
 
-        if is_upload:
+                raise RuntimeError(
+                    "Pyrogram bai tashi cikin "
+                    "30 seconds ba."
+                )
 
-            DEBUG_LAST_UPLOAD_PROGRESS["global"] = {
-                "time": now,
-                "current": current,
-                "total": total,
-                "percentage": percentage
-            }
+        debug_log(
+            "✅ Pyrogram READY.\n"
+            f"Connected: {pyro_bot.is_connected}\n"
+            f"Ready Event: {pyro_ready.is_set()}"
+        )
 
-        if is_download:
+        if not pyro_bot.is_connected:
 
-            DEBUG_LAST_DOWNLOAD_PROGRESS["global"] = {
-                "time": now,
-                "current": current,
-                "total": total,
-                "percentage": percentage
-            }
+            raise RuntimeError(
+                "Pyrogram Client ba connected bane."
+            )
 
-    except Exception as e:
+        # -----------------------------------------------------
+        # GET STATUS MESSAGE
+        # -----------------------------------------------------
 
-        print(
-            f"[PROGRESS TRACK ERROR] "
-            f"{type(e).__name__}: {e}"
+        debug_log(
+            "🔍 CHECK 2: Ana neman status message..."
         )
 
-    # ---------------------------------------------------------
-    # SEND DEBUG TO ADMIN EVERY ~5% OR 10 SECONDS
-    # ---------------------------------------------------------
-
-    try:
+        status_msg = await pyro_bot.get_messages(
+            chat_id,
+            status_msg_id
+        )
 
-        key = (
-            f"{message.chat.id}:"
-            f"{message.id}:"
-            f"{text_type}"
+        debug_log(
+            "✅ Status message an samo.\n"
+            f"Message ID: {status_msg_id}"
         )
 
-        old = DEBUG_PROGRESS.get(key)
+        # -----------------------------------------------------
+        # GET TARGET MESSAGE
+        # -----------------------------------------------------
 
-        should_debug = False
+        debug_log(
+            "🔍 CHECK 3: Ana neman target file message..."
+        )
 
-        if old is None:
-            should_debug = True
+        msg = await pyro_bot.get_messages(
+            chat_id,
+            target_msg_id
+        )
 
-        else:
+        debug_log(
+            "✅ Target message an samo.\n"
+            f"Target ID: {target_msg_id}\n"
+            f"Message Type: {type(msg).__name__}\n"
+            f"Has Video: {bool(getattr(msg, 'video', None))}\n"
+            f"Has Document: {bool(getattr(msg, 'document', None))}"
+        )
 
-            old_percentage = old.get(
-                "percentage",
-                0
-            )
+        # -----------------------------------------------------
+        # MESSAGE DETAILS
+        # -----------------------------------------------------
 
-            old_time = old.get(
-                "time",
-                0
+        try:
+
+            media = (
+                getattr(msg, "video", None)
+                or getattr(msg, "document", None)
             )
 
-            if (
-                percentage - old_percentage >= 5
-                or now - old_time >= 10
-                or current == total
-            ):
-                should_debug = True
+            if media:
 
-        if should_debug:
+                debug_log(
+                    "📦 TARGET MEDIA DETAILS\n\n"
+                    f"File ID: "
+                    f"{getattr(media, 'file_id', 'N/A')}\n"
+                    f"File Name: "
+                    f"{getattr(media, 'file_name', 'N/A')}\n"
+                    f"File Size: "
+                    f"{humanbytes(getattr(media, 'file_size', 0))}\n"
+                    f"MIME Type: "
+                    f"{getattr(media, 'mime_type', 'N/A')}"
+                )
 
-            DEBUG_PROGRESS[key] = {
-                "percentage": percentage,
-                "time": now
-            }
+        except Exception as e:
 
             debug_log(
-                f"📈 PROGRESS UPDATE\n\n"
-                f"Type: {text_type}\n"
-                f"Percentage: {percentage:.2f}%\n"
-                f"Current: {humanbytes(current)}\n"
-                f"Total: {humanbytes(total)}\n"
-                f"Speed: {humanbytes(speed)}/s\n"
-                f"ETA: {eta_str}\n\n"
-                f"{get_system_info()}"
+                "⚠️ Media details error:\n"
+                f"{type(e).__name__}: {e}"
             )
 
-    except Exception as e:
+        # -----------------------------------------------------
+        # UPDATE STATUS
+        # -----------------------------------------------------
 
-        print(
-            f"[ADMIN PROGRESS DEBUG ERROR] "
-            f"{type(e).__name__}: {e}"
+        await status_msg.edit_text(
+            "🔄 **An karɓi zaɓi! Ana shirin sauke fayil...**"
         )
 
-    # ---------------------------------------------------------
-    # EDIT USER STATUS
-    # ---------------------------------------------------------
+        debug_log(
+            "✅ User status an canza zuwa Downloading."
+        )
 
-    try:
+        start_time = time.time()
 
-        await message.edit_text(
-            text=tmp
+        DEBUG_LAST_DOWNLOAD_PROGRESS["global"] = {
+            "time": start_time,
+            "current": 0,
+            "total": 0,
+            "percentage": 0
+        }
+
+        # -----------------------------------------------------
+        # STEP 1: DOWNLOADING
+        # -----------------------------------------------------
+
+        debug_log(
+            "⬇️⬇️⬇️ STEP 1: DOWNLOAD YA FARA ⬇️⬇️⬇️\n\n"
+            f"Start Time: {time.strftime('%H:%M:%S')}\n"
+            f"Target Message: {target_msg_id}\n\n"
+            f"{get_system_info()}"
         )
 
-    except Exception as e:
+        download_start = time.time()
 
-        print(
-            f"[STATUS EDIT ERROR] "
-            f"{type(e).__name__}: {e}"
+        file_path = await pyro_bot.download_media(
+            message=msg,
+            progress=progress_args,
+            progress_args=(
+                "⏬ **Ana Saukewa (Downloading)...**",
+                status_msg,
+                start_time
+            )
         )
 
+        download_time = time.time() - download_start
 
-# -------------------------------------------------------------
-# 3. UPLOAD WATCHDOG
-# -------------------------------------------------------------
+        # -----------------------------------------------------
+        # DOWNLOAD RETURN DEBUG
+        # -----------------------------------------------------
 
-async def upload_watchdog(
-    chat_id,
-    status_msg_id,
-    upload_start,
-    file_size
-):
+        debug_log(
+            "📥 DOWNLOAD FUNCTION YA DAWO!\n\n"
+            f"Return Value:\n"
+            f"{file_path}\n\n"
+            f"Download Duration:\n"
+            f"{download_time:.2f} seconds"
+        )
 
-    debug_log(
-        "👀 UPLOAD WATCHDOG YA FARA.\n"
-        f"Chat ID: {chat_id}\n"
-        f"Status Message ID: {status_msg_id}\n"
-        f"File Size: {humanbytes(file_size)}"
-    )
+        # -----------------------------------------------------
+        # CHECK FILE PATH
+        # -----------------------------------------------------
+
+        if not file_path:
+
+            raise RuntimeError(
+                "download_media() ya dawo da empty file_path."
+            )
+
+        debug_log(
+            "🔍 CHECK 4: Ana duba file path...\n\n"
+            f"Path: {file_path}\n"
+            f"Exists: {os.path.exists(file_path)}\n"
+            f"Is File: {os.path.isfile(file_path)}"
+        )
+
+        if not os.path.exists(file_path):
+
+            raise RuntimeError(
+                "Fayil ya dawo daga download_media "
+                "amma baya cikin filesystem."
+            )
+
+        if not os.path.isfile(file_path):
+
+            raise RuntimeError(
+                "file_path ba regular file bane."
+            )
+
+        # -----------------------------------------------------
+        # FILE SIZE
+        # -----------------------------------------------------
+
+        file_size = os.path.getsize(
+            file_path
+        )
+
+        file_size_readable = humanbytes(
+            file_size
+        )
+
+        debug_log(
+            "📦📦📦 DOWNLOAD YA KAMMALA LAFIYA 📦📦📦\n\n"
+            f"Path:\n"
+            f"{file_path}\n\n"
+            f"File Size:\n"
+            f"{file_size_readable}\n\n"
+            f"Download Time:\n"
+            f"{download_time:.2f}s\n\n"
+            f"{get_system_info()}"
+        )
 
-    try:
+        # -----------------------------------------------------
+        # CHECK FILE CAN BE READ
+        # -----------------------------------------------------
 
-        while True:
+        try:
 
-            await asyncio.sleep(15)
+            with open(
+                file_path,
+                "rb"
+            ) as test_file:
 
-            now = time.time()
+                first_bytes = test_file.read(32)
 
-            last = DEBUG_LAST_UPLOAD_PROGRESS.get(
-                "global"
+            debug_log(
+                "✅ FILE READ TEST YA WUCE.\n\n"
+                f"First 32 bytes:\n"
+                f"{first_bytes}"
             )
 
-            if not last:
+        except Exception as e:
 
-                debug_log(
-                    "⚠️ WATCHDOG:\n"
-                    "Babu upload progress callback har yanzu.\n"
-                    "Wannan na iya nuna cewa Telegram/Pyrogram "
-                    "bai fara tura bytes ba."
-                )
+            raise RuntimeError(
+                "An kasa karanta downloaded file: "
+                f"{type(e).__name__}: {e}"
+            )
 
-                continue
+        # -----------------------------------------------------
+        # STATUS
+        # -----------------------------------------------------
 
-            last_time = last["time"]
+        await status_msg.edit_text(
+            f"✅ **Download Ya Kammala!**\n"
+            f"📂 **Girman Fayil:** `{file_size_readable}`\n\n"
+            f"⏳ **Ana shirin tura shi zuwa Telegram...**"
+        )
 
-            silence = now - last_time
+        debug_log(
+            "🟢 DOWNLOAD STAGE YA KARE.\n"
+            "Yanzu ana shiga UPLOAD stage."
+        )
 
-            debug_log(
-                "👀 UPLOAD WATCHDOG CHECK\n\n"
-                f"Last Upload: "
-                f"{last['percentage']:.2f}%\n"
-                f"Last Bytes: "
-                f"{humanbytes(last['current'])}\n"
-                f"Silence: {silence:.1f}s\n\n"
-                f"{get_system_info()}"
-            )
+        await asyncio.sleep(2)
 
-            if silence >= 60:
+        # -----------------------------------------------------
+        # RESET UPLOAD DEBUG
+        # -----------------------------------------------------
 
-                debug_log(
-                    "🚨🚨🚨 UPLOAD STUCK DETECTED 🚨🚨🚨\n\n"
-                    f"An shafe fiye da dakika 60 "
-                    f"ba tare da sabon upload progress ba.\n\n"
-                    f"Last Percentage: "
-                    f"{last['percentage']:.2f}%\n"
-                    f"Last Bytes: "
-                    f"{humanbytes(last['current'])}\n\n"
-                    f"Wannan na iya nuna:\n"
-                    f"• Render network\n"
-                    f"• Telegram connection\n"
-                    f"• Pyrogram upload\n"
-                    f"• Server resource\n"
-                    f"• Telegram RPC/network timeout"
-                )
+        DEBUG_LAST_UPLOAD_PROGRESS["global"] = {
+            "time": time.time(),
+            "current": 0,
+            "total": file_size,
+            "percentage": 0
+        }
 
-    except asyncio.CancelledError:
+        # -----------------------------------------------------
+        # START WATCHDOG
+        # -----------------------------------------------------
 
-        debug_log(
-            "🛑 UPLOAD WATCHDOG AN KASHE."
+        watchdog_task = asyncio.create_task(
+            upload_watchdog(
+                chat_id,
+                status_msg_id,
+                time.time(),
+                file_size
+            )
         )
 
-    except Exception as e:
+        # -----------------------------------------------------
+        # STEP 2: UPLOADING
+        # -----------------------------------------------------
+
+        upload_start = time.time()
 
         debug_log(
-            "💥 WATCHDOG ERROR\n\n"
-            f"{type(e).__name__}: {e}\n\n"
-            f"{traceback.format_exc()}"
+            "⬆️⬆️⬆️ STEP 2: UPLOAD YA FARA ⬆️⬆️⬆️\n\n"
+            f"File: {file_path}\n"
+            f"Size: {file_size_readable}\n"
+            f"Destination Chat: {chat_id}\n"
+            f"As Video: {as_video}\n"
+            f"Pyrogram Connected: {pyro_bot.is_connected}\n\n"
+            f"{get_system_info()}"
         )
 
+        # -----------------------------------------------------
+        # VIDEO UPLOAD
+        # -----------------------------------------------------
 
-# -------------------------------------------------------------
-# 4. TASK WORKER
-# -------------------------------------------------------------
+        if as_video:
 
-async def run_pyrogram_task(
-    chat_id,
-    target_msg_id,
-    status_msg_id,
-    as_video
-):
+            debug_log(
+                "🎬 SEND_VIDEO() ZA A FARA YANZU.\n\n"
+                "Idan babu progress daga nan, "
+                "matsalar tana kusa da Telegram/Pyrogram "
+                "upload layer."
+            )
 
-    print(
-        "--> [DEBUG] Task din Pyrogram ya FARA aiki!"
-    )
+            result = await pyro_bot.send_video(
+                chat_id=chat_id,
+                video=file_path,
+                caption="🎬 **An kammala sarrafa bidiyon ku lafiya!**",
+                progress=progress_args,
+                progress_args=(
+                    "⬆️ **Ana Turawa (Uploading Video)...**",
+                    status_msg,
+                    upload_start
+                )
+            )
 
-    debug_log(
-        "🚀🚀🚀 PYROGRAM TASK YA FARA 🚀🚀🚀\n\n"
-        f"Chat ID: {chat_id}\n"
-        f"Target Message ID: {target_msg_id}\n"
-        f"Status Message ID: {status_msg_id}\n"
-        f"As Video: {as_video}\n\n"
-        f"Thread: {threading.current_thread().name}\n"
-        f"Pyro Ready: {pyro_ready.is_set()}\n"
-        f"Pyro Connected: {pyro_bot.is_connected}\n\n"
-        f"{get_system_info()}"
-    )
+            debug_log(
+                "🎬 SEND_VIDEO() YA KAMMALA!\n\n"
+                f"Result Type: {type(result).__name__}\n"
+                f"Result ID: {getattr(result, 'id', 'N/A')}"
+            )
 
-    file_path = ""
+        # -----------------------------------------------------
+        # DOCUMENT UPLOAD
+        # -----------------------------------------------------
 
-    watchdog_task = None
+        else:
 
-    task_start = time.time()
+            debug_log(
+                "📁 SEND_DOCUMENT() ZA A FARA YANZU.\n\n"
+                "Idan babu progress daga nan, "
+                "matsalar tana kusa da Telegram/Pyrogram "
+                "upload layer."
+            )
 
-    try:
+            result = await pyro_bot.send_document(
+                chat_id=chat_id,
+                document=file_path,
+                caption="📁 **An kammala sarrafa fayil ɗin ku lafiya!**",
+                progress=progress_args,
+                progress_args=(
+                    "⬆️ **Ana Turawa (Uploading File)...**",
+                    status_msg,
+                    upload_start
+                )
+            )
+
+            debug_log(
+                "📁 SEND_DOCUMENT() YA KAMMALA!\n\n"
+                f"Result Type: {type(result).__name__}\n"
+                f"Result ID: {getattr(result, 'id', 'N/A')}"
+            )
 
         # -----------------------------------------------------
-        # CHECK PYROGRAM
+        # UPLOAD COMPLETE
         # -----------------------------------------------------
 
+        upload_time = time.time() - upload_start
+
         debug_log(
-            "🔍 CHECK 1: Ana duba Pyrogram connection..."
+            "🎉🎉🎉 UPLOAD YA KAMMALA CIF! 🎉🎉🎉\n\n"
+            f"Upload Time:\n"
+            f"{upload_time:.2f} seconds\n\n"
+            f"File Size:\n"
+            f"{file_size_readable}\n\n"
+            f"Average Speed:\n"
+            f"{humanbytes(file_size / upload_time)}/s\n\n"
+            f"{get_system_info()}"
         )
 
-        if not pyro_ready.is_set():
-
-            debug_log(
-                "⚠️ Pyrogram bai READY ba.\n"
-                "Ana jira har zuwa 30 seconds..."
-            )
-
-            ready = await asyncio.to_thread(
-                pyro_ready.wait,
-                30
-            )
+        await status_msg.edit_text(
+            "✅ **An gama aikin sarrafa fayil lafiya!**"
+        )
 
-            if not ready:
+    # ---------------------------------------------------------
+    # FLOOD WAIT
+    # ---------------------------------------------------------
 
-                raise RuntimeError(
-                    "Pyrogram bai tashi cikin "
-                    "30 seconds ba."
-                )
+    except FloodWait as e:
 
         debug_log(
-            "✅ Pyrogram READY.\n"
-            f"Connected: {pyro_bot.is_connected}\n"
-            f"Ready Event: {pyro_ready.is_set()}"
+            "🚨🚨 TELEGRAM FLOOD WAIT 🚨🚨\n\n"
+            f"Seconds: {e.value}\n"
+            f"Exception: {type(e).__name__}\n"
+            f"Message: {e}\n\n"
+            f"TRACEBACK:\n"
+            f"{traceback.format_exc()}"
         )
 
-        if not pyro_bot.is_connected:
+        try:
 
-            raise RuntimeError(
-                "Pyrogram Client ba connected bane."
+            await status_msg.edit_text(
+                f"⚠️ **Telegram Limit!** "
+                f"Jira daƙiƙa `{e.value}`."
+            )
+
+        except Exception as status_error:
+
+            debug_log(
+                "❌ FloodWait status edit ya kasa.\n\n"
+                f"{type(status_error).__name__}: "
+                f"{status_error}"
             )
 
-        # -----------------------------------------------------
-        # GET STATUS MESSAGE
-        # -----------------------------------------------------
+    # ---------------------------------------------------------
+    # GENERAL EXCEPTION
+    # ---------------------------------------------------------
+
+    except Exception as e:
 
         debug_log(
-            "🔍 CHECK 2: Ana neman status message..."
+            "💥💥💥 PYROGRAM TASK YA CRASH 💥💥💥\n\n"
+            f"Exception Type:\n"
+            f"{type(e).__name__}\n\n"
+            f"Exception:\n"
+            f"{e}\n\n"
+            f"File Path:\n"
+            f"{file_path}\n\n"
+            f"Pyrogram Connected:\n"
+            f"{pyro_bot.is_connected}\n\n"
+            f"TRACEBACK:\n"
+            f"{traceback.format_exc()}\n\n"
+            f"SYSTEM:\n"
+            f"{get_system_info()}"
         )
 
-        status_msg = await pyro_bot.get_messages(
-            chat_id,
-            status_msg_id
-        )
+        try:
 
-        debug_log(
-            "✅ Status message an samo.\n"
-            f"Message ID: {status_msg_id}"
-        )
+            if "status_msg" in locals():
 
-        # -----------------------------------------------------
-        # GET TARGET MESSAGE
-        # -----------------------------------------------------
+                await status_msg.edit_text(
+                    f"❌ **Kuskure A Aiki:** "
+                    f"`{type(e).__name__}: {e}`"
+                )
 
-        debug_log(
-            "🔍 CHECK 3: Ana neman target file message..."
-        )
+        except Exception as status_error:
 
-        msg = await pyro_bot.get_messages(
-            chat_id,
-            target_msg_id
-        )
+            debug_log(
+                "❌ An kasa aika error zuwa status message.\n\n"
+                f"{type(status_error).__name__}: "
+                f"{status_error}"
+            )
 
-        debug_log(
-            "✅ Target message an samo.\n"
-            f"Target ID: {target_msg_id}\n"
-            f"Message Type: {type(msg).__name__}\n"
-            f"Has Video: {bool(getattr(msg, 'video', None))}\n"
-            f"Has Document: {bool(getattr(msg, 'document', None))}"
-        )
+    # ---------------------------------------------------------
+    # FINALLY
+    # ---------------------------------------------------------
+
+    finally:
 
         # -----------------------------------------------------
-        # MESSAGE DETAILS
+        # STOP WATCHDOG
         # -----------------------------------------------------
 
         try:
 
-            media = (
-                getattr(msg, "video", None)
-                or getattr(msg, "document", None)
-            )
+            if watchdog_task:
 
-            if media:
+                watchdog_task.cancel()
 
-                debug_log(
-                    "📦 TARGET MEDIA DETAILS\n\n"
-                    f"File ID: "
-                    f"{getattr(media, 'file_id', 'N/A')}\n"
-                    f"File Name: "
-                    f"{getattr(media, 'file_name', 'N/A')}\n"
-                    f"File Size: "
-                    f"{humanbytes(getattr(media, 'file_size', 0))}\n"
-                    f"MIME Type: "
-                    f"{getattr(media, 'mime_type', 'N/A')}"
-                )
+                try:
+                    await watchdog_task
+                except asyncio.CancelledError:
+                    pass
 
         except Exception as e:
 
             debug_log(
-                "⚠️ Media details error:\n"
+                "⚠️ Watchdog cancel error:\n"
                 f"{type(e).__name__}: {e}"
             )
 
         # -----------------------------------------------------
-        # UPDATE STATUS
+        # CLEANUP
         # -----------------------------------------------------
 
-        await status_msg.edit_text(
-            "🔄 **An karɓi zaɓi! Ana shirin sauke fayil...**"
-        )
+        if file_path:
 
-        debug_log(
-            "✅ User status an canza zuwa Downloading."
-        )
+            debug_log(
+                "🧹 CLEANUP YA FARA.\n\n"
+                f"File: {file_path}\n"
+                f"Exists Before Delete: "
+                f"{os.path.exists(file_path)}"
+            )
 
-        start_time = time.time()
+            if os.path.exists(file_path):
 
-        DEBUG_LAST_DOWNLOAD_PROGRESS["global"] = {
-            "time": start_time,
-            "current": 0,
-            "total": 0,
-            "percentage": 0
-        }
+                try:
+
+                    os.remove(file_path)
+
+                    debug_log(
+                        "✅ An goge temporary file lafiya.\n"
+                        f"Exists After Delete: "
+                        f"{os.path.exists(file_path)}"
+                    )
+
+                except Exception as e:
+
+                    debug_log(
+                        "❌ CLEANUP DELETE ERROR\n\n"
+                        f"{type(e).__name__}: {e}\n\n"
+                        f"{traceback.format_exc()}"
+                    )
+
+            else:
+
+                debug_log(
+                    "ℹ️ Cleanup: File baya nan."
+                )
 
         # -----------------------------------------------------
-        # STEP 1: DOWNLOADING
+        # FINAL TASK REPORT
         # -----------------------------------------------------
 
+        total_task_time = (
+            time.time() - task_start
+        )
+
         debug_log(
-            "⬇️⬇️⬇️ STEP 1: DOWNLOAD YA FARA ⬇️⬇️⬇️\n\n"
-            f"Start Time: {time.strftime('%H:%M:%S')}\n"
-            f"Target Message: {target_msg_id}\n\n"
+            "🏁🏁🏁 PYROGRAM TASK YA KARE 🏁🏁🏁\n\n"
+            f"Total Task Time:\n"
+            f"{total_task_time:.2f}s\n\n"
+            f"File Path:\n"
+            f"{file_path}\n\n"
+            f"Pyrogram Connected:\n"
+            f"{pyro_bot.is_connected}\n\n"
             f"{get_system_info()}"
         )
 
-        download_start = time.time()
 
-        file_path = await pyro_bot.download_media(
-            message=msg,
-            progress=progress_args,
-            progress_args=(
-                "⏬ **Ana Saukewa (Downloading)...**",
-                status_msg,
-                start_time
-            )
-        )
+# -------------------------------------------------------------
+# 5. TELEBOT HANDLERS
+# -------------------------------------------------------------
 
-        download_time = time.time() - download_start
+@bot.message_handler(commands=['video'])
+def start_video_process(message):
 
-        # -----------------------------------------------------
-        # DOWNLOAD RETURN DEBUG
-        # -----------------------------------------------------
+    try:
 
         debug_log(
-            "📥 DOWNLOAD FUNCTION YA DAWO!\n\n"
-            f"Return Value:\n"
-            f"{file_path}\n\n"
-            f"Download Duration:\n"
-            f"{download_time:.2f} seconds"
+            "📥📥 /VIDEO COMMAND AN KARƁA 📥📥\n\n"
+            f"User ID: {message.from_user.id}\n"
+            f"Chat ID: {message.chat.id}\n"
+            f"Message ID: {message.message_id}\n"
+            f"Username: @{message.from_user.username}\n"
+            f"First Name: {message.from_user.first_name}\n"
+            f"Pyro Ready: {pyro_ready.is_set()}\n"
+            f"Pyro Connected: {pyro_bot.is_connected}"
         )
 
-        # -----------------------------------------------------
-        # CHECK FILE PATH
-        # -----------------------------------------------------
-
-        if not file_path:
+        USER_STATES[
+            message.from_user.id
+        ] = True
 
-            raise RuntimeError(
-                "download_media() ya dawo da empty file_path."
-            )
+        bot.reply_to(
+            message,
+            "✅ **An kunna tsarin karɓar aiki!**\n\n"
+            "Yanzu aiko min da **Video** ko **File** "
+            "din da kake son sarrafawa.",
+            parse_mode="Markdown"
+        )
 
         debug_log(
-            "🔍 CHECK 4: Ana duba file path...\n\n"
-            f"Path: {file_path}\n"
-            f"Exists: {os.path.exists(file_path)}\n"
-            f"Is File: {os.path.isfile(file_path)}"
+            "✅ /VIDEO RESPONSE AN AIKA."
         )
 
-        if not os.path.exists(file_path):
+    except Exception as e:
 
-            raise RuntimeError(
-                "Fayil ya dawo daga download_media "
-                "amma baya cikin filesystem."
-            )
+        debug_log(
+            "💥 /VIDEO HANDLER ERROR\n\n"
+            f"{type(e).__name__}: {e}\n\n"
+            f"{traceback.format_exc()}"
+        )
 
-        if not os.path.isfile(file_path):
 
-            raise RuntimeError(
-                "file_path ba regular file bane."
-            )
+# -------------------------------------------------------------
+# INCOMING FILE
+# -------------------------------------------------------------
 
-        # -----------------------------------------------------
-        # FILE SIZE
-        # -----------------------------------------------------
+@bot.message_handler(
+    content_types=['video', 'document']
+)
+def handle_incoming_file(message):
 
-        file_size = os.path.getsize(
-            file_path
-        )
+    try:
 
-        file_size_readable = humanbytes(
-            file_size
-        )
+        user_id = message.from_user.id
 
         debug_log(
-            "📦📦📦 DOWNLOAD YA KAMMALA LAFIYA 📦📦📦\n\n"
-            f"Path:\n"
-            f"{file_path}\n\n"
-            f"File Size:\n"
-            f"{file_size_readable}\n\n"
-            f"Download Time:\n"
-            f"{download_time:.2f}s\n\n"
-            f"{get_system_info()}"
+            "📦📦📦 SABON FILE YA SHIGO 📦📦📦\n\n"
+            f"User ID: {user_id}\n"
+            f"Chat ID: {message.chat.id}\n"
+            f"Message ID: {message.message_id}\n"
+            f"Has Video: {bool(message.video)}\n"
+            f"Has Document: {bool(message.document)}"
         )
 
         # -----------------------------------------------------
-        # CHECK FILE CAN BE READ
+        # CHECK USER STATE
         # -----------------------------------------------------
 
-        try:
+        state = USER_STATES.get(
+            user_id,
+            False
+        )
 
-            with open(
-                file_path,
-                "rb"
-            ) as test_file:
+        debug_log(
+            "🔍 USER STATE CHECK\n\n"
+            f"User ID: {user_id}\n"
+            f"State: {state}"
+        )
 
-                first_bytes = test_file.read(32)
+        if not state:
 
             debug_log(
-                "✅ FILE READ TEST YA WUCE.\n\n"
-                f"First 32 bytes:\n"
-                f"{first_bytes}"
+                "ℹ️ An karɓi file amma "
+                "USER_STATES bai kunna ba.\n"
+                "Handler zai RETURN."
             )
 
-        except Exception as e:
+            return
 
-            raise RuntimeError(
-                "An kasa karanta downloaded file: "
-                f"{type(e).__name__}: {e}"
-            )
+        USER_STATES[user_id] = False
+
+        debug_log(
+            "✅ USER STATE AN RESET.\n"
+            "Ana ci gaba da processing."
+        )
 
         # -----------------------------------------------------
-        # STATUS
+        # CREATE BUTTONS
         # -----------------------------------------------------
 
-        await status_msg.edit_text(
-            f"✅ **Download Ya Kammala!**\n"
-            f"📂 **Girman Fayil:** `{file_size_readable}`\n\n"
-            f"⏳ **Ana shirin tura shi zuwa Telegram...**"
+        markup = telebot.types.InlineKeyboardMarkup()
+
+        btn1 = telebot.types.InlineKeyboardButton(
+            "🎬 Video",
+            callback_data="convert_video"
         )
 
-        debug_log(
-            "🟢 DOWNLOAD STAGE YA KARE.\n"
-            "Yanzu ana shiga UPLOAD stage."
+        btn2 = telebot.types.InlineKeyboardButton(
+            "📁 File",
+            callback_data="convert_file"
         )
 
-        await asyncio.sleep(2)
+        markup.add(
+            btn1,
+            btn2
+        )
 
         # -----------------------------------------------------
-        # RESET UPLOAD DEBUG
+        # FILE NAME
         # -----------------------------------------------------
 
-        DEBUG_LAST_UPLOAD_PROGRESS["global"] = {
-            "time": time.time(),
-            "current": 0,
-            "total": file_size,
-            "percentage": 0
-        }
+        file_name = "Video/File"
 
-        # -----------------------------------------------------
-        # START WATCHDOG
-        # -----------------------------------------------------
+        if message.video:
 
-        watchdog_task = asyncio.create_task(
-            upload_watchdog(
-                chat_id,
-                status_msg_id,
-                time.time(),
-                file_size
+            file_name = getattr(
+                message.video,
+                "file_name",
+                "video.mp4"
+            )
+
+        elif message.document:
+
+            file_name = getattr(
+                message.document,
+                "file_name",
+                "file.doc"
             )
+
+        debug_log(
+            "📄 FILE DETAILS\n\n"
+            f"File Name: {file_name}"
         )
 
         # -----------------------------------------------------
-        # STEP 2: UPLOADING
+        # REPLY
         # -----------------------------------------------------
 
-        upload_start = time.time()
+        sent = bot.reply_to(
+            message,
+            f"✅ **An karɓi fayil:** "
+            f"`{file_name}`\n\n"
+            "Shin a wanne tsari kake son dawo da shi?",
+            reply_markup=markup,
+            parse_mode="Markdown"
+        )
 
         debug_log(
-            "⬆️⬆️⬆️ STEP 2: UPLOAD YA FARA ⬆️⬆️⬆️\n\n"
-            f"File: {file_path}\n"
-            f"Size: {file_size_readable}\n"
-            f"Destination Chat: {chat_id}\n"
-            f"As Video: {as_video}\n"
-            f"Pyrogram Connected: {pyro_bot.is_connected}\n\n"
-            f"{get_system_info()}"
+            "✅ CONVERSION BUTTONS AN AIKA.\n\n"
+            f"Status Message ID: {sent.message_id}"
         )
 
         # -----------------------------------------------------
-        # VIDEO UPLOAD
+        # SAVE PENDING DATA
         # -----------------------------------------------------
 
-        if as_video:
+        PENDING_DATA[
+            sent.message_id
+        ] = {
+            "msg_id": message.message_id,
+            "chat_id": message.chat.id
+        }
 
-            debug_log(
-                "🎬 SEND_VIDEO() ZA A FARA YANZU.\n\n"
-                "Idan babu progress daga nan, "
-                "matsalar tana kusa da Telegram/Pyrogram "
-                "upload layer."
-            )
+        debug_log(
+            "💾 PENDING_DATA AN AJIYE.\n\n"
+            f"Key: {sent.message_id}\n"
+            f"Target Message ID: {message.message_id}\n"
+            f"Chat ID: {message.chat.id}\n"
+            f"Current Pending Count: "
+            f"{len(PENDING_DATA)}"
+        )
 
-            result = await pyro_bot.send_video(
-                chat_id=chat_id,
-                video=file_path,
-                caption="🎬 **An kammala sarrafa bidiyon ku lafiya!**",
-                progress=progress_args,
-                progress_args=(
-                    "⬆️ **Ana Turawa (Uploading Video)...**",
-                    status_msg,
-                    upload_start
-                )
-            )
+    except Exception as e:
 
-            debug_log(
-                "🎬 SEND_VIDEO() YA KAMMALA!\n\n"
-                f"Result Type: {type(result).__name__}\n"
-                f"Result ID: {getattr(result, 'id', 'N/A')}"
-            )
+        debug_log(
+            "💥 INCOMING FILE HANDLER ERROR\n\n"
+            f"{type(e).__name__}: {e}\n\n"
+            f"{traceback.format_exc()}"
+        )
 
-        # -----------------------------------------------------
-        # DOCUMENT UPLOAD
-        # -----------------------------------------------------
 
-        else:
+# -------------------------------------------------------------
+# CONVERSION CALLBACK
+# -------------------------------------------------------------
 
-            debug_log(
-                "📁 SEND_DOCUMENT() ZA A FARA YANZU.\n\n"
-                "Idan babu progress daga nan, "
-                "matsalar tana kusa da Telegram/Pyrogram "
-                "upload layer."
-            )
+@bot.callback_query_handler(
+    func=lambda call: call.data.startswith("convert_")
+)
+def process_conversion_callback(call):
 
-            result = await pyro_bot.send_document(
-                chat_id=chat_id,
-                document=file_path,
-                caption="📁 **An kammala sarrafa fayil ɗin ku lafiya!**",
-                progress=progress_args,
-                progress_args=(
-                    "⬆️ **Ana Turawa (Uploading File)...**",
-                    status_msg,
-                    upload_start
-                )
-            )
+    try:
 
-            debug_log(
-                "📁 SEND_DOCUMENT() YA KAMMALA!\n\n"
-                f"Result Type: {type(result).__name__}\n"
-                f"Result ID: {getattr(result, 'id', 'N/A')}"
-            )
+        debug_log(
+            "🔘🔘🔘 CONVERSION BUTTON AN TABA 🔘🔘🔘\n\n"
+            f"User ID: {call.from_user.id}\n"
+            f"Chat ID: {call.message.chat.id}\n"
+            f"Callback ID: {call.id}\n"
+            f"Callback Data: {call.data}\n"
+            f"Message ID: {call.message.message_id}"
+        )
 
         # -----------------------------------------------------
-        # UPLOAD COMPLETE
+        # ANSWER CALLBACK
         # -----------------------------------------------------
 
-        upload_time = time.time() - upload_start
-
-        debug_log(
-            "🎉🎉🎉 UPLOAD YA KAMMALA CIF! 🎉🎉🎉\n\n"
-            f"Upload Time:\n"
-            f"{upload_time:.2f} seconds\n\n"
-            f"File Size:\n"
-            f"{file_size_readable}\n\n"
-            f"Average Speed:\n"
-            f"{humanbytes(file_size / upload_time)}/s\n\n"
-            f"{get_system_info()}"
+        bot.answer_callback_query(
+            call.id
         )
 
-        await status_msg.edit_text(
-            "✅ **An gama aikin sarrafa fayil lafiya!**"
+        debug_log(
+            "✅ callback_query an amsa lafiya."
         )
 
-    # ---------------------------------------------------------
-    # FLOOD WAIT
-    # ---------------------------------------------------------
+        msg_id = call.message.message_id
 
-    except FloodWait as e:
+        # -----------------------------------------------------
+        # PENDING DATA CHECK
+        # -----------------------------------------------------
 
         debug_log(
-            "🚨🚨 TELEGRAM FLOOD WAIT 🚨🚨\n\n"
-            f"Seconds: {e.value}\n"
-            f"Exception: {type(e).__name__}\n"
-            f"Message: {e}\n\n"
-            f"TRACEBACK:\n"
-            f"{traceback.format_exc()}"
+            "🔍 Ana neman callback Message ID "
+            f"{msg_id} cikin PENDING_DATA..."
         )
 
-        try:
+        if msg_id not in PENDING_DATA:
 
-            await status_msg.edit_text(
-                f"⚠️ **Telegram Limit!** "
-                f"Jira daƙiƙa `{e.value}`."
+            debug_log(
+                "❌ PENDING_DATA BA TA SAMU MESSAGE ID BA!\n\n"
+                f"Message ID: {msg_id}\n"
+                f"Available Keys: "
+                f"{list(PENDING_DATA.keys())}"
+            )
+
+            bot.edit_message_text(
+                "❌ **Aikin ya fita daga tsarin lokaci. "
+                "Sake fara sabo da /video.**",
+                call.message.chat.id,
+                msg_id,
+                parse_mode="Markdown"
             )
 
-        except Exception as status_error:
-
-            debug_log(
-                "❌ FloodWait status edit ya kasa.\n\n"
-                f"{type(status_error).__name__}: "
-                f"{status_error}"
-            )
+            return
 
-    # ---------------------------------------------------------
-    # GENERAL EXCEPTION
-    # ---------------------------------------------------------
+        # -----------------------------------------------------
+        # POP DATA
+        # -----------------------------------------------------
 
-    except Exception as e:
+        task_info = PENDING_DATA.pop(
+            msg_id
+        )
 
         debug_log(
-            "💥💥💥 PYROGRAM TASK YA CRASH 💥💥💥\n\n"
-            f"Exception Type:\n"
-            f"{type(e).__name__}\n\n"
-            f"Exception:\n"
-            f"{e}\n\n"
-            f"File Path:\n"
-            f"{file_path}\n\n"
-            f"Pyrogram Connected:\n"
-            f"{pyro_bot.is_connected}\n\n"
-            f"TRACEBACK:\n"
-            f"{traceback.format_exc()}\n\n"
-            f"SYSTEM:\n"
-            f"{get_system_info()}"
+            "✅ PENDING_DATA AN SAMO.\n\n"
+            f"Task Info:\n"
+            f"{task_info}"
         )
 
-        try:
-
-            if "status_msg" in locals():
+        as_video = (
+            call.data == "convert_video"
+        )
 
-                await status_msg.edit_text(
-                    f"❌ **Kuskure A Aiki:** "
-                    f"`{type(e).__name__}: {e}`"
-                )
+        chat_id = task_info[
+            "chat_id"
+        ]
 
-        except Exception as status_error:
+        target_msg_id = task_info[
+            "msg_id"
+        ]
 
-            debug_log(
-                "❌ An kasa aika error zuwa status message.\n\n"
-                f"{type(status_error).__name__}: "
-                f"{status_error}"
-            )
+        debug_log(
+            "🎯 TASK DETAILS\n\n"
+            f"as_video: {as_video}\n"
+            f"chat_id: {chat_id}\n"
+            f"target_msg_id: {target_msg_id}\n"
+            f"status_msg_id: {msg_id}"
+        )
 
-    # ---------------------------------------------------------
-    # FINALLY
-    # ---------------------------------------------------------
+        # -----------------------------------------------------
+        # CHECK PYROGRAM
+        # -----------------------------------------------------
 
-    finally:
+        debug_log(
+            "🔍 CALLBACK CHECK PYROGRAM\n\n"
+            f"Ready: {pyro_ready.is_set()}\n"
+            f"Connected: {pyro_bot.is_connected}\n"
+            f"Loop Running: {pyro_loop.is_running()}\n"
+            f"Loop Closed: {pyro_loop.is_closed()}"
+        )
 
         # -----------------------------------------------------
-        # STOP WATCHDOG
+        # USER STATUS
         # -----------------------------------------------------
 
-        try:
+        bot.edit_message_text(
+            "🔄 **Shirin gudanar da aiki...**, "
+            "Chat ID: " + str(chat_id),
+            chat_id,
+            msg_id
+        )
 
-            if watchdog_task:
+        debug_log(
+            "✅ User status an canza zuwa "
+            "'Shirin gudanar da aiki'."
+        )
 
-                watchdog_task.cancel()
+        # -----------------------------------------------------
+        # SEND TASK TO PYROGRAM LOOP
+        # -----------------------------------------------------
 
-                try:
-                    await watchdog_task
-                except asyncio.CancelledError:
-                    pass
+        debug_log(
+            "🚀 Ana turawa run_pyrogram_task "
+            "cikin Pyrogram asyncio loop..."
+        )
 
-        except Exception as e:
+        future = asyncio.run_coroutine_threadsafe(
+            run_pyrogram_task(
+                chat_id,
+                target_msg_id,
+                msg_id,
+                as_video
+            ),
+            pyro_loop
+        )
 
-            debug_log(
-                "⚠️ Watchdog cancel error:\n"
-                f"{type(e).__name__}: {e}"
-            )
+        debug_log(
+            "✅ asyncio.run_coroutine_threadsafe() "
+            "YA KARƁI TASK.\n\n"
+            f"Future:\n"
+            f"{future}\n"
+            f"Future Done: {future.done()}\n"
+            f"Future Cancelled: {future.cancelled()}"
+        )
 
         # -----------------------------------------------------
-        # CLEANUP
+        # FUTURE ERROR MONITOR
         # -----------------------------------------------------
 
-        if file_path:
+        def future_done_callback(f):
 
-            debug_log(
-                "🧹 CLEANUP YA FARA.\n\n"
-                f"File: {file_path}\n"
-                f"Exists Before Delete: "
-                f"{os.path.exists(file_path)}"
-            )
+            try:
 
-            if os.path.exists(file_path):
+                if f.cancelled():
 
-                try:
+                    debug_log(
+                        "🚨 FUTURE AN CANCELLED!"
+                    )
 
-                    os.remove(file_path)
+                    return
+
+                exception = f.exception()
+
+                if exception:
 
                     debug_log(
-                        "✅ An goge temporary file lafiya.\n"
-                        f"Exists After Delete: "
-                        f"{os.path.exists(file_path)}"
+                        "💥 FUTURE YA KAMMALA DA ERROR!\n\n"
+                        f"Exception Type:\n"
+                        f"{type(exception).__name__}\n\n"
+                        f"Exception:\n"
+                        f"{exception}\n\n"
+                        f"TRACEBACK:\n"
+                        f"{traceback.format_exc()}"
                     )
 
-                except Exception as e:
+                else:
 
                     debug_log(
-                        "❌ CLEANUP DELETE ERROR\n\n"
-                        f"{type(e).__name__}: {e}\n\n"
-                        f"{traceback.format_exc()}"
+                        "✅ FUTURE YA KAMMALA BA TARE DA ERROR BA."
                     )
 
-            else:
+            except Exception as e:
 
                 debug_log(
-                    "ℹ️ Cleanup: File baya nan."
+                    "💥 FUTURE CALLBACK ERROR\n\n"
+                    f"{type(e).__name__}: {e}\n\n"
+                    f"{traceback.format_exc()}"
                 )
 
-        # -----------------------------------------------------
-        # FINAL TASK REPORT
-        # -----------------------------------------------------
+        future.add_done_callback(
+            future_done_callback
+        )
 
-        total_task_time = (
-            time.time() - task_start
+        debug_log(
+            "🟢 FUTURE DONE CALLBACK AN SAITA."
         )
 
+    except Exception as e:
+
         debug_log(
-            "🏁🏁🏁 PYROGRAM TASK YA KARE 🏁🏁🏁\n\n"
-            f"Total Task Time:\n"
-            f"{total_task_time:.2f}s\n\n"
-            f"File Path:\n"
-            f"{file_path}\n\n"
-            f"Pyrogram Connected:\n"
-            f"{pyro_bot.is_connected}\n\n"
-            f"{get_system_info()}"
+            "💥💥💥 CONVERSION CALLBACK CRASH 💥💥💥\n\n"
+            f"Exception Type:\n"
+            f"{type(e).__name__}\n\n"
+            f"Exception:\n"
+            f"{e}\n\n"
+            f"TRACEBACK:\n"
+            f"{traceback.format_exc()}"
         )
 
 
 # -------------------------------------------------------------
-# 5. TELEBOT HANDLERS
+# FINAL START
 # -------------------------------------------------------------
 
-@bot.message_handler(commands=['video'])
-def start_video_process(message):
+if __name__ == "__main__":
+
+    debug_log(
+        "🟢🟢🟢 BOT PROCESS YA FARA 🟢🟢🟢\n\n"
+        f"PID: {os.getpid()}\n"
+        f"Python PID: {os.getpid()}\n"
+        f"Pyrogram Thread: "
+        f"{pyro_thread.name}\n"
+        f"Pyro Ready: "
+        f"{pyro_ready.is_set()}\n\n"
+        f"{get_system_info()}"
+    )
 
     try:
 
         debug_log(
-            "📥📥 /VIDEO COMMAND AN KARƁA 📥📥\n\n"
-            f"User ID: {message.from_user.id}\n"
-            f"Chat ID: {message.chat.id}\n"
-            f"Message ID: {message.message_id}\n"
-            f"Username: @{message.from_user.username}\n"
-            f"First Name: {message.from_user.first_name}\n"
-            f"Pyro Ready: {pyro_ready.is_set()}\n"
-            f"Pyro Connected: {pyro_bot.is_connected}"
+            "📡 Ana fara Telebot infinity_polling()..."
         )
 
-        USER_STATES[
-            message.from_user.id
-        ] = True
-
-        bot.reply_to(
-            message,
-            "✅ **An kunna tsarin karɓar aiki!**\n\n"
-            "Yanzu aiko min da **Video** ko **File** "
-            "din da kake son sarrafawa.",
-            parse_mode="Markdown"
+        bot.infinity_polling(
+            skip_pending=True
         )
 
+    except Exception as e:
+
         debug_log(
-            "✅ /VIDEO RESPONSE AN AIKA."
+            "💥💥💥 BOT MAIN PROCESS YA CRASH 💥💥💥\n\n"
+            f"Exception Type:\n"
+            f"{type(e).__name__}\n\n"
+            f"Exception:\n"
+            f"{e}\n\n"
+            f"TRACEBACK:\n"
+            f"{traceback.format_exc()}"
         )
 
-    except Exception as e:
 
-        debug_log(
-            "💥 /VIDEO HANDLER ERROR\n\n"
-            f"{type(e).__name__}: {e}\n\n"
-            f"{traceback.format_exc()}"
-        )
 
+# ================= TEST COLOR BUTTONS COMMAND =================
+@bot.message_handler(commands=["color"])
+def test_color_buttons(m):
+    # Tabbatar mai amfani Admin ne (Za ka iya sanya ID din ka a nan idan kana bukata)
+    uid = m.from_user.id
+
+    kb = InlineKeyboardMarkup()
+
+    # 1. Button "Test" - Kore (success)
+    btn_test = InlineKeyboardButton(
+        text="🧪 Test", callback_data="test_click", style="success"
+    )
+
+    # 2. Button "Gold" - Ja (danger)
+    btn_gold = InlineKeyboardButton(
+        text="🏆 Gold", callback_data="gold_click", style="danger"
+    )
+
+    # Sanya su a jera a maɓalli guda
+    kb.add(btn_test, btn_gold)
+
+    bot.send_message(uid, "Ga buttons ɗin 👇", reply_markup=kb)
 
-# -------------------------------------------------------------
-# INCOMING FILE
-# -------------------------------------------------------------
 
-@bot.message_handler(
-    content_types=['video', 'document']
+# Callback Query Handler don karɓar latsawar maɓallan
+@bot.callback_query_handler(
+    func=lambda c: c.data in ["test_click", "gold_click"]
 )
-def handle_incoming_file(message):
+def handle_color_test_clicks(call):
+    if call.data == "test_click":
+        bot.answer_callback_query(
+            call.id, "Kayi latsa a maɓallin Test (Green)!"
+        )
+    elif call.data == "gold_click":
+        bot.answer_callback_query(call.id, "Kayi latsa a maɓallin Gold (Red)!")
 
-    try:
+# ========= BUYD (ITEM ONLY | DEEP LINK → DM) =========
+from psycopg2.extras import RealDictCursor
+import uuid
+import time
+import re
 
-        user_id = message.from_user.id
+@bot.message_handler(func=lambda m: m.text and m.text.startswith("/start groupitem_"))
+def groupitem_deeplink_handler(msg):
+    uid = msg.from_user.id
+    user_name = msg.from_user.first_name or "Customer"
 
-        debug_log(
-            "📦📦📦 SABON FILE YA SHIGO 📦📦📦\n\n"
-            f"User ID: {user_id}\n"
-            f"Chat ID: {message.chat.id}\n"
-            f"Message ID: {message.message_id}\n"
-            f"Has Video: {bool(message.video)}\n"
-            f"Has Document: {bool(message.document)}"
-        )
+    # ========= PARSE ITEM IDS + GROUP KEYS =========
+    try:
+        raw = msg.text.split("groupitem_", 1)[1]
+        tokens = [x.strip() for x in re.split(r"[_,\s]+", raw) if x.strip()]
+    except Exception:
+        return
 
-        # -----------------------------------------------------
-        # CHECK USER STATE
-        # -----------------------------------------------------
+    if not tokens:
+        return
 
-        state = USER_STATES.get(
-            user_id,
-            False
-        )
+    # Dukkan DB a session daya; Telegram/gateway bayan an rufe shi
+    owned = None
+    order_id = None
+    try:
+        with db_session() as db:
+            cur = db.cursor(cursor_factory=RealDictCursor)
 
-        debug_log(
-            "🔍 USER STATE CHECK\n\n"
-            f"User ID: {user_id}\n"
-            f"State: {state}"
-        )
+            item_ids = []
+            for token in tokens:
+                # ==== IF ID ====
+                if token.isdigit():
+                    item_ids.append(int(token))
 
-        if not state:
+                # ==== IF GROUP KEY ====
+                else:
+                    cur.execute(
+                        "SELECT id FROM items WHERE group_key=%s",
+                        (token,)
+                    )
+                    rows = cur.fetchall()
+                    item_ids.extend([r["id"] for r in rows])
 
-            debug_log(
-                "ℹ️ An karɓi file amma "
-                "USER_STATES bai kunna ba.\n"
-                "Handler zai RETURN."
+            if not item_ids:
+                return
+
+            # ========= FETCH ITEMS =========
+            placeholders = ",".join(["%s"] * len(item_ids))
+            cur.execute(
+                f"""
+                SELECT id, title, price, file_id, group_key
+                FROM items
+                WHERE id IN ({placeholders})
+                """,
+                tuple(item_ids)
             )
+            items = cur.fetchall()
 
-            return
+            # ========= FILE_ID REQUIRED =========
+            items = [i for i in items if i.get("file_id")]
+            if not items:
+                return
 
-        USER_STATES[user_id] = False
+            item_ids_clean = [i["id"] for i in items]
 
-        debug_log(
-            "✅ USER STATE AN RESET.\n"
-            "Ana ci gaba da processing."
-        )
+            # ========= OWNERSHIP CHECK (Tsararren Tsaro) =========
+            cur.execute(
+                f"""
+                SELECT 1 FROM user_movies
+                WHERE user_id=%s
+                  AND item_id IN ({",".join(["%s"] * len(item_ids_clean))})
+                LIMIT 1
+                """,
+                (uid, *item_ids_clean)
+            )
+            owned = cur.fetchone()
 
-        # -----------------------------------------------------
-        # CREATE BUTTONS
-        # -----------------------------------------------------
+            if not owned:
+                # ========= GROUP_KEY PRICING =========
+                groups = {}
+                for i in items:
+                    key = i["group_key"] or f"single_{i['id']}"
+                    if key not in groups:
+                        groups[key] = int(i["price"] or 0)
 
-        markup = telebot.types.InlineKeyboardMarkup()
+                total = sum(groups.values())
+                item_count = len(items)
 
-        btn1 = telebot.types.InlineKeyboardButton(
-            "🎬 Video",
-            callback_data="convert_video"
-        )
+                if total <= 0:
+                    return
 
-        btn2 = telebot.types.InlineKeyboardButton(
-            "📁 File",
-            callback_data="convert_file"
-        )
+                # ========= REUSE / CREATE ORDER (Maimaita ko Kera Order) =========
+                cur.execute(
+                    f"""
+                    SELECT o.id
+                    FROM orders o
+                    JOIN order_items oi ON oi.order_id = o.id
+                    WHERE o.user_id=%s
+                      AND o.paid=0
+                      AND oi.item_id IN ({",".join(["%s"] * len(item_ids_clean))})
+                    GROUP BY o.id
+                    HAVING COUNT(DISTINCT oi.item_id)=%s
+                    LIMIT 1
+                    """,
+                    (uid, *item_ids_clean, len(item_ids_clean))
+                )
+                row = cur.fetchone()
 
-        markup.add(
-            btn1,
-            btn2
+                if row:
+                    order_id = row["id"]
+                else:
+                    order_id = str(uuid.uuid4())
+                    cur.execute(
+                        "INSERT INTO orders (id, user_id, amount, paid, type) VALUES (%s,%s,%s,0,'film')",
+                        (order_id, uid, total)
+                    )
+                    for i in items:
+                        cur.execute(
+                            """
+                            INSERT INTO order_items (order_id, item_id, file_id, price)
+                            VALUES (%s,%s,%s,%s)
+                            """,
+                            (order_id, i["id"], i["file_id"], int(i["price"] or 0))
+                        )
+    except Exception:
+        return
+
+    if owned:
+        kb = InlineKeyboardMarkup()
+        kb.add(InlineKeyboardButton("📽 PAID MOVIES", callback_data="my_movies"))
+        bot.send_message(
+            uid,
+            "✅ You have already purchased this movie.\n\n"
+            "Please check your *Paid Movies* to download it again.",
+            parse_mode="Markdown",
+            reply_markup=kb
         )
+        return
 
-        # -----------------------------------------------------
-        # FILE NAME
-        # -----------------------------------------------------
+    # ========= FLUTTERWAVE GATEWAY =========
+    display_title = f"{item_count} film(s)"
+    pay_url = create_flutterwave_payment(uid, order_id, total, display_title)
 
-        file_name = "Video/File"
+    if not pay_url:
+        bot.send_message(uid, "❌ Sorry, payment gateway is down. Try again later.")
+        return
 
-        if message.video:
+    # ========= FIXED TITLE DISPLAY =========
+    unique_titles = [
+        i["title"]
+        for _, i in {
+            (i["group_key"] or f"single_{i['id']}"): i
+            for i in items
+        }.items()
+    ]
 
-            file_name = getattr(
-                message.video,
-                "file_name",
-                "video.mp4"
-            )
+    # ========= GET FULL TELEGRAM NAME =========
+    t_first = msg.from_user.first_name or ""
+    t_last = msg.from_user.last_name or ""
+    full_telegram_name = f"{t_first} {t_last}".strip() or "Customer"
 
-        elif message.document:
+    # ========= FINAL UI (SABON FORMAT DA KA ZABA) =========
+    kb = InlineKeyboardMarkup()
 
-            file_name = getattr(
-                message.document,
-                "file_name",
-                "file.doc"
-            )
+    # (PAY NOW) 💳 (TOP ROW)
+    kb.add(
+        InlineKeyboardButton("(PAY NOW) 💳", url=pay_url)
+    )
 
-        debug_log(
-            "📄 FILE DETAILS\n\n"
-            f"File Name: {file_name}"
-        )
+    # SECOND ROW
+    kb.row(
+        InlineKeyboardButton("💰 Pay with Wallet", callback_data=f"walletpay:{order_id}"),
+        InlineKeyboardButton("❌ Cancel order", callback_data=f"cancel:{order_id}")
+    )
 
-        # -----------------------------------------------------
-        # REPLY
-        # -----------------------------------------------------
+    sent = bot.send_message(
+        uid,
+        f"""💳⚡FLUTTERWAVE SIMPLE PAYMENT
+━━━━━━━━━━━━━━━━━━
+Barka {full_telegram_name}
+You want buy this movie
+🎬{", ".join(unique_titles)}
 
-        sent = bot.reply_to(
-            message,
-            f"✅ **An karɓi fayil:** "
-            f"`{file_name}`\n\n"
-            "Shin a wanne tsari kake son dawo da shi?",
-            reply_markup=markup,
-            parse_mode="Markdown"
-        )
+📦 FILMS: {item_count}
+💵PRICE: ₦{total}
+━━━━━━━━━━━━━━━━━━
+ Danna Pay now da ke ƙasa don biya nan take.
+Click pay now👇""",
+        reply_markup=kb
+    )
 
-        debug_log(
-            "✅ CONVERSION BUTTONS AN AIKA.\n\n"
-            f"Status Message ID: {sent.message_id}"
-        )
+    # ===== STORE MESSAGE FOR AUTO DELETE AFTER PAYMENT =====
+    ORDER_MESSAGES[order_id] = (sent.chat.id, sent.message_id)
 
-        # -----------------------------------------------------
-        # SAVE PENDING DATA
-        # -----------------------------------------------------
 
-        PENDING_DATA[
-            sent.message_id
-        ] = {
-            "msg_id": message.message_id,
-            "chat_id": message.chat.id
-        }
+# ================= ADMIN REMOVE MONEY FROM WALLET =================
+@bot.message_handler(commands=["rage"])
+def admin_remove_money(msg):
 
-        debug_log(
-            "💾 PENDING_DATA AN AJIYE.\n\n"
-            f"Key: {sent.message_id}\n"
-            f"Target Message ID: {message.message_id}\n"
-            f"Chat ID: {message.chat.id}\n"
-            f"Current Pending Count: "
-            f"{len(PENDING_DATA)}"
-        )
+    user_id = msg.from_user.id
 
-    except Exception as e:
+    # ===== ADMIN CHECK =====
+    if user_id != ADMIN_ID:
+        bot.reply_to(msg, "❌ You are not authorized to use this command.")
+        return
 
-        debug_log(
-            "💥 INCOMING FILE HANDLER ERROR\n\n"
-            f"{type(e).__name__}: {e}\n\n"
-            f"{traceback.format_exc()}"
-        )
+    try:
+        parts = msg.text.split()
 
+        if len(parts) < 2:
+            bot.reply_to(msg, "Usage: /rage 500")
+            return
 
-# -------------------------------------------------------------
-# CONVERSION CALLBACK
-# -------------------------------------------------------------
+        amount = int(parts[1])
 
-@bot.callback_query_handler(
-    func=lambda call: call.data.startswith("convert_")
-)
-def process_conversion_callback(call):
+        if amount <= 0:
+            bot.reply_to(msg, "❌ Invalid amount.")
+            return
+
+    except:
+        bot.reply_to(msg, "❌ Invalid format.\nUse: /rage 500")
+        return
 
+    # ===== DB =====
     try:
+        with db_session(wallet=True) as db:
+            wallet_cur = db.cursor()
 
-        debug_log(
-            "🔘🔘🔘 CONVERSION BUTTON AN TABA 🔘🔘🔘\n\n"
-            f"User ID: {call.from_user.id}\n"
-            f"Chat ID: {call.message.chat.id}\n"
-            f"Callback ID: {call.id}\n"
-            f"Callback Data: {call.data}\n"
-            f"Message ID: {call.message.message_id}"
-        )
+            # ===== CHECK CURRENT BALANCE =====
+            wallet_cur.execute(
+                "SELECT balance FROM wallet_balance WHERE user_id=%s",
+                (user_id,)
+            )
+            row = wallet_cur.fetchone()
 
-        # -----------------------------------------------------
-        # ANSWER CALLBACK
-        # -----------------------------------------------------
+            current_balance = int(row[0]) if row else 0
 
-        bot.answer_callback_query(
-            call.id
-        )
+            if current_balance >= amount:
+                # ===== DEDUCT BALANCE =====
+                wallet_cur.execute(
+                    """
+                    UPDATE wallet_balance
+                    SET balance = balance - %s,
+                        updated_at = NOW()
+                    WHERE user_id=%s
+                    """,
+                    (amount, user_id)
+                )
 
-        debug_log(
-            "✅ callback_query an amsa lafiya."
-        )
+                # ===== SAVE TRANSACTION =====
+                ref = f"debit_{user_id}_{int(time.time())}"
 
-        msg_id = call.message.message_id
+                wallet_cur.execute(
+                    """
+                    INSERT INTO wallet_transactions
+                    (user_id, amount, type, reference, description)
+                    VALUES (%s,%s,'debit',%s,'Admin Wallet Debit')
+                    """,
+                    (user_id, amount, ref)
+                )
 
-        # -----------------------------------------------------
-        # PENDING DATA CHECK
-        # -----------------------------------------------------
+    except:
+        bot.reply_to(msg, "❌ Failed to remove money.")
+        return
 
-        debug_log(
-            "🔍 Ana neman callback Message ID "
-            f"{msg_id} cikin PENDING_DATA..."
+    if current_balance < amount:
+        bot.reply_to(
+            msg,
+            f"❌ Insufficient balance.\n\nYour Balance: ₦{current_balance}"
         )
+        return
 
-        if msg_id not in PENDING_DATA:
-
-            debug_log(
-                "❌ PENDING_DATA BA TA SAMU MESSAGE ID BA!\n\n"
-                f"Message ID: {msg_id}\n"
-                f"Available Keys: "
-                f"{list(PENDING_DATA.keys())}"
-            )
-
-            bot.edit_message_text(
-                "❌ **Aikin ya fita daga tsarin lokaci. "
-                "Sake fara sabo da /video.**",
-                call.message.chat.id,
-                msg_id,
-                parse_mode="Markdown"
-            )
+    # ===== SUCCESS MESSAGE =====
+    bot.reply_to(
+        msg,
+        f"""💸 <b>WALLET DEBIT SUCCESSFUL</b>
 
-            return
+➖ Amount Removed: ₦{amount}
+🆔 Wallet ID: <code>{user_id}</code>
 
-        # -----------------------------------------------------
-        # POP DATA
-        # -----------------------------------------------------
+Your wallet has been reduced successfully.""",
+        parse_mode="HTML"
+    )
 
-        task_info = PENDING_DATA.pop(
-            msg_id
-        )
 
-        debug_log(
-            "✅ PENDING_DATA AN SAMO.\n\n"
-            f"Task Info:\n"
-            f"{task_info}"
-        )
 
-        as_video = (
-            call.data == "convert_video"
-        )
+# ================= CUSTOMER PAGINATION SYSTEM =================
+# Leaderboard na kowane admin — yana kare minti 30 bayan /customers
+CUSTOMER_CACHE = TTLCache("CUSTOMER_CACHE", maxsize=20, ttl=1800)
 
-        chat_id = task_info[
-            "chat_id"
-        ]
+CUSTOMER_TOTALS_REFRESH_SECONDS = int(os.environ.get("CUSTOMER_TOTALS_REFRESH_SECONDS", 900))
+CUSTOMER_NAME_CONCURRENCY = int(os.environ.get("CUSTOMER_NAME_CONCURRENCY", 8))
 
-        target_msg_id = task_info[
-            "msg_id"
-        ]
 
-        debug_log(
-            "🎯 TASK DETAILS\n\n"
-            f"as_video: {as_video}\n"
-            f"chat_id: {chat_id}\n"
-            f"target_msg_id: {target_msg_id}\n"
-            f"status_msg_id: {msg_id}"
-        )
+def ensure_customer_totals_view():
+    # Leaderboard aggregate — ana refresh lokaci-lokaci, ba kowane /customers ba
+    try:
+        with db_session() as db:
+            db.execute("""
+                CREATE MATERIALIZED VIEW IF NOT EXISTS customer_totals AS
+                SELECT
+                    o.user_id,
+                    SUM(o.amount) AS total_paid,
+                    COUNT(o.id) AS total_orders
+                FROM orders o
+                WHERE o.paid = 1
+                GROUP BY o.user_id
+            """)
+            # UNIQUE index wajibi ne don REFRESH ... CONCURRENTLY
+            db.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_customer_totals_user
+                ON customer_totals (user_id)
+            """)
+            db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_customer_totals_paid
+                ON customer_totals (total_paid DESC)
+            """)
+    except Exception as e:
+        print("❌ customer_totals view error:", e)
 
-        # -----------------------------------------------------
-        # CHECK PYROGRAM
-        # -----------------------------------------------------
 
-        debug_log(
-            "🔍 CALLBACK CHECK PYROGRAM\n\n"
-            f"Ready: {pyro_ready.is_set()}\n"
-            f"Connected: {pyro_bot.is_connected}\n"
-            f"Loop Running: {pyro_loop.is_running()}\n"
-            f"Loop Closed: {pyro_loop.is_closed()}"
-        )
+ensure_customer_totals_view()
 
-        # -----------------------------------------------------
-        # USER STATUS
-        # -----------------------------------------------------
 
-        bot.edit_message_text(
-            "🔄 **Shirin gudanar da aiki...**, "
-            "Chat ID: " + str(chat_id),
-            chat_id,
-            msg_id
-        )
+def refresh_customer_totals():
+    # CONCURRENTLY: /customers yana ci gaba da karanta tsohon data har a gama
+    with db_session() as db:
+        db.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY customer_totals")
 
-        debug_log(
-            "✅ User status an canza zuwa "
-            "'Shirin gudanar da aiki'."
-        )
 
-        # -----------------------------------------------------
-        # SEND TASK TO PYROGRAM LOOP
-        # -----------------------------------------------------
+SCHEDULER.add(
+    "customer_totals",
+    refresh_customer_totals,
+    interval=CUSTOMER_TOTALS_REFRESH_SECONDS,
+    run_at_start=False,
+    singleton=True
+)
 
-        debug_log(
-            "🚀 Ana turawa run_pyrogram_task "
-            "cikin Pyrogram asyncio loop..."
-        )
 
-        future = asyncio.run_coroutine_threadsafe(
-            run_pyrogram_task(
-                chat_id,
-                target_msg_id,
-                msg_id,
-                as_video
-            ),
-            pyro_loop
-        )
+def _customer_chat_name(user_id):
+    try:
+        chat = bot.get_chat(user_id)
+    except Exception:
+        return user_id, None
+    return user_id, chat
 
-        debug_log(
-            "✅ asyncio.run_coroutine_threadsafe() "
-            "YA KARƁI TASK.\n\n"
-            f"Future:\n"
-            f"{future}\n"
-            f"Future Done: {future.done()}\n"
-            f"Future Cancelled: {future.cancelled()}"
-        )
 
-        # -----------------------------------------------------
-        # FUTURE ERROR MONITOR
-        # -----------------------------------------------------
+def customer_names(user_ids):
+    """
+    {user_id: name} na page guda — query daya da ANY, sannan get_chat
+    a lokaci guda ga wadanda babu sunansu; a ajiye su a visited_users.
+    """
+    names = {}
 
-        def future_done_callback(f):
+    try:
+        with db_session() as db:
+            rows = db.execute(
+                """
+                SELECT user_id, first_name, last_name
+                FROM visited_users
+                WHERE user_id = ANY(%s)
+                """,
+                (list(user_ids),)
+            ).fetchall()
+        for user_id, first, last in rows:
+            if first or last:
+                names[user_id] = f"{first or ''} {last or ''}".strip()
+    except Exception as e:
+        print("⚠️ CUSTOMER NAME LOOKUP ERROR:", e)
 
-            try:
+    missing = [uid for uid in user_ids if uid not in names]
+    if not missing:
+        return names
 
-                if f.cancelled():
+    with ThreadPoolExecutor(max_workers=min(CUSTOMER_NAME_CONCURRENCY, len(missing))) as pool:
+        chats = list(pool.map(_customer_chat_name, missing))
 
-                    debug_log(
-                        "🚨 FUTURE AN CANCELLED!"
-                    )
+    found = []
+    for user_id, chat in chats:
+        if chat is None:
+            continue
+        name = f"{chat.first_name or ''} {chat.last_name or ''}".strip()
+        if name:
+            names[user_id] = name
+        found.append((user_id, chat.first_name, chat.last_name, chat.username))
 
-                    return
+    if found:
+        try:
+            with db_session() as db:
+                execute_values(
+                    db.cursor(),
+                    """
+                    INSERT INTO visited_users (user_id, first_name, last_name, username)
+                    VALUES %s
+                    ON CONFLICT (user_id) DO UPDATE
+                    SET first_name = EXCLUDED.first_name,
+                        last_name = EXCLUDED.last_name,
+                        username = EXCLUDED.username
+                    """,
+                    found
+                )
+        except Exception as e:
+            print("⚠️ CUSTOMER NAME SAVE ERROR:", e)
 
-                exception = f.exception()
+    return names
 
-                if exception:
 
-                    debug_log(
-                        "💥 FUTURE YA KAMMALA DA ERROR!\n\n"
-                        f"Exception Type:\n"
-                        f"{type(exception).__name__}\n\n"
-                        f"Exception:\n"
-                        f"{exception}\n\n"
-                        f"TRACEBACK:\n"
-                        f"{traceback.format_exc()}"
-                    )
+@bot.message_handler(commands=["customers", "customershide"])
+def customers_handler(msg):
 
-                else:
+    if msg.from_user.id != ADMIN_ID:
+        return
 
-                    debug_log(
-                        "✅ FUTURE YA KAMMALA BA TARE DA ERROR BA."
-                    )
+    text = msg.text.lower()
+    hide = msg.text.startswith("/customershide") or "hide" in text
 
-            except Exception as e:
+    # /customers refresh → sabunta aggregate kafin a nuna
+    if "refresh" in text:
+        try:
+            refresh_customer_totals()
+        except Exception as e:
+            bot.reply_to(msg, f"❌ Refresh error: {e}")
+            return
 
-                debug_log(
-                    "💥 FUTURE CALLBACK ERROR\n\n"
-                    f"{type(e).__name__}: {e}\n\n"
-                    f"{traceback.format_exc()}"
-                )
+    try:
+        with db_session() as db:
+            rows = db.execute("""
+                SELECT user_id, total_paid, total_orders
+                FROM customer_totals
+                ORDER BY total_paid DESC
+            """).fetchall()
+    except Exception as e:
+        bot.reply_to(msg, f"❌ DB error: {e}")
+        return
 
-        future.add_done_callback(
-            future_done_callback
-        )
+    if not rows:
+        bot.reply_to(msg, "❌ No customers found.")
+        return
 
-        debug_log(
-            "🟢 FUTURE DONE CALLBACK AN SAITA."
-        )
+    CUSTOMER_CACHE[msg.from_user.id] = {
+        "data": rows,
+        "hide": hide
+    }
 
-    except Exception as e:
+    send_customer_page(msg.chat.id, msg.from_user.id, 0)
 
-        debug_log(
-            "💥💥💥 CONVERSION CALLBACK CRASH 💥💥💥\n\n"
-            f"Exception Type:\n"
-            f"{type(e).__name__}\n\n"
-            f"Exception:\n"
-            f"{e}\n\n"
-            f"TRACEBACK:\n"
-            f"{traceback.format_exc()}"
-        )
 
+# ================= PAGE RENDER =================
+def build_customer_text(admin_id, page):
 
-# -------------------------------------------------------------
-# FINAL START
-# -------------------------------------------------------------
+    data = CUSTOMER_CACHE.get(admin_id)
+    if not data:
+        return None, None
 
-if __name__ == "__main__":
+    rows = data["data"]
+    hide = data["hide"]
 
-    debug_log(
-        "🟢🟢🟢 BOT PROCESS YA FARA 🟢🟢🟢\n\n"
-        f"PID: {os.getpid()}\n"
-        f"Python PID: {os.getpid()}\n"
-        f"Pyrogram Thread: "
-        f"{pyro_thread.name}\n"
-        f"Pyro Ready: "
-        f"{pyro_ready.is_set()}\n\n"
-        f"{get_system_info()}"
-    )
+    per_page = 15
+    total_pages = (len(rows) - 1) // per_page
 
-    try:
+    start = page * per_page
+    end = start + per_page
+    chunk = rows[start:end]
 
-        debug_log(
-            "📡 Ana fara Telebot infinity_polling()..."
-        )
+    # ===== NAMES (page guda, query daya) =====
+    names = customer_names([r[0] for r in chunk])
 
-        bot.infinity_polling(
-            skip_pending=True
-        )
+    result = []
+    rank = start + 1
 
-    except Exception as e:
+    for user_id, total_paid, total_orders in chunk:
 
-        debug_log(
-            "💥💥💥 BOT MAIN PROCESS YA CRASH 💥💥💥\n\n"
-            f"Exception Type:\n"
-            f"{type(e).__name__}\n\n"
-            f"Exception:\n"
-            f"{e}\n\n"
-            f"TRACEBACK:\n"
-            f"{traceback.format_exc()}"
-        )
+        # ===== NAME =====
+        name = names.get(user_id) or "Customer"
+
+        # ===== PREFIX =====
+        if rank <= 3:
+            prefix = f"🏆{rank}"
+        else:
+            prefix = f"{rank}"
 
+        # ===== FORMAT (SHORT AS YOU WANT) =====
+        if hide:
+            block = (
+                f"{prefix}. 👤 {name}\n"
+                f"📦 Orders: {total_orders}\n"
+                f"🆔 Wallet ID: <code>{user_id}</code>"
+            )
+        else:
+            block = (
+                f"{prefix}. 👤 {name}\n"
+                f"💰 ₦{int(total_paid)}\n"
+                f"📦 Orders: {total_orders}\n"
+                f"🆔 Wallet ID: <code>{user_id}</code>"
+            )
 
+        result.append(block)
+        result.append("__________")
 
-# ================= TEST COLOR BUTTONS COMMAND =================
-@bot.message_handler(commands=["color"])
-def test_color_buttons(m):
-    # Tabbatar mai amfani Admin ne (Za ka iya sanya ID din ka a nan idan kana bukata)
-    uid = m.from_user.id
+        rank += 1
 
-    kb = InlineKeyboardMarkup()
+    # remove last line
+    if result and result[-1] == "__________":
+        result.pop()
 
-    # 1. Button "Test" - Kore (success)
-    btn_test = InlineKeyboardButton(
-        text="🧪 Test", callback_data="test_click", style="success"
-    )
+    text = "\n".join(result)
 
-    # 2. Button "Gold" - Ja (danger)
-    btn_gold = InlineKeyboardButton(
-        text="🏆 Gold", callback_data="gold_click", style="danger"
+    kb = InlineKeyboardMarkup()
+    kb.row(
+        InlineKeyboardButton("⬅️ Back", callback_data=f"custpage:{page-1}"),
+        InlineKeyboardButton("➡️ Next", callback_data=f"custpage:{page+1}")
     )
 
-    # Sanya su a jera a maɓalli guda
-    kb.add(btn_test, btn_gold)
+    return text, kb
 
-    bot.send_message(uid, "Ga buttons ɗin 👇", reply_markup=kb)
 
+# ================= SEND FIRST =================
+def send_customer_page(chat_id, admin_id, page):
 
-# Callback Query Handler don karɓar latsawar maɓallan
-@bot.callback_query_handler(
-    func=lambda c: c.data in ["test_click", "gold_click"]
-)
-def handle_color_test_clicks(call):
-    if call.data == "test_click":
-        bot.answer_callback_query(
-            call.id, "Kayi latsa a maɓallin Test (Green)!"
-        )
-    elif call.data == "gold_click":
-        bot.answer_callback_query(call.id, "Kayi latsa a maɓallin Gold (Red)!")
+    text, kb = build_customer_text(admin_id, page)
 
-# ========= BUYD (ITEM ONLY | DEEP LINK → DM) =========
-from psycopg2.extras import RealDictCursor
-import uuid
-import time
-import re
+    if not text:
+        return
 
-@bot.message_handler(func=lambda m: m.text and m.text.startswith("/start groupitem_"))
-def groupitem_deeplink_handler(msg):
-    uid = msg.from_user.id
-    user_name = msg.from_user.first_name or "Customer"
+    bot.send_message(
+        chat_id,
+        text,
+        parse_mode="HTML",
+        reply_markup=kb
+    )
 
-    # ========= PARSE ITEM IDS + GROUP KEYS =========
-    try:
-        raw = msg.text.split("groupitem_", 1)[1]
-        tokens = [x.strip() for x in re.split(r"[_,\s]+", raw) if x.strip()]
-    except Exception:
-        return
 
-    if not tokens:
+# ================= CALLBACK =================
+@bot.callback_query_handler(func=lambda c: c.data.startswith("custpage:"))
+def customer_pagination(c):
+
+    if c.from_user.id != ADMIN_ID:
         return
 
-    # ✅ SAFE CONNECTION (Wannan yana nan daram)
-    conn = get_conn()
-    if not conn:
+    try:
+        page = int(c.data.split(":")[1])
+    except:
         return
-    cur = conn.cursor(cursor_factory=RealDictCursor)
 
-    item_ids = []
+    data = CUSTOMER_CACHE.get(c.from_user.id)
+    if not data:
+        return
 
-    try:
-        for token in tokens:
-            # ==== IF ID ====
-            if token.isdigit():
-                item_ids.append(int(token))
+    rows = data["data"]
 
-            # ==== IF GROUP KEY ====
-            else:
-                cur.execute(
-                    "SELECT id FROM items WHERE group_key=%s",
-                    (token,)
-                )
-                rows = cur.fetchall()
-                item_ids.extend([r["id"] for r in rows])
+    per_page = 15
+    total_pages = (len(rows) - 1) // per_page
 
-    except Exception:
-        cur.close()
-        conn.close()
+    # ===== POPUP ALERT =====
+    if page < 0:
+        bot.answer_callback_query(
+            c.id,
+            "🚫 Babu page a baya",
+            show_alert=True
+        )
         return
 
-    if not item_ids:
-        cur.close()
-        conn.close()
+    if page > total_pages:
+        bot.answer_callback_query(
+            c.id,
+            "🚫 Babu wani page a gaba",
+            show_alert=True
+        )
         return
 
-    # ========= FETCH ITEMS =========
+    # ===== NORMAL EDIT =====
+    bot.answer_callback_query(c.id)
+
+    text, kb = build_customer_text(c.from_user.id, page)
+
     try:
-        placeholders = ",".join(["%s"] * len(item_ids))
-        cur.execute(
-            f"""
-            SELECT id, title, price, file_id, group_key
-            FROM items
-            WHERE id IN ({placeholders})
-            """,
-            tuple(item_ids)
+        bot.edit_message_text(
+            text,
+            c.message.chat.id,
+            c.message.message_id,
+            parse_mode="HTML",
+            reply_markup=kb
         )
-        items = cur.fetchall()
-    except Exception:
-        cur.close()
-        conn.close()
-        return
+    except:
+        pass
 
-    if not items:
-        cur.close()
-        conn.close()
-        return
 
-    # ========= FILE_ID REQUIRED =========
-    items = [i for i in items if i.get("file_id")]
-    if not items:
-        cur.close()
-        conn.close()
+# ========= GMAIL TEST COMMAND =========
+import imaplib
+import email
+import html  # Mun shigo da wannan don gyara matsalar alamomin < da >
+from email.header import decode_header
+
+@bot.message_handler(commands=['g'])
+def gmail_test(msg):
+
+    if msg.from_user.id != ADMIN_ID:
         return
 
-    item_ids_clean = [i["id"] for i in items]
+    bot.reply_to(
+        msg,
+        "🔍 Checking Gmail..."
+    )
 
-    # ========= OWNERSHIP CHECK (Tsararren Tsaro) =========
     try:
-        cur.execute(
-            f"""
-            SELECT 1 FROM user_movies
-            WHERE user_id=%s
-              AND item_id IN ({",".join(["%s"] * len(item_ids_clean))})
-            LIMIT 1
-            """,
-            (uid, *item_ids_clean)
+
+        # ===== LOGIN =====
+        mail = imaplib.IMAP4_SSL(
+            IMAP_SERVER,
+            IMAP_PORT
         )
-        owned = cur.fetchone()
-    except Exception:
-        cur.close()
-        conn.close()
-        return
 
-    if owned:
-        kb = InlineKeyboardMarkup()
-        kb.add(InlineKeyboardButton("📽 PAID MOVIES", callback_data="my_movies"))
-        bot.send_message(
-            uid,
-            "✅ You have already purchased this movie.\n\n"
-            "Please check your *Paid Movies* to download it again.",
-            parse_mode="Markdown",
-            reply_markup=kb
+        mail.login(
+            EMAIL_USER,
+            EMAIL_PASS
         )
-        cur.close()
-        conn.close()
-        return
 
-    # ========= GROUP_KEY PRICING =========
-    groups = {}
-    for i in items:
-        key = i["group_key"] or f"single_{i['id']}"
-        if key not in groups:
-            groups[key] = int(i["price"] or 0)
+        mail.select("inbox")
+
+        # ===== SEARCH =====
+        result, data = mail.search(
+            None,
+            "ALL"
+        )
+
+        mail_ids = data[0].split()
+
+        total = len(mail_ids)
+
+        latest_subject = "N/A"
+        latest_sender = "N/A"
+
+        if mail_ids:
 
-    total = sum(groups.values())
-    item_count = len(items)
+            latest_id = mail_ids[-1]
 
-    if total <= 0:
-        cur.close()
-        conn.close()
-        return
+            result, msg_data = mail.fetch(
+                latest_id,
+                "(RFC822)"
+            )
 
-    # ========= REUSE / CREATE ORDER (Maimaita ko Kera Order) =========
-    try:
-        cur.execute(
-            f"""
-            SELECT o.id
-            FROM orders o
-            JOIN order_items oi ON oi.order_id = o.id
-            WHERE o.user_id=%s
-              AND o.paid=0
-              AND oi.item_id IN ({",".join(["%s"] * len(item_ids_clean))})
-            GROUP BY o.id
-            HAVING COUNT(DISTINCT oi.item_id)=%s
-            LIMIT 1
-            """,
-            (uid, *item_ids_clean, len(item_ids_clean))
-        )
-        row = cur.fetchone()
-    except Exception:
-        cur.close()
-        conn.close()
-        return
+            raw_email = msg_data[0][1]
 
-    if row:
-        order_id = row["id"]
-    else:
-        order_id = str(uuid.uuid4())
-        try:
-            cur.execute(
-                "INSERT INTO orders (id, user_id, amount, paid, type) VALUES (%s,%s,%s,0,'film')",
-                (order_id, uid, total)
+            em = email.message_from_bytes(
+                raw_email
             )
-            for i in items:
-                cur.execute(
-                    """
-                    INSERT INTO order_items (order_id, item_id, file_id, price)
-                    VALUES (%s,%s,%s,%s)
-                    """,
-                    (order_id, i["id"], i["file_id"], int(i["price"] or 0))
-                )
-            conn.commit()
-        except Exception:
-            conn.rollback()
-            cur.close()
-            conn.close()
-            return
 
-    # ========= FLUTTERWAVE GATEWAY =========
-    display_title = f"{item_count} film(s)"
-    pay_url = create_flutterwave_payment(uid, order_id, total, display_title)
+            latest_sender = em.get(
+                "From",
+                "Unknown"
+            )
 
-    if not pay_url:
-        bot.send_message(uid, "❌ Sorry, payment gateway is down. Try again later.")
-        cur.close()
-        conn.close()
-        return
+            subject = em.get(
+                "Subject",
+                ""
+            )
 
-    # ========= FIXED TITLE DISPLAY =========
-    unique_titles = [
-        i["title"]
-        for _, i in {
-            (i["group_key"] or f"single_{i['id']}"): i
-            for i in items
-        }.items()
-    ]
+            try:
 
-    # ========= GET FULL TELEGRAM NAME =========
-    t_first = msg.from_user.first_name or ""
-    t_last = msg.from_user.last_name or ""
-    full_telegram_name = f"{t_first} {t_last}".strip() or "Customer"
+                decoded = decode_header(
+                    subject
+                )[0][0]
 
-    # ========= FINAL UI (SABON FORMAT DA KA ZABA) =========
-    kb = InlineKeyboardMarkup()
+                if isinstance(
+                    decoded,
+                    bytes
+                ):
+                    latest_subject = decoded.decode(
+                        errors="ignore"
+                    )
+                else:
+                    latest_subject = decoded
 
-    # (PAY NOW) 💳 (TOP ROW)
-    kb.add(
-        InlineKeyboardButton("(PAY NOW) 💳", url=pay_url)
-    )
+            except:
+                latest_subject = subject
 
-    # SECOND ROW
-    kb.row(
-        InlineKeyboardButton("💰 Pay with Wallet", callback_data=f"walletpay:{order_id}"),
-        InlineKeyboardButton("❌ Cancel order", callback_data=f"cancel:{order_id}")
-    )
+        mail.logout()
 
-    sent = bot.send_message(
-        uid,
-        f"""💳⚡FLUTTERWAVE SIMPLE PAYMENT
-━━━━━━━━━━━━━━━━━━
-Barka {full_telegram_name}
-You want buy this movie
-🎬{", ".join(unique_titles)}
+        # ===== GYARAN PARSING ERROR NA TELEGRAM =====
+        # Wannan sashen yana canza < da > su dawo text na gaskiya domin Telegram ya karanta su
+        safe_sender = html.escape(str(latest_sender))
+        safe_subject = html.escape(str(latest_subject))
 
-📦 FILMS: {item_count}
-💵PRICE: ₦{total}
-━━━━━━━━━━━━━━━━━━
- Danna Pay now da ke ƙasa don biya nan take.
-Click pay now👇""",
-        reply_markup=kb
-    )
+        bot.send_message(
+            msg.chat.id,
+            f"""✅ <b>GMAIL CONNECTED</b>
 
-    # ===== STORE MESSAGE FOR AUTO DELETE AFTER PAYMENT =====
-    ORDER_MESSAGES[order_id] = (sent.chat.id, sent.message_id)
+📧 <b>Email:</b>
+<code>{EMAIL_USER}</code>
 
-    cur.close()
-    conn.close()
+📥 <b>Total Emails:</b>
+{total}
 
+👤 <b>Latest Sender:</b>
+{safe_sender}
 
-# ================= ADMIN REMOVE MONEY FROM WALLET =================
-@bot.message_handler(commands=["rage"])
-def admin_remove_money(msg):
+📝 <b>Latest Subject:</b>
+{safe_subject}
 
-    user_id = msg.from_user.id
+✅ Gmail login successful.
+""",
+            parse_mode="HTML"
+        )
 
-    # ===== ADMIN CHECK =====
-    if user_id != ADMIN_ID:
-        bot.reply_to(msg, "❌ You are not authorized to use this command.")
-        return
+    except Exception as e:
 
-    try:
-        parts = msg.text.split()
+        bot.send_message(
+            msg.chat.id,
+            f"""❌ <b>GMAIL ERROR</b>
 
-        if len(parts) < 2:
-            bot.reply_to(msg, "Usage: /rage 500")
-            return
+<code>{html.escape(str(e))}</code>
+""",
+            parse_mode="HTML"
+        )
 
-        amount = int(parts[1])
 
-        if amount <= 0:
-            bot.reply_to(msg, "❌ Invalid amount.")
-            return
 
-    except:
-        bot.reply_to(msg, "❌ Invalid format.\nUse: /rage 500")
-        return
+import threading
+import time
+import imaplib
+import email
+from email.header import decode_header
+import re
+from email_extractor import extract_payment
 
-    # ===== DB =====
-    wallet_conn = get_wallet_conn()
-    wallet_cur = wallet_conn.cursor()
+# ========= LIVE DEBUG SCANNER (AMOUNT & REMARK ONLY) =========
 
+def email_live_scanner(bot, uid, start_time):
+    # Session ɗaya + UID cursor: muna jiran sabon sako da IDLE maimakon
+    # login kowane sakan 20 da kirga "search ALL".
+    session = GmailSession()
     try:
+        session.connect()
+        last_uid = (session.uidnext or 1) - 1
+    except Exception as e:
+        session.close()
+        bot.send_message(uid, f"❌ Kuskure gurin haɗuwa da Gmail a karon farko: {str(e)}")
+        return
 
-        # ===== CHECK CURRENT BALANCE =====
-        wallet_cur.execute(
-            "SELECT balance FROM wallet_balance WHERE user_id=%s",
-            (user_id,)
-        )
-        row = wallet_cur.fetchone()
+    bot.send_message(
+        uid, 
+        "🚀 **Live Scanner An Kunna!**\n"
+        "⏱ Zai jira sabon saƙo kai tsaye (IDLE) har na **minti 5**.\n\n"
+        "👉 *Je ka yi transfer yanzu don mu ga saƙon da zai shigo...*", 
+        parse_mode="Markdown"
+    )
 
-        current_balance = int(row[0]) if row else 0
+    deadline = start_time + 300  # Minti 5
 
-        if current_balance < amount:
-            bot.reply_to(
-                msg,
-                f"❌ Insufficient balance.\n\nYour Balance: ₦{current_balance}"
-            )
-            return
+    try:
+        while time.time() < deadline:
+            try:
+                mail = session.ensure()
 
-        # ===== DEDUCT BALANCE =====
-        wallet_cur.execute(
-            """
-            UPDATE wallet_balance
-            SET balance = balance - %s,
-                updated_at = NOW()
-            WHERE user_id=%s
-            """,
-            (amount, user_id)
-        )
+                new_uids = fetch_new_uids(mail, last_uid)
+                if not new_uids:
+                    session.wait_for_mail(timeout=max(deadline - time.time(), 1))
+                    continue
 
-        # ===== SAVE TRANSACTION =====
-        import time
-        ref = f"debit_{user_id}_{int(time.time())}"
+                bot.send_message(uid, f"🔔 An sami sabon sako guda {len(new_uids)}! Gashi nan tafe...")
 
-        wallet_cur.execute(
-            """
-            INSERT INTO wallet_transactions
-            (user_id, amount, type, reference, description)
-            VALUES (%s,%s,'debit',%s,'Admin Wallet Debit')
-            """,
-            (user_id, amount, ref)
-        )
+                for _, msg in fetch_messages_by_uid(mail, new_uids[:GMAIL_FETCH_BATCH]):
+                    try:
+                        # ====== PARSE AMOUNT DA REMARK (email_extractor) ======
+                        info = extract_payment(msg)
+                        amount = f"NGN {info.amount}" if info.amount is not None else "None"
+                        remark = info.remark or "None"
 
-        wallet_conn.commit()
+                        # ====== TURA SAKON MAI TSAFTA ======
+                        full_report = (
+                            f"📥 SABON SAKO YA SHIGO GMAIL!\n\n"
+                            f"💰 Amount: {amount}\n"
+                            f"📝 Remark: {remark}\n"
+                            f"━━━━━━━━━━━━━━━━━━━"
+                        )
 
-        # ===== SUCCESS MESSAGE =====
-        bot.reply_to(
-            msg,
-            f"""💸 <b>WALLET DEBIT SUCCESSFUL</b>
+                        bot.send_message(uid, full_report)
 
-➖ Amount Removed: ₦{amount}
-🆔 Wallet ID: <code>{user_id}</code>
+                    except Exception as ev:
+                        bot.send_message(uid, f"⚠️ Kuskure gurin karanta saƙon: {str(ev)}")
 
-Your wallet has been reduced successfully.""",
-            parse_mode="HTML"
-        )
+                bot.send_message(uid, "🛑 Scanner ya tsaya da kansa domin an sami saƙon.")
+                return
 
-    except:
-        wallet_conn.rollback()
-        bot.reply_to(msg, "❌ Failed to remove money.")
+            except imaplib.IMAP4.error as imap_err:
+                session.close()
+                if _imap_rate_limited(imap_err):
+                    bot.send_message(uid, "⚠️ Gmail Rate Limit Warning! Google sun ce mun cika matsawa. Zan tsaya na sakan 40...")
+                    time.sleep(40)
 
+            except Exception as e:
+                print("SCANNER NETWORK ERROR:", e)
+                session.close()
+                time.sleep(5)
     finally:
-        wallet_cur.close()
-        wallet_conn.close()
+        session.close()
 
+    bot.send_message(uid, "⏱ Minti 5 sun cika! Scanner ya mutu da kansa ba tare da an sami sabon saƙo ba.")
 
 
-# ================= CUSTOMER PAGINATION SYSTEM =================
-CUSTOMER_CACHE = {}
 
-@bot.message_handler(commands=["customers", "customershide"])
-def customers_handler(msg):
 
-    if msg.from_user.id != ADMIN_ID:
-        return
 
-    text = msg.text.lower()
-    hide = msg.text.startswith("/customershide") or "hide" in text
+@bot.message_handler(commands=['c'])
+def handle_debug_c_command(msg):
+    uid = msg.from_user.id
+    
+    if str(uid) != str(ADMIN_ID):
+        bot.send_message(uid, "❌ Wannan command ɗin na Admin ne kawai.")
+        return
+        
+    threading.Thread(
+        target=email_live_scanner,
+        args=(bot, uid, time.time()),
+        daemon=True
+    ).start()
 
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT 
-            o.user_id,
-            SUM(o.amount) as total_paid,
-            COUNT(o.id) as total_orders
-        FROM orders o
-        WHERE o.paid = 1
-        GROUP BY o.user_id
-        ORDER BY total_paid DESC
-    """)
 
-    rows = cur.fetchall()
+# ================= ADMIN SALLAH GIFT =================
+@bot.message_handler(commands=["sallah"])
+def send_sallah_gift(msg):
 
-    cur.close()
-    conn.close()
+    admin_id = msg.from_user.id
 
-    if not rows:
-        bot.reply_to(msg, "❌ No customers found.")
+    if admin_id != ADMIN_ID:
         return
 
-    CUSTOMER_CACHE[msg.from_user.id] = {
-        "data": rows,
-        "hide": hide
-    }
+    try:
+        parts = msg.text.replace("/sallah", "").strip().split(",")
 
-    send_customer_page(msg.chat.id, msg.from_user.id, 0)
+        if len(parts) != 2:
+            bot.reply_to(msg, "Usage: /sallah user_id, amount\nExample: /sallah 123456789, 300")
+            return
+
+        user_id = int(parts[0].strip())
+        amount = int(parts[1].strip())
 
+        if amount <= 0:
+            bot.reply_to(msg, "❌ Invalid amount.")
+            return
 
-# ================= PAGE RENDER =================
-def build_customer_text(admin_id, page):
+    except:
+        bot.reply_to(msg, "❌ Invalid format.\nUse: /sallah 123456789, 300")
+        return
 
-    data = CUSTOMER_CACHE.get(admin_id)
-    if not data:
-        return None, None
+    try:
+        # ================= GET USER ORDERS =================
+        with db_session() as db:
+            order_row = db.execute(
+                "SELECT COUNT(*) FROM orders WHERE user_id=%s AND paid=1",
+                (user_id,)
+            ).fetchone()
+        total_orders = order_row[0] if order_row else 0
 
-    rows = data["data"]
-    hide = data["hide"]
+        with db_session(wallet=True) as db:
+            wallet_cur = db.cursor()
 
-    per_page = 15
-    total_pages = (len(rows) - 1) // per_page
+            # ================= CHECK ADMIN BALANCE =================
+            wallet_cur.execute(
+                "SELECT balance FROM wallet_balance WHERE user_id=%s",
+                (admin_id,)
+            )
+            row = wallet_cur.fetchone()
 
-    start = page * per_page
-    end = start + per_page
-    chunk = rows[start:end]
+            admin_balance = int(row[0]) if row else 0
 
-    conn = get_conn()
-    cur = conn.cursor()
+            if admin_balance >= amount:
+                # ================= DEDUCT ADMIN =================
+                wallet_cur.execute(
+                    """
+                    UPDATE wallet_balance
+                    SET balance = balance - %s,
+                        updated_at = NOW()
+                    WHERE user_id=%s
+                    """,
+                    (amount, admin_id)
+                )
 
-    result = []
-    rank = start + 1
+                # ================= CREDIT USER =================
+                wallet_cur.execute(
+                    """
+                    INSERT INTO wallet_balance (user_id, balance)
+                    VALUES (%s,%s)
+                    ON CONFLICT (user_id)
+                    DO UPDATE SET
+                    balance = wallet_balance.balance + EXCLUDED.balance,
+                    updated_at = NOW()
+                    """,
+                    (user_id, amount)
+                )
 
-    for user_id, total_paid, total_orders in chunk:
+                ref = f"sallah_{admin_id}_{int(time.time())}"
 
-        # ===== NAME =====
-        cur.execute("""
-            SELECT first_name, last_name
-            FROM visited_users
-            WHERE user_id=%s
-        """, (user_id,))
-        u = cur.fetchone()
+                # ================= SAVE TRANSACTION =================
+                wallet_cur.execute(
+                    """
+                    INSERT INTO wallet_transactions
+                    (user_id, amount, type, reference, description)
+                    VALUES (%s,%s,'sallah',%s,'Happy Sallah Gift')
+                    """,
+                    (user_id, amount, ref)
+                )
 
-        if u and (u[0] or u[1]):
-            name = f"{u[0] or ''} {u[1] or ''}".strip()
-        else:
-            try:
-                chat = bot.get_chat(user_id)
-                name = f"{chat.first_name or ''} {chat.last_name or ''}".strip()
-            except:
-                name = "Customer"
+    except Exception:
+        bot.reply_to(msg, "❌ Failed to send gift.")
+        return
 
-        # ===== PREFIX =====
-        if rank <= 3:
-            prefix = f"🏆{rank}"
-        else:
-            prefix = f"{rank}"
+    if admin_balance < amount:
+        bot.reply_to(msg, f"❌ Insufficient balance.\nYour Balance: ₦{admin_balance}")
+        return
 
-        # ===== FORMAT (SHORT AS YOU WANT) =====
-        if hide:
-            block = (
-                f"{prefix}. 👤 {name}\n"
-                f"📦 Orders: {total_orders}\n"
-                f"🆔 Wallet ID: <code>{user_id}</code>"
-            )
-        else:
-            block = (
-                f"{prefix}. 👤 {name}\n"
-                f"💰 ₦{int(total_paid)}\n"
-                f"📦 Orders: {total_orders}\n"
-                f"🆔 Wallet ID: <code>{user_id}</code>"
-            )
+    # ================= MESSAGE TO USER =================
+    try:
+        bot.send_message(
+            user_id,
+            f"""🌙✨ Barka da Sallah!
 
-        result.append(block)
-        result.append("__________")
+🎁 Wannan ita ce kyautarka daga Algaita Movie Store saboda goyon bayan da ka nuna wajen siyan fina-finai a wurinmu ❤️
 
-        rank += 1
+💰 An saka maka kyauta a wallet ɗinka — gwargwadon yadda ka siya fim a wurinmu.
+👉 Ka duba wallet ɗinka an tura maka kuɗinka.
 
-    # remove last line
-    if result and result[-1] == "__________":
-        result.pop()
+📦 Your Orders: {total_orders}
+💰 Kyautarka: ₦{amount}
 
-    cur.close()
-    conn.close()
+Muna godiya sosai 🙏  
+Za mu ci gaba da baka kyauta a duk lokacin da muka raba 🎬🔥
 
-    text = "\n".join(result)
+👉 Ka iya amfani da wannan kuɗin domin siyan fina-finai a bot ɗinmu.
 
-    kb = InlineKeyboardMarkup()
-    kb.row(
-        InlineKeyboardButton("⬅️ Back", callback_data=f"custpage:{page-1}"),
-        InlineKeyboardButton("➡️ Next", callback_data=f"custpage:{page+1}")
-    )
+🙏 Muna fatan duk lokacin da kake buƙatar wani fim, ba za ka manta da Algaita Movie Store ba.
 
-    return text, kb
+— Algaita Movie Store  
+🤖 @CEOalgaitabot"""
+        )
+    except:
+        pass
 
+    # ================= ADMIN CONFIRM =================
+    bot.reply_to(
+        msg,
+        f"""✅ An turawa user
 
-# ================= SEND FIRST =================
-def send_customer_page(chat_id, admin_id, page):
+🆔 <code>{user_id}</code>
+💰 ₦{amount}""",
+        parse_mode="HTML"
+    )
 
-    text, kb = build_customer_text(admin_id, page)
 
-    if not text:
-        return
+# ================= EID BROADCAST SYSTEM =================
+# Campaign + recipients suna cikin DB: idan bot ya sake tashi, broadcast
+# yana ci gaba daga inda ya tsaya. Users da suka block bot (403) ana
+# ajiye su a broadcast_blocked_users domin a tsallake su a gaba.
+# Sauran kurakurai (timeout, 5xx, 429) → status 'retry' da attempts;
+# sai bayan BROADCAST_MAX_ATTEMPTS suke zama 'failed'.
+from telebot.apihelper import ApiTelegramException
+from psycopg2.extras import execute_values
+from concurrent.futures import ThreadPoolExecutor
+import time
 
-    bot.send_message(
-        chat_id,
-        text,
-        parse_mode="HTML",
-        reply_markup=kb
-    )
+BROADCAST_CONCURRENCY = int(os.environ.get("BROADCAST_CONCURRENCY", 8))
+BROADCAST_BATCH = BROADCAST_CONCURRENCY * 4
+BROADCAST_PROGRESS_EVERY = 5       # seconds tsakanin edit na progress
+BROADCAST_STALE_SECONDS = 120      # 'sending' da ya wuce haka → pending
+BROADCAST_MAX_ATTEMPTS = int(os.environ.get("BROADCAST_MAX_ATTEMPTS", 4))
+BROADCAST_RETRY_DELAY = int(os.environ.get("BROADCAST_RETRY_DELAY", 30))   # seconds, ninki biyu kowane attempt
 
+BROADCAST_RUNNERS = {}
+BROADCAST_LOCK = threading.Lock()
 
-# ================= CALLBACK =================
-@bot.callback_query_handler(func=lambda c: c.data.startswith("custpage:"))
-def customer_pagination(c):
+EID_MESSAGE = """🌙✨ *BARKA DA BABBAR SALLAH* ✨🌙
+ 
+Assalamu Alaikum dear customer 🤍
+ 
+A wannan lokaci na Babbar Sallah, muna mika godiya ta musamman gareku bisa goyon baya da yarda da kuka nuna mana ta hanyar siyan fina-finai a bot ɗinmu. Allah Ya saka muku da alkhairi 🤲
+ 
+Muna yi muku fatan Sallah mai albarka, lafiya, farin ciki da tsawon rayuwa domin ganin shekarun da ke tafe. Allah Ya gafarta mana baki ɗaya, Ya karɓi ibadunmu, Ya kuma sa mu ci albarkacin wannan rana mai albarka, Ameen 🤲
+ 
+Mun gode da kasancewa tare da mu 💖 *Eid Mubarak!* 🐐🎉
+"""
 
-    if c.from_user.id != ADMIN_ID:
-        return
 
+def ensure_broadcast_tables():
     try:
-        page = int(c.data.split(":")[1])
-    except:
-        return
+        with db_session() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS broadcast_campaigns (
+                    id SERIAL PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    parse_mode TEXT,
+                    status TEXT NOT NULL DEFAULT 'running',
+                    admin_chat BIGINT,
+                    progress_msg_id BIGINT,
+                    total INTEGER DEFAULT 0,
+                    sent INTEGER DEFAULT 0,
+                    failed INTEGER DEFAULT 0,
+                    blocked INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT NOW(),
+                    finished_at TIMESTAMP
+                )
+            """)
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS broadcast_recipients (
+                    campaign_id INTEGER NOT NULL REFERENCES broadcast_campaigns(id) ON DELETE CASCADE,
+                    user_id BIGINT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    error TEXT,
+                    claimed_at TIMESTAMP,
+                    sent_at TIMESTAMP,
+                    PRIMARY KEY (campaign_id, user_id)
+                )
+            """)
+            db.execute("""
+                ALTER TABLE broadcast_recipients
+                ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0,
+                ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP
+            """)
+            db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_broadcast_recipients_status
+                ON broadcast_recipients(campaign_id, status)
+            """)
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS broadcast_blocked_users (
+                    user_id BIGINT PRIMARY KEY,
+                    blocked_at TIMESTAMP DEFAULT NOW()
+                )
+            """)
+        print("✅ broadcast tables ready")
+    except Exception as e:
+        print("❌ BROADCAST TABLES ERROR:", e)
 
-    data = CUSTOMER_CACHE.get(c.from_user.id)
-    if not data:
-        return
 
-    rows = data["data"]
+ensure_broadcast_tables()
 
-    per_page = 15
-    total_pages = (len(rows) - 1) // per_page
 
-    # ===== POPUP ALERT =====
-    if page < 0:
-        bot.answer_callback_query(
-            c.id,
-            "🚫 Babu page a baya",
-            show_alert=True
+# ================= PROGRESS =================
+def broadcast_keyboard(cid, status):
+    kb = InlineKeyboardMarkup()
+    if status == "running":
+        kb.row(
+            InlineKeyboardButton("⏸ Pause", callback_data=f"bc:pause:{cid}"),
+            InlineKeyboardButton("✖️ Cancel", callback_data=f"bc:cancel:{cid}")
+        )
+    elif status == "paused":
+        kb.row(
+            InlineKeyboardButton("▶️ Resume", callback_data=f"bc:resume:{cid}"),
+            InlineKeyboardButton("✖️ Cancel", callback_data=f"bc:cancel:{cid}")
         )
+    return kb
+
+
+def update_broadcast_progress(cid, rate=None):
+    try:
+        with db_session() as db:
+            row = db.execute(
+                """
+                SELECT status, admin_chat, progress_msg_id, total, sent, failed, blocked
+                FROM broadcast_campaigns
+                WHERE id=%s
+                """,
+                (cid,)
+            ).fetchone()
+            retrying = db.execute(
+                "SELECT COUNT(*) FROM broadcast_recipients WHERE campaign_id=%s AND status='retry'",
+                (cid,)
+            ).fetchone()[0]
+    except Exception as e:
+        print("❌ BROADCAST PROGRESS DB ERROR:", e)
         return
 
-    if page > total_pages:
-        bot.answer_callback_query(
-            c.id,
-            "🚫 Babu wani page a gaba",
-            show_alert=True
-        )
+    if not row:
         return
 
-    # ===== NORMAL EDIT =====
-    bot.answer_callback_query(c.id)
+    status, admin_chat, msg_id, total, sent, failed, blocked = row
+    if not admin_chat or not msg_id:
+        return
 
-    text, kb = build_customer_text(c.from_user.id, page)
+    done = sent + failed + blocked
+    text = (
+        f"📣 BROADCAST #{cid} — {status.upper()}\n\n"
+        f"📤 Sent: {sent}\n"
+        f"🚫 Blocked: {blocked}\n"
+        f"❌ Failed: {failed}\n"
+        f"🔁 Retrying: {retrying}\n"
+        f"⏳ Remaining: {max(total - done, 0)}\n"
+        f"👥 Total: {total}"
+    )
+    if rate:
+        text += f"\n⚡ Speed: {rate:.1f}/s"
 
     try:
         bot.edit_message_text(
             text,
-            c.message.chat.id,
-            c.message.message_id,
-            parse_mode="HTML",
-            reply_markup=kb
+            chat_id=admin_chat,
+            message_id=msg_id,
+            reply_markup=broadcast_keyboard(cid, status)
         )
-    except:
+    except Exception:
         pass
 
 
-# ========= GMAIL TEST COMMAND =========
-import imaplib
-import email
-import html  # Mun shigo da wannan don gyara matsalar alamomin < da >
-from email.header import decode_header
+# ================= ENGINE =================
+def create_broadcast(admin_chat, text, parse_mode=None):
+    progress = bot.send_message(admin_chat, "⏳ Loading... Ana shirya broadcast...")
 
-@bot.message_handler(commands=['g'])
-def gmail_test(msg):
+    with db_session() as db:
+        cid = db.execute(
+            """
+            INSERT INTO broadcast_campaigns (text, parse_mode, admin_chat, progress_msg_id)
+            VALUES (%s, %s, %s, %s)
+            RETURNING id
+            """,
+            (text, parse_mode, admin_chat, progress.message_id)
+        ).fetchone()[0]
 
-    if msg.from_user.id != ADMIN_ID:
-        return
+        # ================= GET ALL USERS (PAID + UNPAID) =================
+        total = db.execute(
+            """
+            INSERT INTO broadcast_recipients (campaign_id, user_id)
+            SELECT %s, u.user_id
+            FROM (SELECT DISTINCT user_id FROM orders) u
+            WHERE NOT EXISTS (
+                SELECT 1 FROM broadcast_blocked_users b
+                WHERE b.user_id = u.user_id
+            )
+            """,
+            (cid,)
+        ).rowcount
 
-    bot.reply_to(
-        msg,
-        "🔍 Checking Gmail..."
-    )
+        db.execute(
+            "UPDATE broadcast_campaigns SET total=%s WHERE id=%s",
+            (total, cid)
+        )
 
-    try:
+    return cid, total
 
-        # ===== LOGIN =====
-        mail = imaplib.IMAP4_SSL(
-            IMAP_SERVER,
-            IMAP_PORT
-        )
 
-        mail.login(
-            EMAIL_USER,
-            EMAIL_PASS
-        )
+def start_broadcast_runner(cid):
+    with BROADCAST_LOCK:
+        t = BROADCAST_RUNNERS.get(cid)
+        if t is not None and t.is_alive():
+            return
+        t = threading.Thread(target=run_broadcast, args=(cid,), daemon=True)
+        BROADCAST_RUNNERS[cid] = t
+        t.start()
 
-        mail.select("inbox")
 
-        # ===== SEARCH =====
-        result, data = mail.search(
-            None,
-            "ALL"
-        )
+def _broadcast_send_one(text, parse_mode, user_id):
+    """(user_id, status, error, retry_after) — status: sent / blocked / retry."""
+    try:
+        with telegram_bulk():
+            bot.send_message(user_id, text, parse_mode=parse_mode)
+        return (user_id, "sent", None, 0)
 
-        mail_ids = data[0].split()
+    # ===== BLOCKED / FORBIDDEN (KARSHE) =====
+    except ApiTelegramException as e:
+        if e.error_code == 403:
+            return (user_id, "blocked", str(e.description)[:300], 0)
+        wait = telegram_retry_after(e, 0) if e.error_code == 429 else 0
+        return (user_id, "retry", str(e)[:300], wait)
 
-        total = len(mail_ids)
+    # timeout / network → a sake gwadawa
+    except Exception as e:
+        return (user_id, "retry", str(e)[:300], 0)
 
-        latest_subject = "N/A"
-        latest_sender = "N/A"
 
-        if mail_ids:
+def _broadcast_claim(cid):
+    with db_session() as db:
+        status = db.execute(
+            "SELECT status FROM broadcast_campaigns WHERE id=%s",
+            (cid,)
+        ).fetchone()
+        if not status or status[0] != "running":
+            return None
+
+        rows = db.execute(
+            """
+            UPDATE broadcast_recipients r
+            SET status='sending', claimed_at=NOW()
+            FROM (
+                SELECT user_id FROM broadcast_recipients
+                WHERE campaign_id=%s
+                  AND (status='pending'
+                       OR (status='retry' AND next_attempt_at <= NOW()))
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            ) p
+            WHERE r.campaign_id=%s AND r.user_id=p.user_id
+            RETURNING r.user_id
+            """,
+            (cid, BROADCAST_BATCH, cid)
+        ).fetchall()
+    return [r[0] for r in rows]
 
-            latest_id = mail_ids[-1]
 
-            result, msg_data = mail.fetch(
-                latest_id,
-                "(RFC822)"
-            )
+def _broadcast_record(cid, results):
+    counts = {"sent": 0, "failed": 0, "blocked": 0, "retry": 0}
 
-            raw_email = msg_data[0][1]
+    with db_session() as db:
+        # 'retry' → attempts+1 da backoff; idan attempts sun kare → 'failed'
+        rows = execute_values(
+            db.cursor(),
+            f"""
+            UPDATE broadcast_recipients r
+            SET attempts = r.attempts + (v.status = 'retry')::int,
+                status = CASE
+                    WHEN v.status <> 'retry' THEN v.status
+                    WHEN r.attempts + 1 >= {int(BROADCAST_MAX_ATTEMPTS)} THEN 'failed'
+                    ELSE 'retry'
+                END,
+                error = v.error,
+                claimed_at = NULL,
+                next_attempt_at = CASE WHEN v.status = 'retry' THEN NOW() + GREATEST(
+                    v.wait, {int(BROADCAST_RETRY_DELAY)} * POWER(2, r.attempts)
+                ) * INTERVAL '1 second' END,
+                sent_at = CASE WHEN v.status = 'retry' THEN r.sent_at ELSE NOW() END
+            FROM (VALUES %s) AS v(campaign_id, user_id, status, error, wait)
+            WHERE r.campaign_id=v.campaign_id AND r.user_id=v.user_id
+            RETURNING r.status
+            """,
+            [(cid, uid, st, err, wait) for uid, st, err, wait in results],
+            fetch=True
+        )
+        for (status,) in rows:
+            counts[status] += 1
 
-            em = email.message_from_bytes(
-                raw_email
+        blocked = [(uid,) for uid, st, _, _ in results if st == "blocked"]
+        if blocked:
+            execute_values(
+                db.cursor(),
+                """
+                INSERT INTO broadcast_blocked_users (user_id)
+                VALUES %s
+                ON CONFLICT (user_id) DO NOTHING
+                """,
+                blocked
             )
 
-            latest_sender = em.get(
-                "From",
-                "Unknown"
-            )
+        db.execute(
+            """
+            UPDATE broadcast_campaigns
+            SET sent=sent+%s, failed=failed+%s, blocked=blocked+%s
+            WHERE id=%s
+            """,
+            (counts["sent"], counts["failed"], counts["blocked"], cid)
+        )
 
-            subject = em.get(
-                "Subject",
-                ""
-            )
 
-            try:
+def _broadcast_try_finish(cid):
+    """
+    True idan campaign ya ƙare (ko babu abin da wannan runner zai yi).
+    """
+    with db_session() as db:
+        # recipients da wani runner ya mutu dasu → a mayar pending
+        db.execute(
+            """
+            UPDATE broadcast_recipients
+            SET status='pending', claimed_at=NULL
+            WHERE campaign_id=%s AND status='sending'
+              AND claimed_at < NOW() - (%s * INTERVAL '1 second')
+            """,
+            (cid, BROADCAST_STALE_SECONDS)
+        )
 
-                decoded = decode_header(
-                    subject
-                )[0][0]
+        left = db.execute(
+            """
+            SELECT COUNT(*) FILTER (WHERE status IN ('pending', 'retry')),
+                   COUNT(*) FILTER (WHERE status='sending')
+            FROM broadcast_recipients
+            WHERE campaign_id=%s
+            """,
+            (cid,)
+        ).fetchone()
 
-                if isinstance(
-                    decoded,
-                    bytes
-                ):
-                    latest_subject = decoded.decode(
-                        errors="ignore"
-                    )
-                else:
-                    latest_subject = decoded
+        if left[0] == 0 and left[1] == 0:
+            db.execute(
+                """
+                UPDATE broadcast_campaigns
+                SET status='done', finished_at=NOW()
+                WHERE id=%s AND status='running'
+                """,
+                (cid,)
+            )
+            return True
 
-            except:
-                latest_subject = subject
+        # akwai pending / retry (ba lokacinsu ba tukuna) ko sending na wani process → jira
+        return False
 
-        mail.logout()
 
-        # ===== GYARAN PARSING ERROR NA TELEGRAM =====
-        # Wannan sashen yana canza < da > su dawo text na gaskiya domin Telegram ya karanta su
-        safe_sender = html.escape(str(latest_sender))
-        safe_subject = html.escape(str(latest_subject))
+def run_broadcast(cid):
+    try:
+        with db_session() as db:
+            row = db.execute(
+                "SELECT text, parse_mode FROM broadcast_campaigns WHERE id=%s",
+                (cid,)
+            ).fetchone()
+        if not row:
+            return
+        text, parse_mode = row
 
-        bot.send_message(
-            msg.chat.id,
-            f"""✅ <b>GMAIL CONNECTED</b>
+        started = time.monotonic()
+        last_progress = 0
+        done_here = 0
 
-📧 <b>Email:</b>
-<code>{EMAIL_USER}</code>
+        with ThreadPoolExecutor(max_workers=BROADCAST_CONCURRENCY) as pool:
+            while True:
+                users = _broadcast_claim(cid)
 
-📥 <b>Total Emails:</b>
-{total}
+                if users is None:
+                    break              # paused / cancelled
 
-👤 <b>Latest Sender:</b>
-{safe_sender}
+                if not users:
+                    if _broadcast_try_finish(cid):
+                        break
+                    time.sleep(5)
+                    continue
 
-📝 <b>Latest Subject:</b>
-{safe_subject}
+                results = list(pool.map(
+                    lambda uid: _broadcast_send_one(text, parse_mode, uid),
+                    users
+                ))
+                _broadcast_record(cid, results)
+                done_here += len(results)
+
+                if time.monotonic() - last_progress >= BROADCAST_PROGRESS_EVERY:
+                    last_progress = time.monotonic()
+                    update_broadcast_progress(
+                        cid,
+                        rate=done_here / max(last_progress - started, 0.001)
+                    )
 
-✅ Gmail login successful.
-""",
-            parse_mode="HTML"
-        )
+        update_broadcast_progress(cid)
 
     except Exception as e:
+        print(f"❌ BROADCAST #{cid} ERROR:", e)
 
-        bot.send_message(
-            msg.chat.id,
-            f"""❌ <b>GMAIL ERROR</b>
+    finally:
+        with BROADCAST_LOCK:
+            BROADCAST_RUNNERS.pop(cid, None)
 
-<code>{html.escape(str(e))}</code>
-""",
-            parse_mode="HTML"
-        )
 
+def resume_broadcasts():
+    try:
+        with db_session() as db:
+            rows = db.execute(
+                "SELECT id FROM broadcast_campaigns WHERE status='running'"
+            ).fetchall()
+    except Exception as e:
+        print("❌ BROADCAST RESUME ERROR:", e)
+        return
 
+    for (cid,) in rows:
+        print(f"▶️ RESUMING BROADCAST #{cid}")
+        start_broadcast_runner(cid)
 
-import threading
-import time
-import imaplib
-import email
-from email.header import decode_header
-import re
-from bs4 import BeautifulSoup
 
-# ========= LIVE DEBUG SCANNER (AMOUNT & REMARK ONLY) =========
+@bot.message_handler(commands=["sending"])
+def send_eid_broadcast(msg):
+
+    if msg.from_user.id != ADMIN_ID:
+        return
 
-def email_live_scanner(bot, uid, start_time):
     try:
-        mail = imaplib.IMAP4_SSL(IMAP_SERVER, IMAP_PORT)
-        mail.login(EMAIL_USER, EMAIL_PASS)
-        mail.select("inbox")
-        _, data = mail.search(None, "ALL")
-        initial_ids = data[0].split()
-        initial_count = len(initial_ids)
-        mail.logout()
+        cid, total = create_broadcast(msg.chat.id, EID_MESSAGE, parse_mode="Markdown")
     except Exception as e:
-        bot.send_message(uid, f"❌ Kuskure gurin haɗuwa da Gmail a karon farko: {str(e)}")
+        print("❌ BROADCAST CREATE ERROR:", e)
+        bot.send_message(msg.chat.id, "❌ Failed to fetch users.")
         return
 
-    bot.send_message(
-        uid, 
-        "🚀 **Live Scanner An Kunna!**\n"
-        "⏱ Zai riƙa duba Gmail kowane **sakan 20** (Sau 15 a cikin minti 5) domin guje wa toshewa (Rate Limit).\n\n"
-        "👉 *Je ka yi transfer yanzu don mu ga saƙon da zai shigo...*", 
-        parse_mode="Markdown"
-    )
-
-    loops = 0
-    max_loops = 15  # 15 loops * 20 seconds = 300 seconds (Minti 5)
-
-    while loops < max_loops:
-        time.sleep(20)  # Bada tazarar sakan 20 domin Gmail ya huta
-        loops += 1
+    if not total:
+        with db_session() as db:
+            db.execute(
+                "UPDATE broadcast_campaigns SET status='done', finished_at=NOW() WHERE id=%s",
+                (cid,)
+            )
+        bot.send_message(msg.chat.id, "❌ No users found.")
+        return
 
-        try:
-            mail = imaplib.IMAP4_SSL(IMAP_SERVER, IMAP_PORT)
-            mail.login(EMAIL_USER, EMAIL_PASS)
-            mail.select("inbox")
+    update_broadcast_progress(cid)
+    start_broadcast_runner(cid)
 
-            _, data = mail.search(None, "ALL")
-            current_ids = data[0].split()
 
-            # Idan an sami sabon sako
-            if len(current_ids) > initial_count:
-                new_emails = current_ids[initial_count:]
+@bot.callback_query_handler(func=lambda c: c.data.startswith("bc:"))
+def broadcast_control(call):
 
-                bot.send_message(uid, f"🔔 An sami sabon sako guda {len(new_emails)}! Gashi nan tafe...")
+    if call.from_user.id != ADMIN_ID:
+        bot.answer_callback_query(call.id)
+        return
 
-                for num in new_emails:
-                    try:
-                        _, msg_data = mail.fetch(num, "(RFC822)")
-                        raw_email = msg_data[0][1]
-                        msg = email.message_from_bytes(raw_email)
-
-                        # ====== CIRO TEXT KO HTML ======
-                        body_text = ""
-                        if msg.is_multipart():
-                            for part in msg.walk():
-                                content_type = part.get_content_type()
-                                if content_type == "text/plain":
-                                    try:
-                                        body_text += part.get_payload(decode=True).decode(errors="ignore")
-                                    except:
-                                        pass
-                                elif content_type == "text/html" and not body_text:
-                                    try:
-                                        html_content = part.get_payload(decode=True).decode(errors="ignore")
-                                        soup = BeautifulSoup(html_content, "html.parser")
-                                        body_text = soup.get_text(separator=" ")
-                                    except:
-                                        pass
-                        else:
-                            try:
-                                raw_body = msg.get_payload(decode=True).decode(errors="ignore")
-                                if "<html>" in raw_body.lower():
-                                    soup = BeautifulSoup(raw_body, "html.parser")
-                                    body_text = soup.get_text(separator=" ")
-                                else:
-                                    body_text = raw_body
-                            except:
-                                pass
-
-                        # ====== PARSE AMOUNT DA REMARK ======
-                        amount = "None"
-                        remark = "None"
-
-                        if body_text:
-                            # Search for Amount (NGN 199.40 or 199.40)
-                            amt_match = re.search(r'(?:NGN|₦|\b)\s*([\d,]+\.\d{2})', body_text, re.IGNORECASE)
-                            if amt_match:
-                                amount = f"NGN {amt_match.group(1)}"
-
-                            # Search for Remark
-                            remark_match = re.search(r'Remark:\s*([^\n\r]+)', body_text, re.IGNORECASE)
-                            if remark_match:
-                                extracted_remark = remark_match.group(1).strip()
-                                if extracted_remark:
-                                    remark = extracted_remark
+    try:
+        _, action, cid = call.data.split(":", 2)
+        cid = int(cid)
+    except:
+        bot.answer_callback_query(call.id, "Invalid.")
+        return
 
-                        # ====== TURA SAKON MAI TSAFTA ======
-                        full_report = (
-                            f"📥 SABON SAKO YA SHIGO GMAIL!\n\n"
-                            f"💰 Amount: {amount}\n"
-                            f"📝 Remark: {remark}\n"
-                            f"━━━━━━━━━━━━━━━━━━━"
-                        )
+    transitions = {
+        "pause": ("paused", ("running",)),
+        "resume": ("running", ("paused",)),
+        "cancel": ("cancelled", ("running", "paused")),
+    }
+    if action not in transitions:
+        bot.answer_callback_query(call.id, "Invalid.")
+        return
 
-                        bot.send_message(uid, full_report)
+    new_status, from_status = transitions[action]
 
-                    except Exception as ev:
-                        bot.send_message(uid, f"⚠️ Kuskure gurin karanta saƙon: {str(ev)}")
+    with db_session() as db:
+        changed = db.execute(
+            """
+            UPDATE broadcast_campaigns
+            SET status=%s,
+                finished_at = CASE WHEN %s='cancelled' THEN NOW() ELSE finished_at END
+            WHERE id=%s AND status = ANY(%s)
+            """,
+            (new_status, new_status, cid, list(from_status))
+        ).rowcount
 
-                mail.logout()
-                bot.send_message(uid, "🛑 Scanner ya tsaya da kansa domin an sami saƙon.")
-                return
+    if not changed:
+        bot.answer_callback_query(call.id, "⚠️ Ba za a iya ba yanzu.")
+        return
 
-            mail.logout()
+    if new_status == "running":
+        start_broadcast_runner(cid)
 
-        except imaplib.IMAP4.error as imap_err:
-            err_msg = str(imap_err).lower()
-            if "limit" in err_msg or "too many" in err_msg or "block" in err_msg:
-                bot.send_message(uid, "⚠️ Gmail Rate Limit Warning! Google sun ce mun cika matsawa. Zan tsaya na sakan 40...")
-                time.sleep(40)
-            else:
-                pass
+    bot.answer_callback_query(call.id, f"✅ {new_status.upper()}")
+    update_broadcast_progress(cid)
 
-        except Exception as e:
-            print("SCANNER NETWORK ERROR:", e)
-            pass
 
-    bot.send_message(uid, "⏱ Minti 5 sun cika! Scanner ya mutu da kansa bayan ya duba sau 15 ba tare da an sami sabon saƙo ba.")
+threading.Thread(target=resume_broadcasts, daemon=True).start()
 
 
 
+# ================= ADMIN SAVE SYSTEM =================
 
+# -------- SAVE --------
+@bot.message_handler(commands=["save"])
+def save_note(msg):
 
-@bot.message_handler(commands=['c'])
-def handle_debug_c_command(msg):
-    uid = msg.from_user.id
-    
-    if str(uid) != str(ADMIN_ID):
-        bot.send_message(uid, "❌ Wannan command ɗin na Admin ne kawai.")
+    if msg.from_user.id != ADMIN_ID:
         return
-        
-    threading.Thread(
-        target=email_live_scanner,
-        args=(bot, uid, time.time()),
-        daemon=True
-    ).start()
-
 
-# ================= ADMIN SALLAH GIFT =================
-@bot.message_handler(commands=["sallah"])
-def send_sallah_gift(msg):
-
-    admin_id = msg.from_user.id
+    # REMOVE COMMAND ONLY (keep multi-line)
+    text = msg.text.replace("/save", "", 1).strip()
 
-    if admin_id != ADMIN_ID:
+    if not text:
+        bot.reply_to(msg, "❌ Rubuta abin da zaka ajiye.")
         return
 
     try:
-        parts = msg.text.replace("/sallah", "").strip().split(",")
-
-        if len(parts) != 2:
-            bot.reply_to(msg, "Usage: /sallah user_id, amount\nExample: /sallah 123456789, 300")
-            return
+        with db_session() as db:
+            db.execute(
+                "INSERT INTO admin_notes (admin_id, content) VALUES (%s,%s)",
+                (msg.from_user.id, text)
+            )
+    except:
+        bot.reply_to(msg, "❌ Failed.")
+        return
 
-        user_id = int(parts[0].strip())
-        amount = int(parts[1].strip())
+    bot.reply_to(msg, "✅ An ajiye.")
 
-        if amount <= 0:
-            bot.reply_to(msg, "❌ Invalid amount.")
-            return
 
-    except:
-        bot.reply_to(msg, "❌ Invalid format.\nUse: /sallah 123456789, 300")
-        return
+# ========= GMAIL CHECKER (PALMPAY HTML PARSER & REMARK FIX) =========
+# Session ɗaya na IMAP yana zama a buɗe: login sau ɗaya, sannan IDLE
+# domin Gmail ya sanar da mu da zarar sabon sako ya shigo (ba sai mun
+# yi login kowane sakan 20 ba). Idan server bai da IDLE → polling.
+import html
+import select
+import ssl
+from email_extractor import extract_payment, extract_stats_text
+
+GMAIL_IDLE_SECONDS = 540      # Gmail yana yanke IDLE bayan ~10 min → sake IDLE kafin nan
+GMAIL_POLL_SECONDS = 20       # fallback idan babu IDLE
+GMAIL_MAX_BACKOFF = 300
+
+# UID sync: muna tuna UID na karshe da muka gani (mail_sync_state) →
+# kowane zagaye muna ɗauko sababbin UID kawai, ba "search ALL" ba.
+GMAIL_FETCH_BATCH = int(os.getenv("GMAIL_FETCH_BATCH", "25"))
+GMAIL_INITIAL_BACKLOG = int(os.getenv("GMAIL_INITIAL_BACKLOG", "15"))
+GMAIL_BODY_PEEK_BYTES = int(os.getenv("GMAIL_BODY_PEEK_BYTES", "65536"))
+# Sakon da extraction dinsa ya fadi ana sake gwadawa (cursor ba ya wuce shi)
+# har sau nawa kafin a yi logging processed=False a wuce
+GMAIL_EXTRACT_ATTEMPTS = int(os.getenv("GMAIL_EXTRACT_ATTEMPTS", "5"))
+
+# Headers da jikin sako kawai (ba attachments ba); PEEK → ba a sa \Seen ba
+GMAIL_FETCH_PARTS = (
+    "(UID BODY.PEEK[HEADER.FIELDS (FROM SUBJECT DATE MIME-VERSION CONTENT-TYPE CONTENT-TRANSFER-ENCODING)] "
+    f"BODY.PEEK[TEXT]<0.{GMAIL_BODY_PEEK_BYTES}>)"
+)
 
-    wallet_conn = get_wallet_conn()
-    wallet_cur = wallet_conn.cursor()
+GMAIL_CHECKER_RUNNING = False
 
-    try:
-        # ================= CHECK ADMIN BALANCE =================
-        wallet_cur.execute(
-            "SELECT balance FROM wallet_balance WHERE user_id=%s",
-            (admin_id,)
-        )
-        row = wallet_cur.fetchone()
+register_stats_section("📧 EMAIL EXTRACTOR", extract_stats_text)
 
-        admin_balance = int(row[0]) if row else 0
 
-        if admin_balance < amount:
-            bot.reply_to(msg, f"❌ Insufficient balance.\nYour Balance: ₦{admin_balance}")
-            return
+def _imap_rate_limited(err):
+    err = str(err).lower()
+    return "limit" in err or "too many" in err or "block" in err
 
-        # ================= GET USER ORDERS =================
-        conn = get_conn()
-        cur = conn.cursor()
 
-        cur.execute(
-            "SELECT COUNT(*) FROM orders WHERE user_id=%s AND paid=1",
-            (user_id,)
-        )
-        order_row = cur.fetchone()
-        total_orders = order_row[0] if order_row else 0
+def _imap_response_int(mail, code):
+    # SELECT yana dawo da "* OK [UIDVALIDITY 123]" → imaplib yana ajiye shi
+    try:
+        _, data = mail.response(code)
+        if data and data[-1]:
+            return int(data[-1])
+    except Exception:
+        pass
+    return None
 
-        cur.close()
-        conn.close()
 
-        # ================= DEDUCT ADMIN =================
-        wallet_cur.execute(
-            """
-            UPDATE wallet_balance
-            SET balance = balance - %s,
-                updated_at = NOW()
-            WHERE user_id=%s
-            """,
-            (amount, admin_id)
-        )
+def _imap_has_data(mail):
+    """
+    True idan akwai bytes da za a karanta ba tare da jira ba — har da
+    wadanda imaplib ya riga ya ajiye a mail.file buffer (select bai gani).
+    """
+    sock = mail.sock
+    timeout = sock.gettimeout()
+    sock.setblocking(False)
+    try:
+        # peek: buffer idan akwai; in ba haka ba recv daya (non-blocking)
+        return bool(mail.file.peek(1))
+    except (ssl.SSLWantReadError, BlockingIOError):
+        return False
+    finally:
+        sock.settimeout(timeout)
 
-        # ================= CREDIT USER =================
-        wallet_cur.execute(
-            """
-            INSERT INTO wallet_balance (user_id, balance)
-            VALUES (%s,%s)
-            ON CONFLICT (user_id)
-            DO UPDATE SET
-            balance = wallet_balance.balance + EXCLUDED.balance,
-            updated_at = NOW()
-            """,
-            (user_id, amount)
-        )
 
-        import time
-        ref = f"sallah_{admin_id}_{int(time.time())}"
+_FETCH_START_RE = re.compile(rb"^\d+ \(")
+_FETCH_UID_RE = re.compile(rb"UID (\d+)")
 
-        # ================= SAVE TRANSACTION =================
-        wallet_cur.execute(
-            """
-            INSERT INTO wallet_transactions
-            (user_id, amount, type, reference, description)
-            VALUES (%s,%s,'sallah',%s,'Happy Sallah Gift')
-            """,
-            (user_id, amount, ref)
-        )
 
-        wallet_conn.commit()
+def _parse_uid_fetch(data):
+    """
+    UID FETCH response → [(uid, email.message.Message)], an jera da UID.
+    """
+    found = []
+    cur = None
 
-        # ================= MESSAGE TO USER =================
-        try:
-            bot.send_message(
-                user_id,
-                f"""🌙✨ Barka da Sallah!
+    for item in data or []:
+        if isinstance(item, tuple):
+            desc, payload = item[0], item[1]
+            if _FETCH_START_RE.match(desc):
+                cur = {"uid": None, "header": b"", "text": b""}
+                found.append(cur)
+            if cur is None:
+                continue
+        elif isinstance(item, bytes) and cur is not None:
+            desc, payload = item, None
+        else:
+            continue
 
-🎁 Wannan ita ce kyautarka daga Algaita Movie Store saboda goyon bayan da ka nuna wajen siyan fina-finai a wurinmu ❤️
+        m = _FETCH_UID_RE.search(desc)
+        if m and cur["uid"] is None:
+            cur["uid"] = int(m.group(1))
+        if payload is None:
+            continue
+        if b"HEADER" in desc:
+            cur["header"] = payload
+        elif b"TEXT" in desc:
+            cur["text"] = payload
+
+    messages = []
+    for f in found:
+        if not f["uid"]:
+            continue
+        header = f["header"]
+        if header and not header.endswith(b"\r\n\r\n"):
+            header = header.rstrip(b"\r\n") + b"\r\n\r\n"
+        messages.append((f["uid"], email.message_from_bytes(header + f["text"])))
 
-💰 An saka maka kyauta a wallet ɗinka — gwargwadon yadda ka siya fim a wurinmu.
-👉 Ka duba wallet ɗinka an tura maka kuɗinka.
+    messages.sort(key=lambda m: m[0])
+    return messages
 
-📦 Your Orders: {total_orders}
-💰 Kyautarka: ₦{amount}
 
-Muna godiya sosai 🙏  
-Za mu ci gaba da baka kyauta a duk lokacin da muka raba 🎬🔥
+def fetch_new_uids(mail, last_uid):
+    """
+    UID da suka fi last_uid. Lura: "N:*" yana dawo da UID mafi girma ko da
+    ya yi ƙasa da N → shi ya sa muke tacewa.
+    """
+    _, data = mail.uid("SEARCH", None, f"UID {int(last_uid) + 1}:*")
+    if not data or not data[0]:
+        return []
+    return sorted(u for u in (int(x) for x in data[0].split()) if u > last_uid)
 
-👉 Ka iya amfani da wannan kuɗin domin siyan fina-finai a bot ɗinmu.
 
-🙏 Muna fatan duk lokacin da kake buƙatar wani fim, ba za ka manta da Algaita Movie Store ba.
+def fetch_messages_by_uid(mail, uids):
+    if not uids:
+        return []
+    uid_set = ",".join(str(u) for u in uids)
+    _, data = mail.uid("FETCH", uid_set, GMAIL_FETCH_PARTS)
+    return _parse_uid_fetch(data)
 
-— Algaita Movie Store  
-🤖 @CEOalgaitabot"""
-            )
-        except:
-            pass
 
-        # ================= ADMIN CONFIRM =================
-        bot.reply_to(
-            msg,
-            f"""✅ An turawa user
+def load_mail_cursor(session):
+    """
+    last_uid na mailbox. Idan babu cursor ko UIDVALIDITY ya canza (Gmail ya
+    sake lambobin UID) → a fara daga sakonni GMAIL_INITIAL_BACKLOG na karshe.
+    """
+    with db_session() as db:
+        row = db.execute(
+            "SELECT uidvalidity, last_uid FROM mail_sync_state WHERE mailbox=%s",
+            (session.mailbox,)
+        ).fetchone()
 
-🆔 <code>{user_id}</code>
-💰 ₦{amount}""",
-            parse_mode="HTML"
-        )
+    if row and session.uidvalidity is not None and int(row[0]) == session.uidvalidity:
+        return int(row[1])
 
-    except Exception:
-        wallet_conn.rollback()
-        bot.reply_to(msg, "❌ Failed to send gift.")
+    if row:
+        print(f"📭 UIDVALIDITY ya canza ({row[0]} → {session.uidvalidity}), an sake cursor")
 
-    finally:
-        wallet_cur.close()
-        wallet_conn.close()
+    uidnext = session.uidnext or 1
+    last_uid = max(uidnext - 1 - GMAIL_INITIAL_BACKLOG, 0)
+    save_mail_cursor(session, last_uid)
+    return last_uid
 
 
-# ================= EID BROADCAST SYSTEM =================
-from telebot.apihelper import ApiTelegramException
-import time
+def save_mail_cursor(session, last_uid, db=None):
+    if session.uidvalidity is None:
+        return
+    if db is None:
+        with db_session() as db:
+            return save_mail_cursor(session, last_uid, db=db)
 
-EID_MESSAGE = """🌙✨ *BARKA DA BABBAR SALLAH* ✨🌙
- 
-Assalamu Alaikum dear customer 🤍
- 
-A wannan lokaci na Babbar Sallah, muna mika godiya ta musamman gareku bisa goyon baya da yarda da kuka nuna mana ta hanyar siyan fina-finai a bot ɗinmu. Allah Ya saka muku da alkhairi 🤲
- 
-Muna yi muku fatan Sallah mai albarka, lafiya, farin ciki da tsawon rayuwa domin ganin shekarun da ke tafe. Allah Ya gafarta mana baki ɗaya, Ya karɓi ibadunmu, Ya kuma sa mu ci albarkacin wannan rana mai albarka, Ameen 🤲
- 
-Mun gode da kasancewa tare da mu 💖 *Eid Mubarak!* 🐐🎉
-"""
+    db.execute("""
+        INSERT INTO mail_sync_state (mailbox, uidvalidity, last_uid, updated_at)
+        VALUES (%s, %s, %s, NOW())
+        ON CONFLICT (mailbox) DO UPDATE
+        SET uidvalidity=EXCLUDED.uidvalidity,
+            last_uid=EXCLUDED.last_uid,
+            updated_at=NOW()
+    """, (session.mailbox, session.uidvalidity, last_uid))
 
 
-@bot.message_handler(commands=["sending"])
-def send_eid_broadcast(msg):
+class GmailSession:
+    """
+    Persistent IMAP session tare da IDLE, reconnect (backoff) da
+    polling fallback.
+    """
 
-    if msg.from_user.id != ADMIN_ID:
-        return
+    def __init__(self, mailbox="inbox"):
+        self.mailbox = mailbox
+        self.mail = None
+        self.supports_idle = False
+        self.failures = 0
+        self.uidvalidity = None
+        self.uidnext = None
+        self.retries = {}        # email key -> extraction attempts da suka fadi
+
+    def connect(self):
+        self.close()
+        mail = imaplib.IMAP4_SSL(IMAP_SERVER, IMAP_PORT)
+        mail.login(EMAIL_USER, EMAIL_PASS)
+        mail.select(self.mailbox)
+        self.uidvalidity = _imap_response_int(mail, "UIDVALIDITY")
+        self.uidnext = _imap_response_int(mail, "UIDNEXT")
+        self.mail = mail
+        self.supports_idle = "IDLE" in mail.capabilities
+        self.failures = 0
+        return mail
+
+    def ensure(self):
+        """
+        Yana dawo da session mai rai; idan ya mutu ana sake haɗawa da backoff.
+        """
+        while self.mail is None:
+            try:
+                self.connect()
+            except Exception as e:
+                self.failures += 1
+                delay = min(2 ** self.failures, GMAIL_MAX_BACKOFF)
+                if _imap_rate_limited(e):
+                    delay = max(delay, 60)
+                print(f"GMAIL LOGIN ERROR (retry in {delay}s):", e)
+                time.sleep(delay)
+        return self.mail
+
+    def close(self):
+        if self.mail is None:
+            return
+        try:
+            self.mail.logout()
+        except Exception:
+            pass
+        self.mail = None
 
-    bot.reply_to(msg, "⏳ Loading... Ana tura sakonni...")
+    def wait_for_mail(self, timeout=GMAIL_IDLE_SECONDS):
+        """
+        Jira har sabon sako ya shigo ko timeout. True = a duba inbox.
+        """
+        if not self.supports_idle:
+            time.sleep(GMAIL_POLL_SECONDS)
+            return True
 
-    conn = get_conn()
-    cur = conn.cursor()
+        try:
+            return self._idle(timeout)
+        except Exception as e:
+            print("GMAIL IDLE ERROR:", e)
+            self.close()
+            return True
+
+    def _idle(self, timeout):
+        # imaplib bashi da IDLE → RFC 2177 da hannu
+        mail = self.mail
+        tag = mail._new_tag()
+        mail.send(tag + b" IDLE\r\n")
+
+        line = mail.readline()
+        if not line.startswith(b"+"):
+            raise imaplib.IMAP4.error(f"IDLE rejected: {line!r}")
+
+        sock = mail.sock
+        deadline = time.monotonic() + timeout
+        got_new = False
+
+        while not got_new:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
 
-    try:
-        # ================= GET ALL USERS (PAID + UNPAID) =================
-        cur.execute("""
-            SELECT DISTINCT user_id FROM orders
-        """)
-        rows = cur.fetchall()
+            # EXISTS zai iya zuwa tare da "+ idling" → yana mail.file buffer
+            ready = _imap_has_data(mail)
+            if not ready:
+                r, _, _ = select.select([sock], [], [], remaining)
+                ready = bool(r)
+            if not ready:
+                break
 
-        users = [r[0] for r in rows]
+            line = mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("connection closed during IDLE")
+            if b"EXISTS" in line or b"RECENT" in line:
+                got_new = True
 
-    except:
-        bot.send_message(msg.chat.id, "❌ Failed to fetch users.")
-        return
+        mail.send(b"DONE\r\n")
+        while True:
+            line = mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("connection closed ending IDLE")
+            if line.startswith(tag):
+                break
 
-    finally:
-        cur.close()
-        conn.close()
+        return got_new
 
-    if not users:
-        bot.send_message(msg.chat.id, "❌ No users found.")
-        return
 
-    sent = 0
-    failed = 0
+# ===== REMARK / AMOUNT MATCHING =====
+# Maimakon mu loda duk pending orders mu gwada kowanne a kan kowane email,
+# muna ciro "tokens" daga email sau ɗaya → index na UPPER(remark) ya nemo su.
+G_REMARK_MAX_TOKENS = 400
 
-    # ================= SAFE SEND FUNCTION =================
-    def safe_send(user_id):
+_REMARK_TOKEN_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9_\-]{2,63}")
 
-        while True:
-            try:
-                bot.send_message(user_id, EID_MESSAGE, parse_mode="Markdown")
-                return True
 
-            except ApiTelegramException as e:
+def ensure_g_orders_remark_index():
+    with db_session() as db:
+        db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_g_orders_pending_remark
+            ON g_orders (UPPER(TRIM(remark)))
+            WHERE paid=0 AND status='pending'
+        """)
 
-                # ===== RATE LIMIT =====
-                if e.error_code == 429:
-                    try:
-                        retry = int(e.result_json["parameters"]["retry_after"])
-                    except:
-                        retry = 30
 
-                    time.sleep(retry)
-                    continue
+ensure_g_orders_remark_index()
 
-                # ===== BLOCKED / FORBIDDEN =====
-                elif e.error_code == 403:
-                    return False
 
-                else:
-                    time.sleep(3)
-                    return False
+def remark_candidates(text, remark=None):
+    """
+    Duk abin da zai iya zama remark a cikin email (UPPER, ba maimaici).
+    """
+    seen = set()
 
-            except:
-                time.sleep(3)
-                return False
+    if remark:
+        value = remark.strip().upper()
+        seen.add(value)
+        seen.update(value.split())
 
-    # ================= LOOP =================
-    for user_id in users:
+    for m in _REMARK_TOKEN_RE.finditer(text):
+        seen.add(m.group(0).upper())
+        if len(seen) >= G_REMARK_MAX_TOKENS:
+            break
 
-        ok = safe_send(user_id)
+    return list(seen)
 
-        if ok:
-            sent += 1
-        else:
-            failed += 1
 
-        time.sleep(2)  # SAFE DELAY
+def pick_g_order(orders, claimed, paid_amount, found):
+    """
+    Order na farko (tsoho zuwa sabo) da remark dinsa ya fito a email kuma
+    kudin ya isa. orders: (id, user_id, amount, remark, UPPER(TRIM(remark))).
+    """
+    for order_id, user_id, expected_amount, remark, remark_key in orders:
+        if order_id in claimed or not remark_key or not found(remark_key):
+            continue
+        # Tabbatar da biyan kudi idan ya yi daidai da farashin fim
+        if paid_amount >= expected_amount or (expected_amount - paid_amount) <= 5:
+            return (order_id, user_id, expected_amount, remark)
+    return None
+
+
+def has_pending_g_orders():
+    with db_session() as db:
+        return db.execute("""
+            SELECT 1
+            FROM g_orders
+            WHERE paid=0
+            AND status='pending'
+            AND created_at >= NOW() - INTERVAL '20 minutes'
+            LIMIT 1
+        """).fetchone() is not None
 
-    # ================= FINAL REPORT =================
-    bot.send_message(
-        msg.chat.id,
-        f"""✅ BROADCAST COMPLETED
 
-📤 Sent: {sent}
-❌ Failed: {failed}
-👥 Total: {len(users)}
-"""
-    )
+def process_g_email_batch(session, messages, new_last_uid):
+    """
+    Batch ɗaya na sakonni → transaction ɗaya: dedupe (= ANY), nemo orders,
+    email logs (multi-row insert), mark paid da cursor duk tare.
+    Round trips ba sa ƙaruwa da yawan sakonni.
 
+    Idan extraction ya fadi, cursor yana tsayawa kafin UID din (a sake
+    dauko shi a sync na gaba) har GMAIL_EXTRACT_ATTEMPTS. Yana dawo da
+    cursor da aka ajiye.
+    """
+    keyed = [(uid, f"{session.uidvalidity}:{uid}", msg) for uid, msg in messages]
+    paid = []
+    titles = {}
+    retry_uid = None
+
+    with db_session() as db:
+        # ===== DUPLICATE CHECK (QUERY ƊAYA) =====
+        seen = set()
+        if keyed:
+            rows = db.execute(
+                "SELECT email_uid FROM g_email_logs WHERE email_uid = ANY(%s)",
+                ([key for _, key, _ in keyed],)
+            ).fetchall()
+            seen = {r[0] for r in rows}
+
+        # ===== ZAKULO AMOUNT/REMARK (email_extractor: regex → soup last resort) =====
+        emails = []
+        logs = []
+        all_candidates = set()
+        for uid, key, msg in keyed:
+            if key in seen:
+                continue
+            try:
+                info = extract_payment(msg)
+            except Exception as e:
+                attempts = session.retries.get(key, 0) + 1
+                print(f"EMAIL PROCESS ERROR ({attempts}/{GMAIL_EXTRACT_ATTEMPTS}):", key, e)
+                if attempts < GMAIL_EXTRACT_ATTEMPTS:
+                    # Kada a rasa biya: ba log, cursor zai tsaya kafin wannan UID
+                    session.retries[key] = attempts
+                    retry_uid = uid if retry_uid is None else min(retry_uid, uid)
+                    continue
+                session.retries.pop(key, None)
+                logs.append((key, msg.get("From", ""), msg.get("Subject", ""), None, None, False))
+                try:
+                    bot.send_message(ADMIN_ID, f"⚠️ Email <code>{key}</code> bai karantu ba bayan sau {attempts}: {html.escape(str(e))}", parse_mode="HTML")
+                except:
+                    pass
+                continue
+            session.retries.pop(key, None)
+            candidates = set(remark_candidates(info.text, info.remark))
+            all_candidates.update(candidates)
+            emails.append((key, info, candidates))
+
+        # ===== NEMO ORDERS TA REMARK (INDEX, QUERY ƊAYA) =====
+        orders = []
+        if all_candidates:
+            orders = db.execute("""
+                SELECT id, user_id, amount, remark, UPPER(TRIM(remark))
+                FROM g_orders
+                WHERE paid=0
+                AND status='pending'
+                AND UPPER(TRIM(remark)) = ANY(%s)
+                ORDER BY created_at
+            """, (list(all_candidates),)).fetchall()
+
+        claimed = set()
+        fallback_orders = None
+        for key, info, candidates in emails:
+            paid_amount = info.amount or 0
+            matched = pick_g_order(orders, claimed, paid_amount, candidates.__contains__)
+
+            if matched is None:
+                # Babu token da ya dace → tsohon substring check. Remark mai
+                # '/', '.', space ko kasa da haruffa 3 ba zai fito a tokens ba.
+                if fallback_orders is None:
+                    fallback_orders = db.execute("""
+                        SELECT id, user_id, amount, remark, UPPER(TRIM(remark))
+                        FROM g_orders
+                        WHERE paid=0
+                        AND status='pending'
+                        ORDER BY created_at
+                    """).fetchall()
+                upper_text = info.text.upper()
+                matched = pick_g_order(fallback_orders, claimed, paid_amount, lambda k: k in upper_text)
+
+            if matched:
+                claimed.add(matched[0])
+                paid.append(matched)
+                logs.append((key, info.sender, info.subject, matched[3], matched[2], True))
+            else:
+                logs.append((key, info.sender, info.subject, None, None, False))
 
+        # ===== SAVE EMAIL LOGS =====
+        if logs:
+            execute_values(
+                db.cursor(),
+                """
+                INSERT INTO g_email_logs (email_uid, sender, subject, remark, amount, processed)
+                VALUES %s
+                ON CONFLICT (email_uid) DO NOTHING
+                """,
+                logs
+            )
 
-# ================= ADMIN SAVE SYSTEM =================
+        # ===== MARK ORDERS AS PAID + DAUKO FINA-FINAI =====
+        if paid:
+            rows = db.execute("""
+                UPDATE g_orders
+                SET paid=1, status='success', paid_at=NOW()
+                WHERE id = ANY(%s)
+                AND paid=0
+                RETURNING id
+            """, ([m[0] for m in paid],)).fetchall()
+            updated = {r[0] for r in rows}
+            paid = [m for m in paid if m[0] in updated]
+            rollup_paid_orders(db.cursor(), updated, source="g_orders")
+
+        if paid:
+            rows = db.execute("""
+                SELECT gi.order_id, i.title, i.group_key
+                FROM g_order_items gi
+                JOIN items i ON i.id=gi.item_id
+                WHERE gi.order_id = ANY(%s)
+                ORDER BY gi.id
+            """, ([m[0] for m in paid],)).fetchall()
+            for order_id, title, group_key in rows:
+                titles.setdefault(order_id, {}).setdefault(group_key or title, title)
+
+        if retry_uid is not None:
+            new_last_uid = min(new_last_uid, retry_uid - 1)
+        save_mail_cursor(session, new_last_uid, db=db)
+
+    # Bayan commit → sanarwa
+    for order_id, user_id, amount, remark in paid:
+        try:
+            notify_g_payment(order_id, user_id, amount, remark, ", ".join(titles.get(order_id, {}).values()))
+        except Exception as e:
+            print("G_PAYMENT NOTIFY ERROR:", order_id, e)
 
-# -------- SAVE --------
-@bot.message_handler(commands=["save"])
-def save_note(msg):
+    return new_last_uid
 
-    if msg.from_user.id != ADMIN_ID:
-        return
 
-    # REMOVE COMMAND ONLY (keep multi-line)
-    text = msg.text.replace("/save", "", 1).strip()
+def notify_g_payment(order_id, user_id, amount, remark, titles_text):
+    # Goge tsohon sakon countdown
+    if order_id in G_ORDER_MESSAGES:
+        chat_id, message_id = G_ORDER_MESSAGES[order_id]
+        try:
+            bot.delete_message(chat_id, message_id)
+        except:
+            pass
+        del G_ORDER_MESSAGES[order_id]
 
-    if not text:
-        bot.reply_to(msg, "❌ Rubuta abin da zaka ajiye.")
-        return
+    # ===== TURA WA USER KAYA =====
+    kb = InlineKeyboardMarkup()
+    kb.add(InlineKeyboardButton("⬇️ DOWNLOAD NOW", callback_data=f"g_deliver:{order_id}"))
 
-    conn = get_conn()
-    cur = conn.cursor()
+    bot.send_message(
+        user_id,
+        f"🎉 <b>PAYMENT SUCCESSFUL</b>\n\n🎬 <b>Items:</b>\n{html.escape(titles_text)}\n\n🗃 <b>Order ID:</b>\n<code>{order_id}</code>\n\n💰 <b>Amount Paid:</b>\n₦{amount}\n\n⬇️ Click button below to download.",
+        parse_mode="HTML",
+        reply_markup=kb
+    )
 
+    # ===== NOTIFY ADMIN (KAMAR YADDA /c YAKE YI) =====
     try:
-        cur.execute(
-            "INSERT INTO admin_notes (admin_id, content) VALUES (%s,%s)",
-            (msg.from_user.id, text)
-        )
-        conn.commit()
+        admin_report = (
+            f"🔔 <b>[GMAIL ALERT] An samu sabon sako!</b>\n\n"
+            f"✅ <b>G_PAYMENT SUCCESSFUL</b>\n"
+            f"👤 User ID: <code>{user_id}</code>\n"
+            f"📦 Order: <code>{order_id}</code>\n"
+            f"💰 Amount: ₦{amount}\n"
+            f"📝 Remark: <code>{remark}</code>\n"
+            f"🎬 Films: {titles_text}"
+        )
+        bot.send_message(ADMIN_ID, admin_report, parse_mode="HTML")
+    except:
+        pass
 
-        bot.reply_to(msg, "✅ An ajiye.")
 
-    except:
-        conn.rollback()
-        bot.reply_to(msg, "❌ Failed.")
+def sync_new_g_emails(session):
+    """
+    Sarrafa sababbin sakonni tun daga cursor. Cursor yana ci gaba ne a cikin
+    transaction ɗaya da logs → idan wani abu ya faɗi, batch ɗin gaba ɗaya
+    za a sake shi a zagaye na gaba.
+    """
+    mail = session.mail
+    last_uid = load_mail_cursor(session)
 
-    finally:
-        cur.close()
-        conn.close()
+    while True:
+        uids = fetch_new_uids(mail, last_uid)
+        if not uids:
+            return
 
+        batch = uids[:GMAIL_FETCH_BATCH]
+        messages = fetch_messages_by_uid(mail, batch)
 
+        # UID da aka goge kafin FETCH ba sa dawowa → cursor ya wuce su ma
+        saved = process_g_email_batch(session, messages, batch[-1])
+        if saved != batch[-1]:
+            # sako ya kasa → a sake daga nan a sync na gaba (ba a tsallake shi ba)
+            return
 
-# ========= GMAIL CHECKER (PALMPAY HTML PARSER & REMARK FIX) =========
-import html
-from bs4 import BeautifulSoup  # Tabbatar ka yi: pip install beautifulsoup4
+        last_uid = batch[-1]
+        if len(uids) <= GMAIL_FETCH_BATCH:
+            return
 
-GMAIL_CHECKER_RUNNING = False
 
 def start_gmail_checker():
     global GMAIL_CHECKER_RUNNING
@@ -5090,245 +8857,60 @@ def start_gmail_checker():
         except:
             pass
 
-        while True:
-            try:
-                conn = get_conn()
-                cur = conn.cursor()
-                cur.execute("""
-                    SELECT id, user_id, remark, amount
-                    FROM g_orders
-                    WHERE paid=0
-                    AND status='pending'
-                    AND created_at >= NOW() - INTERVAL '20 minutes'
-                    LIMIT 1
-                """)
-                pending = cur.fetchone()
-
-                if not pending:
-                    cur.close()
-                    conn.close()
-                    GMAIL_CHECKER_RUNNING = False
-                    try:
-                        bot.send_message(ADMIN_ID, "💤 <b>Gmail Checker:</b> An kashe tsarin tunda babu oda.")
-                    except:
-                        pass
-                    return
-                
-                cur.close()
-                conn.close()
+        session = GmailSession()
 
-                # ===== LOGIN GMAIL =====
+        try:
+            while True:
                 try:
-                    mail = imaplib.IMAP4_SSL(IMAP_SERVER, IMAP_PORT)
-                    mail.login(EMAIL_USER, EMAIL_PASS)
-                    mail.select("inbox")
-                except Exception as e:
-                    print("GMAIL LOGIN ERROR:", e)
-                    time.sleep(20)
-                    continue
-
-                result, data = mail.search(None, "ALL")
-                mail_ids = data[0].split()
+                    if not LEADER.is_leader():
+                        # wani process ne leader yanzu → shi zai riƙe IMAP
+                        GMAIL_CHECKER_RUNNING = False
+                        return
 
-                # Duba sakonni 15 na karshe
-                for num in reversed(mail_ids[-15:]):
-                    try:
-                        result, msg_data = mail.fetch(num, "(RFC822)")
-                        raw_email = msg_data[0][1]
-                        msg = email.message_from_bytes(raw_email)
-                        email_uid = str(num.decode())
-
-                        # ===== DUPLICATE CHECK =====
-                        conn = get_conn()
-                        cur = conn.cursor()
-                        cur.execute("SELECT 1 FROM g_email_logs WHERE email_uid=%s", (email_uid,))
-                        if cur.fetchone():
-                            cur.close()
-                            conn.close()
-                            continue
-
-                        sender = msg.get("From", "")
-                        subject = msg.get("Subject", "")
-                        decoded_subject = ""
+                    if not has_pending_g_orders():
+                        GMAIL_CHECKER_RUNNING = False
                         try:
-                            decoded = decode_header(subject)[0][0]
-                            if isinstance(decoded, bytes):
-                                decoded_subject = decoded.decode(errors="ignore")
-                            else:
-                                decoded_subject = decoded
+                            bot.send_message(ADMIN_ID, "💤 <b>Gmail Checker:</b> An kashe tsarin tunda babu oda.")
                         except:
-                            decoded_subject = subject
-
-                        # ===== ZAKULO RUBUTU DAGA HTML KO PLAIN TEXT =====
-                        body_content = ""
-                        if msg.is_multipart():
-                            for part in msg.walk():
-                                content_type = part.get_content_type()
-                                # Idan sako ne na HTML (Kamar na Palmpay) ko Plain Text, a dauko shi
-                                if content_type in ["text/plain", "text/html"]:
-                                    try:
-                                        raw_payload = part.get_payload(decode=True).decode(errors="ignore")
-                                        if content_type == "text/html":
-                                            # Wanke lambobin HTML da BeautifulSoup don ya zama plain text
-                                            soup = BeautifulSoup(raw_payload, "html.parser")
-                                            body_content += "\n" + soup.get_text(separator=" ")
-                                        else:
-                                            body_content += "\n" + raw_payload
-                                    except:
-                                        pass
-                        else:
-                            content_type = msg.get_content_type()
-                            try:
-                                raw_payload = msg.get_payload(decode=True).decode(errors="ignore")
-                                if content_type == "text/html":
-                                    soup = BeautifulSoup(raw_payload, "html.parser")
-                                    body_content = soup.get_text(separator=" ")
-                                else:
-                                    body_content = raw_payload
-                            except:
-                                pass
-
-                        full_text = decoded_subject + "\n" + body_content
-
-                        # ===== DUBA PENDING ORDERS DAGA DATABASE =====
-                        cur.execute("""
-                            SELECT id, user_id, amount, remark
-                            FROM g_orders
-                            WHERE paid=0
-                            AND status='pending'
-                        """)
-                        orders = cur.fetchall()
-                        matched = None
-
-                        for o in orders:
-                            order_id, user_id, expected_amount, remark = o
-
-                            # Gwada kowanne Remark da manyan bakake da kanana domin tsaro (.upper())
-                            if remark and remark.strip().upper() in full_text.upper():
-                                
-                                # Regex na musamman don Palmpay: NGN 99.70 ko ₦99.70 ko Amount: 99
-                                amount_match = re.search(r'(?:Amount|Received Amount|NGN|₦)\s*:?\s*₦?\s*([\d,]+(?:\.\d+)?)', full_text, re.IGNORECASE)
-                                if not amount_match:
-                                    amount_match = re.search(r'([\d,]+(?:\.\d+)?)\s*(?:NGN|Naira)', full_text, re.IGNORECASE)
-
-                                paid_amount = 0
-                                if amount_match:
-                                    try:
-                                        raw_amt = amount_match.group(1).replace(",", "")
-                                        paid_amount = int(float(raw_amt))
-                                    except:
-                                        paid_amount = 0
-
-                                # Tabbatar da biyan kudi idan ya yi daidai da farashin fim
-                                if paid_amount >= expected_amount or (expected_amount - paid_amount) <= 5:
-                                    matched = (order_id, user_id, expected_amount, remark)
-                                    break
-
-                        # ===== SAVE EMAIL LOG =====
-                        cur.execute("""
-                            INSERT INTO g_email_logs (email_uid, sender, subject, processed)
-                            VALUES (%s, %s, %s, FALSE)
-                            ON CONFLICT (email_uid) DO NOTHING
-                        """, (email_uid, sender, decoded_subject))
-                        conn.commit()
-
-                        if not matched:
-                            cur.close()
-                            conn.close()
-                            continue
+                            pass
+                        return
 
-                        order_id, user_id, amount, remark = matched
-
-                        # ===== MARK ORDER AS PAID =====
-                        cur.execute("""
-                            UPDATE g_orders
-                            SET paid=1, status='success', paid_at=NOW()
-                            WHERE id=%s
-                        """, (order_id,))
-
-                        cur.execute("""
-                            UPDATE g_email_logs
-                            SET processed=TRUE, remark=%s, amount=%s
-                            WHERE email_uid=%s
-                        """, (remark, amount, email_uid))
-                        conn.commit()
-
-                        # ===== DAUKO FINA-FINAI =====
-                        cur.execute("""
-                            SELECT i.title, i.group_key
-                            FROM g_order_items gi
-                            JOIN items i ON i.id=gi.item_id
-                            WHERE gi.order_id=%s
-                        """, (order_id,))
-                        rows = cur.fetchall()
+                    # ===== SESSION (LOGIN SAU ƊAYA) =====
+                    session.ensure()
 
-                        groups = {}
-                        for title, group_key in rows:
-                            key = group_key or title
-                            if key not in groups:
-                                groups[key] = title
-
-                        titles_text = ", ".join(groups.values())
-
-                        # Goge tsohon sakon countdown
-                        if order_id in G_ORDER_MESSAGES:
-                            chat_id, message_id = G_ORDER_MESSAGES[order_id]
-                            try:
-                                bot.delete_message(chat_id, message_id)
-                            except:
-                                pass
-                            del G_ORDER_MESSAGES[order_id]
-
-                        # ===== TURA WA USER KAYA =====
-                        kb = InlineKeyboardMarkup()
-                        kb.add(InlineKeyboardButton("⬇️ DOWNLOAD NOW", callback_data=f"g_deliver:{order_id}"))
-
-                        bot.send_message(
-                            user_id,
-                            f"🎉 <b>PAYMENT SUCCESSFUL</b>\n\n🎬 <b>Items:</b>\n{html.escape(titles_text)}\n\n🗃 <b>Order ID:</b>\n<code>{order_id}</code>\n\n💰 <b>Amount Paid:</b>\n₦{amount}\n\n⬇️ Click button below to download.",
-                            parse_mode="HTML",
-                            reply_markup=kb
-                        )
+                    sync_new_g_emails(session)
 
-                        # ===== NOTIFY ADMIN (KAMAR YADDA /c YAKE YI) =====
-                        try:
-                            admin_report = (
-                                f"🔔 <b>[GMAIL ALERT] An samu sabon sako!</b>\n\n"
-                                f"✅ <b>G_PAYMENT SUCCESSFUL</b>\n"
-                                f"👤 User ID: <code>{user_id}</code>\n"
-                                f"📦 Order: <code>{order_id}</code>\n"
-                                f"💰 Amount: ₦{amount}\n"
-                                f"📝 Remark: <code>{remark}</code>\n"
-                                f"🎬 Films: {titles_text}"
-                            )
-                            bot.send_message(ADMIN_ID, admin_report, parse_mode="HTML")
-                        except:
-                            pass
+                    # ===== JIRAN SABON SAKO (IDLE / POLLING) =====
+                    # Idan akwai sakon da za a sake gwadawa, kada a jira IDLE gaba daya
+                    session.wait_for_mail(GMAIL_POLL_SECONDS if session.retries else GMAIL_IDLE_SECONDS)
 
-                        cur.close()
-                        conn.close()
+                except imaplib.IMAP4.error as imap_err:
+                    session.close()
+                    if _imap_rate_limited(imap_err):
+                        time.sleep(40)
 
-                    except Exception as e:
-                        print("EMAIL PROCESS ERROR:", e)
-                        continue
+                except Exception as e:
+                    print("GMAIL CHECKER MAIN LOOP ERROR:", e)
+                    session.close()
+                    time.sleep(10)
+                    continue
+        finally:
+            session.close()
 
-                mail.logout()
+    threading.Thread(target=checker_loop, daemon=True).start()
 
-            except imaplib.IMAP4.error as imap_err:
-                err_msg = str(imap_err).lower()
-                if "limit" in err_msg or "too many" in err_msg or "block" in err_msg:
-                    time.sleep(40)
-                else:
-                    pass
 
-            except Exception as e:
-                print("GMAIL CHECKER MAIN LOOP ERROR:", e)
-                time.sleep(10)
-                continue
+GMAIL_WATCH_SECONDS = int(os.getenv("GMAIL_WATCH_SECONDS", "60"))
 
-            time.sleep(20)
 
-    threading.Thread(target=checker_loop, daemon=True).start()
+def gmail_checker_watchdog():
+    # Checker yana kashe kansa idan babu oda → scheduler ya sake kunna shi
+    # da zarar pending g_order ta bayyana (IDLE session yana nan a thread ɗinsa).
+    if not GMAIL_CHECKER_RUNNING and has_pending_g_orders():
+        start_gmail_checker()
+
+
+SCHEDULER.add("gmail_checker", gmail_checker_watchdog, interval=GMAIL_WATCH_SECONDS, jitter=5, singleton=True)
 
 
 
@@ -5342,17 +8924,11 @@ def view_notes(msg):
     if msg.from_user.id != ADMIN_ID:
         return
 
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute(
-        "SELECT content FROM admin_notes WHERE admin_id=%s ORDER BY id DESC",
-        (msg.from_user.id,)
-    )
-    rows = cur.fetchall()
-
-    cur.close()
-    conn.close()
+    with db_session() as db:
+        rows = db.execute(
+            "SELECT content FROM admin_notes WHERE admin_id=%s ORDER BY id DESC",
+            (msg.from_user.id,)
+        ).fetchall()
 
     if not rows:
         bot.reply_to(msg, "📭 Babu komai a ajiya.")
@@ -5377,52 +8953,129 @@ def count_all_users(msg):
     if msg.from_user.id != ADMIN_ID:
         return
 
-    conn = get_conn()
-    cur = conn.cursor()
+    try:
+        with db_session() as db:
+            # ===== COUNT ALL / PAID / PENDING USERS (QUERY ƊAYA) =====
+            total_users, paid_users, pending_users = db.execute("""
+                SELECT COUNT(DISTINCT user_id),
+                       COUNT(DISTINCT user_id) FILTER (WHERE paid = 1),
+                       COUNT(DISTINCT user_id) FILTER (WHERE paid = 0)
+                FROM orders
+            """).fetchone()
+    except:
+        bot.reply_to(msg, "❌ Failed to fetch users.")
+        return
+
+    # ===== MESSAGE =====
+    bot.send_message(
+        msg.chat.id,
+        f"""🎉 <b>OUR USERS</b>
+
+👥 Total Users: <b>{total_users or 0}</b>
+
+✅ Paid Users: <b>{paid_users or 0}</b>
+⏳ Pending Users: <b>{pending_users or 0}</b>
+""",
+        parse_mode="HTML"
+    )
+
+
+# ================= ADMIN STATS (/stats) =================
+@bot.message_handler(commands=["stats"])
+def admin_stats(msg):
+
+    if msg.from_user.id != ADMIN_ID:
+        return
+
+    bot.send_message(
+        msg.chat.id,
+        "📊 <b>BOT STATS</b>\n\n" + build_stats_text(),
+        parse_mode="HTML"
+    )
+
+
+# ================= MEDIA KIND BACKFILL (/mediakinds) =================
+@bot.message_handler(commands=["mediakinds"])
+def backfill_media_kinds(msg):
+
+    if msg.from_user.id != ADMIN_ID:
+        return
+
+    bot.reply_to(msg, "⏳ Ana cike media_kind na tsofaffin items...")
+
+    updated = 0
+    unknown = 0
+    last_id = 0
 
     try:
-        # ===== COUNT ALL UNIQUE USERS (PAID + UNPAID) =====
-        cur.execute("""
-            SELECT COUNT(DISTINCT user_id)
-            FROM orders
-        """)
-        total_users = cur.fetchone()[0] or 0
+        while True:
+            with db_session() as db:
+                rows = db.execute(
+                    """
+                    SELECT id, file_id
+                    FROM items
+                    WHERE media_kind IS NULL
+                      AND file_id IS NOT NULL
+                      AND id > %s
+                    ORDER BY id
+                    LIMIT 500
+                    """,
+                    (last_id,)
+                ).fetchall()
 
-        # ===== COUNT PAID USERS =====
-        cur.execute("""
-            SELECT COUNT(DISTINCT user_id)
-            FROM orders
-            WHERE paid = 1
-        """)
-        paid_users = cur.fetchone()[0] or 0
+                if not rows:
+                    break
 
-        # ===== COUNT PENDING USERS =====
-        cur.execute("""
-            SELECT COUNT(DISTINCT user_id)
-            FROM orders
-            WHERE paid = 0
-        """)
-        pending_users = cur.fetchone()[0] or 0
+                last_id = rows[-1][0]
 
-        # ===== MESSAGE =====
-        bot.send_message(
-            msg.chat.id,
-            f"""🎉 <b>OUR USERS</b>
+                pairs = []
+                for item_id, file_id in rows:
+                    kind = media_kind(file_id)
+                    if kind:
+                        pairs.append((item_id, kind))
+                    else:
+                        unknown += 1
 
-👥 Total Users: <b>{total_users}</b>
+                if pairs:
+                    execute_values(
+                        db.cursor(),
+                        """
+                        UPDATE items i
+                        SET media_kind = v.kind
+                        FROM (VALUES %s) AS v(id, kind)
+                        WHERE i.id = v.id
+                        """,
+                        pairs
+                    )
+                    updated += len(pairs)
 
-✅ Paid Users: <b>{paid_users}</b>
-⏳ Pending Users: <b>{pending_users}</b>
-""",
-            parse_mode="HTML"
-        )
+    except Exception as e:
+        bot.send_message(msg.chat.id, f"❌ Backfill error: {e}")
+        return
 
-    except:
-        bot.reply_to(msg, "❌ Failed to fetch users.")
+    bot.send_message(
+        msg.chat.id,
+        f"✅ media_kind backfill\n\n🎞 Updated: {updated}\n❓ Unknown: {unknown}"
+    )
 
-    finally:
-        cur.close()
-        conn.close()
+
+# ================= SALES ROLLUP BACKFILL (/salesbackfill) =================
+@bot.message_handler(commands=["salesbackfill"])
+def backfill_daily_sales(msg):
+
+    if msg.from_user.id != ADMIN_ID:
+        return
+
+    bot.reply_to(msg, "⏳ Ana sake gina daily_sales daga orders...")
+
+    try:
+        with db_session() as db:
+            rows = rebuild_daily_sales(db)
+    except Exception as e:
+        bot.send_message(msg.chat.id, f"❌ Backfill error: {e}")
+        return
+
+    bot.send_message(msg.chat.id, f"✅ daily_sales rebuilt\n\n📈 Rows: {rows}")
 
 
 
@@ -5493,57 +9146,50 @@ def admin_add_money(msg):
         return
 
     # ===== DB =====
-    wallet_conn = get_wallet_conn()
-    wallet_cur = wallet_conn.cursor()
-
     try:
+        with db_session(wallet=True) as db:
+            wallet_cur = db.cursor()
 
-        # ===== UPDATE BALANCE =====
-        wallet_cur.execute(
-            """
-            INSERT INTO wallet_balance (user_id, balance)
-            VALUES (%s,%s)
-            ON CONFLICT (user_id)
-            DO UPDATE SET
-            balance = wallet_balance.balance + EXCLUDED.balance,
-            updated_at = NOW()
-            """,
-            (user_id, amount)
-        )
+            # ===== UPDATE BALANCE =====
+            wallet_cur.execute(
+                """
+                INSERT INTO wallet_balance (user_id, balance)
+                VALUES (%s,%s)
+                ON CONFLICT (user_id)
+                DO UPDATE SET
+                balance = wallet_balance.balance + EXCLUDED.balance,
+                updated_at = NOW()
+                """,
+                (user_id, amount)
+            )
 
-        # ===== SAVE TRANSACTION =====
-        ref = f"admin_{user_id}_{int(time.time())}"
+            # ===== SAVE TRANSACTION =====
+            ref = f"admin_{user_id}_{int(time.time())}"
 
-        wallet_cur.execute(
-            """
-            INSERT INTO wallet_transactions
-            (user_id, amount, type, reference, description)
-            VALUES (%s,%s,'admin_credit',%s,'Admin Wallet Funding')
-            """,
-            (user_id, amount, ref)
-        )
+            wallet_cur.execute(
+                """
+                INSERT INTO wallet_transactions
+                (user_id, amount, type, reference, description)
+                VALUES (%s,%s,'admin_credit',%s,'Admin Wallet Funding')
+                """,
+                (user_id, amount, ref)
+            )
 
-        wallet_conn.commit()
+    except Exception as e:
+        bot.reply_to(msg, "❌ Failed to add money.")
+        return
 
-        # ===== SUCCESS MESSAGE =====
-        bot.reply_to(
-            msg,
-            f"""✅ <b>WALLET FUNDED SUCCESSFULLY</b>
+    # ===== SUCCESS MESSAGE =====
+    bot.reply_to(
+        msg,
+        f"""✅ <b>WALLET FUNDED SUCCESSFULLY</b>
 
 💰 Amount Added: ₦{amount}
 🆔 Wallet ID: <code>{user_id}</code>
 
 Your wallet has been credited successfully.""",
-            parse_mode="HTML"
-        )
-
-    except Exception as e:
-        wallet_conn.rollback()
-        bot.reply_to(msg, "❌ Failed to add money.")
-    
-    finally:
-        wallet_cur.close()
-        wallet_conn.close()
+        parse_mode="HTML"
+    )
 
 
 # ======= VIP ORDER CREATOR (CALLBACK subvip) =========
@@ -5558,46 +9204,41 @@ def vipgroup_handler(c):
     uid = c.from_user.id
     first_name = c.from_user.first_name or "User"
 
-    conn = get_conn()
-    if not conn:
-        return
-
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-
-    # ========= CHECK EXISTING UNPAID VIP =========
-    cur.execute(
-        """
-        SELECT id, amount
-        FROM orders
-        WHERE user_id=%s
-          AND type='vip'
-          AND paid=0
-        LIMIT 1
-        """,
-        (uid,)
-    )
-    row = cur.fetchone()
-
-    # ========= REUSE OR CREATE =========
-    if row:
-        order_id = row["id"]
+    with db_session() as db:
+        cur = db.cursor(cursor_factory=RealDictCursor)
 
-        if int(row["amount"]) != int(VIP_PRICE):
-            cur.execute(
-                "UPDATE orders SET amount=%s WHERE id=%s",
-                (VIP_PRICE, order_id)
-            )
-            conn.commit()
-    else:
-        order_id = str(uuid.uuid4())
+        # ========= CHECK EXISTING UNPAID VIP =========
         cur.execute(
             """
-            INSERT INTO orders (id, user_id, amount, paid, type)
-            VALUES (%s,%s,%s,0,'vip')
+            SELECT id, amount
+            FROM orders
+            WHERE user_id=%s
+              AND type='vip'
+              AND paid=0
+            LIMIT 1
             """,
-            (order_id, uid, VIP_PRICE)
+            (uid,)
         )
-        conn.commit()
+        row = cur.fetchone()
+
+        # ========= REUSE OR CREATE =========
+        if row:
+            order_id = row["id"]
+
+            if int(row["amount"]) != int(VIP_PRICE):
+                cur.execute(
+                    "UPDATE orders SET amount=%s WHERE id=%s",
+                    (VIP_PRICE, order_id)
+                )
+        else:
+            order_id = str(uuid.uuid4())
+            cur.execute(
+                """
+                INSERT INTO orders (id, user_id, amount, paid, type)
+                VALUES (%s,%s,%s,0,'vip')
+                """,
+                (order_id, uid, VIP_PRICE)
+            )
 
     # ========= CREATE PAYMENT LINK (Flutterwave) =========
     # Mun sauya daga create_paystack_payment zuwa create_flutterwave_payment
@@ -5610,8 +9251,6 @@ def vipgroup_handler(c):
 
     if not pay_url:
         bot.send_message(uid, "❌ Sorry, payment gateway is down. Try again later.")
-        cur.close()
-        conn.close()
         return
 
     # ========= FORMAT =========
@@ -5651,9 +9290,6 @@ Tap below to continue👇.
         c.message.message_id
     )
 
-    cur.close()
-    conn.close()
-
 
 import uuid
 from psycopg2.extras import RealDictCursor
@@ -5671,63 +9307,53 @@ def wallet_amount_handler(c):
     except:
         return
 
-    conn = get_wallet_conn()
-    if not conn:
-        return
+    with db_session(wallet=True) as db:
+        cur = db.cursor(cursor_factory=RealDictCursor)
+
+        # ===== CHECK PENDING WALLET ORDER =====
+        cur.execute(
+            """
+            SELECT id, amount
+            FROM wallet_deposits
+            WHERE user_id=%s
+            AND status='pending'
+            LIMIT 1
+            """,
+            (uid,)
+        )
 
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+        row = cur.fetchone()
 
-    # ===== CHECK PENDING WALLET ORDER =====
-    cur.execute(
-        """
-        SELECT id, amount
-        FROM wallet_deposits
-        WHERE user_id=%s
-        AND status='pending'
-        LIMIT 1
-        """,
-        (uid,)
-    )
+        # ===== REUSE ORDER =====
+        if row:
 
-    row = cur.fetchone()
+            order_id = row["id"]
 
-    # ===== REUSE ORDER =====
-    if row:
+            if int(row["amount"]) != amount:
 
-        order_id = row["id"]
+                cur.execute(
+                    """
+                    UPDATE wallet_deposits
+                    SET amount=%s
+                    WHERE id=%s
+                    """,
+                    (amount, order_id)
+                )
 
-        if int(row["amount"]) != amount:
+        # ===== CREATE NEW ORDER =====
+        else:
+
+            order_id = str(uuid.uuid4())
 
             cur.execute(
                 """
-                UPDATE wallet_deposits
-                SET amount=%s
-                WHERE id=%s
+                INSERT INTO wallet_deposits
+                (id, user_id, amount, type, status)
+                VALUES (%s,%s,%s,'wallet','pending')
                 """,
-                (amount, order_id)
+                (order_id, uid, amount)
             )
 
-            conn.commit()
-
-    # ===== CREATE NEW ORDER =====
-    else:
-
-        order_id = str(uuid.uuid4())
-
-        cur.execute(
-            """
-            INSERT INTO wallet_deposits
-            (id, user_id, amount, type, status)
-            VALUES (%s,%s,%s,'wallet','pending')
-            """,
-            (order_id, uid, amount)
-        )
-
-        conn.commit()
-
-    cur.close()
-    conn.close()
-
     # ===== CREATE FLUTTERWAVE LINK =====
     pay_url = create_flutterwave_payment(
         uid,
@@ -5772,6 +9398,182 @@ import time
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton  
   
   
+# ==========================================
+# VIP INVITE LINK POOL
+# ==========================================
+# Links na shiga VIP (member_limit=1) ana ƙirƙira su a background kafin
+# a buƙace su, domin user ya karɓi link nan take (UPDATE ... SKIP LOCKED)
+# ba tare da jiran Telegram ba. Link da ba a yi amfani da shi ba ana
+# revoke shi (countdown wheel / janitor) sannan pool ya cika da sabo.
+# Idan pool ya ƙare → VIP_LINK (permanent) kamar da.
+VIP_LINK_POOL_SIZE = int(os.environ.get("VIP_LINK_POOL_SIZE", 20))
+VIP_LINK_REFILL_BATCH = int(os.environ.get("VIP_LINK_REFILL_BATCH", 10))
+VIP_LINK_TTL_DAYS = int(os.environ.get("VIP_LINK_TTL_DAYS", 7))
+VIP_LINK_CLAIM_GRACE = COUNTDOWN_SECONDS + 120   # claimed amma ba a shiga ba → revoke
+
+
+def ensure_vip_invite_links_table():
+    with db_session() as db:
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS vip_invite_links (
+                id SERIAL PRIMARY KEY,
+                invite_link TEXT UNIQUE NOT NULL,
+                status TEXT NOT NULL DEFAULT 'available',
+                user_id BIGINT,
+                created_at TIMESTAMPTZ DEFAULT NOW(),
+                expire_at TIMESTAMPTZ NOT NULL,
+                claimed_at TIMESTAMPTZ,
+                used_at TIMESTAMPTZ
+            )
+        """)
+        db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_vip_invite_links_available
+            ON vip_invite_links (id)
+            WHERE status='available'
+        """)
+
+
+ensure_vip_invite_links_table()
+
+
+def claim_vip_invite_link(user_id):
+    """
+    Link ɗaya daga pool (O(1)); None idan pool babu komai.
+    """
+    try:
+        with db_session() as db:
+            row = db.execute("""
+                UPDATE vip_invite_links
+                SET status='claimed', user_id=%s, claimed_at=NOW()
+                WHERE id = (
+                    SELECT id FROM vip_invite_links
+                    WHERE status='available'
+                    AND expire_at > NOW() + INTERVAL '1 hour'
+                    ORDER BY id
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING invite_link
+            """, (user_id,)).fetchone()
+    except Exception as e:
+        print("VIP LINK CLAIM ERROR:", e)
+        return None
+
+    if row is None:
+        SCHEDULER.trigger("vip_link_refill")
+        return None
+    return row[0]
+
+
+def mark_vip_invite_link(invite_link, status):
+    if not invite_link:
+        return
+    try:
+        with db_session() as db:
+            db.execute("""
+                UPDATE vip_invite_links
+                SET status=%s,
+                    used_at=CASE WHEN %s='used' THEN NOW() ELSE used_at END
+                WHERE invite_link=%s
+            """, (status, status, invite_link))
+    except Exception as e:
+        print("VIP LINK MARK ERROR:", e)
+
+
+def _revoke_vip_links(rows):
+    revoked = []
+    with telegram_bulk():
+        for link_id, invite_link in rows:
+            try:
+                bot.revoke_chat_invite_link(VIP_GROUP_ID, invite_link)
+            except Exception as e:
+                # link ya riga ya mutu (expired/revoked) → a bar shi ma
+                print("VIP LINK REVOKE ERROR:", e)
+            revoked.append(link_id)
+    return revoked
+
+
+def refill_vip_invite_links():
+    # ===== 1. REVOKE: claimed amma ba a shiga ba, ko wanda ya kusa expire =====
+    with db_session() as db:
+        stale = db.execute("""
+            SELECT id, invite_link
+            FROM vip_invite_links
+            WHERE (status='claimed' AND claimed_at < NOW() - (%s * INTERVAL '1 second'))
+               OR (status='available' AND expire_at < NOW() + INTERVAL '1 hour')
+            LIMIT 100
+        """, (VIP_LINK_CLAIM_GRACE,)).fetchall()
+
+    if stale:
+        revoked = _revoke_vip_links(stale)
+        with db_session() as db:
+            db.execute(
+                "UPDATE vip_invite_links SET status='revoked' WHERE id = ANY(%s)",
+                (revoked,)
+            )
+
+    # ===== 2. REFILL =====
+    with db_session() as db:
+        available = db.execute("""
+            SELECT COUNT(*) FROM vip_invite_links
+            WHERE status='available' AND expire_at > NOW() + INTERVAL '1 hour'
+        """).fetchone()[0]
+
+        db.execute("""
+            DELETE FROM vip_invite_links
+            WHERE status IN ('used', 'revoked')
+            AND created_at < NOW() - INTERVAL '30 days'
+        """)
+
+    missing = min(VIP_LINK_POOL_SIZE - available, VIP_LINK_REFILL_BATCH)
+    if missing <= 0:
+        return
+
+    expire_ts = int(time.time()) + VIP_LINK_TTL_DAYS * 86400
+    created = []
+    with telegram_bulk():
+        for _ in range(missing):
+            try:
+                link = bot.create_chat_invite_link(
+                    VIP_GROUP_ID,
+                    member_limit=1,
+                    expire_date=expire_ts
+                )
+                created.append((link.invite_link, expire_ts))
+            except Exception as e:
+                print("VIP LINK CREATE ERROR:", e)
+                break
+
+    if created:
+        with db_session() as db:
+            execute_values(
+                db.cursor(),
+                """
+                INSERT INTO vip_invite_links (invite_link, expire_at)
+                VALUES %s
+                ON CONFLICT (invite_link) DO NOTHING
+                """,
+                created,
+                template="(%s, to_timestamp(%s))"
+            )
+        print(f"🔗 VIP LINK POOL +{len(created)}")
+
+
+def vip_link_pool_stats():
+    try:
+        with db_session() as db:
+            rows = db.execute(
+                "SELECT status, COUNT(*) FROM vip_invite_links GROUP BY status ORDER BY status"
+            ).fetchall()
+    except Exception as e:
+        return f"db error: {e}"
+    return " | ".join(f"{s}: {n}" for s, n in rows) or "pool empty (VIP_LINK fallback)"
+
+
+SCHEDULER.add("vip_link_refill", refill_vip_invite_links, interval=60, jitter=5, singleton=True)
+register_stats_section("🔗 VIP INVITE LINKS", vip_link_pool_stats)
+
+
 @bot.callback_query_handler(func=lambda c: c.data.startswith("vipnow:"))  
 def handle_vip_join(c):  
   
@@ -5784,12 +9586,14 @@ def handle_vip_join(c):
         sent_chat_id = c.message.chat.id  
         sent_message_id = c.message.message_id  
   
-        # ===== JOIN BUTTON =====  
+        # ===== JOIN BUTTON (LINK DAGA POOL, KO VIP_LINK) =====
+        invite_link = claim_vip_invite_link(user_id)
+
         kb = InlineKeyboardMarkup()  
         kb.add(  
             InlineKeyboardButton(  
                 "🔐 Join VIP Now",  
-                url=VIP_LINK  
+                url=invite_link or VIP_LINK  
             )  
         )  
   
@@ -5803,142 +9607,138 @@ def handle_vip_join(c):
             reply_markup=kb  
         )  
   
-        # ===== COUNTDOWN =====  
-        def countdown():  
-  
-            for remaining in range(COUNTDOWN_SECONDS - 1, -1, -1):  
-  
-                time.sleep(1)  
-  
-                # ===== CHECK DIRECT FROM GROUP =====  
-                try:  
-                    member = bot.get_chat_member(VIP_GROUP_ID, user_id)  
-  
-                    if member.status in ["member", "administrator", "creator"]:  
-  
-                        # ================= DB UPDATE ACTIVE =================  
-                        try:  
-                            from datetime import datetime, timedelta  
-  
-                            conn = get_conn()  
-                            cur = conn.cursor()  
-  
-                            # ✅ JOIN DATE = lokacin da ya shiga  
-                            join_date = datetime.now()  
-  
-                            # ✅ EXPIRE = lissafi daga saman file  
-                            if VIP_DURATION_UNIT == "minutes":  
-                                expire_at = join_date + timedelta(minutes=VIP_DURATION_VALUE)  
-                            else:  
-                                expire_at = join_date + timedelta(days=VIP_DURATION_VALUE)  
-  
-                            # ===== CHECK IF USER EXISTS =====
-                            cur.execute(
-                                "SELECT 1 FROM vip_members WHERE user_id=%s",
-                                (user_id,)
-                            )
-                            exists = cur.fetchone()
-
-                            if exists:
-                                cur.execute(  
-                                    """  
-                                    UPDATE vip_members  
-                                    SET status='active',  
-                                        join_date=%s,  
-                                        expire_at=%s,  
-                                        warn1_sent=FALSE,  
-                                        warn2_sent=FALSE  
-                                    WHERE user_id=%s  
-                                    """,  
-                                    (join_date, expire_at, user_id)  
-                                )  
-                            else:
-                                cur.execute(
-                                    """
-                                    INSERT INTO vip_members
-                                    (user_id, status, join_date, expire_at, warn1_sent, warn2_sent)
-                                    VALUES (%s, 'active', %s, %s, FALSE, FALSE)
-                                    """,
-                                    (user_id, join_date, expire_at)
-                                )
-
-                            conn.commit()  
-                            cur.close()  
-                            conn.close()  
-  
-                        except:  
-                            pass  
-                        # =====================================================  
-  
-                        # EDIT MESSAGE TO USER JOINED  
-                        try:  
-                            bot.edit_message_text(  
-                                f"{first_name} Joined ✅",  
-                                chat_id=sent_chat_id,  
-                                message_id=sent_message_id  
-                            )  
-                        except:  
-                            pass  
-  
-                        # SEND THANK YOU PRIVATE MESSAGE  
-                        try:  
-                            bot.send_message(  
-                                user_id,  
-                                "🙏 Thank you our valued customer.\n"  
-                                "Fatanmu zakaji dadin wannan group."  
-                            )  
-                        except:  
-                            pass  
-  
-                        return  
-                except:  
-                    pass  
-  
-                # ===== UPDATE COUNTDOWN =====  
-                try:  
-                    bot.edit_message_text(  
-                        f"🔐 <b>VIP ACCESS READY</b>\n\n"  
-                        f"⏳ Link expires in {remaining} seconds...\n\n"  
-                        f"Tap below to join 👇",  
-                        chat_id=sent_chat_id,  
-                        message_id=sent_message_id,  
-                        parse_mode="HTML",  
-                        reply_markup=kb  
-                    )  
-                except:  
-                    pass  
-  
-            # ===== TIME OUT =====  
-            admin_kb = InlineKeyboardMarkup()  
-            admin_kb.add(  
-                InlineKeyboardButton(  
-                    "👤ADMIN HELP",  
-                    url=f"https://t.me/{ADMIN_USERNAME}"  
-                )  
-            )  
-  
-            try:  
-                bot.edit_message_text(  
-                    "❌ TIME OUT\n\n"  
-                    "This link has expired.",  
-                    chat_id=sent_chat_id,  
-                    message_id=sent_message_id,  
-                    reply_markup=admin_kb  
-                )  
-            except:  
-                pass  
-  
-            try:  
-                time.sleep(2)  
-                bot.send_message(  
-                    user_id,  
-                    "An turama maka link amma link din har yayi expire\n"  
-                    "baka shiga ba don haka tintini admin."  
-                )  
-            except:  
-                pass  
-  
-        threading.Thread(target=countdown).start()  
+        # ===== COUNTDOWN (COUNTDOWN WHEEL) =====
+        def vip_joined():
+
+            # ===== CHECK DIRECT FROM GROUP =====
+            member = bot.get_chat_member(VIP_GROUP_ID, user_id)
+            if member.status not in ["member", "administrator", "creator"]:
+                return False
+
+            # ================= DB UPDATE ACTIVE =================
+            try:
+                from datetime import datetime, timedelta
+
+                # ✅ JOIN DATE = lokacin da ya shiga
+                join_date = datetime.now()
+
+                # ✅ EXPIRE = lissafi daga saman file
+                if VIP_DURATION_UNIT == "minutes":
+                    expire_at = join_date + timedelta(minutes=VIP_DURATION_VALUE)
+                else:
+                    expire_at = join_date + timedelta(days=VIP_DURATION_VALUE)
+
+                with db_session() as db:
+                    cur = db.cursor()
+
+                    # ===== CHECK IF USER EXISTS =====
+                    cur.execute(
+                        "SELECT 1 FROM vip_members WHERE user_id=%s",
+                        (user_id,)
+                    )
+                    exists = cur.fetchone()
+
+                    if exists:
+                        cur.execute(
+                            """
+                            UPDATE vip_members
+                            SET status='active',
+                                join_date=%s,
+                                expire_at=%s,
+                                warn1_sent=FALSE,
+                                warn2_sent=FALSE
+                            WHERE user_id=%s
+                            """,
+                            (join_date, expire_at, user_id)
+                        )
+                    else:
+                        cur.execute(
+                            """
+                            INSERT INTO vip_members
+                            (user_id, status, join_date, expire_at, warn1_sent, warn2_sent)
+                            VALUES (%s, 'active', %s, %s, FALSE, FALSE)
+                            """,
+                            (user_id, join_date, expire_at)
+                        )
+
+                VIP_DUE.schedule(user_id)
+
+            except:
+                pass
+
+            mark_vip_invite_link(invite_link, "used")
+            # =====================================================
+
+            # EDIT MESSAGE TO USER JOINED
+            try:
+                bot.edit_message_text(
+                    f"{first_name} Joined ✅",
+                    chat_id=sent_chat_id,
+                    message_id=sent_message_id
+                )
+            except:
+                pass
+
+            # SEND THANK YOU PRIVATE MESSAGE
+            try:
+                bot.send_message(
+                    user_id,
+                    "🙏 Thank you our valued customer.\n"
+                    "Fatanmu zakaji dadin wannan group."
+                )
+            except:
+                pass
+
+            return True
+
+        def vip_timeout():
+            # ===== TIME OUT (wheel ya riga ya revoke link) =====
+            mark_vip_invite_link(invite_link, "revoked")
+
+            admin_kb = InlineKeyboardMarkup()
+            admin_kb.add(
+                InlineKeyboardButton(
+                    "👤ADMIN HELP",
+                    url=f"https://t.me/{ADMIN_USERNAME}"
+                )
+            )
+
+            try:
+                bot.edit_message_text(
+                    "❌ TIME OUT\n\n"
+                    "This link has expired.",
+                    chat_id=sent_chat_id,
+                    message_id=sent_message_id,
+                    reply_markup=admin_kb
+                )
+            except:
+                pass
+
+            try:
+                bot.send_message(
+                    user_id,
+                    "An turama maka link amma link din har yayi expire\n"
+                    "baka shiga ba don haka tintini admin."
+                )
+            except:
+                pass
+
+        COUNTDOWNS.start(
+            f"vipnow:{user_id}",
+            COUNTDOWN_SECONDS,
+            sent_chat_id,
+            sent_message_id,
+            render=lambda remaining: (
+                f"🔐 <b>VIP ACCESS READY</b>\n\n"
+                f"⏳ Link expires in {remaining} seconds...\n\n"
+                f"Tap below to join 👇"
+            ),
+            check=vip_joined,
+            on_expire=vip_timeout,
+            revoke=(VIP_GROUP_ID, invite_link) if invite_link else None,
+            parse_mode="HTML",
+            reply_markup=kb
+        )
   
     except:  
         pass  
@@ -5947,156 +9747,250 @@ import threading
 import time  
 from datetime import datetime  
   
-def vip_expiry_checker():  
-  
-    while True:  
-        try:  
-            conn = get_conn()  
-            cur = conn.cursor()  
-  
-            cur.execute(  
-                """  
-                SELECT user_id  
-                FROM vip_members  
-                WHERE status='active'  
-                AND expire_at IS NOT NULL  
-                AND expire_at <= NOW()  
-                """  
-            )  
-  
-            expired_users = cur.fetchall()  
-  
-            for row in expired_users:  
-                user_id = row[0]  
-  
-                # ===== REMOVE FROM GROUP (NOT PERMANENT BAN) =====  
-                try:  
-                    bot.ban_chat_member(VIP_GROUP_ID, user_id)  
-                    bot.unban_chat_member(VIP_GROUP_ID, user_id)  
-                except:  
-                    pass  
-  
-                # ===== UPDATE STATUS =====  
-                try:  
-                    cur.execute(  
-                        """  
-                        UPDATE vip_members  
-                        SET status='expired'  
-                        WHERE user_id=%s  
-                        """,  
-                        (user_id,)  
-                    )  
-                    conn.commit()  
-  
-                    # ===== WARNING 3 CALL =====  
-                    send_expired_message(user_id)  
-  
-                except:  
-                    pass  
-  
-            cur.close()  
-            conn.close()  
-  
-        except:  
-            pass  
-  
-        time.sleep(43200)  # check every 60 seconds  
-  
-  
-threading.Thread(target=vip_expiry_checker, daemon=True).start()
+# ==========================================
+# VIP DUE QUEUE (EXPIRY + WARNINGS A DAIDAI LOKACI)
+# ==========================================
+# Maimakon mu duba table duk bayan awa 12, leader yana riƙe heap na
+# lokutan da kowane member zai karɓi warning 1/2 da lokacin da zai kare.
+# Ana loda members da za su kare nan da VIP_DUE_HORIZON_DAYS kawai
+# (index na (status, expire_at)), ana sake loda su kowane awa, kuma
+# insert/renewal yana sake tsara member ɗin nan take (VIP_DUE.schedule).
+import heapq
+from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+VIP_DUE_HORIZON_DAYS = WARNING_1_VALUE + 2
+VIP_DUE_RESYNC_SECONDS = int(os.environ.get("VIP_DUE_RESYNC_SECONDS", 3600))
+VIP_EVENT_GRACE_SECONDS = 12 * 3600   # warning da ya makara fiye da haka → a tsallake
+VIP_WARN_MARGIN_SECONDS = 600         # warning da ya zo da wuri kaɗan (agogo) har yanzu yana aiki
+
 
+def ensure_vip_due_index():
+    with db_session() as db:
+        db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_vip_members_status_expire
+            ON vip_members (status, expire_at)
+        """)
 
-# ==========================================
-# VIP WARNING SYSTEM (SMART VERSION)
-# ==========================================
 
-import threading
-import time
-from datetime import datetime, timedelta
-from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
+ensure_vip_due_index()
 
-def vip_warning_system():
-    while True:
-        try:
-            conn = get_conn()
-            cur = conn.cursor()
-            now = datetime.now()
 
-            # Muna dauko user_id, expire_at da flags
-            cur.execute("""
-                SELECT user_id, expire_at, warn1_sent, warn2_sent
-                FROM vip_members
-                WHERE status='active'
-                AND expire_at IS NOT NULL
-            """)
+def vip_warning_text(kind):
+    if kind == "warn1":
+        return (
+            f"⏳ TUNATARWA ZANYI MAKA\n\n"
+            f"Subscription ɗinka (ALGAITA VIP) zai kare nan da {WARNING_1_VALUE} kwana.\n\n"
+            f"Muna matuƙar godiya da kasancewarka tare da mu ❤️\n"
+            f"Da fatan za ka sabunta kafin lokacin ya ƙare domin cigaba da more VIP group."
+        )
+    return (
+        f"⚠NAZO NA SANAR DAKAI\n\n"
+        f"Subscription ɗinka (ALGAITA VIP) zai kare nan da {WARNING_2_VALUE} kwana.\n\n"
+        f"Idan ba ka sabunta ba kafin lokacin ya cika, za a cire ka daga VIP group.\n"
+        f"Da fatan za ka sabunta yanzu domin kada a cire ka."
+    )
 
-            users = cur.fetchall()
 
-            for user_id, expire_at, warn1_sent, warn2_sent in users:
-                
-                remaining = expire_at - now
-                remaining_days = remaining.days
+def vip_remove_members(user_ids):
+    """
+    Cire members daga VIP group (ban + unban → ba na dindindin ba).
+    TG_LIMITER yana tsara gudun (bulk priority).
+    """
+    removed = []
+    with telegram_bulk():
+        for user_id in user_ids:
+            try:
+                bot.ban_chat_member(VIP_GROUP_ID, user_id)
+                bot.unban_chat_member(VIP_GROUP_ID, user_id)
+                removed.append(user_id)
+            except Exception as e:
+                print("VIP REMOVE ERROR:", user_id, e)
+    return removed
+
+
+class VipDueQueue:
+    def __init__(self):
+        self.heap = []
+        self.versions = {}          # user_id → expire_at (epoch) da aka tsara
+        self.cond = threading.Condition()
+        self.started = False
+        self.fired = {"expire": 0, "warn1": 0, "warn2": 0}
+        self.skipped = 0
+        self._seq = 0
+
+    _SELECT = """
+        SELECT user_id,
+               EXTRACT(EPOCH FROM expire_at),
+               EXTRACT(EPOCH FROM expire_at - NOW()),
+               COALESCE(warn1_sent, FALSE),
+               COALESCE(warn2_sent, FALSE)
+        FROM vip_members
+        WHERE status='active'
+        AND expire_at IS NOT NULL
+        AND expire_at <= NOW() + (%s * INTERVAL '1 day')
+    """
 
-                # =================================
-                # WARNING 1 (GARGADI NA FARKO)
-                # =================================
-                # Zai duba idan kwanaki sun yi daidai da WARNING_1_VALUE
-                if remaining_days == WARNING_1_VALUE and not warn1_sent:
-                    try:
-                        kb = InlineKeyboardMarkup()
-                        kb.add(InlineKeyboardButton("💳REPAY NOW", callback_data="subvip"))
-
-                        bot.send_message(
-                            user_id,
-                            f"⏳ TUNATARWA ZANYI MAKA\n\n"
-                            f"Subscription ɗinka (ALGAITA VIP) zai kare nan da {WARNING_1_VALUE} kwana.\n\n"
-                            f"Muna matuƙar godiya da kasancewarka tare da mu ❤️\n"
-                            f"Da fatan za ka sabunta kafin lokacin ya ƙare domin cigaba da more VIP group.",
-                            reply_markup=kb
-                        )
+    def _push_member(self, user_id, version, remaining, warn1_sent, warn2_sent):
+        # remaining daga NOW() na DB → agogon server bai shafe mu ba
+        day = 86400
+        expire_ts = time.time() + float(remaining)
+        events = []
+        if not warn1_sent and remaining > WARNING_2_VALUE * day:
+            events.append(("warn1", expire_ts - WARNING_1_VALUE * day))
+        if not warn2_sent and remaining > 0:
+            events.append(("warn2", expire_ts - WARNING_2_VALUE * day))
+        events.append(("expire", expire_ts + 1))
+
+        self.versions[user_id] = version
+        for kind, due in events:
+            self._seq += 1
+            heapq.heappush(self.heap, (due, self._seq, kind, user_id, version))
+
+    def resync(self):
+        with db_session() as db:
+            rows = db.execute(self._SELECT, (VIP_DUE_HORIZON_DAYS,)).fetchall()
+
+        with self.cond:
+            self.heap = []
+            self.versions = {}
+            for row in rows:
+                self._push_member(*row)
+            self.cond.notify()
+        self.start()
+
+    def schedule(self, user_id):
+        """
+        A kira bayan insert/renewal na vip_members. Tsoffin events na
+        member ɗin sun zama stale; idan yana cikin horizon a sake tsara shi.
+        """
+        if not LEADER.is_leader():
+            return   # leader zai gani a resync
+        with db_session() as db:
+            row = db.execute(
+                self._SELECT + " AND user_id=%s",
+                (VIP_DUE_HORIZON_DAYS, user_id)
+            ).fetchone()
 
-                        # Update database domin hana double sending
-                        cur.execute("UPDATE vip_members SET warn1_sent=TRUE WHERE user_id=%s", (user_id,))
-                        conn.commit()
-                    except:
-                        pass
-
-                # =================================
-                # WARNING 2 (GARGADI NA KARSHE)
-                # =================================
-                # Zai duba idan kwanaki sun yi daidai da WARNING_2_VALUE
-                elif remaining_days == WARNING_2_VALUE and not warn2_sent:
-                    try:
-                        kb = InlineKeyboardMarkup()
-                        kb.add(InlineKeyboardButton("💳REPAY NOW", callback_data="subvip"))
-
-                        bot.send_message(
-                            user_id,
-                            f"⚠NAZO NA SANAR DAKAI\n\n"
-                            f"Subscription ɗinka (ALGAITA VIP) zai kare nan da {WARNING_2_VALUE} kwana.\n\n"
-                            f"Idan ba ka sabunta ba kafin lokacin ya cika, za a cire ka daga VIP group.\n"
-                            f"Da fatan za ka sabunta yanzu domin kada a cire ka.",
-                            reply_markup=kb
-                        )
+        with self.cond:
+            self.versions.pop(user_id, None)
+            if row:
+                self._push_member(*row)
+            self.cond.notify()
 
-                        # Update database
-                        cur.execute("UPDATE vip_members SET warn2_sent=TRUE WHERE user_id=%s", (user_id,))
-                        conn.commit()
-                    except:
-                        pass
+    def start(self):
+        with self.cond:
+            if self.started:
+                return
+            self.started = True
+        threading.Thread(target=self._loop, daemon=True).start()
 
-            cur.close()
-            conn.close()
+    def _loop(self):
+        while True:
+            with self.cond:
+                while not self.heap or self.heap[0][0] > time.time():
+                    timeout = self.heap[0][0] - time.time() if self.heap else None
+                    self.cond.wait(timeout)
+
+                now = time.time()
+                due = {"expire": [], "warn1": [], "warn2": []}
+                while self.heap and self.heap[0][0] <= now:
+                    when, _, kind, user_id, version = heapq.heappop(self.heap)
+                    if self.versions.get(user_id) != version:
+                        continue
+                    if kind != "expire" and now - when > VIP_EVENT_GRACE_SECONDS:
+                        self.skipped += 1
+                        continue
+                    due[kind].append(user_id)
 
-        except Exception as e:
-            # print(f"Error: {e}") # Zaka iya barin sa a kashe
-            pass
+            if not LEADER.is_leader():
+                continue
+            try:
+                self._fire(due)
+            except Exception as e:
+                print("❌ VIP DUE QUEUE ERROR:", e)
+
+    def _fire(self, due):
+        if due["expire"]:
+            self._expire(due["expire"])
+        for kind in ("warn1", "warn2"):
+            if due[kind]:
+                self._warn(kind, due[kind])
+
+    def _expire(self, user_ids):
+        with db_session() as db:
+            rows = db.execute("""
+                UPDATE vip_members
+                SET status='expired'
+                WHERE user_id = ANY(%s)
+                AND status='active'
+                AND expire_at <= NOW()
+                RETURNING user_id
+            """, (user_ids,)).fetchall()
+        expired = [r[0] for r in rows]
+
+        # wanda bai kare ba (renewal / agogo) → a sake tsara shi
+        for user_id in set(user_ids) - set(expired):
+            self.schedule(user_id)
+
+        if not expired:
+            return
+
+        vip_remove_members(expired)
+        self.fired["expire"] += len(expired)
+
+        # ===== WARNING 3 CALL =====
+        with telegram_bulk():
+            for user_id in expired:
+                send_expired_message(user_id)
+
+    def _warn(self, kind, user_ids):
+        column = "warn1_sent" if kind == "warn1" else "warn2_sent"
+        days = WARNING_1_VALUE if kind == "warn1" else WARNING_2_VALUE
+
+        # Update database kafin turawa domin hana double sending.
+        # Event na tsohon period (renewal a wani worker) → expire_at ya yi
+        # nisa fiye da window na warning, don haka UPDATE bai taɓa shi ba.
+        with db_session() as db:
+            rows = db.execute(f"""
+                UPDATE vip_members
+                SET {column}=TRUE
+                WHERE user_id = ANY(%s)
+                AND status='active'
+                AND {column} IS NOT TRUE
+                AND expire_at > NOW()
+                AND expire_at <= NOW() + (%s * INTERVAL '1 day') + (%s * INTERVAL '1 second')
+                RETURNING user_id
+            """, (user_ids, days, VIP_WARN_MARGIN_SECONDS)).fetchall()
+
+        # wanda bai cancanta ba (renewal) → a sake tsara shi daga DB
+        for user_id in set(user_ids) - {r[0] for r in rows}:
+            self.schedule(user_id)
+
+        text = vip_warning_text(kind)
+        with telegram_bulk():
+            for (user_id,) in rows:
+                try:
+                    kb = InlineKeyboardMarkup()
+                    kb.add(InlineKeyboardButton("💳REPAY NOW", callback_data="subvip"))
+                    bot.send_message(user_id, text, reply_markup=kb)
+                    self.fired[kind] += 1
+                except Exception:
+                    pass
 
-        # Yana duba duk bayan awa 12 domin ya kama kwanakin daidai
-        time.sleep(43200)
+    def stats(self):
+        with self.cond:
+            pending = len(self.versions)
+            nxt = int(max(self.heap[0][0] - time.time(), 0)) if self.heap else None
+        fired = " | ".join(f"{k}: {v}" for k, v in self.fired.items())
+        return (
+            f"members in horizon: {pending} | next event: {nxt if nxt is not None else '-'}s\n"
+            f"fired → {fired} | skipped late warnings: {self.skipped}"
+        )
 
-# Kunna system din a gefe
-threading.Thread(target=vip_warning_system, daemon=True).start()
+
+VIP_DUE = VipDueQueue()
+SCHEDULER.add("vip_due_resync", VIP_DUE.resync, interval=VIP_DUE_RESYNC_SECONDS, jitter=30, singleton=True)
+register_stats_section("💎 VIP DUE QUEUE", VIP_DUE.stats)
 
 
 
@@ -6206,29 +10100,29 @@ def receive_vip_user_id(message):
     # INSERT OR UPDATE USER
     # ===============================
     try:
-        conn = get_conn()
-        cur = conn.cursor()
+        with db_session() as db:
+            cur = db.cursor()
 
-        cur.execute("""
-            INSERT INTO vip_members (user_id, join_date, expire_at, status, warn1_sent, warn2_sent)
-            VALUES (%s, %s, %s, 'active', FALSE, FALSE)
-            ON CONFLICT (user_id)
-            DO UPDATE SET
-                join_date = EXCLUDED.join_date,
-                expire_at = EXCLUDED.expire_at,
-                status = 'active',
-                warn1_sent = FALSE,
-                warn2_sent = FALSE
-        """, (user_id, join_date, expire_at))
-
-        conn.commit()
-        cur.close()
-        conn.close()
+            cur.execute("""
+                INSERT INTO vip_members (user_id, join_date, expire_at, status, warn1_sent, warn2_sent)
+                VALUES (%s, %s, %s, 'active', FALSE, FALSE)
+                ON CONFLICT (user_id)
+                DO UPDATE SET
+                    join_date = EXCLUDED.join_date,
+                    expire_at = EXCLUDED.expire_at,
+                    status = 'active',
+                    warn1_sent = FALSE,
+                    warn2_sent = FALSE
+            """, (user_id, join_date, expire_at))
+
+            db.commit()
 
     except:
         bot.send_message(message.chat.id, "An samu matsala wajen saka user a DB.")
         return
 
+    VIP_DUE.schedule(user_id)
+
     # ===============================
     # SUCCESS MESSAGE TO ADMIN
     # ===============================
@@ -6259,18 +10153,15 @@ def open_wallet(c):
     uid = c.from_user.id
     name = c.from_user.first_name or "User"
 
-    conn = get_wallet_conn()
-    if not conn:
-        return
-
-    cur = conn.cursor()
+    with db_session(wallet=True) as db:
+        cur = db.cursor()
 
-    # ===== CHECK WALLET =====
-    cur.execute(
-        "SELECT balance FROM wallet_balance WHERE user_id=%s",
-        (uid,)
-    )
-    row = cur.fetchone()
+        # ===== CHECK WALLET =====
+        cur.execute(
+            "SELECT balance FROM wallet_balance WHERE user_id=%s",
+            (uid,)
+        )
+        row = cur.fetchone()
 
     if row:
         balance = int(row[0])
@@ -6315,8 +10206,6 @@ Balance: ₦0
         reply_markup=kb
     )
 
-    cur.close()
-    conn.close()
 
 # ==========================================
 # ==========================================
@@ -6335,18 +10224,15 @@ def wallet_back(c):
     uid = c.from_user.id
     name = c.from_user.first_name or "User"
 
-    conn = get_wallet_conn()
-    if not conn:
-        return
-
-    cur = conn.cursor()
+    with db_session(wallet=True) as db:
+        cur = db.cursor()
 
-    cur.execute(
-        "SELECT balance FROM wallet_balance WHERE user_id=%s",
-        (uid,)
-    )
+        cur.execute(
+            "SELECT balance FROM wallet_balance WHERE user_id=%s",
+            (uid,)
+        )
 
-    row = cur.fetchone()
+        row = cur.fetchone()
 
     if row:
         balance = int(row[0])
@@ -6387,10 +10273,6 @@ Balance: ₦0
         parse_mode="HTML"
     )
 
-    cur.close()
-    conn.close()
-
-
 
 # ==========================================
 # WALLET LAST 5 TRANSACTIONS
@@ -6403,25 +10285,22 @@ def wallet_history(c):
 
     uid = c.from_user.id
 
-    conn = get_wallet_conn()
-    if not conn:
-        return
-
-    cur = conn.cursor()
+    with db_session(wallet=True) as db:
+        cur = db.cursor()
 
-    # ===== GET LAST 5 =====
-    cur.execute(
-        """
-        SELECT amount, type, description, created_at
-        FROM wallet_transactions
-        WHERE user_id=%s
-        ORDER BY created_at DESC
-        LIMIT 5
-        """,
-        (uid,)
-    )
+        # ===== GET LAST 5 =====
+        cur.execute(
+            """
+            SELECT amount, type, description, created_at
+            FROM wallet_transactions
+            WHERE user_id=%s
+            ORDER BY created_at DESC
+            LIMIT 5
+            """,
+            (uid,)
+        )
 
-    rows = cur.fetchall()
+        rows = cur.fetchall()
 
     if not rows:
 
@@ -6464,8 +10343,6 @@ Babu wani transaction a wallet ɗinka tukuna."""
         reply_markup=kb
     )
 
-    cur.close()
-    conn.close()
 
 # ==========================================
 
@@ -6521,182 +10398,180 @@ def wallet_pay_handler(call):
         return
 
     # ================= MAIN DB =================
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-        SELECT user_id, amount, paid, type
-        FROM orders
-        WHERE id=%s
-        """,
-        (order_id,)
-    )
+    # Order a kulle (FOR UPDATE) kuma a mayar paid kafin a taɓa wallet:
+    # danna biyu a lokaci guda → na biyu yana jira, sannan ya ga paid=1.
+    # Idan cire kudin wallet ya gaza, main session ya yi rollback.
+    insufficient = None
 
-    row = cur.fetchone()
+    with db_session() as db:
+        cur = db.cursor()
 
-    if not row:
-        cur.close()
-        conn.close()
-        bot.answer_callback_query(call.id, "Order not found.")
-        return
+        cur.execute(
+            """
+            SELECT user_id, amount, paid, type
+            FROM orders
+            WHERE id=%s
+            FOR UPDATE
+            """,
+            (order_id,)
+        )
 
-    order_user, amount, paid, order_type = row
+        row = cur.fetchone()
 
-    if order_user != user_id:
-        cur.close()
-        conn.close()
-        bot.answer_callback_query(call.id, "This order does not belong to you.")
-        return
+        if not row:
+            bot.answer_callback_query(call.id, "Order not found.")
+            return
 
-    if paid == 1:
-        cur.close()
-        conn.close()
-        bot.answer_callback_query(call.id, "Order already paid.")
-        return
+        order_user, amount, paid, order_type = row
 
-    # ================= WALLET DB =================
-    wallet_conn = get_wallet_conn()
-    wallet_cur = wallet_conn.cursor()
+        if order_user != user_id:
+            bot.answer_callback_query(call.id, "This order does not belong to you.")
+            return
 
-    wallet_cur.execute(
-        "SELECT balance FROM wallet_balance WHERE user_id=%s",
-        (user_id,)
-    )
+        if paid == 1:
+            bot.answer_callback_query(call.id, "Order already paid.")
+            return
 
-    w = wallet_cur.fetchone()
+        # ================= MARK ORDER PAID =================
+        cur.execute(
+            "UPDATE orders SET paid=1 WHERE id=%s AND paid=0",
+            (order_id,)
+        )
 
-    balance = int(w[0]) if w else 0
+        if not cur.rowcount:
+            bot.answer_callback_query(call.id, "Order already paid.")
+            return
 
-    # ================= INSUFFICIENT BALANCE =================
-    if balance < amount:
+        rollup_paid_orders(cur, [order_id])
 
-        bot.answer_callback_query(
-            call.id,
-            f"❌ Insufficient wallet balance\n\n"
-            f"Your balance: ₦{balance}\n"
-            f"Movie price: ₦{amount}\n\n"
-            f"Please click PAY NOW to complete payment.",
-            show_alert=True
-        )
+        # ================= WALLET DB =================
+        with db_session(wallet=True) as wdb:
+            wallet_cur = wdb.cursor()
 
-        wallet_cur.close()
-        wallet_conn.close()
-        cur.close()
-        conn.close()
-        return
+            # ================= DEDUCT WALLET =================
+            wallet_cur.execute(
+                """
+                UPDATE wallet_balance
+                SET balance = balance - %s,
+                    updated_at = NOW()
+                WHERE user_id=%s
+                AND balance >= %s
+                RETURNING balance
+                """,
+                (amount, user_id, amount)
+            )
 
-    # ================= DEDUCT WALLET =================
-    wallet_cur.execute(
-        """
-        UPDATE wallet_balance
-        SET balance = balance - %s,
-            updated_at = NOW()
-        WHERE user_id=%s
-        """,
-        (amount, user_id)
-    )
+            if wallet_cur.fetchone() is None:
+                wallet_cur.execute(
+                    "SELECT balance FROM wallet_balance WHERE user_id=%s",
+                    (user_id,)
+                )
+                w = wallet_cur.fetchone()
+                insufficient = int(w[0]) if w else 0
+            else:
+                wallet_cur.execute(
+                    """
+                    INSERT INTO wallet_transactions
+                    (user_id, amount, type, reference, description)
+                    VALUES (%s,%s,'purchase',%s,'Movie Purchase')
+                    """,
+                    (user_id, amount, order_id)
+                )
 
-    wallet_cur.execute(
-        """
-        INSERT INTO wallet_transactions
-        (user_id, amount, type, reference, description)
-        VALUES (%s,%s,'purchase',%s,'Movie Purchase')
-        """,
-        (user_id, amount, order_id)
-    )
+        # ================= INSUFFICIENT BALANCE =================
+        if insufficient is not None:
+            db.rollback()
 
-    wallet_conn.commit()
+            bot.answer_callback_query(
+                call.id,
+                f"❌ Insufficient wallet balance\n\n"
+                f"Your balance: ₦{insufficient}\n"
+                f"Movie price: ₦{amount}\n\n"
+                f"Please click PAY NOW to complete payment.",
+                show_alert=True
+            )
+            return
 
-    wallet_cur.close()
-    wallet_conn.close()
+    # ================= ORDER DETAILS (karatu kawai) =================
+    with db_session() as db:
+        cur = db.cursor()
 
-    # ================= MARK ORDER PAID =================
-    cur.execute(
-        "UPDATE orders SET paid=1 WHERE id=%s",
-        (order_id,)
-    )
+        # ================= DELETE ORDER MESSAGE =================
+        if order_id in ORDER_MESSAGES:
 
-    # ================= DELETE ORDER MESSAGE =================
-    if order_id in ORDER_MESSAGES:
+            chat_id, message_id = ORDER_MESSAGES[order_id]
 
-        chat_id, message_id = ORDER_MESSAGES[order_id]
+            try:
+                bot.delete_message(chat_id, message_id)
+            except:
+                pass
 
-        try:
-            bot.delete_message(chat_id, message_id)
-        except:
-            pass
+            del ORDER_MESSAGES[order_id]
 
-        del ORDER_MESSAGES[order_id]
+        # ================= USER INFO =================
+        cur.execute(
+            """
+            SELECT first_name, last_name
+            FROM visited_users
+            WHERE user_id=%s
+            """,
+            (user_id,)
+        )
 
-    # ================= USER INFO =================
-    cur.execute(
-        """
-        SELECT first_name, last_name
-        FROM visited_users
-        WHERE user_id=%s
-        """,
-        (user_id,)
-    )
+        u = cur.fetchone()
 
-    u = cur.fetchone()
+        if u and (u[0] or u[1]):
+            full_name = f"{u[0] or ''} {u[1] or ''}".strip()
+        else:
+            try:
+                chat = bot.get_chat(user_id)
+                full_name = f"{chat.first_name or ''} {chat.last_name or ''}".strip()
+            except:
+                full_name = "User"
 
-    if u and (u[0] or u[1]):
-        full_name = f"{u[0] or ''} {u[1] or ''}".strip()
-    else:
         try:
             chat = bot.get_chat(user_id)
-            full_name = f"{chat.first_name or ''} {chat.last_name or ''}".strip()
+            tg_username = f"@{chat.username}" if chat.username else "unknown"
         except:
-            full_name = "User"
-
-    try:
-        chat = bot.get_chat(user_id)
-        tg_username = f"@{chat.username}" if chat.username else "unknown"
-    except:
-        tg_username = "unknown"
-
-    # ================= FETCH ITEMS =================
-    cur.execute(
-        """
-        SELECT i.title, i.group_key
-        FROM order_items oi
-        JOIN items i ON i.id = oi.item_id
-        WHERE oi.order_id=%s
-        """,
-        (order_id,)
-    )
+            tg_username = "unknown"
 
-    rows = cur.fetchall()
+        # ================= FETCH ITEMS =================
+        cur.execute(
+            """
+            SELECT i.title, i.group_key
+            FROM order_items oi
+            JOIN items i ON i.id = oi.item_id
+            WHERE oi.order_id=%s
+            """,
+            (order_id,)
+        )
 
-    groups = {}
+        rows = cur.fetchall()
 
-    for title, group_key in rows:
+        groups = {}
 
-        key = group_key or f"single_{title}"
+        for title, group_key in rows:
 
-        if key not in groups:
-            groups[key] = {"title": title, "count": 0}
+            key = group_key or f"single_{title}"
 
-        groups[key]["count"] += 1
+            if key not in groups:
+                groups[key] = {"title": title, "count": 0}
 
-    lines = []
-    for g in groups.values():
-        if g["count"] > 1:
-            lines.append(f"{g['title']} ({g['count']})")
-        else:
-            lines.append(f"{g['title']}")
+            groups[key]["count"] += 1
 
-    titles_text = ", ".join(lines) if lines else "N/A"
+        lines = []
+        for g in groups.values():
+            if g["count"] > 1:
+                lines.append(f"{g['title']} ({g['count']})")
+            else:
+                lines.append(f"{g['title']}")
 
-    item_count = sum(g["count"] for g in groups.values())
+        titles_text = ", ".join(lines) if lines else "N/A"
 
-    # ================= TIME =================
-    now = (datetime.now() + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
+        item_count = sum(g["count"] for g in groups.values())
 
-    conn.commit()
-    cur.close()
-    conn.close()
+        # ================= TIME =================
+        now = (datetime.now() + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
 
     # ================= USER MESSAGE =================
     kb = InlineKeyboardMarkup()
@@ -6765,8 +10640,13 @@ def transfer_money_start(c):
     name = c.from_user.first_name or "User"
 
     # ===== CHECK WALLET BALANCE =====
-    conn = get_wallet_conn()
-    if not conn:
+    try:
+        with db_session(wallet=True) as db:
+            row = db.execute(
+                "SELECT balance FROM wallet_balance WHERE user_id=%s",
+                (uid,)
+            ).fetchone()
+    except Exception:
         bot.answer_callback_query(
             c.id,
             "Wallet error",
@@ -6774,23 +10654,11 @@ def transfer_money_start(c):
         )
         return
 
-    cur = conn.cursor()
-
-    cur.execute(
-        "SELECT balance FROM wallet_balance WHERE user_id=%s",
-        (uid,)
-    )
-
-    row = cur.fetchone()
-
     if row:
         balance = float(row[0])
     else:
         balance = 0.0
 
-    cur.close()
-    conn.close()
-
     # ===== IF BALANCE LESS THAN 100 =====
     if balance < 100:
 
@@ -6843,8 +10711,6 @@ A nan zaka iya tura kudi zuwa ga abokinka.
 import time
 import threading
 
-TRANSFER_STAGE = {}
-
 @bot.callback_query_handler(func=lambda c: c.data == "start_transfer")
 def ask_friend_id(c):
 
@@ -6864,19 +10730,11 @@ def ask_friend_id(c):
         "chat_id": chat_id
     }
 
-    def countdown():
-
-        remaining = timeout
-
-        while remaining > 0:
-
-            if uid not in TRANSFER_STAGE:
-                return
-
-            minutes = remaining // 60
-            seconds = remaining % 60
+    def render(remaining):
+        minutes = remaining // 60
+        seconds = remaining % 60
 
-            text = f"""💸 TRANSFER MONEY
+        return f"""💸 TRANSFER MONEY
 
 Aiko ID na abokinka wanda kake son aikawa kudin.
 
@@ -6885,22 +10743,9 @@ Turo ID yanzu.
 ⏳ Time remaining: {minutes}:{seconds:02d}
 """
 
-            try:
-                bot.edit_message_text(
-                    text,
-                    chat_id=chat_id,
-                    message_id=msg_id
-                )
-            except:
-                pass
-
-            time.sleep(1)
-            remaining -= 1
-
+    def on_timeout():
         # ===== TIMEOUT =====
-        if uid in TRANSFER_STAGE:
-
-            del TRANSFER_STAGE[uid]
+        if TRANSFER_STAGE.pop(uid, None) is not None:
 
             try:
                 bot.edit_message_text(
@@ -6916,14 +10761,31 @@ Ka sake gwadawa idan kana son tura kudi.""",
             except:
                 pass
 
-    threading.Thread(target=countdown, daemon=True).start()
+    try:
+        bot.edit_message_text(
+            render(timeout),
+            chat_id=chat_id,
+            message_id=msg_id
+        )
+    except:
+        pass
+
+    COUNTDOWNS.start(
+        f"transfer:{uid}",
+        timeout,
+        chat_id,
+        msg_id,
+        render=render,
+        alive=lambda: uid in TRANSFER_STAGE,
+        on_expire=on_timeout
+    )
 
 
 # ==========================================
 # RECEIVE FRIEND ID
 # ==========================================
 
-@bot.message_handler(func=lambda m: m.from_user.id in TRANSFER_STAGE and TRANSFER_STAGE[m.from_user.id]["stage"] == "waiting_friend_id")
+@bot.message_handler(func=lambda m: TRANSFER_STAGE.get(m.from_user.id, {}).get("stage") == "waiting_friend_id")
 def receive_friend_id(message):
 
     uid = message.from_user.id
@@ -6966,16 +10828,18 @@ def receive_friend_id(message):
 
     # ===== DELETE COUNTDOWN MESSAGE =====
     try:
-        bot.delete_message(
-            TRANSFER_STAGE[uid]["chat_id"],
-            TRANSFER_STAGE[uid]["msg_id"]
-        )
+        stage = TRANSFER_STAGE[uid]
+        bot.delete_message(stage["chat_id"], stage["msg_id"])
     except:
         pass
 
     # ===== SAVE FRIEND ID =====
-    TRANSFER_STAGE[uid]["friend_id"] = friend_id
-    TRANSFER_STAGE[uid]["stage"] = "choose_amount"
+    stage = TRANSFER_STAGE.get(uid)
+    if not stage:
+        return
+    stage["friend_id"] = friend_id
+    stage["stage"] = "choose_amount"
+    TRANSFER_STAGE[uid] = stage
 
     # ===== BUTTONS =====
     kb = InlineKeyboardMarkup(row_width=2)
@@ -7026,22 +10890,20 @@ def transfer_amount_handler(c):
     except:
         return
 
-    friend_id = TRANSFER_STAGE[uid].get("friend_id")
-    friend_name = TRANSFER_STAGE[uid].get("friend_name", "User")
-
-    # ===== CHECK BALANCE =====
-    conn = get_wallet_conn()
-    if not conn:
+    stage = TRANSFER_STAGE.get(uid)
+    if not stage:
         return
+    friend_id = stage.get("friend_id")
+    friend_name = stage.get("friend_name", "User")
 
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-
-    cur.execute(
-        "SELECT balance FROM wallet_balance WHERE user_id=%s",
-        (uid,)
-    )
-
-    row = cur.fetchone()
+    # ===== CHECK BALANCE =====
+    with db_session(wallet=True) as db:
+        cur = db.cursor(cursor_factory=RealDictCursor)
+        cur.execute(
+            "SELECT balance FROM wallet_balance WHERE user_id=%s",
+            (uid,)
+        )
+        row = cur.fetchone()
 
     balance = int(row["balance"]) if row else 0
 
@@ -7063,13 +10925,11 @@ Please add money to your wallet."""
             )
         except:
             pass
-
-        cur.close()
-        conn.close()
         return
 
     # ===== SAVE AMOUNT =====
-    TRANSFER_STAGE[uid]["amount"] = amount
+    stage["amount"] = amount
+    TRANSFER_STAGE[uid] = stage
 
     # ===== CONFIRM MESSAGE =====
     text = f"""💸 Confirm Transfer
@@ -7101,9 +10961,6 @@ Please confirm to continue."""
         )
     except:
         pass
-
-    cur.close()
-    conn.close()
     
 # ==========================================
 # CONFIRM TRANSFER
@@ -7113,7 +10970,8 @@ from psycopg2.extras import RealDictCursor
 from datetime import datetime
 
 
-TRANSFER_LOCK = set()
+# Double-click guard na transfer — yana kare kansa idan worker ya mutu
+TRANSFER_LOCK = SharedStateDict("transfer_lock", ttl=120)
 
 @bot.callback_query_handler(func=lambda c: c.data == "confirm_transfer")
 def confirm_transfer(c):
@@ -7127,107 +10985,80 @@ def confirm_transfer(c):
     sender_username = c.from_user.username or "None"
 
     # ===== PREVENT DOUBLE CLICK =====
-    if uid in TRANSFER_LOCK:
+    if not TRANSFER_LOCK.claim(uid):
         return
 
-    TRANSFER_LOCK.add(uid)
-
     if uid not in TRANSFER_STAGE:
-        TRANSFER_LOCK.discard(uid)
+        TRANSFER_LOCK.pop(uid, None)
         return
 
-    friend_id = TRANSFER_STAGE[uid].get("friend_id")
-    friend_name = TRANSFER_STAGE[uid].get("friend_name","User")
-    amount = int(TRANSFER_STAGE[uid].get("amount",0))
+    stage = TRANSFER_STAGE.get(uid, {})
+    friend_id = stage.get("friend_id")
+    friend_name = stage.get("friend_name","User")
+    amount = int(stage.get("amount",0))
 
     if not friend_id or amount <= 0:
-        TRANSFER_LOCK.discard(uid)
-        return
-
-    conn = get_wallet_conn()
-    if not conn:
-        TRANSFER_LOCK.discard(uid)
+        TRANSFER_LOCK.pop(uid, None)
         return
 
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-
     try:
+        with db_session(wallet=True) as db:
+            cur = db.cursor(cursor_factory=RealDictCursor)
 
-        conn.autocommit = False
-
-        # ===== LOCK BALANCE =====
-        cur.execute(
-            "SELECT balance FROM wallet_balance WHERE user_id=%s FOR UPDATE",
-            (uid,)
-        )
-
-        row = cur.fetchone()
-        sender_balance = int(row["balance"]) if row else 0
-
-        if sender_balance < amount:
-
-            conn.rollback()
-
-            bot.edit_message_text(
-f"""❌ Transfer failed
-
-Your balance is not enough.
-
-Balance: ₦{sender_balance}
-Amount: ₦{amount}""",
-                chat_id=chat_id,
-                message_id=msg_id
+            # ===== LOCK BALANCE =====
+            cur.execute(
+                "SELECT balance FROM wallet_balance WHERE user_id=%s FOR UPDATE",
+                (uid,)
             )
 
-            TRANSFER_LOCK.discard(uid)
-            return
-
-        # ===== DEDUCT SENDER =====
-        cur.execute(
-            """
-            UPDATE wallet_balance
-            SET balance = balance - %s
-            WHERE user_id=%s
-            """,
-            (amount, uid)
-        )
+            row = cur.fetchone()
+            sender_balance = int(row["balance"]) if row else 0
 
-        # ===== ADD RECEIVER =====
-        cur.execute(
-            """
-            INSERT INTO wallet_balance (user_id, balance)
-            VALUES (%s,%s)
-            ON CONFLICT (user_id)
-            DO UPDATE SET balance = wallet_balance.balance + %s
-            """,
-            (friend_id, amount, amount)
-        )
+            if sender_balance < amount:
+                db.rollback()
+            else:
+                # ===== DEDUCT SENDER =====
+                cur.execute(
+                    """
+                    UPDATE wallet_balance
+                    SET balance = balance - %s
+                    WHERE user_id=%s
+                    """,
+                    (amount, uid)
+                )
 
-        # ===== TRANSACTION LOG =====
-        cur.execute(
-            """
-            INSERT INTO wallet_transactions
-            (user_id, amount, type, description)
-            VALUES (%s,%s,'transfer_out','Money sent')
-            """,
-            (uid, amount)
-        )
+                # ===== ADD RECEIVER =====
+                cur.execute(
+                    """
+                    INSERT INTO wallet_balance (user_id, balance)
+                    VALUES (%s,%s)
+                    ON CONFLICT (user_id)
+                    DO UPDATE SET balance = wallet_balance.balance + %s
+                    """,
+                    (friend_id, amount, amount)
+                )
 
-        cur.execute(
-            """
-            INSERT INTO wallet_transactions
-            (user_id, amount, type, description)
-            VALUES (%s,%s,'transfer_in','Money received')
-            """,
-            (friend_id, amount)
-        )
+                # ===== TRANSACTION LOG =====
+                cur.execute(
+                    """
+                    INSERT INTO wallet_transactions
+                    (user_id, amount, type, description)
+                    VALUES (%s,%s,'transfer_out','Money sent')
+                    """,
+                    (uid, amount)
+                )
 
-        conn.commit()
+                cur.execute(
+                    """
+                    INSERT INTO wallet_transactions
+                    (user_id, amount, type, description)
+                    VALUES (%s,%s,'transfer_in','Money received')
+                    """,
+                    (friend_id, amount)
+                )
 
     except Exception:
 
-        conn.rollback()
-
         bot.edit_message_text(
 """❌ Transfer failed
 
@@ -7237,14 +11068,24 @@ Please try again.""",
             message_id=msg_id
         )
 
-        cur.close()
-        conn.close()
-
-        TRANSFER_LOCK.discard(uid)
+        TRANSFER_LOCK.pop(uid, None)
         return
 
-    cur.close()
-    conn.close()
+    if sender_balance < amount:
+
+        bot.edit_message_text(
+f"""❌ Transfer failed
+
+Your balance is not enough.
+
+Balance: ₦{sender_balance}
+Amount: ₦{amount}""",
+            chat_id=chat_id,
+            message_id=msg_id
+        )
+
+        TRANSFER_LOCK.pop(uid, None)
+        return
 
     # ===== REMOVE SESSION =====
     if uid in TRANSFER_STAGE:
@@ -7309,7 +11150,7 @@ Status: SUCCESS"""
         pass
 
     # ===== RELEASE LOCK =====
-    TRANSFER_LOCK.discard(uid)    
+    TRANSFER_LOCK.pop(uid, None)    
 #=========================================================
 @bot.message_handler(
     func=lambda m: (
@@ -7409,36 +11250,30 @@ def howto_update_flow(m):
             return
 
         try:
-            conn = get_conn()
-            cur = conn.cursor()
+            with db_session() as db:
+                cur = db.cursor()
 
-            cur.execute("SELECT MAX(version) FROM how_to_buy")
-            last_version = cur.fetchone()[0] or 0
+                cur.execute("SELECT MAX(version) FROM how_to_buy")
+                last_version = cur.fetchone()[0] or 0
 
-            cur.execute(
-                """
-                INSERT INTO how_to_buy
-                (hausa_text, english_text, media_file_id, media_type, version)
-                VALUES (%s, %s, %s, %s, %s)
-                """,
-                (
-                    state["hausa_text"],
-                    state["english_text"],
-                    file_id,
-                    media_type,
-                    last_version + 1
+                cur.execute(
+                    """
+                    INSERT INTO how_to_buy
+                    (hausa_text, english_text, media_file_id, media_type, version)
+                    VALUES (%s, %s, %s, %s, %s)
+                    """,
+                    (
+                        state["hausa_text"],
+                        state["english_text"],
+                        file_id,
+                        media_type,
+                        last_version + 1
+                    )
                 )
-            )
 
-            conn.commit()
-            cur.close()
-            conn.close()
+                db.commit()
 
         except Exception as e:
-            try:
-                conn.rollback()
-            except:
-                pass
             print("HOWTO UPDATE ERROR:", e)
             return
 
@@ -7484,15 +11319,15 @@ def post_to_channel(m):
     if m.from_user.id != ADMIN_ID:
         return
 
-    cur.execute(
-        """
-        SELECT version
-        FROM how_to_buy
-        ORDER BY version DESC
-        LIMIT 1
-        """
-    )
-    row = cur.fetchone()
+    with db_session() as db:
+        row = db.execute(
+            """
+            SELECT version
+            FROM how_to_buy
+            ORDER BY version DESC
+            LIMIT 1
+            """
+        ).fetchone()
 
     if not row:
         bot.send_message(m.chat.id, "❌ Babu HOW TO BUY da aka saita tukuna.")
@@ -7540,18 +11375,17 @@ def howto_start_handler(m):
         return
 
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT hausa_text, english_text, media_file_id, media_type
-            FROM how_to_buy
-            WHERE version=%s
-            """,
-            (version,)
-        )
-        row = cur.fetchone()
-        cur.close()
+        with db_session() as db:
+            cur = db.cursor()
+            cur.execute(
+                """
+                SELECT hausa_text, english_text, media_file_id, media_type
+                FROM how_to_buy
+                WHERE version=%s
+                """,
+                (version,)
+            )
+            row = cur.fetchone()
     except Exception:
         return
 
@@ -7593,18 +11427,17 @@ def howto_language_switch(c):
         return
 
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT hausa_text, english_text
-            FROM how_to_buy
-            WHERE version=%s
-            """,
-            (version,)
-        )
-        row = cur.fetchone()
-        cur.close()
+        with db_session() as db:
+            cur = db.cursor()
+            cur.execute(
+                """
+                SELECT hausa_text, english_text
+                FROM how_to_buy
+                WHERE version=%s
+                """,
+                (version,)
+            )
+            row = cur.fetchone()
     except Exception:
         return
 
@@ -7640,7 +11473,7 @@ def admin_sales_command(msg):
         return
 
     now = _ng_now()
-    since = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    since = now.date().replace(day=1)
 
     send_sales_report(
         since,
@@ -8143,16 +11976,12 @@ def user_buttons(message):
 def clear_cart(uid):
     uid = str(uid)
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute(
-            "DELETE FROM cart WHERE user_id = %s",
-            (uid,)
-        )
-        conn.commit()
-        cur.close()
+        with db_session() as db:
+            db.execute(
+                "DELETE FROM cart WHERE user_id = %s",
+                (uid,)
+            )
     except Exception as e:
-        conn.rollback()
         print("CLEAR CART ERROR:", e)
 
 # ======================================
@@ -8160,37 +11989,29 @@ def clear_cart(uid):
 # ======================================
 def get_cart(uid):
     uid = str(uid)
-    conn = None
-    cur = None
 
     try:
-        conn = get_conn()
-        cur = conn.cursor()
+        with db_session() as db:
+            cur = db.cursor()
 
-        cur.execute("""
-            SELECT
-                c.item_id,
-                i.title,
-                i.price,
-                i.file_id
-            FROM cart c
-            JOIN items i ON i.id = c.item_id
-            WHERE c.user_id = %s
-            ORDER BY c.id DESC
-        """, (uid,))
+            cur.execute("""
+                SELECT
+                    c.item_id,
+                    i.title,
+                    i.price,
+                    i.file_id
+                FROM cart c
+                JOIN items i ON i.id = c.item_id
+                WHERE c.user_id = %s
+                ORDER BY c.id DESC
+            """, (uid,))
 
-        rows = cur.fetchall()
+            rows = cur.fetchall()
         return rows
 
     except Exception as e:
         print("GET_CART ERROR:", e)
         return []
-
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
 # ======================================
 def get_credits_for_user(user_id):
     return 0, []
@@ -8268,25 +12089,19 @@ def get_cart(uid):
     uid = str(uid)  # 🔐 MUHIMMI
 
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT
-                c.item_id,
-                i.title,
-                i.price,
-                i.file_id,
-                i.group_key
-            FROM cart c
-            JOIN items i ON i.id = c.item_id
-            WHERE c.user_id = %s
-            """,
-            (uid,)
-        )
-        rows = cur.fetchall()
-        cur.close()
-        return rows
+        with db_session() as db:
+            cur = db.cursor()
+            cur.execute(
+                "SELECT item_id FROM cart WHERE user_id = %s",
+                (uid,)
+            )
+            item_ids = [r[0] for r in cur.fetchall()]
+
+        # Bayanan item daga CATALOG (babu JOIN da items)
+        return [
+            (i.id, i.title, i.price, i.file_id, i.group_key)
+            for i in CATALOG.items(item_ids)
+        ]
 
     except Exception as e:
         # 🔥 DEBUG MAI KARFI
@@ -8423,25 +12238,35 @@ def cancel_order_handler(c):
     except Exception:
         return
 
-    conn = get_conn()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-
-    # 🔎 Tabbatar order na wannan user ne kuma unpaid
+    # 🔎 Tabbatar order na wannan user ne kuma unpaid, sannan a goge shi
     try:
-        cur.execute(
-            """
-            SELECT id
-            FROM orders
-            WHERE id=%s
-              AND user_id=%s
-              AND paid=0
-            """,
-            (order_id, uid)
-        )
-        order = cur.fetchone()
+        with db_session() as db:
+            cur = db.cursor(cursor_factory=RealDictCursor)
+            cur.execute(
+                """
+                SELECT id
+                FROM orders
+                WHERE id=%s
+                  AND user_id=%s
+                  AND paid=0
+                """,
+                (order_id, uid)
+            )
+            order = cur.fetchone()
+
+            if order:
+                # 🧹 Goge order_items gaba ɗaya
+                cur.execute(
+                    "DELETE FROM order_items WHERE order_id=%s",
+                    (order_id,)
+                )
+
+                # 🧹 Goge order
+                cur.execute(
+                    "DELETE FROM orders WHERE id=%s",
+                    (order_id,)
+                )
     except Exception:
-        cur.close()
-        conn.close()
         return
 
     if not order:
@@ -8454,29 +12279,6 @@ def cancel_order_handler(c):
             )
         except:
             pass
-
-        cur.close()
-        conn.close()
-        return
-
-    # 🧹 Goge order_items gaba ɗaya
-    try:
-        cur.execute(
-            "DELETE FROM order_items WHERE order_id=%s",
-            (order_id,)
-        )
-
-        # 🧹 Goge order
-        cur.execute(
-            "DELETE FROM orders WHERE id=%s",
-            (order_id,)
-        )
-
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        cur.close()
-        conn.close()
         return
 
     # ✏️ EDIT ORIGINAL MESSAGE INSTEAD OF SENDING NEW ONE
@@ -8490,9 +12292,6 @@ def cancel_order_handler(c):
     except:
         pass
 
-    cur.close()
-    conn.close()
-
 
 
 
@@ -8503,7 +12302,7 @@ def admin_sales_command(msg):
         return
 
     now = _ng_now()
-    since = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    since = now.date().replace(day=1)
 
     send_sales_report(
         since,
@@ -8694,98 +12493,96 @@ ORDERS_PER_PAGE = 5
 def build_unpaid_orders_view(uid, page):
     offset = page * ORDERS_PER_PAGE
 
-    conn = get_conn()
-    cur = conn.cursor()
+    with db_session() as db:
+        cur = db.cursor()
 
-    # ===== COUNT ORDERS (IGNORE EMPTY + OWNED ITEMS) =====
-    cur.execute(
-        """
-        SELECT COUNT(DISTINCT o.id)
-        FROM orders o
-        WHERE o.user_id=%s
-          AND o.paid=0
-          AND EXISTS (
-              SELECT 1 FROM order_items oi
-              WHERE oi.order_id = o.id
-                AND NOT EXISTS (
-                    SELECT 1 FROM user_movies um
-                    WHERE um.user_id=%s
-                      AND um.item_id=oi.item_id
-                )
-          )
-        """,
-        (uid, uid)
-    )
-    total = cur.fetchone()[0]
+        # ===== COUNT ORDERS (IGNORE EMPTY + OWNED ITEMS) =====
+        cur.execute(
+            """
+            SELECT COUNT(DISTINCT o.id)
+            FROM orders o
+            WHERE o.user_id=%s
+              AND o.paid=0
+              AND EXISTS (
+                  SELECT 1 FROM order_items oi
+                  WHERE oi.order_id = o.id
+                    AND NOT EXISTS (
+                        SELECT 1 FROM user_movies um
+                        WHERE um.user_id=%s
+                          AND um.item_id=oi.item_id
+                    )
+              )
+            """,
+            (uid, uid)
+        )
+        total = cur.fetchone()[0]
 
-    # ===== IF NO UNPAID LEFT =====
-    if total == 0:
+        # ===== IF NO UNPAID LEFT =====
+        if total == 0:
 
-        cur.close()
-        conn.close()
 
-        kb = InlineKeyboardMarkup()
-        kb.add(
-            InlineKeyboardButton(
-                "🏘 Our Channel",
-                url=f"https://t.me/{CHANNEL.lstrip('@')}"
+            kb = InlineKeyboardMarkup()
+            kb.add(
+                InlineKeyboardButton(
+                    "🏘 Our Channel",
+                    url=f"https://t.me/{CHANNEL.lstrip('@')}"
+                )
             )
-        )
 
-        return (
-            "📩<b>There are no unpaid orders.\n\nGo to our channel to buy Films</b>",
-            kb
-        )
+            return (
+                "📩<b>There are no unpaid orders.\n\nGo to our channel to buy Films</b>",
+                kb
+            )
 
-    # ===== TOTAL BALANCE (IGNORE OWNED ITEMS) =====
-    cur.execute(
-        """
-        SELECT COALESCE(SUM(o.amount), 0)
-        FROM orders o
-        WHERE o.user_id=%s
-          AND o.paid=0
-          AND EXISTS (
-              SELECT 1 FROM order_items oi
-              WHERE oi.order_id=o.id
-                AND NOT EXISTS (
-                    SELECT 1 FROM user_movies um
-                    WHERE um.user_id=%s
-                      AND um.item_id=oi.item_id
-                )
-          )
-        """,
-        (uid, uid)
-    )
-    total_amount = cur.fetchone()[0]
+        # ===== TOTAL BALANCE (IGNORE OWNED ITEMS) =====
+        cur.execute(
+            """
+            SELECT COALESCE(SUM(o.amount), 0)
+            FROM orders o
+            WHERE o.user_id=%s
+              AND o.paid=0
+              AND EXISTS (
+                  SELECT 1 FROM order_items oi
+                  WHERE oi.order_id=o.id
+                    AND NOT EXISTS (
+                        SELECT 1 FROM user_movies um
+                        WHERE um.user_id=%s
+                          AND um.item_id=oi.item_id
+                    )
+              )
+            """,
+            (uid, uid)
+        )
+        total_amount = cur.fetchone()[0]
 
-    # ===== FETCH ORDERS (OWNERSHIP SAFE) =====
-    cur.execute(
-        """
-        SELECT
-            o.id,
-            COUNT(oi.item_id) AS items_count,
-            o.amount AS amount,
-            MAX(i.title) AS title,
-            COUNT(DISTINCT i.group_key) AS gk_count,
-            MIN(oi.price) AS base_price,
-            MIN(i.group_key) AS group_key
-        FROM orders o
-        JOIN order_items oi ON oi.order_id = o.id
-        LEFT JOIN items i ON i.id = oi.item_id
-        WHERE o.user_id=%s
-          AND o.paid=0
-          AND NOT EXISTS (
-              SELECT 1 FROM user_movies um
-              WHERE um.user_id=%s
-                AND um.item_id=oi.item_id
-          )
-        GROUP BY o.id
-        ORDER BY o.created_at DESC
-        LIMIT %s OFFSET %s
-        """,
-        (uid, uid, ORDERS_PER_PAGE, offset)
-    )
-    rows = cur.fetchall()
+        # ===== FETCH ORDERS (OWNERSHIP SAFE) =====
+        cur.execute(
+            """
+            SELECT
+                o.id,
+                COUNT(oi.item_id) AS items_count,
+                o.amount AS amount,
+                MAX(i.title) AS title,
+                COUNT(DISTINCT i.group_key) AS gk_count,
+                MIN(oi.price) AS base_price,
+                MIN(i.group_key) AS group_key
+            FROM orders o
+            JOIN order_items oi ON oi.order_id = o.id
+            LEFT JOIN items i ON i.id = oi.item_id
+            WHERE o.user_id=%s
+              AND o.paid=0
+              AND NOT EXISTS (
+                  SELECT 1 FROM user_movies um
+                  WHERE um.user_id=%s
+                    AND um.item_id=oi.item_id
+              )
+            GROUP BY o.id
+            ORDER BY o.created_at DESC
+            LIMIT %s OFFSET %s
+            """,
+            (uid, uid, ORDERS_PER_PAGE, offset)
+        )
+        rows = cur.fetchall()
 
     text = f"📩<b>Your unpaid orders ({total})</b>\n\n"
     kb = InlineKeyboardMarkup()
@@ -8848,77 +12645,73 @@ def build_unpaid_orders_view(uid, page):
         )
     )
 
-    cur.close()
-    conn.close()
     return text, kb
 
 def build_paid_orders_view(uid, page):
     offset = page * ORDERS_PER_PAGE
 
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute(
-        "SELECT COUNT(*) FROM orders WHERE user_id=%s AND paid=1",
-        (uid,)
-    )
-    total = cur.fetchone()[0]
+    with db_session() as db:
+        cur = db.cursor()
 
-    if total == 0:
-        cur.close()
-        conn.close()
-        kb = InlineKeyboardMarkup()
-        kb.add(InlineKeyboardButton("🎥 PAID MOVIES", callback_data="my_movies"))
-        kb.add(
-            InlineKeyboardButton(
-                "🏘 Our Channel",
-                url=f"https://t.me/{CHANNEL.lstrip('@')}"
-            )
+        cur.execute(
+            "SELECT COUNT(*) FROM orders WHERE user_id=%s AND paid=1",
+            (uid,)
         )
-        return "📩 <b>There are no paid orders.\n\n Go to our Channel to buy films</b>", kb
-
-    cur.execute(
-        """
-        SELECT
-            o.id,
-            COUNT(oi.item_id) AS items_count,
-            MAX(i.title) AS title,
-            COUNT(DISTINCT i.group_key) AS gk_count
-        FROM orders o
-        JOIN order_items oi ON oi.order_id = o.id
-        LEFT JOIN items i ON i.id = oi.item_id
-        WHERE o.user_id=%s AND o.paid=1
-        GROUP BY o.id
-        ORDER BY o.created_at DESC
-        LIMIT %s OFFSET %s
-        """,
-        (uid, ORDERS_PER_PAGE, offset)
-    )
-    rows = cur.fetchall()
+        total = cur.fetchone()[0]
 
-    text = f"📩 <b>Your paid orders ({total})</b>\n\n"
-    kb = InlineKeyboardMarkup()
+        if total == 0:
+            kb = InlineKeyboardMarkup()
+            kb.add(InlineKeyboardButton("🎥 PAID MOVIES", callback_data="my_movies"))
+            kb.add(
+                InlineKeyboardButton(
+                    "🏘 Our Channel",
+                    url=f"https://t.me/{CHANNEL.lstrip('@')}"
+                )
+            )
+            return "📩 <b>There are no paid orders.\n\n Go to our Channel to buy films</b>", kb
 
-    for oid, count, title, gk_count in rows:
         cur.execute(
-            "SELECT COUNT(*) FROM user_movies WHERE order_id=%s AND user_id=%s",
-            (oid, uid)
+            """
+            SELECT
+                o.id,
+                COUNT(oi.item_id) AS items_count,
+                MAX(i.title) AS title,
+                COUNT(DISTINCT i.group_key) AS gk_count
+            FROM orders o
+            JOIN order_items oi ON oi.order_id = o.id
+            LEFT JOIN items i ON i.id = oi.item_id
+            WHERE o.user_id=%s AND o.paid=1
+            GROUP BY o.id
+            ORDER BY o.created_at DESC
+            LIMIT %s OFFSET %s
+            """,
+            (uid, ORDERS_PER_PAGE, offset)
         )
-        delivered = cur.fetchone()[0]
+        rows = cur.fetchall()
 
-        remain = count - delivered
+        text = f"📩 <b>Your paid orders ({total})</b>\n\n"
+        kb = InlineKeyboardMarkup()
 
-        if count > 1 and gk_count == 1:
-            name = f"{title} (EP {count})"
-        else:
-            name = title or f"Group order ({count} items)"
+        for oid, count, title, gk_count in rows:
+            cur.execute(
+                "SELECT COUNT(*) FROM user_movies WHERE order_id=%s AND user_id=%s",
+                (oid, uid)
+            )
+            delivered = cur.fetchone()[0]
 
-        short = name[:27] + "…" if len(name) > 27 else name
+            remain = count - delivered
 
-        if remain > 0:
-            text += f"• {short} — ✅ Paid (Remaining: {remain})\n"
-        else:
-            text += f"• {short} — ✅ Arrived\n"
+            if count > 1 and gk_count == 1:
+                name = f"{title} (EP {count})"
+            else:
+                name = title or f"Group order ({count} items)"
+
+            short = name[:27] + "…" if len(name) > 27 else name
+
+            if remain > 0:
+                text += f"• {short} — ✅ Paid (Remaining: {remain})\n"
+            else:
+                text += f"• {short} — ✅ Arrived\n"
 
     nav = []
     if page > 0:
@@ -8946,12 +12739,9 @@ def build_paid_orders_view(uid, page):
         )
     )
 
-    cur.close()
-    conn.close()
     return text, kb
 
 
-
 # ---------- START handler (VIEW) ----------
 @bot.message_handler(commands=['start'])
 def start_handler(msg):
@@ -8994,12 +12784,7 @@ def groupitem_deeplink_handler(msg):
     if not tokens:
         return
 
-    # ✅ SAFE CONNECTION
-    conn = get_conn()
-    if not conn:
-        return
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-
+    # ========= ITEMS (CATALOG) =========
     item_ids = []
 
     try:
@@ -9010,85 +12795,22 @@ def groupitem_deeplink_handler(msg):
 
             # ==== IF GROUP KEY ====
             else:
-                cur.execute(
-                    "SELECT id FROM items WHERE group_key=%s",
-                    (token,)
-                )
-                rows = cur.fetchall()
-                item_ids.extend([r["id"] for r in rows])
-
-    except Exception:
-        cur.close()
-        conn.close()
-        return
+                item_ids.extend(i.id for i in CATALOG.group(token))
 
-    if not item_ids:
-        cur.close()
-        conn.close()
-        return
-
-    # ========= FETCH ITEMS =========
-    try:
-        placeholders = ",".join(["%s"] * len(item_ids))
-        cur.execute(
-            f"""
-            SELECT id, title, price, file_id, group_key
-            FROM items
-            WHERE id IN ({placeholders})
-            """,
-            tuple(item_ids)
-        )
-        items = cur.fetchall()
+        items = [
+            i._asdict()
+            for i in CATALOG.items(dict.fromkeys(item_ids))
+        ]
     except Exception:
-        cur.close()
-        conn.close()
-        return
-
-    if not items:
-        cur.close()
-        conn.close()
         return
 
     # ========= FILE_ID REQUIRED =========
     items = [i for i in items if i.get("file_id")]
     if not items:
-        cur.close()
-        conn.close()
         return
 
     item_ids_clean = [i["id"] for i in items]
 
-    # ========= OWNERSHIP CHECK =========
-    try:
-        cur.execute(
-            f"""
-            SELECT 1 FROM user_movies
-            WHERE user_id=%s
-              AND item_id IN ({",".join(["%s"] * len(item_ids_clean))})
-            LIMIT 1
-            """,
-            (uid, *item_ids_clean)
-        )
-        owned = cur.fetchone()
-    except Exception:
-        cur.close()
-        conn.close()
-        return
-
-    if owned:
-        kb = InlineKeyboardMarkup()
-        kb.add(InlineKeyboardButton("📽 PAID MOVIES", callback_data="my_movies"))
-        bot.send_message(
-            uid,
-            "✅ You have already purchased this movie.\n\n"
-            "Please check your *Paid Movies* to download it again.",
-            parse_mode="Markdown",
-            reply_markup=kb
-        )
-        cur.close()
-        conn.close()
-        return
-
     # ========= GROUP_KEY PRICING =========
     groups = {}
     for i in items:
@@ -9100,55 +12822,73 @@ def groupitem_deeplink_handler(msg):
     item_count = len(items)
 
     if total <= 0:
-        cur.close()
-        conn.close()
         return
 
-    # ========= REUSE / CREATE ORDER =========
     try:
-        cur.execute(
-            f"""
-            SELECT o.id
-            FROM orders o
-            JOIN order_items oi ON oi.order_id = o.id
-            WHERE o.user_id=%s
-              AND o.paid=0
-              AND oi.item_id IN ({",".join(["%s"] * len(item_ids_clean))})
-            GROUP BY o.id
-            HAVING COUNT(DISTINCT oi.item_id)=%s
-            LIMIT 1
-            """,
-            (uid, *item_ids_clean, len(item_ids_clean))
-        )
-        row = cur.fetchone()
-    except Exception:
-        cur.close()
-        conn.close()
-        return
+        with db_session() as db:
+            cur = db.cursor(cursor_factory=RealDictCursor)
 
-    if row:
-        order_id = row["id"]
-    else:
-        order_id = str(uuid.uuid4())
-        try:
+            # ========= OWNERSHIP CHECK =========
             cur.execute(
-                "INSERT INTO orders (id, user_id, amount, paid, type) VALUES (%s,%s,%s,0,'film')",
-                (order_id, uid, total)
+                f"""
+                SELECT 1 FROM user_movies
+                WHERE user_id=%s
+                  AND item_id IN ({",".join(["%s"] * len(item_ids_clean))})
+                LIMIT 1
+                """,
+                (uid, *item_ids_clean)
             )
-            for i in items:
+            owned = cur.fetchone()
+
+            order_id = None
+            if not owned:
+                # ========= REUSE / CREATE ORDER =========
                 cur.execute(
-                    """
-                    INSERT INTO order_items (order_id, item_id, file_id, price)
-                    VALUES (%s,%s,%s,%s)
+                    f"""
+                    SELECT o.id
+                    FROM orders o
+                    JOIN order_items oi ON oi.order_id = o.id
+                    WHERE o.user_id=%s
+                      AND o.paid=0
+                      AND oi.item_id IN ({",".join(["%s"] * len(item_ids_clean))})
+                    GROUP BY o.id
+                    HAVING COUNT(DISTINCT oi.item_id)=%s
+                    LIMIT 1
                     """,
-                    (order_id, i["id"], i["file_id"], int(i["price"] or 0))
+                    (uid, *item_ids_clean, len(item_ids_clean))
                 )
-            conn.commit()
-        except Exception:
-            conn.rollback()
-            cur.close()
-            conn.close()
-            return
+                row = cur.fetchone()
+
+                if row:
+                    order_id = row["id"]
+                else:
+                    order_id = str(uuid.uuid4())
+                    cur.execute(
+                        "INSERT INTO orders (id, user_id, amount, paid, type) VALUES (%s,%s,%s,0,'film')",
+                        (order_id, uid, total)
+                    )
+                    for i in items:
+                        cur.execute(
+                            """
+                            INSERT INTO order_items (order_id, item_id, file_id, price)
+                            VALUES (%s,%s,%s,%s)
+                            """,
+                            (order_id, i["id"], i["file_id"], int(i["price"] or 0))
+                        )
+    except Exception:
+        return
+
+    if owned:
+        kb = InlineKeyboardMarkup()
+        kb.add(InlineKeyboardButton("📽 PAID MOVIES", callback_data="my_movies"))
+        bot.send_message(
+            uid,
+            "✅ You have already purchased this movie.\n\n"
+            "Please check your *Paid Movies* to download it again.",
+            parse_mode="Markdown",
+            reply_markup=kb
+        )
+        return
 
     # ========= FLUTTERWAVE (An sauya daga Paystack) =========
     display_title = f"{item_count} film(s)"
@@ -9157,8 +12897,6 @@ def groupitem_deeplink_handler(msg):
 
     if not pay_url:
         bot.send_message(uid, "❌ Sorry, payment gateway is down. Try again later.")
-        cur.close()
-        conn.close()
         return
 
     # ========= FIXED TITLE DISPLAY =========
@@ -9205,9 +12943,6 @@ def groupitem_deeplink_handler(msg):
     # ===== STORE MESSAGE FOR AUTO DELETE AFTER PAYMENT =====
     ORDER_MESSAGES[order_id] = (sent.chat.id, sent.message_id)
 
-    cur.close()
-    conn.close()
-
 
    
 
@@ -9216,7 +12951,7 @@ def groupitem_deeplink_handler(msg):
 
 # ================= ADMIN MANUAL SUPPORT SYSTEM ===========
 
-ADMIN_SUPPORT = {}
+ADMIN_SUPPORT = SharedStateDict("admin_support")
 
 # ---------- /problem ----------
 @bot.message_handler(commands=["problem"])
@@ -9280,21 +13015,25 @@ def admin_support_flow(m):
     stage = data.get("stage")
     text = (m.text or "").strip()
 
-    conn = None
-    cur = None
-
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-
         # ===== RESEND ORDER =====
         if stage == "wait_order_id":
 
-            cur.execute(
-                "SELECT user_id, amount, paid FROM orders WHERE id=%s",
-                (text,)
-            )
-            row = cur.fetchone()
+            with db_session() as db:
+                cur = db.cursor()
+                cur.execute(
+                    "SELECT user_id, amount, paid FROM orders WHERE id=%s",
+                    (text,)
+                )
+                row = cur.fetchone()
+
+                items = []
+                if row and row[2] == 1:
+                    cur.execute(
+                        "SELECT item_id FROM order_items WHERE order_id=%s",
+                        (text,)
+                    )
+                    items = cur.fetchall()
 
             if not row:
                 ADMIN_SUPPORT.pop(m.from_user.id, None)
@@ -9316,12 +13055,6 @@ def admin_support_flow(m):
                 )
                 return
 
-            cur.execute(
-                "SELECT item_id FROM order_items WHERE order_id=%s",
-                (text,)
-            )
-            items = cur.fetchall()
-
             if not items:
                 ADMIN_SUPPORT.pop(m.from_user.id, None)
                 bot.send_message(
@@ -9360,6 +13093,7 @@ Tura <b>/sendall</b> domin a sake tura items.""",
 
             data["gift_user"] = int(text)
             data["stage"] = "gift_message"
+            ADMIN_SUPPORT[m.from_user.id] = data
 
             bot.send_message(
                 m.chat.id,
@@ -9371,6 +13105,7 @@ Tura <b>/sendall</b> domin a sake tura items.""",
         if stage == "gift_message":
             data["gift_message"] = text
             data["stage"] = "gift_item"
+            ADMIN_SUPPORT[m.from_user.id] = data
 
             bot.send_message(
                 m.chat.id,
@@ -9379,23 +13114,11 @@ Tura <b>/sendall</b> domin a sake tura items.""",
             )
             return
 
-        if stage == "gift_item":
-            q = text.lower()
-
-            cur.execute(
-                """
-                SELECT file_id, title
-                FROM items
-                WHERE LOWER(title) LIKE %s
-                   OR LOWER(file_name) LIKE %s
-                ORDER BY id DESC
-                LIMIT 1
-                """,
-                (f"%{q}%", f"%{q}%")
-            )
-            row = cur.fetchone()
+        if stage in ("gift_item", "gift_pick"):
+            # Fuzzy search na iya kuskure → admin ya zabi item da kansa
+            found = CATALOG.search(text, limit=5)
 
-            if not row:
+            if not found:
                 ADMIN_SUPPORT.pop(m.from_user.id, None)
                 bot.send_message(
                     m.chat.id,
@@ -9404,40 +13127,124 @@ Tura <b>/sendall</b> domin a sake tura items.""",
                 )
                 return
 
-            file_id, title = row
+            data["stage"] = "gift_pick"
+            ADMIN_SUPPORT[m.from_user.id] = data
 
-            try:
-                bot.send_video(
-                    data["gift_user"],
-                    file_id,
-                    caption=data["gift_message"]
-                )
-            except:
-                bot.send_document(
-                    data["gift_user"],
-                    file_id,
-                    caption=data["gift_message"]
-                )
+            kb = InlineKeyboardMarkup()
+            for item in found:
+                kb.add(InlineKeyboardButton(f"🎬 {item.title}", callback_data=f"giftpick:{item.id}"))
+            kb.add(InlineKeyboardButton("❌ Cancel", callback_data="giftpick:cancel"))
 
             bot.send_message(
                 m.chat.id,
-                f"""🎁 <b>An kammala</b>
+                "🎬 Zabi item da za a tura (ko ka sake rubuta suna):",
+                parse_mode="HTML",
+                reply_markup=kb
+            )
+
+    except Exception as e:
+        print("ADMIN_SUPPORT_FLOW DB ERROR:", e)
+
+
+# ---------- GIFT: ADMIN YA ZABI ITEM ----------
+@bot.callback_query_handler(func=lambda c: c.data.startswith("giftpick:"))
+def admin_gift_pick(c):
+    if c.from_user.id != ADMIN_ID:
+        return
+
+    data = ADMIN_SUPPORT.get(c.from_user.id)
+    if not data or data.get("stage") != "gift_pick":
+        bot.answer_callback_query(c.id, "⚠️ Gift ya kare, sake /problem.")
+        return
+
+    choice = c.data.split(":", 1)[1]
+    if choice == "cancel":
+        ADMIN_SUPPORT.pop(c.from_user.id, None)
+        bot.answer_callback_query(c.id, "❌ An soke")
+        return
+
+    item = CATALOG.item(int(choice))
+    if not item:
+        bot.answer_callback_query(c.id, "❌ Item babu shi yanzu.")
+        return
+
+    # pop kafin tura → danna sau biyu ba zai tura kyauta biyu ba
+    if ADMIN_SUPPORT.pop(c.from_user.id, None) is None:
+        bot.answer_callback_query(c.id)
+        return
+    bot.answer_callback_query(c.id)
+
+    send_media_by_kind(
+        data["gift_user"],
+        item.file_id,
+        caption=data["gift_message"],
+        kind=item.media_kind
+    )
+
+    bot.send_message(
+        c.from_user.id,
+        f"""🎁 <b>An kammala</b>
 
 👤 User ID: <code>{data['gift_user']}</code>
-🎬 Item: <b>{title}</b>""",
-                parse_mode="HTML"
-            )
+🎬 Item: <b>{item.title}</b>""",
+        parse_mode="HTML"
+    )
 
-            ADMIN_SUPPORT.pop(m.from_user.id, None)
 
+# ================= 🔍 RESEND SEARCH (USER TEXT) =================
+# Sai fina-finan da user ya riga ya saya ake nema (CATALOG.search, typo/prefix).
+@bot.message_handler(
+    func=lambda m: m.text
+    and user_states.get(m.from_user.id, {}).get("action") == "_resend_search_"
+)
+def resend_search_text(m):
+    uid = m.from_user.id
+    text = m.text.strip()
+
+    try:
+        with db_session() as db:
+            owned = [
+                r[0] for r in db.execute(
+                    "SELECT DISTINCT item_id FROM user_movies WHERE user_id=%s",
+                    (uid,)
+                ).fetchall()
+            ]
     except Exception as e:
-        print("ADMIN_SUPPORT_FLOW DB ERROR:", e)
+        print("RESEND SEARCH DB ERROR:", e)
+        bot.send_message(uid, "❌ Database error.")
+        return
 
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
+    if not owned:
+        user_states.pop(uid, None)
+        bot.send_message(uid, "❌ You have no purchased movies yet.")
+        return
+
+    found = CATALOG.search(text, limit=10, allowed=owned)
+
+    if not found:
+        bot.send_message(
+            uid,
+            "❌ No purchased movie matches that name.\n"
+            "Try again with another name or first letter(s)."
+        )
+        return
+
+    kb = InlineKeyboardMarkup()
+    for item in found:
+        kb.add(
+            InlineKeyboardButton(
+                f"🎬 {item.title}",
+                callback_data=f"resend_one:{item.id}"
+            )
+        )
+
+    user_states.pop(uid, None)
+    bot.send_message(
+        uid,
+        "🎥 <b>Your movies</b>\nTap a movie to resend it.",
+        parse_mode="HTML",
+        reply_markup=kb
+    )
 
 
 
@@ -9450,153 +13257,163 @@ from psycopg2.extras import RealDictCursor
 @bot.callback_query_handler(func=lambda c: c.data == "payall:")
 def pay_all_unpaid(call):
     uid = call.from_user.id
-    user_name = call.from_user.first_name or "Customer"
-    bot.answer_callback_query(call.id)
-
-    try:
-        conn = get_conn()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-
-        # ==================================================
-        # 1️⃣ FETCH ALL UNPAID ORDER ITEMS
-        # ==================================================
-        cur.execute(
-            """
-            SELECT
-                o.id        AS old_order_id,
-                i.id        AS item_id,
-                i.title,
-                i.price,
-                i.file_id,
-                i.group_key
-            FROM orders o
-            JOIN order_items oi ON oi.order_id = o.id
-            JOIN items i ON i.id = oi.item_id
-            WHERE o.user_id=%s
-              AND o.paid=0
-            """,
-            (uid,)
-        )
-        rows = cur.fetchall()
-
-        if not rows:
-            bot.send_message(uid, "❌ No unpaid orders found.")
-            return
+    user_name = call.from_user.first_name or "Customer"
+    bot.answer_callback_query(call.id)
 
-        # ==================================================
-        # 2️⃣ REMOVE OWNED ITEMS
-        # ==================================================
-        all_item_ids = list({r["item_id"] for r in rows})
+    try:
+        with db_session() as db:
+            cur = db.cursor(cursor_factory=RealDictCursor)
 
-        if all_item_ids:
+            # ==================================================
+            # 1️⃣ FETCH ALL UNPAID ORDER ITEMS
+            # ==================================================
             cur.execute(
-                f"""
-                SELECT item_id
-                FROM user_movies
-                WHERE user_id=%s
-                  AND item_id IN ({",".join(["%s"] * len(all_item_ids))})
+                """
+                SELECT
+                    o.id        AS old_order_id,
+                    oi.item_id
+                FROM orders o
+                JOIN order_items oi ON oi.order_id = o.id
+                WHERE o.user_id=%s
+                  AND o.paid=0
                 """,
-                (uid, *all_item_ids)
+                (uid,)
             )
-            owned_ids = {r["item_id"] for r in cur.fetchall()}
-        else:
-            owned_ids = set()
+            links = cur.fetchall()
+            catalog = {i.id: i for i in CATALOG.items(r["item_id"] for r in links)}
 
-        if owned_ids:
-            kb_owned = InlineKeyboardMarkup()
-            kb_owned.add(
-                InlineKeyboardButton("📽 PAID MOVIES", callback_data="my_movies")
-            )
+            rows = []
+            for r in links:
+                item = catalog.get(r["item_id"])
+                if item is None:
+                    continue
+                rows.append({
+                    "old_order_id": r["old_order_id"],
+                    "item_id": item.id,
+                    "title": item.title,
+                    "price": item.price,
+                    "file_id": item.file_id,
+                    "group_key": item.group_key,
+                })
 
-            bot.send_message(
-                uid,
-                "You have already purchased some of these movies.\n"
-                "You can access them anytime from your paid movies section below.",
-                reply_markup=kb_owned
-            )
+            if not rows:
+                bot.send_message(uid, "❌ No unpaid orders found.")
+                return
 
-        items = [
-            r for r in rows
-            if r["file_id"]
-            and int(r["price"] or 0) > 0
-            and r["item_id"] not in owned_ids
-        ]
+            # ==================================================
+            # 2️⃣ REMOVE OWNED ITEMS
+            # ==================================================
+            all_item_ids = list({r["item_id"] for r in rows})
 
-        if not items:
-            bot.send_message(uid, "❌ No payable items.")
-            return
+            if all_item_ids:
+                cur.execute(
+                    f"""
+                    SELECT item_id
+                    FROM user_movies
+                    WHERE user_id=%s
+                      AND item_id IN ({",".join(["%s"] * len(all_item_ids))})
+                    """,
+                    (uid, *all_item_ids)
+                )
+                owned_ids = {r["item_id"] for r in cur.fetchall()}
+            else:
+                owned_ids = set()
 
-        item_ids = list({i["item_id"] for i in items})
-        old_order_ids = list({i["old_order_id"] for i in items})
+            if owned_ids:
+                kb_owned = InlineKeyboardMarkup()
+                kb_owned.add(
+                    InlineKeyboardButton("📽 PAID MOVIES", callback_data="my_movies")
+                )
 
-        # ==================================================
-        # 3️⃣ GROUP KEY LOGIC
-        # ==================================================
-        groups = {}
+                bot.send_message(
+                    uid,
+                    "You have already purchased some of these movies.\n"
+                    "You can access them anytime from your paid movies section below.",
+                    reply_markup=kb_owned
+                )
 
-        for i in items:
-            key = i["group_key"] or f"single_{i['item_id']}"
-            if key not in groups:
-                groups[key] = {
-                    "price": int(i["price"]),
-                    "items": []
-                }
-            groups[key]["items"].append(i)
+            items = [
+                r for r in rows
+                if r["file_id"]
+                and int(r["price"] or 0) > 0
+                and r["item_id"] not in owned_ids
+            ]
 
-        total_amount = sum(g["price"] for g in groups.values())
+            if not items:
+                bot.send_message(uid, "❌ No payable items.")
+                return
 
-        if total_amount <= 0:
-            bot.send_message(uid, "❌ Invalid total amount.")
-            return
+            item_ids = list({i["item_id"] for i in items})
+            old_order_ids = list({i["old_order_id"] for i in items})
 
-        # ==================================================
-        # 4️⃣ CREATE COLLECTOR ORDER
-        # ==================================================
-        order_id = str(uuid.uuid4())
+            # ==================================================
+            # 3️⃣ GROUP KEY LOGIC
+            # ==================================================
+            groups = {}
 
-        # Mun saka type='film' domin webhook ya gane
-        cur.execute(
-            """
-            INSERT INTO orders (id, user_id, amount, paid, type)
-            VALUES (%s, %s, %s, 0, 'film')
-            """,
-            (order_id, uid, total_amount)
-        )
+            for i in items:
+                key = i["group_key"] or f"single_{i['item_id']}"
+                if key not in groups:
+                    groups[key] = {
+                        "price": int(i["price"]),
+                        "items": []
+                    }
+                groups[key]["items"].append(i)
 
-        for g in groups.values():
-            for i in g["items"]:
-                cur.execute(
-                    """
-                    INSERT INTO order_items
-                    (order_id, item_id, file_id, price)
-                    VALUES (%s, %s, %s, %s)
-                    """,
-                    (order_id, i["item_id"], i["file_id"], g["price"])
-                )
+            total_amount = sum(g["price"] for g in groups.values())
 
-        conn.commit()
+            if total_amount <= 0:
+                bot.send_message(uid, "❌ Invalid total amount.")
+                return
 
-        # ==================================================
-        # 5️⃣ DELETE OLD ORDERS
-        # ==================================================
-        if old_order_ids:
-            cur.execute(
-                f"""
-                DELETE FROM order_items
-                WHERE order_id IN ({",".join(["%s"] * len(old_order_ids))})
-                """,
-                tuple(old_order_ids)
-            )
+            # ==================================================
+            # 4️⃣ CREATE COLLECTOR ORDER
+            # ==================================================
+            order_id = str(uuid.uuid4())
 
+            # Mun saka type='film' domin webhook ya gane
             cur.execute(
-                f"""
-                DELETE FROM orders
-                WHERE id IN ({",".join(["%s"] * len(old_order_ids))})
+                """
+                INSERT INTO orders (id, user_id, amount, paid, type)
+                VALUES (%s, %s, %s, 0, 'film')
                 """,
-                tuple(old_order_ids)
+                (order_id, uid, total_amount)
             )
 
-            conn.commit()
+            for g in groups.values():
+                for i in g["items"]:
+                    cur.execute(
+                        """
+                        INSERT INTO order_items
+                        (order_id, item_id, file_id, price)
+                        VALUES (%s, %s, %s, %s)
+                        """,
+                        (order_id, i["item_id"], i["file_id"], g["price"])
+                    )
+
+            db.commit()
+
+            # ==================================================
+            # 5️⃣ DELETE OLD ORDERS
+            # ==================================================
+            if old_order_ids:
+                cur.execute(
+                    f"""
+                    DELETE FROM order_items
+                    WHERE order_id IN ({",".join(["%s"] * len(old_order_ids))})
+                    """,
+                    tuple(old_order_ids)
+                )
+
+                cur.execute(
+                    f"""
+                    DELETE FROM orders
+                    WHERE id IN ({",".join(["%s"] * len(old_order_ids))})
+                    """,
+                    tuple(old_order_ids)
+                )
+
+                db.commit()
 
         # ==================================================
         # 6️⃣ FLUTTERWAVE (An sauya daga Paystack)
@@ -9667,21 +13484,12 @@ def pay_all_unpaid(call):
         print(traceback.format_exc())
         pass
 
-    finally:
-        try:
-            cur.close()
-            conn.close()
-        except:
-            pass
-
 
 import uuid
 from datetime import datetime
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
 from telebot.apihelper import ApiTelegramException
 
-series_sessions = {}
-
 # ===============================
 # COLLECT SERIES FILES (PRO EDIT VERSION)
 # ===============================
@@ -9692,10 +13500,6 @@ series_sessions = {}
 def series_collect_files(m):
 
     uid = m.from_user.id
-    sess = series_sessions.get(uid)
-
-    if not sess or sess.get("stage") != "collect":
-        return
 
     try:
         # ================= GET FILE =================
@@ -9707,27 +13511,35 @@ def series_collect_files(m):
             file_name = m.document.file_name or "file"
 
         # ================= SAVE =================
-        sess["files"].append({
-            "dm_file_id": dm_file_id,
-            "file_name": file_name
-        })
+        # Files suna zuwa a lokaci guda → append a karkashin row lock
+        with series_sessions.mutate(uid) as sess:
+            if not sess or sess.get("stage") != "collect":
+                return
 
-        total = len(sess["files"])
+            sess["files"].append({
+                "dm_file_id": dm_file_id,
+                "file_name": file_name
+            })
+
+            total = len(sess["files"])
+            progress_msg_id = sess.get("progress_msg_id")
 
         # ================= CREATE OR EDIT MESSAGE =================
-        if not sess.get("progress_msg_id"):
+        if not progress_msg_id:
 
             msg = bot.send_message(
                 uid,
                 f"✅ An karɓi (1)\n📂 {file_name}"
             )
-            sess["progress_msg_id"] = msg.message_id
+            with series_sessions.mutate(uid) as sess:
+                if sess is not None:
+                    sess["progress_msg_id"] = msg.message_id
 
         else:
             bot.edit_message_text(
                 f"✅ An karɓi ({total})\n📂 {file_name}",
                 uid,
-                sess["progress_msg_id"]
+                progress_msg_id
             )
 
     except ApiTelegramException as e:
@@ -9804,6 +13616,7 @@ def series_done(m):
     )
 
     sess["stage"] = "ask_hausa"
+    series_sessions[uid] = sess
 
     kb = InlineKeyboardMarkup()
     kb.add(
@@ -9823,21 +13636,26 @@ def handle_hausa_choice(c):
     sess = series_sessions.get(uid)
     bot.answer_callback_query(c.id)
 
+    if not sess:
+        return
+
     if c.data == "hausa_no":
         sess["hausa_matches"] = []
         sess["stage"] = "meta"
+        series_sessions[uid] = sess
         bot.send_message(uid, "📸 Turo poster + caption (suna da farashi)")
         return
 
     sess["stage"] = "hausa_names"
+    series_sessions[uid] = sess
     bot.send_message(uid, "✍️ Rubuta sunayen Hausa series (layi-layi)")
 
 # ===============================
 # RECEIVE HAUSA TITLES
 # ===============================
 @bot.message_handler(
-    func=lambda m: m.text and m.from_user.id in series_sessions
-    and series_sessions[m.from_user.id].get("stage") == "hausa_names"
+    func=lambda m: m.text
+    and series_sessions.get(m.from_user.id, {}).get("stage") == "hausa_names"
 )
 def receive_hausa_titles(m):
     uid = m.from_user.id
@@ -9855,6 +13673,7 @@ def receive_hausa_titles(m):
 
     sess["hausa_matches"] = matches
     sess["stage"] = "meta"
+    series_sessions[uid] = sess
 
     bot.send_message(uid, "📸 Yanzu turo poster + caption (suna da farashi)")
 
@@ -9919,20 +13738,13 @@ def series_finalize(m):
 
     poster_file_id = m.photo[-1].file_id
 
-    # ================= DB CONNECT =================
-    try:
-        conn = get_conn()
-        cur = conn.cursor()
-    except:
-        return
-
     # ================= CREATE SERIES =================
     try:
-        cur.execute(
-            "INSERT INTO series (title, price, poster_file_id) VALUES (%s,%s,%s) RETURNING id",
-            (title, price, poster_file_id)
-        )
-        series_id = cur.fetchone()[0]
+        with db_session() as db:
+            series_id = db.execute(
+                "INSERT INTO series (title, price, poster_file_id) VALUES (%s,%s,%s) RETURNING id",
+                (title, price, poster_file_id)
+            ).fetchone()[0]
     except Exception as e:
         print(f"Series DB Error: {e}")
         return
@@ -9949,38 +13761,13 @@ def series_finalize(m):
     )
 
     # ================= SAFE SEND =================
+    # Upload na storage bulk ne: TG_LIMITER yana jiran 429 da kansa
     def safe_send_document(chat_id, file_id, caption):
-
-        while True:
-            try:
+        try:
+            with telegram_bulk():
                 return bot.send_document(chat_id, file_id, caption=caption)
-
-            except ApiTelegramException as e:
-
-                if e.error_code == 429:
-                    retry = int(e.result_json["parameters"]["retry_after"])
-
-                    bot.edit_message_text(
-                        f"⏸ Rate limit hit.\nWaiting {retry}s...\n"
-                        f"{len(item_ids)}/{total_files} saved",
-                        ADMIN_ID,
-                        progress_msg.message_id
-                    )
-
-                    time.sleep(retry)
-
-                    bot.edit_message_text(
-                        f"⏳ Loading... ({len(item_ids)}/{total_files})",
-                        ADMIN_ID,
-                        progress_msg.message_id
-                    )
-
-                    continue
-                else:
-                    return None
-
-            except:
-                return None
+        except:
+            return None
 
     # ================= UPLOAD LOOP =================
     for f in sess["files"]:
@@ -9998,28 +13785,30 @@ def series_finalize(m):
         if not doc:
             continue
 
+        # Kowane item session nasa → kuskure daya ba ya goge sauran
         try:
-            cur.execute(
-                """
-                INSERT INTO items
-                (title, price, file_id, file_name, group_key,
-                 created_at, channel_msg_id, channel_username, cashback_amount)
-                VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                RETURNING id
-                """,
-                (
-                    title,
-                    price,
-                    doc.file_id,
-                    f["file_name"],
-                    group_key,
-                    created_at,
-                    msg.message_id,
-                    STORAGE_CHANNEL,
-                    cashback_amount  # Adana cashback na fim ɗin
-                )
-            )
-            new_id = cur.fetchone()[0]
+            with db_session() as db:
+                new_id = db.execute(
+                    """
+                    INSERT INTO items
+                    (title, price, file_id, file_name, group_key,
+                     created_at, channel_msg_id, channel_username, cashback_amount, media_kind)
+                    VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+                    RETURNING id
+                    """,
+                    (
+                        title,
+                        price,
+                        doc.file_id,
+                        f["file_name"],
+                        group_key,
+                        created_at,
+                        msg.message_id,
+                        STORAGE_CHANNEL,
+                        cashback_amount,  # Adana cashback na fim ɗin
+                        media_kind(doc.file_id, media_kind_of_message(msg))
+                    )
+                ).fetchone()[0]
             item_ids.append(new_id)
 
         except Exception as e:
@@ -10033,17 +13822,6 @@ def series_finalize(m):
             progress_msg.message_id
         )
 
-        time.sleep(1.1)
-
-    # ================= COMMIT =================
-    try:
-        conn.commit()
-    except:
-        pass
-
-    cur.close()
-    conn.close()
-
     # ================= PUBLIC POST =================
     try:
         display_price = f"{price:,}" if has_comma else str(price)
@@ -10138,29 +13916,25 @@ def handle_callback(c):
         # ==================================================
         # REMOVE OWNED MOVIES
         # ==================================================
-        conn = None
-        cur = None
-
         try:
-            conn = get_conn()
-            cur = conn.cursor(cursor_factory=RealDictCursor)
-
             all_ids = []
             for g in groups.values():
                 for item_id, _, _ in g["items"]:
                     all_ids.append(item_id)
 
             if all_ids:
-                cur.execute(
-                    f"""
-                    SELECT item_id FROM user_movies
-                    WHERE user_id=%s
-                    AND item_id IN ({",".join(["%s"]*len(all_ids))})
-                    """,
-                    (uid, *all_ids)
-                )
+                with db_session() as db:
+                    cur = db.cursor(cursor_factory=RealDictCursor)
+                    cur.execute(
+                        f"""
+                        SELECT item_id FROM user_movies
+                        WHERE user_id=%s
+                        AND item_id IN ({",".join(["%s"]*len(all_ids))})
+                        """,
+                        (uid, *all_ids)
+                    )
 
-                owned_ids = {r["item_id"] for r in cur.fetchall()}
+                    owned_ids = {r["item_id"] for r in cur.fetchall()}
             else:
                 owned_ids = set()
 
@@ -10183,15 +13957,6 @@ def handle_callback(c):
         except:
             return
 
-        finally:
-            try:
-                if cur:
-                    cur.close()
-                if conn:
-                    conn.close()
-            except:
-                pass
-
         # ==================================================
         # CALCULATE TOTAL
         # ==================================================
@@ -10207,46 +13972,30 @@ def handle_callback(c):
         # ==================================================
         # CREATE ORDER
         # ==================================================
-        conn = None
-        cur = None
-
         try:
-            conn = get_conn()
-            cur = conn.cursor(cursor_factory=RealDictCursor)
-
-            # Mun kara type='film' domin Flutterwave Webhook ya gane
-            cur.execute(
-                "INSERT INTO orders (id,user_id,amount,paid,type) VALUES (%s,%s,%s,0,'film')",
-                (order_id, uid, total)
-            )
+            with db_session() as db:
+                cur = db.cursor(cursor_factory=RealDictCursor)
 
-            for g in groups.values():
-                for item_id, title, file_id in g["items"]:
-                    cur.execute(
-                        """
-                        INSERT INTO order_items
-                        (order_id,item_id,file_id,price)
-                        VALUES (%s,%s,%s,%s)
-                        """,
-                        (order_id, item_id, file_id, g["price"])
-                    )
+                # Mun kara type='film' domin Flutterwave Webhook ya gane
+                cur.execute(
+                    "INSERT INTO orders (id,user_id,amount,paid,type) VALUES (%s,%s,%s,0,'film')",
+                    (order_id, uid, total)
+                )
 
-            conn.commit()
+                for g in groups.values():
+                    for item_id, title, file_id in g["items"]:
+                        cur.execute(
+                            """
+                            INSERT INTO order_items
+                            (order_id,item_id,file_id,price)
+                            VALUES (%s,%s,%s,%s)
+                            """,
+                            (order_id, item_id, file_id, g["price"])
+                        )
 
         except:
-            if conn:
-                conn.rollback()
             return
 
-        finally:
-            try:
-                if cur:
-                    cur.close()
-                if conn:
-                    conn.close()
-            except:
-                pass
-
         # ==================================================
         # CLEAR CART
         # ==================================================
@@ -10387,60 +14136,49 @@ def handle_callback(c):
 
             mood, order_id = parts[1], parts[2]
 
-            conn = get_conn()              # ✅ GYARA KADAI
-            cur = conn.cursor()
-
-            cur.execute(
-                """
-                SELECT paid
-                FROM orders
-                WHERE id=%s AND user_id=%s
-                """,
-                (order_id, uid)
-            )
-            row = cur.fetchone()
+            with db_session() as db:
+                cur = db.cursor()
 
-            if not row or row[0] != 1:
-                cur.close()
-                conn.close()               # ✅ GYARA KADAI
-                bot.answer_callback_query(
-                    c.id,
-                    "⚠️ Wannan order ba naka bane ko ba'a biya ba.",
-                    show_alert=True
+                cur.execute(
+                    """
+                    SELECT paid
+                    FROM orders
+                    WHERE id=%s AND user_id=%s
+                    """,
+                    (order_id, uid)
                 )
-                return
+                row = cur.fetchone()
 
-            cur.execute(
-                "SELECT 1 FROM feedbacks WHERE order_id=%s",
-                (order_id,)
-            )
-            if cur.fetchone():
-                cur.close()
-                conn.close()               # ✅ GYARA KADAI
-                bot.answer_callback_query(
-                    c.id,
-                    "Ka riga ka bada ra'ayi.",
-                    show_alert=True
+                if not row or row[0] != 1:
+                    bot.answer_callback_query(
+                        c.id,
+                        "⚠️ Wannan order ba naka bane ko ba'a biya ba.",
+                        show_alert=True
+                    )
+                    return
+
+                cur.execute(
+                    "SELECT 1 FROM feedbacks WHERE order_id=%s",
+                    (order_id,)
                 )
-                return
+                if cur.fetchone():
+                    bot.answer_callback_query(
+                        c.id,
+                        "Ka riga ka bada ra'ayi.",
+                        show_alert=True
+                    )
+                    return
 
-            cur.execute(
-                """
-                INSERT INTO feedbacks (order_id, user_id, mood)
-                VALUES (%s, %s, %s)
-                """,
-                (order_id, uid, mood)
-            )
-            conn.commit()
-            cur.close()
-            conn.close()                   # ✅ GYARA KADAI
+                cur.execute(
+                    """
+                    INSERT INTO feedbacks (order_id, user_id, mood)
+                    VALUES (%s, %s, %s)
+                    """,
+                    (order_id, uid, mood)
+                )
+                db.commit()
 
         except Exception:
-            try:
-                cur.close()
-                conn.close()               # ✅ GYARA KADAI
-            except:
-                pass
             bot.answer_callback_query(
                 c.id,
                 "⚠️ Ba a iya adana ra'ayi ba",
@@ -10522,82 +14260,37 @@ def handle_callback(c):
     if data.startswith("addcartdm:"):
         try:
             raw = data.split(":", 1)[1]
-            parts = raw.replace("|", "_").split("_")
-        except:
-            bot.answer_callback_query(c.id, "❌ Invalid item")
-            return
-
-        if not parts:
-            bot.answer_callback_query(c.id, "❌ Invalid item")
-            return
-
-        added = 0
-        skipped = 0
-        owned = 0   # ✅ NEW
-
-        try:
-            conn = get_conn()
-            cur = conn.cursor()
-
-            for part in parts:
-
-                # =====================
-                # IF NUMERIC → ITEM ID
-                # =====================
-                if part.isdigit():
-
-                    cur.execute(
-                        "SELECT id FROM items WHERE id=%s",
-                        (part,)
-                    )
-                    if not cur.fetchone():
-                        skipped += 1
-                        continue
-
-                    # ✅ CHECK IF USER ALREADY OWNS ITEM
-                    cur.execute(
-                        """
-                        SELECT 1 FROM order_items oi
-                        JOIN orders o ON o.id = oi.order_id
-                        WHERE o.user_id=%s AND oi.item_id=%s AND o.paid=1
-                        """,
-                        (uid, part)
-                    )
-                    if cur.fetchone():
-                        owned += 1
-                        continue
+            parts = raw.replace("|", "_").split("_")
+        except:
+            bot.answer_callback_query(c.id, "❌ Invalid item")
+            return
 
-                    cur.execute(
-                        "SELECT 1 FROM cart WHERE user_id=%s AND item_id=%s",
-                        (uid, part)
-                    )
-                    if cur.fetchone():
-                        skipped += 1
-                        continue
+        if not parts:
+            bot.answer_callback_query(c.id, "❌ Invalid item")
+            return
 
-                    cur.execute(
-                        "INSERT INTO cart (user_id, item_id) VALUES (%s, %s)",
-                        (uid, part)
-                    )
-                    added += 1
+        added = 0
+        skipped = 0
+        owned = 0   # ✅ NEW
 
-                # =====================
-                # OTHERWISE → GROUP KEY
-                # =====================
-                else:
+        try:
+            with db_session() as db:
+                cur = db.cursor()
 
-                    cur.execute(
-                        "SELECT id FROM items WHERE group_key=%s",
-                        (part,)
-                    )
-                    group_items = cur.fetchall()
+                for part in parts:
 
-                    if not group_items:
-                        skipped += 1
-                        continue
+                    # =====================
+                    # IF NUMERIC → ITEM ID
+                    # =====================
+                    if part.isdigit():
 
-                    for row in group_items:
-                        item_id = row[0]
+                        cur.execute(
+                            "SELECT id FROM items WHERE id=%s",
+                            (part,)
+                        )
+                        if not cur.fetchone():
+                            skipped += 1
+                            continue
 
                         # ✅ CHECK IF USER ALREADY OWNS ITEM
                         cur.execute(
@@ -10606,7 +14299,7 @@ def handle_callback(c):
                             JOIN orders o ON o.id = oi.order_id
                             WHERE o.user_id=%s AND oi.item_id=%s AND o.paid=1
                             """,
-                            (uid, item_id)
+                            (uid, part)
                         )
                         if cur.fetchone():
                             owned += 1
@@ -10614,7 +14307,7 @@ def handle_callback(c):
 
                         cur.execute(
                             "SELECT 1 FROM cart WHERE user_id=%s AND item_id=%s",
-                            (uid, item_id)
+                            (uid, part)
                         )
                         if cur.fetchone():
                             skipped += 1
@@ -10622,14 +14315,58 @@ def handle_callback(c):
 
                         cur.execute(
                             "INSERT INTO cart (user_id, item_id) VALUES (%s, %s)",
-                            (uid, item_id)
+                            (uid, part)
                         )
                         added += 1
 
-            conn.commit()
+                    # =====================
+                    # OTHERWISE → GROUP KEY
+                    # =====================
+                    else:
+
+                        cur.execute(
+                            "SELECT id FROM items WHERE group_key=%s",
+                            (part,)
+                        )
+                        group_items = cur.fetchall()
+
+                        if not group_items:
+                            skipped += 1
+                            continue
+
+                        for row in group_items:
+                            item_id = row[0]
+
+                            # ✅ CHECK IF USER ALREADY OWNS ITEM
+                            cur.execute(
+                                """
+                                SELECT 1 FROM order_items oi
+                                JOIN orders o ON o.id = oi.order_id
+                                WHERE o.user_id=%s AND oi.item_id=%s AND o.paid=1
+                                """,
+                                (uid, item_id)
+                            )
+                            if cur.fetchone():
+                                owned += 1
+                                continue
+
+                            cur.execute(
+                                "SELECT 1 FROM cart WHERE user_id=%s AND item_id=%s",
+                                (uid, item_id)
+                            )
+                            if cur.fetchone():
+                                skipped += 1
+                                continue
+
+                            cur.execute(
+                                "INSERT INTO cart (user_id, item_id) VALUES (%s, %s)",
+                                (uid, item_id)
+                            )
+                            added += 1
+
+                db.commit()
 
         except Exception:
-            conn.rollback()
             bot.answer_callback_query(c.id, "❌ Add to cart failed")
             return
 
@@ -10671,51 +14408,40 @@ def handle_callback(c):
         removed = 0
 
         try:
-            conn = get_conn()
-            cur = conn.cursor()
+            with db_session() as db:
+                cur = db.cursor()
 
-            parts = [p.strip() for p in raw.split("_") if p.strip()]
-            ids = set()
+                parts = [p.strip() for p in raw.split("_") if p.strip()]
+                ids = set()
 
-            for part in parts:
+                for part in parts:
 
-                # ===== ID =====
-                if part.isdigit():
-                    ids.add(int(part))
-
-                # ===== GROUP KEY =====
-                else:
-                    cur.execute(
-                        "SELECT id FROM items WHERE group_key=%s",
-                        (part,)
-                    )
-                    rows = cur.fetchall()
-                    for r in rows:
-                        ids.add(r[0])
+                    # ===== ID =====
+                    if part.isdigit():
+                        ids.add(int(part))
 
-            if not ids:
-                bot.answer_callback_query(c.id, "❌ No item selected")
-                return
+                    # ===== GROUP KEY =====
+                    else:
+                        cur.execute(
+                            "SELECT id FROM items WHERE group_key=%s",
+                            (part,)
+                        )
+                        rows = cur.fetchall()
+                        for r in rows:
+                            ids.add(r[0])
 
-            for item_id in ids:
-                cur.execute(
-                    "DELETE FROM cart WHERE user_id=%s AND item_id=%s",
-                    (uid, item_id)
-                )
-                removed += cur.rowcount
+                if not ids:
+                    bot.answer_callback_query(c.id, "❌ No item selected")
+                    return
 
-            conn.commit()
-            cur.close()
-            conn.close()
+                for item_id in ids:
+                    cur.execute(
+                        "DELETE FROM cart WHERE user_id=%s AND item_id=%s",
+                        (uid, item_id)
+                    )
+                    removed += cur.rowcount
 
         except Exception:
-            try:
-                conn.rollback()
-                cur.close()
-                conn.close()
-            except:
-                pass
-
             bot.answer_callback_query(c.id, "❌ Remove failed")
             return
 
@@ -10748,24 +14474,12 @@ def handle_callback(c):
     # =====================
     if data == "clearcart":
         try:
-            conn = get_conn()
-            cur = conn.cursor()
-            cur.execute(
-                "DELETE FROM cart WHERE user_id=%s",
-                (uid,)
-            )
-            removed = cur.rowcount
-            conn.commit()
-            cur.close()
-            conn.close()
+            with db_session() as db:
+                removed = db.execute(
+                    "DELETE FROM cart WHERE user_id=%s",
+                    (uid,)
+                ).rowcount
         except Exception:
-            try:
-                conn.rollback()
-                cur.close()
-                conn.close()
-            except:
-                pass
-
             bot.answer_callback_query(c.id, "❌ Clear failed")
             return
 
@@ -10860,11 +14574,11 @@ def handle_callback(c):
             return
 
         try:
-            conn = get_conn()
-            used = conn.execute(
-                "SELECT COUNT(*) FROM resend_logs WHERE user_id=%s",
-                (uid,)
-            ).fetchone()[0]
+            with db_session() as db:
+                used = db.execute(
+                    "SELECT COUNT(*) FROM resend_logs WHERE user_id=%s",
+                    (uid,)
+                ).fetchone()[0]
         except:
             bot.answer_callback_query(c.id, "❌ Database error.")
             return
@@ -10879,18 +14593,18 @@ def handle_callback(c):
             return
 
         try:
-            conn = get_conn()
-            rows = conn.execute(
-                """
-                SELECT DISTINCT ui.item_id, i.file_id, i.title
-                FROM user_movies ui
-                JOIN items i ON i.id = ui.item_id
-                WHERE ui.user_id=%s
-                  AND ui.created_at >= NOW() - INTERVAL '%s days'
-                ORDER BY ui.created_at ASC
-                """,
-                (uid, days)
-            ).fetchall()
+            with db_session() as db:
+                rows = db.execute(
+                    """
+                    SELECT DISTINCT ui.item_id, i.file_id, i.title, i.media_kind
+                    FROM user_movies ui
+                    JOIN items i ON i.id = ui.item_id
+                    WHERE ui.user_id=%s
+                      AND ui.created_at >= NOW() - INTERVAL '%s days'
+                    ORDER BY ui.created_at ASC
+                    """,
+                    (uid, days)
+                ).fetchall()
         except:
             bot.answer_callback_query(c.id, "❌ Database error.")
             return
@@ -10900,19 +14614,18 @@ def handle_callback(c):
             bot.answer_callback_query(c.id)
             return
 
-        for _, file_id, title in rows:
+        for _, file_id, title, kind in rows:
             try:
-                bot.send_video(uid, file_id, caption=f"🎬 {title}")
+                send_media_by_kind(uid, file_id, caption=f"🎬 {title}", kind=kind)
             except:
-                bot.send_document(uid, file_id, caption=f"🎬 {title}")
+                pass
 
         try:
-            conn = get_conn()
-            conn.execute(
-                "INSERT INTO resend_logs (user_id, used_at) VALUES (%s, NOW())",
-                (uid,)
-            )
-            conn.commit()
+            with db_session() as db:
+                db.execute(
+                    "INSERT INTO resend_logs (user_id, used_at) VALUES (%s, NOW())",
+                    (uid,)
+                )
         except:
             pass
 
@@ -10934,11 +14647,11 @@ def handle_callback(c):
             return
 
         try:
-            conn = get_conn()
-            used = conn.execute(
-                "SELECT COUNT(*) FROM resend_logs WHERE user_id=%s",
-                (uid,)
-            ).fetchone()[0]
+            with db_session() as db:
+                used = db.execute(
+                    "SELECT COUNT(*) FROM resend_logs WHERE user_id=%s",
+                    (uid,)
+                ).fetchone()[0]
         except:
             bot.answer_callback_query(c.id, "❌ Database error.")
             return
@@ -10952,17 +14665,17 @@ def handle_callback(c):
             return
 
         try:
-            conn = get_conn()
-            row = conn.execute(
-                """
-                SELECT i.file_id, i.title
-                FROM user_movies ui
-                JOIN items i ON i.id = ui.item_id
-                WHERE ui.user_id=%s AND ui.item_id=%s
-                LIMIT 1
-                """,
-                (uid, item_id)
-            ).fetchone()
+            with db_session() as db:
+                row = db.execute(
+                    """
+                    SELECT i.file_id, i.title, i.media_kind
+                    FROM user_movies ui
+                    JOIN items i ON i.id = ui.item_id
+                    WHERE ui.user_id=%s AND ui.item_id=%s
+                    LIMIT 1
+                    """,
+                    (uid, item_id)
+                ).fetchone()
         except:
             bot.answer_callback_query(c.id, "❌ Database error.")
             return
@@ -10971,20 +14684,19 @@ def handle_callback(c):
             bot.answer_callback_query(c.id, "❌ Movie not found.")
             return
 
-        file_id, title = row
+        file_id, title, kind = row
 
         try:
-            bot.send_video(uid, file_id, caption=f"🎬 {title}")
+            send_media_by_kind(uid, file_id, caption=f"🎬 {title}", kind=kind)
         except:
-            bot.send_document(uid, file_id, caption=f"🎬 {title}")
+            pass
 
         try:
-            conn = get_conn()
-            conn.execute(
-                "INSERT INTO resend_logs (user_id, used_at) VALUES (%s, NOW())",
-                (uid,)
-            )
-            conn.commit()
+            with db_session() as db:
+                db.execute(
+                    "INSERT INTO resend_logs (user_id, used_at) VALUES (%s, NOW())",
+                    (uid,)
+                )
         except:
             pass
 
@@ -11045,39 +14757,33 @@ def handle_callback(c):
         oid = data.split(":", 1)[1]
 
         try:
-            conn = get_conn()
-            cur = conn.cursor()
+            with db_session() as db:
+                cur = db.cursor()
 
-            cur.execute(
-                """
-                SELECT 1 FROM orders
-                WHERE id=%s AND user_id=%s AND paid=0
-                """,
-                (oid, uid)
-            )
-            if not cur.fetchone():
-                bot.answer_callback_query(c.id, "❌ Order not found")
-                cur.close()
-                return
+                cur.execute(
+                    """
+                    SELECT 1 FROM orders
+                    WHERE id=%s AND user_id=%s AND paid=0
+                    """,
+                    (oid, uid)
+                )
+                if not cur.fetchone():
+                    bot.answer_callback_query(c.id, "❌ Order not found")
+                    return
 
-            cur.execute(
-                "DELETE FROM order_items WHERE order_id=%s",
-                (oid,)
-            )
+                cur.execute(
+                    "DELETE FROM order_items WHERE order_id=%s",
+                    (oid,)
+                )
 
-            cur.execute(
-                "DELETE FROM orders WHERE id=%s",
-                (oid,)
-            )
+                cur.execute(
+                    "DELETE FROM orders WHERE id=%s",
+                    (oid,)
+                )
 
-            conn.commit()
-            cur.close()
+                db.commit()
 
         except Exception:
-            try:
-                conn.rollback()
-            except:
-                pass
             bot.answer_callback_query(c.id, "❌ Failed to remove")
             return
 
@@ -11097,36 +14803,31 @@ def handle_callback(c):
     # =====================
     if data == "delete_unpaid":
         try:
-            conn = get_conn()
-            cur = conn.cursor()
+            with db_session() as db:
+                cur = db.cursor()
 
-            cur.execute(
-                """
-                DELETE FROM order_items
-                WHERE order_id IN (
-                    SELECT id FROM orders
-                    WHERE user_id=%s AND paid=0
+                cur.execute(
+                    """
+                    DELETE FROM order_items
+                    WHERE order_id IN (
+                        SELECT id FROM orders
+                        WHERE user_id=%s AND paid=0
+                    )
+                    """,
+                    (uid,)
                 )
-                """,
-                (uid,)
-            )
 
-            cur.execute(
-                """
-                DELETE FROM orders
-                WHERE user_id=%s AND paid=0
-                """,
-                (uid,)
-            )
+                cur.execute(
+                    """
+                    DELETE FROM orders
+                    WHERE user_id=%s AND paid=0
+                    """,
+                    (uid,)
+                )
 
-            conn.commit()
-            cur.close()
+                db.commit()
 
         except Exception:
-            try:
-                conn.rollback()
-            except:
-                pass
             bot.answer_callback_query(c.id, "❌ Failed to delete")
             return
 
@@ -11198,13 +14899,14 @@ def handle_callback(c):
 
     # ================= CHECK ORDER =================
     try:
-        row = conn.execute(
-            """
-            SELECT id FROM orders
-            WHERE id=%s AND user_id=%s AND paid=1
-            """,
-            (order_id, uid)
-        ).fetchone()
+        with db_session() as db:
+            row = db.execute(
+                """
+                SELECT id FROM orders
+                WHERE id=%s AND user_id=%s AND paid=1
+                """,
+                (order_id, uid)
+            ).fetchone()
     except Exception as e:
         print("❌ DB ERROR (ORDER CHECK):", e)
         bot.answer_callback_query(
@@ -11225,10 +14927,11 @@ def handle_callback(c):
         return
 
     # ================= CHECK DUPLICATE =================
-    exists = conn.execute(
-        "SELECT 1 FROM feedbacks WHERE order_id=%s",
-        (order_id,)
-    ).fetchone()
+    with db_session() as db:
+        exists = db.execute(
+            "SELECT 1 FROM feedbacks WHERE order_id=%s",
+            (order_id,)
+        ).fetchone()
 
     print("🧾 FEEDBACK EXISTS:", exists)
 
@@ -11242,14 +14945,14 @@ def handle_callback(c):
 
     # ================= INSERT FEEDBACK =================
     try:
-        conn.execute(
-            """
-            INSERT INTO feedbacks (order_id, user_id, mood)
-            VALUES (%s, %s, %s)
-            """,
-            (order_id, uid, mood)
-        )
-        conn.commit()
+        with db_session() as db:
+            db.execute(
+                """
+                INSERT INTO feedbacks (order_id, user_id, mood)
+                VALUES (%s, %s, %s)
+                """,
+                (order_id, uid, mood)
+            )
     except Exception as e:
         print("❌ INSERT FEEDBACK ERROR:", e)
         bot.answer_callback_query(
@@ -11329,9 +15032,10 @@ def handle_callback(c):
             bot.answer_callback_query(c.id, "Invalid.")
             return
 
-        row = conn.execute(
-            "SELECT items FROM weekly ORDER BY id DESC LIMIT 1"
-        ).fetchone()
+        with db_session() as db:
+            row = db.execute(
+                "SELECT items FROM weekly ORDER BY id DESC LIMIT 1"
+            ).fetchone()
 
         if not row:
             bot.answer_callback_query(c.id, "No weekly items.")
@@ -11506,62 +15210,59 @@ def handle_callback(c):
 def myorders(message):
     uid = message.from_user.id
 
-    conn = None
-    cur = None
-
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-
-        cur.execute(
-            """
-            SELECT id, amount, paid
-            FROM orders
-            WHERE user_id=%s
-            ORDER BY created_at DESC
-            """,
-            (uid,)
-        )
-        rows = cur.fetchall()
+        with db_session() as db:
+            cur = db.cursor()
 
-        if not rows:
-            bot.reply_to(
-                message,
-                "❌ You don’t have any orders yet.",
-                reply_markup=reply_menu(uid)
-            )
-            return
-
-        txt = "🛒 <b>Your Orders</b>\n\n"
-
-        for oid, amount, paid in rows:
-            amount = int(amount or 0)
-
-            # 🔒 SAFE COUNT (order_items ONLY)
             cur.execute(
                 """
-                SELECT COUNT(*)
-                FROM order_items
-                WHERE order_id=%s
+                SELECT id, amount, paid
+                FROM orders
+                WHERE user_id=%s
+                ORDER BY created_at DESC
                 """,
-                (oid,)
+                (uid,)
             )
-            info = cur.fetchone()
-            items_count = info[0] if info else 0
+            rows = cur.fetchall()
 
-            # 🛡 KARIYA: idan babu item kwata-kwata, tsallake
-            if items_count <= 0:
-                continue
+            if not rows:
+                bot.reply_to(
+                    message,
+                    "❌ You don’t have any orders yet.",
+                    reply_markup=reply_menu(uid)
+                )
+                return
 
-            # 🏷 LABEL
-            label = "1 item" if items_count == 1 else f"Group items ({items_count})"
+            txt = "🛒 <b>Your Orders</b>\n\n"
 
-            txt += (
-                f"🆔 <code>{oid}</code>\n"
-                f"📦 {label}\n"
-                f"💰 Amount: ₦{amount}\n"
-                f"💳 Status: {'✅ Paid' if paid else '❌ Unpaid'}\n\n"
-            )
+            for oid, amount, paid in rows:
+                amount = int(amount or 0)
+
+                # 🔒 SAFE COUNT (order_items ONLY)
+                cur.execute(
+                    """
+                    SELECT COUNT(*)
+                    FROM order_items
+                    WHERE order_id=%s
+                    """,
+                    (oid,)
+                )
+                info = cur.fetchone()
+                items_count = info[0] if info else 0
+
+                # 🛡 KARIYA: idan babu item kwata-kwata, tsallake
+                if items_count <= 0:
+                    continue
+
+                # 🏷 LABEL
+                label = "1 item" if items_count == 1 else f"Group items ({items_count})"
+
+                txt += (
+                    f"🆔 <code>{oid}</code>\n"
+                    f"📦 {label}\n"
+                    f"💰 Amount: ₦{amount}\n"
+                    f"💳 Status: {'✅ Paid' if paid else '❌ Unpaid'}\n\n"
+                )
 
         bot.send_message(
             uid,
@@ -11577,12 +15278,6 @@ def myorders(message):
             "⚠️ An samu matsala. Sake gwadawa daga baya.",
             reply_markup=reply_menu(uid)
         )
-
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
 #s ========== ADMIN FILE UPLOAD (ITEMS ONLY
 
 # ================== SALES REPORT SYSTEM (ITEMS BASED – POSTGRES FIXED) ==================
@@ -11602,41 +15297,130 @@ def _last_day_of_month(dt):
     return (nxt - timedelta(days=nxt.day)).day
 
 
-# ================= ONE REPORT ENGINE =================
-def send_sales_report(since_dt, title, target_chat_id, silent_if_empty=False):
+# ================= DAILY SALES ROLLUP =================
+# Kowane order da aka biya yana kara layi guda a daily_sales (day, grp)
+# a cikin transaction din da ya mayar da shi paid=1. Report ba ya sake
+# hada orders/order_items/items — yana karanta rollup kawai.
+# `day` ranar Najeriya ce (Africa/Lagos), kamar windows na reports.
+SALES_TZ = "Africa/Lagos"
 
-    conn = get_conn()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+_SALES_SOURCES = {
+    "orders": "order_items",
+    "g_orders": "g_order_items",
+}
 
+
+def _grouped_sales_sql(source, where=""):
+    # Layi daya ga kowane (order, group) — farashin group sau daya
+    return f"""
+        SELECT
+            o.id AS order_id,
+            -- created_at (TIMESTAMP) yana a session TimeZone → ranar Najeriya
+            (COALESCE(o.created_at::timestamptz, NOW()) AT TIME ZONE '{SALES_TZ}')::date AS day,
+            COALESCE(i.group_key, 'single_' || i.id) AS grp,
+            MIN(i.title) AS title,
+            MAX(oi.price) AS group_price
+        FROM {source} o
+        JOIN {_SALES_SOURCES[source]} oi ON oi.order_id = o.id
+        JOIN items i ON i.id = oi.item_id
+        WHERE o.paid = 1 {where}
+        GROUP BY o.id, day, grp
+    """
+
+
+def rollup_paid_orders(cur, order_ids, source="orders"):
+    """
+    Kara orders da suka zama paid yanzu cikin daily_sales.
+    A kira shi sau daya kawai, daga transaction din da ya yi paid=0 → 1.
+    """
+    order_ids = list(order_ids or [])
+    if not order_ids:
+        return
+
+    cur.execute(
+        f"""
+        INSERT INTO daily_sales (day, grp, title, orders, total)
+        SELECT day, grp, MIN(title), COUNT(*), SUM(group_price)
+        FROM ({_grouped_sales_sql(source, "AND o.id = ANY(%s)")}) g
+        GROUP BY day, grp
+        ON CONFLICT (day, grp) DO UPDATE
+        SET orders = daily_sales.orders + EXCLUDED.orders,
+            total = daily_sales.total + EXCLUDED.total,
+            title = LEAST(daily_sales.title, EXCLUDED.title)
+        """,
+        (order_ids,)
+    )
+
+
+def rebuild_daily_sales(db):
+    """Sake gina daily_sales gaba daya daga orders + g_orders."""
+    db.execute("LOCK TABLE daily_sales IN EXCLUSIVE MODE")
+    db.execute("DELETE FROM daily_sales")
+    db.execute(f"""
+        INSERT INTO daily_sales (day, grp, title, orders, total)
+        SELECT day, grp, MIN(title), COUNT(*), SUM(group_price)
+        FROM (
+            {_grouped_sales_sql("orders")}
+            UNION ALL
+            {_grouped_sales_sql("g_orders")}
+        ) g
+        GROUP BY day, grp
+    """)
+    db.execute(f"COMMENT ON TABLE daily_sales IS 'tz={SALES_TZ}'")
+    return db.execute("SELECT COUNT(*) FROM daily_sales").fetchone()[0]
+
+
+def ensure_daily_sales_table():
     try:
-        cur.execute(
-            """
-            WITH grouped_orders AS (
+        with db_session() as db:
+            existed = db.execute("SELECT to_regclass('daily_sales')").fetchone()[0]
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS daily_sales (
+                    day DATE NOT NULL,
+                    grp TEXT NOT NULL,
+                    title TEXT,
+                    orders INTEGER NOT NULL DEFAULT 0,
+                    total BIGINT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, grp)
+                )
+            """)
+            # Sabon table, ko rows na tsohon calendar (session tz) → sake gina shi
+            tz = db.execute("SELECT obj_description('daily_sales'::regclass)").fetchone()[0]
+            if not existed or tz != f"tz={SALES_TZ}":
+                rows = rebuild_daily_sales(db)
+                print(f"📈 daily_sales backfilled: {rows} rows")
+    except Exception as e:
+        print("❌ daily_sales table error:", e)
+
+
+ensure_daily_sales_table()
+
+
+# ================= ONE REPORT ENGINE =================
+def send_sales_report(since_day, title, target_chat_id, silent_if_empty=False):
+    """since_day: ranar Najeriya ta farko (date) da report ya hada."""
+
+    try:
+        with db_session() as db:
+            cur = db.cursor(cursor_factory=RealDictCursor)
+
+            # Rollup na kwana-kwana: window yana farawa daga since_day
+            cur.execute(
+                """
                 SELECT
-                    o.id AS order_id,
-                    COALESCE(i.group_key, 'single_' || i.id) AS grp,
-                    MIN(i.title) AS title,
-                    MAX(oi.price) AS group_price
-                FROM orders o
-                JOIN order_items oi ON oi.order_id = o.id
-                JOIN items i ON i.id = oi.item_id
-                WHERE o.paid = 1
-                  AND o.created_at >= %s
-                GROUP BY o.id, grp
+                    grp,
+                    MIN(title) AS title,
+                    SUM(orders) AS orders,
+                    SUM(total) AS total
+                FROM daily_sales
+                WHERE day >= %s
+                GROUP BY grp
+                ORDER BY total DESC
+                """,
+                (since_day,)
             )
-            SELECT
-                grp,
-                MIN(title) AS title,
-                COUNT(order_id) AS orders,
-                SUM(group_price) AS total
-            FROM grouped_orders
-            GROUP BY grp
-            ORDER BY total DESC
-            """,
-            (since_dt,)
-        )
 
-        rows = cur.fetchall()
+            rows = cur.fetchall()
 
     except Exception as e:
         bot.send_message(
@@ -11645,10 +15429,6 @@ def send_sales_report(since_dt, title, target_chat_id, silent_if_empty=False):
         )
         return
 
-    finally:
-        cur.close()
-        conn.close()
-
     # ===== NO SALES =====
     if not rows:
         if not silent_if_empty:
@@ -11683,7 +15463,8 @@ def send_sales_report(since_dt, title, target_chat_id, silent_if_empty=False):
 
 # ================= AUTOMATIC WEEKLY (GROUP) =================
 def weekly_sales():
-    since = _ng_now() - timedelta(days=7)
+    # Kwana 7 daidai (Asabar → Juma'a): ranar Juma'a ta baya tana report na baya
+    since = (_ng_now() - timedelta(days=6)).date()
     send_sales_report(
         since,
         "📊 WEEKLY SALES REPORT",
@@ -11695,7 +15476,7 @@ def weekly_sales():
 # ================= AUTOMATIC MONTHLY (GROUP) =================
 def monthly_sales():
     now = _ng_now()
-    since = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    since = now.date().replace(day=1)
 
     send_sales_report(
         since,
@@ -11706,30 +15487,10 @@ def monthly_sales():
 
 
 # ================= SCHEDULER =================
-def sales_report_scheduler():
-    weekly_sent = False
-    monthly_sent = False
-
-    while True:
-        now = _ng_now()
-
-        # Friday 23:50
-        if now.weekday() == 4 and now.hour == 23 and now.minute == 50:
-            if not weekly_sent:
-                weekly_sales()
-                weekly_sent = True
-        else:
-            weekly_sent = False
-
-        # Last day of month 23:50
-        if now.day == _last_day_of_month(now) and now.hour == 23 and now.minute == 50:
-            if not monthly_sent:
-                monthly_sales()
-                monthly_sent = True
-        else:
-            monthly_sent = False
-
-        time.sleep(20)
+# Friday 23:50 da ranar karshe ta wata 23:50 (lokacin Najeriya, UTC+1).
+# Monthly catch-up gajere ne: bayan tsakar dare monthly_sales zai ɗauki sabon wata.
+SCHEDULER.add("weekly_sales", weekly_sales, cron="50 23 * * 5", utc_offset=1, catch_up=6 * 3600, singleton=True)
+SCHEDULER.add("monthly_sales", monthly_sales, cron="50 23 L * *", utc_offset=1, catch_up=9 * 60, singleton=True)
 
 
 
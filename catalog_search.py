@@ -0,0 +1,471 @@
+"""
+Catalog search: fuzzy neman fim ta title / file name a cikin memory.
+
+Trigram index (kamar pg_trgm) a kan kalmomin catalog: kalmar query da
+typo ("tawye", "labrina") tana samun kalmar da ta dace saboda yawancin
+trigrams dinta suna nan. Kalmar karshe kuma ana daukarta a matsayin
+prefix (user yana rubutu: "Da" → Dan Tawaye).
+
+    python catalog_search.py             # correctness + benchmark (100k synthetic titles)
+    python catalog_search.py 250000      # girman catalog na benchmark
+"""
+
+import bisect
+import heapq
+import itertools
+import random
+import re
+import sys
+import threading
+import time
+import unicodedata
+
+
+# ======================
+# NORMALIZE
+# ======================
+_NON_WORD_RE = re.compile(r"[^0-9a-z]+")
+
+# Haruffan Hausa masu ƙugiya ba sa rabuwa da NFKD
+_HAUSA = str.maketrans({"ɓ": "b", "ɗ": "d", "ƙ": "k", "ƴ": "y", "'": "", "’": "", "ʼ": ""})
+
+# Kalmomin file name da ba sa taimakawa bincike
+_NOISE = {"mp4", "mkv", "avi", "webm", "480p", "720p", "1080p", "hd", "x264", "hevc"}
+
+
+def normalize(text):
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", str(text).lower().translate(_HAUSA))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(w for w in _NON_WORD_RE.sub(" ", text).split() if w not in _NOISE)
+
+
+def deletes(word):
+    """Kalmomi da harafi daya ya bace (edit distance 1 na gajerun kalmomi)."""
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def trigrams(text):
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+# ======================
+# INDEX
+# ======================
+class Hit:
+    __slots__ = ("id", "score", "text")
+
+    def __init__(self, doc_id, score, text):
+        self.id = doc_id
+        self.score = score
+        self.text = text
+
+    def __repr__(self):
+        return f"Hit({self.id}, {self.score:.2f}, {self.text!r})"
+
+
+class SearchIndex:
+    """
+    add(doc_id, title, *texts) / remove(doc_id) / search(query, limit, allowed=None).
+
+    Matakai biyu: (1) kowace kalmar query → kalmomin vocabulary masu kama
+    da ita (trigram similarity / harafi daya; kalmar karshe kuma prefix),
+    (2) docs masu dauke da dukkan kalmomin query (ko duka sai daya idan sun
+    kai 3) ana ba su score. Candidates su ne intersection na docs din
+    kalmomin, kuma sabbin SCORE_LIMIT kawai ake ba score.
+    """
+
+    WORD_MIN = 0.4        # trigram similarity mafi karanci na kalma (typo)
+    EDIT_SIM = 0.6        # harafi daya ya bace/kari/canza (gajerun kalmomi)
+    EDIT_MAX_LEN = 8      # kalmomi masu tsawo trigrams sun isa
+    PREFIX_SIM = 0.8      # kalmar karshe da ake rubutawa (prefix)
+    MAX_EXPAND = 12       # iyakar kalmomin vocabulary na kowace kalmar query
+    SCORE_LIMIT = 1500    # iyakar docs da ake ba score (sabbi tukuna)
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.docs = {}           # doc_id -> (title, frozenset words, adadin kalmomin title)
+        self.word_docs = {}      # word -> set(doc_id)
+        self.word_grams = {}     # word -> frozenset trigrams
+        self.gram_words = {}     # trigram -> set(word)
+        self.del_words = {}      # kalma da harafi daya ya bace -> set(word)
+        self._vocab = None       # sorted words domin prefix; None = sai an sake gina
+        self._titles = None      # sorted [(title, doc_id)] domin query gajere
+        self.searches = 0
+        self.seconds = 0.0
+
+    def __len__(self):
+        return len(self.docs)
+
+    # ---------- maintenance ----------
+    def add(self, doc_id, title, *texts):
+        title = normalize(title)
+        words = set(title.split())
+        for text in texts:
+            words.update(normalize(text).split())
+
+        with self.lock:
+            if doc_id in self.docs:
+                self._drop(doc_id)
+            self.docs[doc_id] = (title, frozenset(words), len(title.split()))
+            self._titles = None
+            for w in words:
+                ids = self.word_docs.get(w)
+                if ids is None:
+                    ids = self.word_docs[w] = set()
+                    grams = self.word_grams[w] = frozenset(trigrams(w))
+                    for g in grams:
+                        self.gram_words.setdefault(g, set()).add(w)
+                    if len(w) <= self.EDIT_MAX_LEN:
+                        for d in deletes(w):
+                            self.del_words.setdefault(d, set()).add(w)
+                    self._vocab = None
+                ids.add(doc_id)
+
+    def remove(self, doc_id):
+        with self.lock:
+            if doc_id in self.docs:
+                self._drop(doc_id)
+                self._titles = None
+
+    def _drop(self, doc_id):
+        _, words, _ = self.docs.pop(doc_id)
+        for w in words:
+            ids = self.word_docs[w]
+            ids.discard(doc_id)
+            if ids:
+                continue
+            del self.word_docs[w]
+            for g in self.word_grams.pop(w):
+                gw = self.gram_words[g]
+                gw.discard(w)
+                if not gw:
+                    del self.gram_words[g]
+            if len(w) <= self.EDIT_MAX_LEN:
+                for d in deletes(w):
+                    dw = self.del_words[d]
+                    dw.discard(w)
+                    if not dw:
+                        del self.del_words[d]
+            self._vocab = None
+
+    # ---------- search ----------
+    def _match_word(self, qw, last, fuzzy=True):
+        """
+        {word: similarity} na kalmomin vocabulary da suka yi kama da qw.
+        fuzzy=False → daidai da prefix kawai (ba a taɓa trigrams ba).
+        """
+        found = {}
+        if qw in self.word_docs:
+            found[qw] = 1.0
+
+        if fuzzy and len(qw) >= 3:
+            grams = trigrams(qw)
+            need = max(1, int(len(grams) * self.WORD_MIN + 0.999))
+            # Kalma mai akalla `need` trigrams iri daya dole ta raba daya daga
+            # cikin (len - need + 1) mafi karanci → sai su kawai ake dubawa
+            rare = sorted(grams, key=lambda g: len(self.gram_words.get(g, ())))
+            pool = set()
+            for g in rare[:len(grams) - need + 1]:
+                pool.update(self.gram_words.get(g, ()))
+            for w in pool:
+                n = len(self.word_grams[w] & grams)
+                if n < need:
+                    continue
+                sim = n / (len(grams) + len(self.word_grams[w]) - n)
+                if sim >= self.WORD_MIN and sim > found.get(w, 0):
+                    found[w] = sim
+
+        if fuzzy and 3 <= len(qw) <= self.EDIT_MAX_LEN + 1:
+            # Trigrams ba sa ganin typo a gajerun kalmomi ("kra" → kora):
+            # harafi ya bace (qw ∈ deletes(w)), an kara (w ∈ deletes(qw)),
+            # ko an canza (deletes suna haduwa)
+            near = set(self.del_words.get(qw, ()))
+            for d in deletes(qw):
+                if d in self.word_docs:
+                    near.add(d)
+                near.update(self.del_words.get(d, ()))
+            near.discard(qw)
+            for w in near:
+                if found.get(w, 0) < self.EDIT_SIM:
+                    found[w] = self.EDIT_SIM
+
+        if last:
+            if self._vocab is None:
+                self._vocab = sorted(self.word_docs)
+            i = bisect.bisect_left(self._vocab, qw)
+            while i < len(self._vocab) and self._vocab[i].startswith(qw):
+                w = self._vocab[i]
+                if found.get(w, 0) < self.PREFIX_SIM:
+                    found[w] = self.PREFIX_SIM
+                i += 1
+
+        if len(found) > self.MAX_EXPAND:
+            # Kalma gama-gari tana jawo kalmomi da yawa → mafi kama kawai
+            found = dict(heapq.nlargest(self.MAX_EXPAND, found.items(), key=lambda kv: kv[1]))
+        return found
+
+    def _title_prefix(self, query, allowed):
+        # Harafi 1-2 ("Da" → Dan Tawaye): titles masu farawa da query
+        if allowed is not None and len(allowed) * 4 < len(self.docs):
+            return [d for d in allowed if d in self.docs and self.docs[d][0].startswith(query)]
+        if self._titles is None:
+            self._titles = sorted((title, d) for d, (title, _, _) in self.docs.items())
+        found = []
+        i = bisect.bisect_left(self._titles, (query,))
+        while i < len(self._titles) and self._titles[i][0].startswith(query):
+            d = self._titles[i][1]
+            if allowed is None or d in allowed:
+                found.append(d)
+            i += 1
+        return found
+
+    def search(self, query, limit=10, allowed=None):
+        started = time.perf_counter()
+        query = normalize(query)
+        if not query:
+            return []
+
+        qwords = query.split()
+
+        with self.lock:
+            if len(query) < 3:
+                top = heapq.nlargest(limit, self._title_prefix(query, allowed))
+                hits = [Hit(d, 1.0, self.docs[d][0]) for d in top]
+            else:
+                # Kalmomi daidai/prefix tukuna; typo sai idan ba su isa limit
+                # ba, ko wata kalma ba ta samu daidai ba (in ba haka ba sauran
+                # kalmomi gama-gari su cika limit kuma typo ba zai taba zuwa ba)
+                strong = [
+                    self._match_word(qw, i == len(qwords) - 1, fuzzy=False)
+                    for i, qw in enumerate(qwords)
+                ]
+                scored = self._score(query, qwords, strong, allowed, limit)
+                if len(scored) < limit or not all(strong):
+                    # Kalmar da ta samu daidai (1.0) ba ta bukatar typo variants
+                    matches = [
+                        m if 1.0 in m.values() else self._match_word(qw, i == len(qwords) - 1)
+                        for i, (qw, m) in enumerate(zip(qwords, strong))
+                    ]
+                    if matches != strong:
+                        scored = self._score(query, qwords, matches, allowed, limit)
+
+                # Score mafi girma; idan daidai, sabon doc (id mafi girma) tukuna
+                top = heapq.nlargest(limit, scored, key=lambda t: (t[0], t[1]))
+                hits = [Hit(d, score, title) for score, d, title in top]
+
+        self.searches += 1
+        self.seconds += time.perf_counter() - started
+        return hits
+
+    def _score(self, query, qwords, matches, allowed, limit):
+        useful = [m for m in matches if m]
+        need = len(qwords) if len(qwords) <= 2 else len(qwords) - 1
+        if len(useful) < need:
+            return []
+        # Kalmomin kowace match daga mafi kama → wanda ya fara samuwa shi ne max
+        ranked = [sorted(m.items(), key=lambda kv: kv[1], reverse=True) for m in useful]
+
+        if allowed is not None and len(allowed) * 4 < len(self.docs):
+            return self._score_docs(query, qwords, ranked, need, [d for d in allowed if d in self.docs])
+
+        if not isinstance(allowed, (set, frozenset, type(None))):
+            allowed = set(allowed)
+        sets = sorted((self._word_set(m) for m in useful), key=len)
+
+        # Docs masu dauke da dukkan kalmomi tukuna; idan sun cika limit ba a
+        # bukatar wadanda suka rasa kalma daya (score dinsu ya fi kasa)
+        full = set.intersection(*sets) if len(sets) > 1 else set(sets[0])
+        if allowed is not None:
+            full &= allowed
+        scored = self._score_docs(query, qwords, ranked, need, self._cap(full))
+        if len(useful) == need or len(scored) >= limit:
+            return scored
+
+        # Kalma daya na iya rasa → union na intersections ba tare da ita ba
+        partial = set()
+        for i in range(len(sets)):
+            rest = sets[:i] + sets[i + 1:]
+            partial |= set.intersection(*rest) if len(rest) > 1 else rest[0]
+        partial -= full
+        if allowed is not None:
+            partial &= allowed
+        return scored + self._score_docs(query, qwords, ranked, need, self._cap(partial))
+
+    def _cap(self, candidates):
+        if len(candidates) > self.SCORE_LIMIT:
+            # Kalmomi gama-gari: sabbin docs kawai (idan score daidai, sabo ke gaba)
+            return heapq.nlargest(self.SCORE_LIMIT, candidates)
+        return candidates
+
+    def _score_docs(self, query, qwords, ranked, need, candidates):
+        scored = []
+        for d in candidates:
+            title, words, title_len = self.docs[d]
+            total = 0.0
+            hit_words = 0
+            for pairs in ranked:
+                for w, sim in pairs:
+                    if w in words:
+                        total += sim
+                        hit_words += 1
+                        break
+            if hit_words < need:
+                continue
+
+            score = total / len(qwords)
+            # Title gajere mai dauke da query ya fi wanda ke da karin kalmomi
+            score += 0.2 * total / max(title_len, len(qwords))
+            if title.startswith(query):
+                score += 0.3
+            elif query in title:
+                score += 0.15
+            scored.append((score, d, title))
+
+        return scored
+
+    def _word_set(self, match):
+        if len(match) == 1:
+            return self.word_docs[next(iter(match))]
+        docs = set()
+        for w in match:
+            docs |= self.word_docs[w]
+        return docs
+
+    def stats(self):
+        avg = (self.seconds / self.searches * 1000) if self.searches else 0.0
+        return (
+            f"docs: {len(self.docs)} | words: {len(self.word_docs)} | "
+            f"searches: {self.searches} | avg {avg:.2f}ms"
+        )
+
+
+# ======================
+# SELF TEST + BENCHMARK
+# ======================
+_SAMPLE = [
+    (1, "Dan Tawaye", "dan_tawaye_part1.mp4"),
+    (2, "Dan Tawaye 2", "Dan.Tawaye.2.720p.mkv"),
+    (3, "Labarina Season 5", "labarina_s05e01.mp4"),
+    (4, "Izzar So", "izzar_so_ep120.mp4"),
+    (5, "Kwana Casa'in", "kwana_casain_s3.mp4"),
+    (6, "The Last Kingdom", "the.last.kingdom.s01.mkv"),
+    (7, "Ɗan Birni", "dan_birni.mp4"),
+]
+
+# (query, id da ake sa ran ya zo na farko)
+_CHECKS = [
+    ("dan tawaye", 1),
+    ("tawaye 2", 2),
+    ("dan tawye", 1),           # typo (harafi ya bace)
+    ("labrina", 3),             # typo
+    ("izar so", 4),
+    ("kwana casain", 5),
+    ("last kingdom", 6),
+    ("dan birni", 7),           # Ɗ → d
+    ("Da", 7),                  # prefix (sabon doc tukuna)
+    ("s05e01", 3),              # file name
+]
+
+_SYLLABLES = [
+    "ba", "da", "ka", "la", "ma", "na", "ra", "sa", "ta", "wa", "ya", "za",
+    "bi", "di", "ki", "li", "mi", "ni", "ri", "si", "ti", "zi",
+    "bu", "du", "ku", "lu", "mu", "nu", "ru", "su", "tu", "zu", "ga", "go", "ko", "yo",
+]
+
+
+def _synthetic(n, seed=7):
+    # Vocabulary mai Zipf: wasu kalmomi ("dan", "season") suna ko'ina, yawanci ba safai ba
+    rnd = random.Random(seed)
+    vocab = list(dict.fromkeys(
+        "".join(rnd.choice(_SYLLABLES) for _ in range(rnd.randint(2, 4)))
+        for _ in range(max(n // 3, 1000))
+    ))
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(vocab))))
+    docs = []
+    for i in range(1, n + 1):
+        words = rnd.choices(vocab, cum_weights=cum_weights, k=rnd.randint(1, 4))
+        title = " ".join(w.capitalize() for w in words)
+        if rnd.random() < 0.3:
+            title += f" Season {rnd.randint(1, 9)}"
+        docs.append((i, title, f"{'_'.join(words)}_ep{rnd.randint(1, 200)}.mp4"))
+    return docs
+
+
+def _typo(rnd, text):
+    i = rnd.randrange(len(text))
+    return text[:i] + text[i + 1:] if rnd.random() < 0.5 else text[:i] + rnd.choice("aeiou") + text[i:]
+
+
+def _bench(n):
+    rnd = random.Random(11)
+    docs = _synthetic(n)
+
+    started = time.perf_counter()
+    index = SearchIndex()
+    for doc_id, title, file_name in docs:
+        index.add(doc_id, title, file_name)
+    build = time.perf_counter() - started
+
+    targets = [docs[rnd.randrange(n)] for _ in range(300)]
+    queries = [(normalize(t), d) for d, t, _ in targets]
+    typos = [(_typo(rnd, q), d) for q, d in queries]
+    short = ["".join(rnd.choice(_SYLLABLES))[:2] for _ in range(100)]
+
+    def run(qs):
+        times, found = [], 0
+        for q, want in qs:
+            t = time.perf_counter()
+            hits = index.search(q, limit=10)
+            times.append(time.perf_counter() - t)
+            found += any(h.id == want for h in hits)
+        times.sort()
+        return times[len(times) // 2] * 1000, times[int(len(times) * 0.95)] * 1000, found / len(qs) * 100
+
+    def scan(qs):
+        # Tsohon hanya: LIKE %q% a kan kowane title
+        t = time.perf_counter()
+        for q, _ in qs:
+            [d for d, title, fname in docs if q in title.lower() or q in fname.lower()]
+        return (time.perf_counter() - t) / len(qs) * 1000
+
+    print(f"\nsynthetic catalog: {n} titles | build {build:.2f}s")
+    p50, p95, rate = run(queries)
+    print(f"exact   : p50 {p50:.2f}ms p95 {p95:.2f}ms | found in top 10: {rate:.0f}%")
+    p50, p95, rate = run(typos)
+    print(f"typo    : p50 {p50:.2f}ms p95 {p95:.2f}ms | found in top 10: {rate:.0f}%")
+    p50, p95, _ = run([(q, None) for q in short])
+    print(f"prefix  : p50 {p50:.2f}ms p95 {p95:.2f}ms")
+    print(f"LIKE scan baseline: {scan(queries[:30]):.2f}ms per query (no typo tolerance)")
+    print(index.stats())
+
+
+def main(argv):
+    n = int(argv[0]) if argv else 100_000
+
+    index = SearchIndex()
+    for doc_id, title, file_name in _SAMPLE:
+        index.add(doc_id, title, file_name)
+
+    failures = 0
+    for query, want in _CHECKS:
+        hits = index.search(query, limit=3)
+        ok = bool(hits) and hits[0].id == want
+        failures += not ok
+        print(f"{'✅' if ok else '❌'} {query!r}: {hits}")
+    if failures:
+        print(f"{failures} check(s) failed")
+        return 1
+
+    _bench(n)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,369 @@
+"""
+Email extractor: ciro amount da remark daga sakon banki (Palmpay da sauransu).
+
+Tier 1 → profile na kowane banki (an zaɓa ta sender/subject) + regex da aka
+riga aka compile, HTML ana wanke shi da regex kawai.
+Tier 2 → BeautifulSoup sai idan tier 1 bai sami amount ko remark ba.
+
+    python email_extractor.py              # correctness + benchmark (corpus na ciki)
+    python email_extractor.py a.eml b.eml  # gwada sakonni na gaske
+"""
+
+import email
+import html
+import re
+import sys
+import threading
+import time
+from email.header import decode_header
+
+
+# ======================
+# BANK PROFILES
+# ======================
+_AMOUNT_GENERIC = (
+    re.compile(r"(?:Amount|Received Amount|NGN|₦)\s*:?\s*₦?\s*([\d,]+(?:\.\d+)?)", re.IGNORECASE),
+    re.compile(r"([\d,]+(?:\.\d+)?)\s*(?:NGN|Naira)", re.IGNORECASE),
+)
+_REMARK_GENERIC = (
+    re.compile(r"(?:Remark|Narration|Description)\s*:?\s*\n?\s*([^\n\r]+)", re.IGNORECASE),
+)
+
+PROFILES = [
+    {
+        "name": "palmpay",
+        "match": re.compile(r"palmpay", re.IGNORECASE),
+        "amount": (
+            re.compile(r"(?:Received Amount|Amount)\s*:?\s*\n?\s*(?:NGN|₦)?\s*([\d,]+(?:\.\d+)?)", re.IGNORECASE),
+            re.compile(r"(?:NGN|₦)\s*([\d,]+(?:\.\d+)?)", re.IGNORECASE),
+        ),
+        "remark": (
+            re.compile(r"Remark\s*:?\s*\n?\s*([^\n\r]+)", re.IGNORECASE),
+        ),
+    },
+    {
+        "name": "generic",
+        "match": None,
+        "amount": _AMOUNT_GENERIC,
+        "remark": _REMARK_GENERIC,
+    },
+]
+
+
+# ======================
+# HTML → TEXT (BA TARE DA SOUP BA)
+# ======================
+_DROP_BLOCKS_RE = re.compile(r"<(script|style|head)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_BREAK_TAGS_RE = re.compile(r"<\s*(?:br|/p|/div|/tr|/td|/th|/li|/h[1-6]|/table)\b[^>]*>", re.IGNORECASE)
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPACES_RE = re.compile(r"[ \t\f\v\xa0]+")
+_BLANK_LINES_RE = re.compile(r"\s*\n\s*")
+
+
+def html_to_text(raw):
+    raw = _DROP_BLOCKS_RE.sub(" ", raw)
+    raw = _BREAK_TAGS_RE.sub("\n", raw)
+    raw = _TAG_RE.sub(" ", raw)
+    raw = html.unescape(raw)
+    raw = _SPACES_RE.sub(" ", raw)
+    return _BLANK_LINES_RE.sub("\n", raw).strip()
+
+
+def soup_to_text(raw):
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(raw, "html.parser").get_text(separator="\n")
+
+
+# ======================
+# STATS
+# ======================
+EXTRACT_STATS = {
+    "emails": 0,
+    "matched": 0,
+    "seconds": 0.0,
+    "paths": {},
+}
+EXTRACT_STATS_LOCK = threading.Lock()
+
+
+def _record(path, matched, elapsed):
+    with EXTRACT_STATS_LOCK:
+        EXTRACT_STATS["emails"] += 1
+        EXTRACT_STATS["seconds"] += elapsed
+        if matched:
+            EXTRACT_STATS["matched"] += 1
+        paths = EXTRACT_STATS["paths"]
+        paths[path] = paths.get(path, 0) + 1
+
+
+def extract_stats_text():
+    with EXTRACT_STATS_LOCK:
+        n = EXTRACT_STATS["emails"]
+        if not n:
+            return "Babu email tukuna."
+        avg_ms = EXTRACT_STATS["seconds"] / n * 1000
+        rate = EXTRACT_STATS["matched"] / n * 100
+        paths = " | ".join(f"{k}: {v}" for k, v in sorted(EXTRACT_STATS["paths"].items()))
+    return f"emails: {n} | matched: {rate:.0f}% | avg {avg_ms:.2f}ms\n{paths}"
+
+
+# ======================
+# EXTRACTION
+# ======================
+class Extracted:
+    __slots__ = ("amount", "remark", "text", "subject", "sender", "path")
+
+    def __init__(self, amount, remark, text, subject, sender, path):
+        self.amount = amount
+        self.remark = remark
+        self.text = text
+        self.subject = subject
+        self.sender = sender
+        self.path = path
+
+    @property
+    def matched(self):
+        return self.amount is not None and self.remark is not None
+
+
+def decode_subject(raw):
+    try:
+        decoded, charset = decode_header(raw or "")[0]
+        if isinstance(decoded, bytes):
+            return decoded.decode(charset or "utf-8", errors="ignore")
+        return decoded
+    except Exception:
+        return raw or ""
+
+
+def _part_text(part):
+    payload = part.get_payload(decode=True)
+    if not payload:
+        return ""
+    return payload.decode(part.get_content_charset() or "utf-8", errors="ignore")
+
+
+def _bodies(msg):
+    """
+    (plain, html) na farko a cikin sako — ba a wuce attachments ba.
+    """
+    plain = html_body = None
+    parts = msg.walk() if msg.is_multipart() else (msg,)
+
+    for part in parts:
+        if part.get_content_maintype() != "text":
+            continue
+        if part.get_content_disposition() == "attachment":
+            continue
+        ctype = part.get_content_type()
+        if ctype == "text/plain" and plain is None:
+            plain = _part_text(part)
+        elif ctype == "text/html" and html_body is None:
+            html_body = _part_text(part)
+        if plain is not None and html_body is not None:
+            break
+
+    return plain, html_body
+
+
+def pick_profile(sender, subject):
+    key = f"{sender}\n{subject}"
+    for profile in PROFILES:
+        if profile["match"] is None or profile["match"].search(key):
+            return profile
+    return PROFILES[-1]
+
+
+def _first(patterns, text):
+    for pattern in patterns:
+        m = pattern.search(text)
+        if m:
+            return m.group(1).strip()
+    return None
+
+
+def parse_amount(value):
+    if not value:
+        return None
+    try:
+        return int(float(value.replace(",", "")))
+    except ValueError:
+        return None
+
+
+def _apply(profile, text):
+    amount = parse_amount(_first(profile["amount"], text))
+    remark = _first(profile["remark"], text) or None
+    return amount, remark
+
+
+def extract_payment(msg, allow_soup=True):
+    """
+    email.message.Message → Extracted(amount, remark, text, ...).
+    """
+    started = time.perf_counter()
+
+    sender = msg.get("From", "") or ""
+    subject = decode_subject(msg.get("Subject", ""))
+    profile = pick_profile(sender, subject)
+    plain, html_body = _bodies(msg)
+
+    # ===== TIER 1: plain text / HTML da regex =====
+    body = plain if plain else (html_to_text(html_body) if html_body else "")
+    text = subject + "\n" + body
+    amount, remark = _apply(profile, text)
+    path = profile["name"]
+
+    if (amount is None or remark is None) and plain and html_body:
+        # wasu bankuna suna sa remark a HTML kawai
+        html_text = subject + "\n" + html_to_text(html_body)
+        a2, r2 = _apply(profile, html_text)
+        if a2 is not None or r2 is not None:
+            amount = amount if amount is not None else a2
+            remark = remark or r2
+            text = text + "\n" + html_text
+
+    # ===== TIER 2: BeautifulSoup (last resort) =====
+    if allow_soup and (amount is None or remark is None) and html_body:
+        try:
+            soup_text = subject + "\n" + soup_to_text(html_body)
+            a2, r2 = _apply(profile, soup_text)
+            if a2 is not None or r2 is not None:
+                amount = amount if amount is not None else a2
+                remark = remark or r2
+                text = text + "\n" + soup_text
+                path = "soup"
+        except Exception:
+            pass
+
+    result = Extracted(amount, remark, text, subject, sender, path)
+    _record(path if result.matched or path == "soup" else "unmatched", result.matched, time.perf_counter() - started)
+    return result
+
+
+# ======================
+# CORPUS (ANONYMIZED) + BENCHMARK
+# ======================
+_PALMPAY_HTML = """From: PalmPay <noreply@palmpay.example>
+Subject: Transaction Notification
+MIME-Version: 1.0
+Content-Type: text/html; charset="utf-8"
+
+<html><head><style>td {{ color: #333; }}</style></head><body>
+<table><tr><td>Dear Customer,</td></tr>
+<tr><td>You have received money in your PalmPay account.</td></tr>
+<tr><td>Received Amount</td><td>&#8358;{amount}</td></tr>
+<tr><td>Sender</td><td>JOHN DOE</td></tr>
+<tr><td>Remark</td><td>{remark}</td></tr>
+<tr><td>Transaction ID</td><td>TX000000000001</td></tr>
+</table><p>Thank you for choosing PalmPay.</p></body></html>
+"""
+
+_GENERIC_MULTIPART = """From: Alerts <alerts@bank.example>
+Subject: Credit Alert
+MIME-Version: 1.0
+Content-Type: multipart/alternative; boundary="BOUNDARY"
+
+--BOUNDARY
+Content-Type: text/plain; charset="utf-8"
+
+Credit Alert
+Amount: NGN {amount}
+Narration: {remark}
+Balance: NGN 12,345.67
+
+--BOUNDARY
+Content-Type: text/html; charset="utf-8"
+
+<html><body><p>Credit Alert</p><p>Amount: NGN {amount}</p><p>Narration: {remark}</p></body></html>
+--BOUNDARY--
+"""
+
+_HTML_ONLY_REMARK = """From: Alerts <alerts@bank.example>
+Subject: You received {amount} Naira
+MIME-Version: 1.0
+Content-Type: multipart/alternative; boundary="B2"
+
+--B2
+Content-Type: text/plain; charset="utf-8"
+
+You received {amount} Naira. View this email in HTML for details.
+
+--B2
+Content-Type: text/html; charset="utf-8"
+
+<div><span>Remark:</span> <b>{remark}</b></div>
+--B2--
+"""
+
+_NEWSLETTER = """From: News <news@shop.example>
+Subject: Weekend deals
+MIME-Version: 1.0
+Content-Type: text/html; charset="utf-8"
+
+<html><body><h1>Big sale</h1><p>Everything must go this weekend.</p></body></html>
+"""
+
+CORPUS = [
+    (_PALMPAY_HTML.format(amount="1,500.00", remark="SQ7K2P9"), 1500, "SQ7K2P9"),
+    (_PALMPAY_HTML.format(amount="99.70", remark="ABX12Q"), 99, "ABX12Q"),
+    (_GENERIC_MULTIPART.format(amount="250.00", remark="GF55XY"), 250, "GF55XY"),
+    (_HTML_ONLY_REMARK.format(amount="300", remark="RM88ZZ"), 300, "RM88ZZ"),
+    (_NEWSLETTER, None, None),
+]
+
+
+def _baseline_soup(msg):
+    # Tsohon hanya: soup a kan kowane HTML part
+    text = ""
+    for part in (msg.walk() if msg.is_multipart() else (msg,)):
+        if part.get_content_type() == "text/html":
+            text += "\n" + soup_to_text(_part_text(part))
+        elif part.get_content_type() == "text/plain":
+            text += "\n" + _part_text(part)
+    return _apply(PROFILES[-1], text)
+
+
+def _bench(fn, messages, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for m in messages:
+            fn(m)
+    return (time.perf_counter() - started) / (rounds * len(messages)) * 1e6
+
+
+def main(argv):
+    rounds = 200
+    files = [a for a in argv if not a.startswith("--")]
+
+    if files:
+        for path in files:
+            with open(path, "rb") as f:
+                msg = email.message_from_bytes(f.read())
+            r = extract_payment(msg)
+            print(f"{path}: path={r.path} amount={r.amount} remark={r.remark!r}")
+        messages = [email.message_from_bytes(open(p, "rb").read()) for p in files]
+    else:
+        failures = 0
+        for raw, amount, remark in CORPUS:
+            r = extract_payment(email.message_from_string(raw))
+            ok = (r.amount, r.remark) == (amount, remark)
+            failures += not ok
+            print(f"{'✅' if ok else '❌'} {r.subject!r}: path={r.path} amount={r.amount} remark={r.remark!r}")
+        if failures:
+            print(f"{failures} corpus mismatch(es)")
+            return 1
+        messages = [email.message_from_string(raw) for raw, _, _ in CORPUS]
+
+    fast = _bench(extract_payment, messages, rounds)
+    try:
+        soup = _bench(_baseline_soup, messages, rounds)
+        print(f"\nper email: extractor {fast:.0f}µs | soup baseline {soup:.0f}µs ({soup / fast:.1f}x)")
+    except ImportError:
+        print(f"\nper email: extractor {fast:.0f}µs (bs4 not installed, no baseline)")
+    print(extract_stats_text())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
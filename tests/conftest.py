@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules din suna a tushen repo (ba package ba)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,60 @@
+import pytest
+
+from catalog_search import _CHECKS, _SAMPLE, SearchIndex, normalize
+
+
+@pytest.fixture
+def index():
+    idx = SearchIndex()
+    for doc_id, title, file_name in _SAMPLE:
+        idx.add(doc_id, title, file_name)
+    return idx
+
+
+@pytest.mark.parametrize("query, want", _CHECKS, ids=[q for q, _ in _CHECKS])
+def test_sample_checks(index, query, want):
+    hits = index.search(query, limit=3)
+    assert hits and hits[0].id == want
+
+
+def test_normalize():
+    assert normalize("Ɗan.Birni_720p.MKV") == "dan birni"
+    assert normalize("Kwana Casa'in") == "kwana casain"
+    assert normalize(None) == ""
+
+
+def test_empty_query(index):
+    assert index.search("  ... ") == []
+
+
+def test_no_match(index):
+    assert index.search("zzzzqqqq") == []
+
+
+def test_limit(index):
+    assert len(index.search("dan", limit=2)) == 2
+
+
+def test_allowed(index):
+    hits = index.search("dan tawaye", allowed={2})
+    assert [h.id for h in hits] == [2]
+
+
+def test_remove(index):
+    index.remove(1)
+    assert all(h.id != 1 for h in index.search("dan tawaye"))
+    assert "part1" not in index.word_docs
+
+
+def test_readd_replaces_words(index):
+    index.add(4, "Sabon Suna", "sabon_suna.mp4")
+    assert index.search("izzar so") == []
+    assert index.search("sabon suna")[0].id == 4
+    assert len(index) == len(_SAMPLE)
+
+
+def test_duplicate_titles_newest_first():
+    idx = SearchIndex()
+    for doc_id in range(1, 6):
+        idx.add(doc_id, "Dan Tawaye")
+    assert [h.id for h in idx.search("dan tawaye", limit=3)] == [5, 4, 3]
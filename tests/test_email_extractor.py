@@ -0,0 +1,111 @@
+import email
+
+import pytest
+
+import email_extractor
+from email_extractor import CORPUS, extract_payment, html_to_text, parse_amount, pick_profile
+
+
+def _extract(raw, **kwargs):
+    return extract_payment(email.message_from_string(raw), **kwargs)
+
+
+# ======================
+# CORPUS
+# ======================
+@pytest.mark.parametrize(
+    "raw, amount, remark",
+    CORPUS,
+    ids=["palmpay_html", "palmpay_decimals", "generic_multipart", "html_only_remark", "newsletter"],
+)
+def test_corpus(raw, amount, remark):
+    r = _extract(raw)
+    assert (r.amount, r.remark) == (amount, remark)
+
+
+@pytest.mark.parametrize("raw, amount, remark", CORPUS[:4])
+def test_corpus_without_soup(raw, amount, remark):
+    # tier 1 kadai ya isa ga duk samfurin da ke da biya
+    r = _extract(raw, allow_soup=False)
+    assert (r.amount, r.remark) == (amount, remark)
+    assert r.path != "soup"
+
+
+# ======================
+# EDGE CASES
+# ======================
+_MISSING_AMOUNT = """From: PalmPay <noreply@palmpay.example>
+Subject: Transaction Notification
+MIME-Version: 1.0
+Content-Type: text/plain; charset="utf-8"
+
+You have received money in your PalmPay account.
+Remark: SQ1234
+"""
+
+_HTML_ONLY_BODY = """From: Alerts <alerts@bank.example>
+Subject: Credit Alert
+MIME-Version: 1.0
+Content-Type: text/html; charset="utf-8"
+
+<html><head><script>var Amount = 1;</script></head><body>
+<table><tr><td>Amount:</td><td>NGN 4,200.00</td></tr>
+<tr><td>Narration:</td><td>HT77QQ</td></tr></table>
+</body></html>
+"""
+
+_UNKNOWN_SENDER = """From: Someone <someone@unknown.example>
+Subject: Payment received
+MIME-Version: 1.0
+Content-Type: text/plain; charset="utf-8"
+
+Amount: 750
+Description: UK42AB
+"""
+
+
+def test_missing_amount():
+    r = _extract(_MISSING_AMOUNT, allow_soup=False)
+    assert r.amount is None
+    assert r.remark == "SQ1234"
+    assert not r.matched
+    assert r.path == "palmpay"
+
+
+def test_html_only_body():
+    r = _extract(_HTML_ONLY_BODY, allow_soup=False)
+    assert (r.amount, r.remark) == (4200, "HT77QQ")
+    assert r.matched
+    assert "var Amount" not in r.text
+
+
+def test_unknown_sender_falls_back_to_generic():
+    msg = email.message_from_string(_UNKNOWN_SENDER)
+    assert pick_profile(msg["From"], msg["Subject"])["name"] == "generic"
+
+    r = extract_payment(msg)
+    assert (r.amount, r.remark) == (750, "UK42AB")
+    assert r.path == "generic"
+
+
+def test_palmpay_picked_by_sender():
+    assert pick_profile("PalmPay <noreply@palmpay.example>", "Alert")["name"] == "palmpay"
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("1,500.00", 1500), ("99.70", 99), ("", None), (None, None), ("abc", None)],
+)
+def test_parse_amount(value, expected):
+    assert parse_amount(value) == expected
+
+
+def test_html_to_text_drops_style_and_entities():
+    text = html_to_text("<style>p {color: red}</style><p>A&amp;B</p><br>C")
+    assert text == "A&B\nC"
+
+
+def test_stats_recorded():
+    before = email_extractor.EXTRACT_STATS["emails"]
+    _extract(CORPUS[0][0])
+    assert email_extractor.EXTRACT_STATS["emails"] == before + 1